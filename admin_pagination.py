@@ -0,0 +1,101 @@
+# Keyset Pagination Helpers for the Admin APIs
+# Cursor pagination on (created_at, id) with explicit column projection
+
+import base64
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Any
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 500
+
+# Explicit projections for admin list endpoints
+ADMIN_USER_COLUMNS = "id, telegram_user_id, first_name, username, email, total_commitments, created_at"
+ADMIN_COMMITMENT_COLUMNS = "id, user_id, telegram_user_id, commitment, status, smart_score, created_at, completed_at"
+ADMIN_USER_SEARCH_COLUMNS = ("first_name", "username", "email")
+
+def encode_cursor(row: Dict) -> str:
+    """Encode the (created_at, id) position of a row as an opaque cursor"""
+    payload = json.dumps([row.get("created_at"), row.get("id")], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode a cursor produced by encode_cursor; raises ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+    if not created_at or not row_id:
+        raise ValueError("Invalid cursor: missing position")
+
+    # Both values are interpolated into PostgREST filters, so only well-formed ones pass
+    try:
+        datetime.fromisoformat(str(created_at).replace("Z", "+00:00"))
+        row_id = str(uuid.UUID(str(row_id)))
+    except ValueError:
+        raise ValueError("Invalid cursor: malformed position")
+
+    return created_at, row_id
+
+def quote_filter_value(value: str) -> str:
+    """Double-quote a value for PostgREST filter grammar so , . ( ) : are taken literally"""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def search_filter(term: Optional[str], columns: Tuple[str, ...]) -> Optional[str]:
+    """`or` expression matching `term` as a substring (ilike) of any of `columns`"""
+    if not term:
+        return None
+    pattern = quote_filter_value(f"*{term}*")
+    return ",".join(f"{column}.ilike.{pattern}" for column in columns)
+
+def fetch_keyset_page(query, cursor: Optional[str] = None, limit: int = 50, or_filter: Optional[str] = None) -> Dict[str, Any]:
+    """Fetch one newest-first page of a query ordered by (created_at, id)
+
+    `query` is a filtered select builder; ordering, the keyset predicate and the
+    limit are applied here so every page is an index range scan. `or_filter` is
+    an optional PostgREST `or` expression (e.g. a multi-column search) - it is
+    folded into the keyset predicate because PostgREST takes one `or` per level.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        before = f'created_at.lt.{quote_filter_value(created_at)}'
+        tie = f'created_at.eq.{quote_filter_value(created_at)},id.lt.{row_id}'
+        if or_filter:
+            query = query.or_(f"and(or({or_filter}),{before}),and(or({or_filter}),{tie})")
+        else:
+            query = query.or_(f"{before},and({tie})")
+    elif or_filter:
+        query = query.or_(or_filter)
+
+    # Ask for one extra row to know whether another page exists
+    result = query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1).execute()
+    rows = result.data or []
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        "rows": rows,
+        "next_cursor": encode_cursor(rows[-1]) if has_more and rows else None,
+        "has_more": has_more
+    }
+
+def fetch_active_roles(supabase: Client, user_ids: List[str]) -> Dict[str, List[str]]:
+    """Active roles for a page of users in one batched query"""
+    if not user_ids:
+        return {}
+
+    result = supabase.table("user_roles").select("user_id, role_type").in_("user_id", user_ids).eq("is_active", True).execute()
+
+    roles: Dict[str, List[str]] = {}
+    for row in result.data or []:
+        roles.setdefault(row["user_id"], []).append(row["role_type"])
+    return roles
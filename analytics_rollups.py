@@ -0,0 +1,208 @@
+# Delivery and Sequence Analytics Rollups for The Progress Method
+# Reads trigger-maintained daily rollups; falls back to one streaming pass over the raw tables
+
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Any
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_STATUS_COLUMNS = ("pending", "sending", "sent", "delivered", "opened", "clicked", "failed", "bounced")
+SEQUENCE_STATE_COLUMNS = ("started", "active", "completed", "stopped")
+
+def stream_rows(query_factory: Callable[[], Any], page_size: int = 1000) -> Iterable[Dict]:
+    """Yield rows of a query page by page (the factory must return an ordered builder)"""
+    offset = 0
+    while True:
+        result = query_factory().range(offset, offset + page_size - 1).execute()
+        rows = result.data or []
+        yield from rows
+        if len(rows) < page_size:
+            break
+        offset += page_size
+
+def _empty_delivery_counts() -> Dict[str, int]:
+    return {"scheduled": 0, **{column: 0 for column in DELIVERY_STATUS_COLUMNS}}
+
+def _classify_delivery(row: Dict) -> Dict[str, int]:
+    """Rollup contribution of one raw message_deliveries row"""
+    status = row.get("delivery_status")
+    counts = _empty_delivery_counts()
+    counts["scheduled"] = 1
+    if status in ("failed", "bounced"):
+        counts["failed"] = 1
+        if status == "bounced" or "bounce" in (row.get("failure_reason") or "").lower():
+            counts["bounced"] = 1
+    elif status in counts:
+        counts[status] = 1
+    return counts
+
+class AnalyticsRollups:
+    """Daily rollups of message_deliveries (per sequence/channel) and user_sequence_state (per sequence)"""
+
+    def __init__(self, supabase_client: Client, page_size: int = 1000):
+        self.supabase = supabase_client
+        self.page_size = page_size
+        self._available = {"delivery_daily_rollups": True, "sequence_daily_rollups": True}
+
+    def _rollup_failed(self, table: str, error: Exception):
+        """Stop reading a rollup table that is not deployed; other errors only skip this call"""
+        message = str(error)
+        if table in message or "42P01" in message or "PGRST205" in message:
+            self._available[table] = False
+        logger.warning(f"{table} unavailable, aggregating raw rows: {error}")
+
+    def delivery_rollups(self, days: int, channel: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Rows of (day, sequence_type, channel, scheduled, <status counts>) for the last `days` days"""
+        cutoff = (datetime.now() - timedelta(days=days)).date().isoformat()
+
+        if self._available["delivery_daily_rollups"]:
+            try:
+                def rollup_query():
+                    query = self.supabase.table("delivery_daily_rollups").select(
+                        "day, sequence_type, channel, scheduled, " + ", ".join(DELIVERY_STATUS_COLUMNS)
+                    ).gte("day", cutoff)
+                    if channel:
+                        query = query.eq("channel", channel)
+                    return query.order("day").order("sequence_type").order("channel")
+                return list(stream_rows(rollup_query, self.page_size))
+            except Exception as e:
+                self._rollup_failed("delivery_daily_rollups", e)
+
+        return self._aggregate_deliveries(cutoff, channel)
+
+    def _aggregate_deliveries(self, cutoff: str, channel: Optional[str]) -> List[Dict[str, Any]]:
+        """One streaming pass over the needed columns of message_deliveries"""
+        def query_factory():
+            query = self.supabase.table("message_deliveries").select(
+                "id, scheduled_at, sequence_type, channel, delivery_status, failure_reason"
+            ).gte("scheduled_at", cutoff)
+            if channel:
+                query = query.eq("channel", channel)
+            return query.order("id")
+
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        for row in stream_rows(query_factory, self.page_size):
+            key = ((row.get("scheduled_at") or "")[:10], row["sequence_type"], row["channel"])
+            group = groups.get(key)
+            if group is None:
+                group = {"day": key[0], "sequence_type": key[1], "channel": key[2], **_empty_delivery_counts()}
+                groups[key] = group
+            for column, value in _classify_delivery(row).items():
+                group[column] += value
+
+        return list(groups.values())
+
+    def sequence_rollups(self) -> List[Dict[str, Any]]:
+        """Rows of (day, sequence_type, started, active, completed, stopped)"""
+        if self._available["sequence_daily_rollups"]:
+            try:
+                return list(stream_rows(lambda: self.supabase.table("sequence_daily_rollups").select(
+                    "day, sequence_type, " + ", ".join(SEQUENCE_STATE_COLUMNS)
+                ).order("day").order("sequence_type"), self.page_size))
+            except Exception as e:
+                self._rollup_failed("sequence_daily_rollups", e)
+
+        groups: Dict[str, Dict[str, Any]] = {}
+        query_factory = lambda: self.supabase.table("user_sequence_state").select(
+            "id, sequence_type, is_active, completed_at, stopped_at"
+        ).order("id")
+        for row in stream_rows(query_factory, self.page_size):
+            group = groups.setdefault(row["sequence_type"], {"day": None, "sequence_type": row["sequence_type"],
+                                                              **{column: 0 for column in SEQUENCE_STATE_COLUMNS}})
+            group["started"] += 1
+            if row.get("completed_at"):
+                group["completed"] += 1
+            elif row.get("stopped_at"):
+                group["stopped"] += 1
+            elif row.get("is_active"):
+                group["active"] += 1
+
+        return list(groups.values())
+
+    # ---------------------------------------------------------------
+    # Report shapes used by the services
+    # ---------------------------------------------------------------
+
+    def email_delivery_stats(self, days: int = 7) -> Dict[str, Any]:
+        """Same shape as EmailDeliveryService.get_delivery_stats (funnel counts are cumulative)"""
+        totals = _empty_delivery_counts()
+        for row in self.delivery_rollups(days, channel="email"):
+            for column in totals:
+                totals[column] += row.get(column) or 0
+
+        clicked = totals["clicked"]
+        opened = totals["opened"] + clicked
+        delivered = totals["delivered"] + opened
+        sent = totals["sent"] + delivered
+
+        stats = {
+            "period_days": days,
+            "total_scheduled": totals["scheduled"],
+            "sent": sent,
+            "delivered": delivered,
+            "opened": opened,
+            "clicked": clicked,
+            "bounced": totals["bounced"],
+            "failed": totals["failed"]
+        }
+        stats["delivery_rate"] = round((delivered / sent * 100) if sent > 0 else 0, 2)
+        stats["open_rate"] = round((opened / delivered * 100) if delivered > 0 else 0, 2)
+        stats["click_rate"] = round((clicked / opened * 100) if opened > 0 else 0, 2)
+        return stats
+
+    def sequence_delivery_analytics(self, days: int = 30) -> Dict[str, Any]:
+        """Channel and sequence breakdowns (same counting as the delivery_analytics view)"""
+        analytics = {
+            "period_days": days,
+            "total_deliveries": 0,
+            "channel_breakdown": {},
+            "sequence_breakdown": {},
+            "overall_metrics": {"delivery_rate": 0, "open_rate": 0, "click_rate": 0}
+        }
+        totals = {"scheduled": 0, "delivered": 0, "opened": 0, "clicked": 0}
+
+        for row in self.delivery_rollups(days):
+            counts = {column: row.get(column) or 0 for column in totals}
+            for breakdown, key in (("channel_breakdown", row["channel"]), ("sequence_breakdown", row["sequence_type"])):
+                bucket = analytics[breakdown].setdefault(key, {"scheduled": 0, "delivered": 0, "opened": 0, "clicked": 0})
+                for column, value in counts.items():
+                    bucket[column] += value
+            for column, value in counts.items():
+                totals[column] += value
+
+        analytics["total_deliveries"] = totals["scheduled"]
+        analytics["overall_metrics"]["delivery_rate"] = round(
+            (totals["delivered"] / totals["scheduled"] * 100) if totals["scheduled"] > 0 else 0, 2
+        )
+        analytics["overall_metrics"]["open_rate"] = round(
+            (totals["opened"] / totals["delivered"] * 100) if totals["delivered"] > 0 else 0, 2
+        )
+        analytics["overall_metrics"]["click_rate"] = round(
+            (totals["clicked"] / totals["opened"] * 100) if totals["opened"] > 0 else 0, 2
+        )
+        return analytics
+
+    def sequence_state_analytics(self) -> Dict[str, Any]:
+        """Same shape as NurtureSequences.get_sequence_analytics"""
+        analytics = {
+            "total_sequences_started": 0,
+            "sequence_stats": {},
+            "completion_rates": {},
+            "user_engagement": {}
+        }
+
+        for row in self.sequence_rollups():
+            stats = analytics["sequence_stats"].setdefault(
+                row["sequence_type"], {"started": 0, "completed": 0, "active": 0, "stopped": 0}
+            )
+            for column in stats:
+                stats[column] += row.get(column) or 0
+            analytics["total_sequences_started"] += row.get("started") or 0
+
+        for seq_type, stats in analytics["sequence_stats"].items():
+            total_finished = stats["completed"] + stats["stopped"]
+            analytics["completion_rates"][seq_type] = round((stats["completed"] / total_finished) * 100, 1) if total_finished > 0 else 0
+
+        return analytics
@@ -9,6 +9,7 @@ import logging
 from datetime import datetime
 from dotenv import load_dotenv
 from supabase import create_client
+from user_directory import UserDirectory
 
 # Load environment
 load_dotenv()
@@ -42,11 +43,14 @@ async def get_available_users():
     """Get users available for pod assignment (excluding test users and admin)"""
     logger.info("🔍 Getting available users...")
     
-    users = supabase.table("users").select("*").order("created_at", desc=True).execute()
+    # Load the compact user projection instead of every users column
+    directory = UserDirectory(supabase)
+    await directory.load()
+    users = [u.to_dict() for u in directory.all_users()]
     
     # Filter out test users and keep real users
     real_users = []
-    for user in users.data:
+    for user in users:
         username = user.get("username", "")
         first_name = user.get("first_name", "")
         telegram_id = user.get("telegram_user_id")
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Attendance Export
+Streams meeting_attendance as CSV or NDJSON, page by page, for any pod, date range or user
+"""
+
+import csv
+import io
+import json
+import logging
+import sys
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Optional
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson"
+}
+
+EXPORT_COLUMNS = (
+    "attendance_id", "meeting_id", "pod_id", "meeting_date", "meeting_time",
+    "user_id", "first_name", "username", "telegram_user_id",
+    "attended", "duration_minutes", "detection_method", "meet_join_time", "meet_leave_time",
+    "confidence_score", "created_at"
+)
+
+# meeting_attendance columns added by the Meet schema; older databases only have the base ones
+MEET_COLUMNS = ("detection_method", "meet_join_time", "meet_leave_time", "confidence_score")
+BASE_SELECT = (
+    "id, meeting_id, user_id, attended, duration_minutes, created_at, "
+    "pod_meetings!inner(pod_id, meeting_date, meeting_time), "
+    "users(first_name, username, telegram_user_id)"
+)
+
+DEFAULT_PAGE_SIZE = 1000
+# PostgREST max-rows: a larger limit still returns at most this many rows
+MAX_PAGE_SIZE = 1000
+
+class AttendanceExporter:
+    """
+    Pages through meeting_attendance by primary key (keyset pagination)
+
+    Every page is `id > last id ORDER BY id LIMIT page_size`, so each request is an
+    index range scan however deep the export goes, and rows are encoded and handed
+    on as soon as their page arrives: memory stays at one page whatever the range.
+    Pod and date filters apply to the inner-joined pod_meetings row. Page sizes are
+    clamped to MAX_PAGE_SIZE, and the export ends on the first empty page, so a
+    server-side row cap can shorten pages without truncating the export.
+    """
+
+    def __init__(self, supabase_client: Client, page_size: int = DEFAULT_PAGE_SIZE):
+        self.supabase = supabase_client
+        self.page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        self._meet_columns = True
+
+    def iter_rows(self, pod_id: Optional[str] = None, start_date: Optional[str] = None,
+                  end_date: Optional[str] = None, user_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Flat export rows (EXPORT_COLUMNS), in meeting_attendance id order"""
+        last_id = None
+        while True:
+            page = self._fetch_page(last_id, pod_id, start_date, end_date, user_id)
+            if not page:
+                return
+            for record in page:
+                yield self._flatten(record)
+            last_id = page[-1]["id"]
+
+    def _fetch_page(self, last_id, pod_id, start_date, end_date, user_id):
+        select = BASE_SELECT + (", " + ", ".join(MEET_COLUMNS) if self._meet_columns else "")
+        query = self.supabase.table("meeting_attendance").select(select)
+        if pod_id:
+            query = query.eq("pod_meetings.pod_id", pod_id)
+        if start_date:
+            query = query.gte("pod_meetings.meeting_date", start_date)
+        if end_date:
+            query = query.lte("pod_meetings.meeting_date", end_date)
+        if user_id:
+            query = query.eq("user_id", user_id)
+        if last_id:
+            query = query.gt("id", last_id)
+
+        try:
+            return query.order("id").limit(self.page_size).execute().data or []
+        except Exception as e:
+            if self._meet_columns and "42703" in str(e):
+                logger.warning(f"⚠️ Meet attendance columns missing, exporting base columns only: {e}")
+                self._meet_columns = False
+                return self._fetch_page(last_id, pod_id, start_date, end_date, user_id)
+            raise
+
+    @staticmethod
+    def _flatten(record: Dict[str, Any]) -> Dict[str, Any]:
+        meeting = record.get("pod_meetings") or {}
+        user = record.get("users") or {}
+        return {
+            "attendance_id": record["id"],
+            "meeting_id": record["meeting_id"],
+            "pod_id": meeting.get("pod_id"),
+            "meeting_date": meeting.get("meeting_date"),
+            "meeting_time": meeting.get("meeting_time"),
+            "user_id": record["user_id"],
+            "first_name": user.get("first_name"),
+            "username": user.get("username"),
+            "telegram_user_id": user.get("telegram_user_id"),
+            "attended": record.get("attended"),
+            "duration_minutes": record.get("duration_minutes"),
+            "detection_method": record.get("detection_method"),
+            "meet_join_time": record.get("meet_join_time"),
+            "meet_leave_time": record.get("meet_leave_time"),
+            "confidence_score": record.get("confidence_score"),
+            "created_at": record.get("created_at")
+        }
+
+    def stream(self, export_format: str = "csv", compress: bool = False, **filters) -> Iterator[bytes]:
+        """Encoded (and optionally gzipped) chunks of the export, one per page"""
+        chunks = encode_rows(self.iter_rows(**filters), export_format, self.page_size)
+        return gzip_chunks(chunks) if compress else chunks
+
+def encode_rows(rows: Iterable[Dict[str, Any]], export_format: str, rows_per_chunk: int = DEFAULT_PAGE_SIZE) -> Iterator[bytes]:
+    """CSV (with header) or NDJSON bytes, `rows_per_chunk` rows at a time"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    buffer = io.StringIO()
+    writer = None
+    if export_format == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, lineterminator="\n")
+        writer.writeheader()
+
+    pending = 0
+    for row in rows:
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row, default=str))
+            buffer.write("\n")
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip a byte stream incrementally"""
+    compressor = zlib.compressobj(wbits=31)  # 16 + MAX_WBITS: gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def export_filename(export_format: str, compress: bool = False, pod_id: Optional[str] = None,
+                    start_date: Optional[str] = None, end_date: Optional[str] = None) -> str:
+    parts = ["attendance", pod_id or "all-pods"]
+    if start_date or end_date:
+        parts.append(f"{start_date or 'start'}_{end_date or 'end'}")
+    return "-".join(parts) + f".{export_format}" + (".gz" if compress else "")
+
+def main():
+    import argparse
+    from telbot import Config
+    from supabase import create_client
+
+    parser = argparse.ArgumentParser(description="Export meeting attendance as CSV or NDJSON")
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv', help='Output format')
+    parser.add_argument('--pod', help='Only this pod (default: all pods)')
+    parser.add_argument('--start', help='First meeting date (YYYY-MM-DD)')
+    parser.add_argument('--end', help='Last meeting date (YYYY-MM-DD)')
+    parser.add_argument('--user', help='Only this user id')
+    parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help=f'Rows fetched per request (at most {MAX_PAGE_SIZE})')
+    parser.add_argument('--output', '-o', help='Output file (default: stdout)')
+    args = parser.parse_args()
+
+    config = Config()
+    supabase = create_client(config.supabase_url, config.supabase_key)
+    exporter = AttendanceExporter(supabase, page_size=args.page_size)
+
+    chunks = exporter.stream(args.format, args.gzip, pod_id=args.pod, start_date=args.start,
+                             end_date=args.end, user_id=args.user)
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+if __name__ == "__main__":
+    main()
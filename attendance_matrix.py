@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Attendance Matrix
+Members × meetings attendance arrays with per-member statistics computed in whole-matrix passes
+"""
+
+import bisect
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Cell states
+NO_RECORD = 0
+ABSENT = 1
+ATTENDED = 2
+
+# Records counted by the recency windows (prediction score, trend and no-show flags)
+PREDICTION_WINDOW = 6
+TREND_WINDOW = 3
+NO_SHOW_WINDOW = 2
+
+Cell = Tuple[str, str, int, Optional[float], Optional[float], bool]
+
+class AttendanceMatrix:
+    """
+    Attendance of `member_ids` (rows) at `meeting_ids` (columns, oldest first)
+
+    Each cell holds a state (NO_RECORD / ABSENT / ATTENDED), the minutes counted towards
+    the member's average duration and their arrival offset (NaN when not counted), and
+    a late flag. A member's history is their recorded cells in column order, so the
+    streak and recency statistics match walking each member's records oldest first.
+    """
+
+    def __init__(self, member_ids: Sequence[str], meeting_ids: Sequence[str], cells: Iterable[Cell]):
+        self.member_ids = list(member_ids)
+        self.meeting_ids = list(meeting_ids)
+        rows = {member_id: i for i, member_id in enumerate(self.member_ids)}
+        columns = {meeting_id: j for j, meeting_id in enumerate(self.meeting_ids)}
+        shape = (len(self.member_ids), len(self.meeting_ids))
+
+        if NUMPY_AVAILABLE:
+            self.status = np.zeros(shape, dtype=np.int8)
+            self.duration = np.full(shape, np.nan)
+            self.offset = np.full(shape, np.nan)
+            self.late = np.zeros(shape, dtype=bool)
+        else:
+            self.status = [[NO_RECORD] * shape[1] for _ in range(shape[0])]
+            self.duration = [[math.nan] * shape[1] for _ in range(shape[0])]
+            self.offset = [[math.nan] * shape[1] for _ in range(shape[0])]
+            self.late = [[False] * shape[1] for _ in range(shape[0])]
+
+        # Records of non-members or of meetings outside the window are not part of the matrix
+        for member_id, meeting_id, state, duration, offset, late in cells:
+            i, j = rows.get(member_id), columns.get(meeting_id)
+            if i is None or j is None:
+                continue
+            if NUMPY_AVAILABLE:
+                self.status[i, j] = state
+                self.duration[i, j] = math.nan if duration is None else duration
+                self.offset[i, j] = math.nan if offset is None else offset
+                self.late[i, j] = late
+            else:
+                self.status[i][j] = state
+                self.duration[i][j] = math.nan if duration is None else duration
+                self.offset[i][j] = math.nan if offset is None else offset
+                self.late[i][j] = late
+
+    def stats(self) -> Dict[str, List[Any]]:
+        """Per-member columns, each a list aligned with `member_ids`
+
+        records / attended / late_count, average_duration / average_offset (0 when there is
+        nothing to average), current_streak / longest_streak (attended records in a row),
+        recent_attended / recent_records (last PREDICTION_WINDOW records), trend_recent /
+        trend_earlier (attended among the last TREND_WINDOW records and the TREND_WINDOW
+        before them), attended_recently (any attendance in the last NO_SHOW_WINDOW records)
+        and last_attended (column of the latest attendance, -1 for none).
+        """
+        if not self.member_ids:
+            return {name: [] for name in STAT_NAMES}
+        if NUMPY_AVAILABLE:
+            return self._stats_numpy()
+        return self._stats_python()
+
+    def _stats_numpy(self) -> Dict[str, List[Any]]:
+        status = self.status
+        recorded = status != NO_RECORD
+        attended = status == ATTENDED
+        columns = status.shape[1]
+
+        records = recorded.sum(axis=1)
+        attended_total = attended.cumsum(axis=1)
+        # Attended count as of each member's latest absence; a streak is the growth since then
+        at_last_absence = np.maximum.accumulate(np.where(status == ABSENT, attended_total, 0), axis=1)
+        streaks = attended_total - at_last_absence
+
+        # 0 for a member's latest record, 1 for the one before, ...
+        from_end = records[:, None] - recorded.cumsum(axis=1)
+
+        def attended_in(first: int, last: int):
+            return (attended & recorded & (from_end >= first) & (from_end < last)).sum(axis=1)
+
+        def mean(values):
+            counted = ~np.isnan(values)
+            counts = counted.sum(axis=1)
+            return np.where(counts > 0, np.nansum(values, axis=1) / np.maximum(counts, 1), 0.0)
+
+        return {
+            "records": records.tolist(),
+            "attended": attended.sum(axis=1).tolist(),
+            "late_count": (self.late & recorded).sum(axis=1).tolist(),
+            "average_duration": mean(self.duration).tolist(),
+            "average_offset": mean(self.offset).tolist(),
+            "current_streak": streaks[:, -1].tolist() if columns else [0] * len(self.member_ids),
+            "longest_streak": streaks.max(axis=1).tolist() if columns else [0] * len(self.member_ids),
+            "recent_attended": attended_in(0, PREDICTION_WINDOW).tolist(),
+            "recent_records": np.minimum(records, PREDICTION_WINDOW).tolist(),
+            "trend_recent": attended_in(0, TREND_WINDOW).tolist(),
+            "trend_earlier": attended_in(TREND_WINDOW, 2 * TREND_WINDOW).tolist(),
+            "attended_recently": (attended_in(0, NO_SHOW_WINDOW) > 0).tolist(),
+            "last_attended": (np.where(attended.any(axis=1), columns - 1 - attended[:, ::-1].argmax(axis=1), -1).tolist()
+                              if columns else [-1] * len(self.member_ids)),
+        }
+
+    def _stats_python(self) -> Dict[str, List[Any]]:
+        stats: Dict[str, List[Any]] = {name: [] for name in STAT_NAMES}
+        for status, durations, offsets, late in zip(self.status, self.duration, self.offset, self.late):
+            history = [state == ATTENDED for state in status if state != NO_RECORD]
+
+            current = longest = 0
+            for was_attended in history:
+                current = current + 1 if was_attended else 0
+                longest = max(longest, current)
+
+            counted_durations = [value for value in durations if not math.isnan(value)]
+            counted_offsets = [value for value in offsets if not math.isnan(value)]
+            last_attended = max((j for j, state in enumerate(status) if state == ATTENDED), default=-1)
+
+            stats["records"].append(len(history))
+            stats["attended"].append(sum(history))
+            stats["late_count"].append(sum(1 for state, was_late in zip(status, late) if was_late and state != NO_RECORD))
+            stats["average_duration"].append(sum(counted_durations) / len(counted_durations) if counted_durations else 0.0)
+            stats["average_offset"].append(sum(counted_offsets) / len(counted_offsets) if counted_offsets else 0.0)
+            stats["current_streak"].append(current)
+            stats["longest_streak"].append(longest)
+            stats["recent_attended"].append(sum(history[-PREDICTION_WINDOW:]))
+            stats["recent_records"].append(min(len(history), PREDICTION_WINDOW))
+            stats["trend_recent"].append(sum(history[-TREND_WINDOW:]))
+            stats["trend_earlier"].append(sum(history[-2 * TREND_WINDOW:-TREND_WINDOW]))
+            stats["attended_recently"].append(any(history[-NO_SHOW_WINDOW:]))
+            stats["last_attended"].append(last_attended)
+        return stats
+
+STAT_NAMES = ("records", "attended", "late_count", "average_duration", "average_offset", "current_streak",
+              "longest_streak", "recent_attended", "recent_records", "trend_recent", "trend_earlier",
+              "attended_recently", "last_attended")
+
+def ratio(numerators: Sequence[float], denominators: Sequence[float], empty: float = 0.0) -> List[float]:
+    """Element-wise numerator / denominator, `empty` where the denominator is 0"""
+    if NUMPY_AVAILABLE:
+        numerators = np.asarray(numerators, dtype=float)
+        denominators = np.asarray(denominators, dtype=float)
+        return np.where(denominators > 0, numerators / np.maximum(denominators, 1), empty).tolist()
+    return [numerator / denominator if denominator else empty for numerator, denominator in zip(numerators, denominators)]
+
+def band(values: Sequence[float], cutoffs: Sequence[float], labels: Sequence[Any]) -> List[Any]:
+    """labels[k] where k is how many (ascending) cutoffs each value reaches"""
+    if NUMPY_AVAILABLE:
+        indexes = np.searchsorted(np.asarray(cutoffs, dtype=float), np.asarray(values, dtype=float), side="right")
+        return [labels[k] for k in indexes.tolist()]
+    return [labels[bisect.bisect_right(cutoffs, value)] for value in values]
+
+def first_match(conditions: Sequence[Sequence[bool]], labels: Sequence[Any], default: Any) -> List[Any]:
+    """Per element, the label of the first true condition (np.select over labels)"""
+    if not conditions or not len(conditions[0]):
+        return [default] * (len(conditions[0]) if conditions else 0)
+    if NUMPY_AVAILABLE:
+        indexes = np.select([np.asarray(condition, dtype=bool) for condition in conditions],
+                            list(range(len(labels))), default=len(labels))
+        choices = list(labels) + [default]
+        return [choices[k] for k in indexes.tolist()]
+    return [next((label for label, hit in zip(labels, row) if hit), default) for row in zip(*conditions)]
@@ -14,7 +14,9 @@ from dataclasses import dataclass
 from supabase import Client
 from google_admin_reports import GoogleAdminReports
 from meet_correlation_engine import MeetCorrelationEngine
+from meet_sync_state import MeetSyncState
 from google_calendar_attendance import GoogleCalendarAttendance
+from google_api_executor import google_api_executor
 
 logger = logging.getLogger(__name__)
 
@@ -37,10 +39,13 @@ class AutomaticAttendanceEngine:
         self.admin_reports = None
         self.correlation_engine = None
         self.calendar_integration = None
+        self.sync_state = MeetSyncState(supabase_client)
         
         # Configuration
         self.max_days_to_process = 7  # Process up to 7 days of historical data
         self.batch_size = 50  # Process meetings in batches
+        self.max_concurrent_days = 3  # Days fetched at once during a backfill (Admin Reports quota)
+        self.max_concurrent_meetings = 10  # Meetings resolved and synced at once within a batch
         
         logger.info("🤖 Automatic Attendance Engine initialized")
     
@@ -69,12 +74,14 @@ class AutomaticAttendanceEngine:
             logger.error(f"❌ Failed to initialize Automatic Attendance Engine: {e}")
             raise
     
-    async def process_meetings_for_date(self, target_date: date = None) -> AttendanceProcessingResult:
+    async def process_meetings_for_date(self, target_date: date = None,
+                                        refresh_matcher: bool = True) -> AttendanceProcessingResult:
         """
         Process automatic attendance for all meetings on a specific date
         
         Args:
             target_date: Date to process (defaults to yesterday)
+            refresh_matcher: Rebuild the participant matcher first (a backfill builds it once)
         
         Returns:
             AttendanceProcessingResult with processing statistics
@@ -106,13 +113,23 @@ class AutomaticAttendanceEngine:
             
             logger.info(f"📊 Found {len(meetings)} meetings to process")
             
+            # Load the day's Meet audit log once; every session sync below reads
+            # its participants from this cached index instead of re-paging the API
+            index = await self._load_event_index(target_date)
+            logger.info(f"📥 {len(index.events)} Meet events across {len(index.by_meet_code)} Meet codes for {target_date}")
+            if refresh_matcher:
+                self.correlation_engine.refresh_matcher()
+            
+            # Calendar events for the day, fetched once and shared by every meeting
+            calendar_events = await self._get_calendar_events_for_date(target_date)
+            
             # Process meetings in batches
             for i in range(0, len(meetings), self.batch_size):
                 batch = meetings[i:i + self.batch_size]
                 
                 logger.info(f"🔄 Processing batch {i//self.batch_size + 1}/{(len(meetings)-1)//self.batch_size + 1}")
                 
-                batch_results = await self._process_meeting_batch(batch, target_date)
+                batch_results = await self._process_meeting_batch(batch, target_date, calendar_events)
                 
                 # Aggregate results
                 result.meetings_with_meet_data += batch_results['meetings_with_data']
@@ -130,6 +147,8 @@ class AutomaticAttendanceEngine:
             logger.info(f"   👥 {result.total_participants_found} total participants found")
             logger.info(f"   📝 {result.attendance_records_created} new + {result.attendance_records_updated} updated records")
             logger.info(f"   ⏱️ Processing time: {result.processing_time_seconds:.2f} seconds")
+            logger.info(f"   📡 Admin Reports cache: {self.admin_reports.cache_stats}")
+            logger.debug(f"   📡 Google API latency: {google_api_executor.get_stats()}")
             
             if result.errors:
                 logger.warning(f"⚠️ {len(result.errors)} errors occurred during processing")
@@ -141,6 +160,24 @@ class AutomaticAttendanceEngine:
             result.errors.append(f"Processing failed: {str(e)}")
             return result
     
+    async def _load_event_index(self, target_date: date):
+        """
+        Index of the day's call_ended events
+        
+        The API is asked only for events newer than the day's high-water mark; the
+        index is then built from the stored audit log. Without sync checkpoints the
+        whole day is fetched from the API.
+        """
+        if self.sync_state.available:
+            sync_stats = await self.admin_reports.sync_meet_data_for_date(target_date, self.sync_state)
+            if not sync_stats['errors']:
+                raw_events = self.sync_state.load_event_data(target_date, ['call_ended'])
+                if raw_events is not None:
+                    events = self.admin_reports.events_from_raw(raw_events)
+                    return self.admin_reports.prime_event_index(target_date, target_date, ['call_ended'], events)
+        
+        return await self.admin_reports.get_meet_event_index(target_date, target_date, ['call_ended'])
+    
     async def _get_meetings_for_date(self, target_date: date) -> List[Dict]:
         """Get all meetings that occurred on a specific date"""
         try:
@@ -164,7 +201,8 @@ class AutomaticAttendanceEngine:
             logger.error(f"❌ Failed to get meetings for {target_date}: {e}")
             return []
     
-    async def _process_meeting_batch(self, meetings: List[Dict], target_date: date) -> Dict[str, Any]:
+    async def _process_meeting_batch(self, meetings: List[Dict], target_date: date,
+                                     calendar_events: Optional[List[Dict]] = None) -> Dict[str, Any]:
         """Process a batch of meetings for automatic attendance"""
         batch_results = {
             'meetings_with_data': 0,
@@ -174,60 +212,81 @@ class AutomaticAttendanceEngine:
             'errors': []
         }
         
-        for meeting in meetings:
-            try:
-                meeting_id = meeting['id']
-                
-                # Check if this meeting has an associated Meet session
-                meet_session = await self._get_or_create_meet_session(meeting)
-                
-                if not meet_session:
-                    logger.debug(f"📭 No Meet session found for meeting {meeting_id}")
-                    continue
-                
-                # Sync Meet data for this session
-                sync_result = await self.correlation_engine.sync_meet_session_data(
-                    meet_session['id'], target_date
-                )
-                
-                if sync_result['status'] == 'success':
-                    batch_results['meetings_with_data'] += 1
-                    batch_results['total_participants'] += sync_result.get('participants_found', 0)
-                    batch_results['records_created'] += sync_result.get('new_attendance_records', 0)
-                    batch_results['records_updated'] += sync_result.get('updated_records', 0)
-                    
-                    logger.info(f"✅ Processed meeting {meeting_id}: {sync_result.get('participants_found', 0)} participants")
-                    
-                elif sync_result['status'] == 'no_data':
-                    logger.debug(f"📭 No Meet data available for meeting {meeting_id}")
-                    
-                else:
-                    error_msg = f"Failed to sync meeting {meeting_id}: {sync_result.get('error', 'unknown')}"
+        # Existing Meet sessions for the whole batch in one query
+        existing = await asyncio.to_thread(
+            self.supabase.table('meet_sessions').select('*').in_(
+                'meeting_id', [meeting['id'] for meeting in meetings]
+            ).execute
+        )
+        sessions_by_meeting = {}
+        for session in existing.data or []:
+            sessions_by_meeting.setdefault(session['meeting_id'], session)
+        
+        semaphore = asyncio.Semaphore(self.max_concurrent_meetings)
+        
+        async def resolve(meeting: Dict) -> Optional[Dict]:
+            async with semaphore:
+                try:
+                    return await self._get_or_create_meet_session(
+                        meeting, sessions_by_meeting.get(meeting['id']), calendar_events
+                    )
+                except Exception as e:
+                    error_msg = f"Failed to process meeting {meeting.get('id', 'unknown')}: {str(e)}"
                     batch_results['errors'].append(error_msg)
                     logger.error(f"❌ {error_msg}")
+                    return None
+        
+        sessions = await asyncio.gather(*(resolve(meeting) for meeting in meetings))
+        
+        meeting_sessions = {}
+        for meeting, meet_session in zip(meetings, sessions):
+            if not meet_session:
+                logger.debug(f"📭 No Meet session found for meeting {meeting['id']}")
+                continue
+            meeting_sessions[meet_session['id']] = meeting['id']
+        
+        if not meeting_sessions:
+            return batch_results
+        
+        # Sync Meet data for every session of the batch; attendance is written in bulk
+        sync_results = await self.correlation_engine.sync_sessions(
+            [meet_session for meet_session in sessions if meet_session],
+            target_date,
+            max_concurrency=self.max_concurrent_meetings
+        )
+        
+        for session_id, sync_result in sync_results.items():
+            meeting_id = meeting_sessions.get(session_id)
+            
+            if sync_result['status'] == 'success':
+                batch_results['meetings_with_data'] += 1
+                batch_results['total_participants'] += sync_result.get('participants_found', 0)
+                batch_results['records_created'] += sync_result.get('new_attendance_records', 0)
+                batch_results['records_updated'] += sync_result.get('updated_records', 0)
                 
-            except Exception as e:
-                error_msg = f"Failed to process meeting {meeting.get('id', 'unknown')}: {str(e)}"
+                logger.info(f"✅ Processed meeting {meeting_id}: {sync_result.get('participants_found', 0)} participants")
+                
+            elif sync_result['status'] == 'no_data':
+                logger.debug(f"📭 No Meet data available for meeting {meeting_id}")
+                
+            else:
+                error_msg = f"Failed to sync meeting {meeting_id}: {sync_result.get('error', 'unknown')}"
                 batch_results['errors'].append(error_msg)
                 logger.error(f"❌ {error_msg}")
         
         return batch_results
     
-    async def _get_or_create_meet_session(self, meeting: Dict) -> Optional[Dict]:
+    async def _get_or_create_meet_session(self, meeting: Dict, existing_session: Optional[Dict] = None,
+                                          calendar_events: Optional[List[Dict]] = None) -> Optional[Dict]:
         """Get existing Meet session or create one if meeting has Meet link"""
         meeting_id = meeting['id']
         
         try:
-            # Check if Meet session already exists
-            existing_session = self.supabase.table('meet_sessions').select('*').eq(
-                'meeting_id', meeting_id
-            ).execute()
-            
-            if existing_session.data:
-                return existing_session.data[0]
+            if existing_session:
+                return existing_session
             
             # Try to find Meet link for this meeting
-            meet_link = await self._find_meet_link_for_meeting(meeting)
+            meet_link = await self._find_meet_link_for_meeting(meeting, calendar_events)
             
             if not meet_link:
                 return None
@@ -241,14 +300,17 @@ class AutomaticAttendanceEngine:
             )
             
             # Return the newly created session
-            new_session = self.supabase.table('meet_sessions').select('*').eq('id', session_id).execute()
+            new_session = await asyncio.to_thread(
+                self.supabase.table('meet_sessions').select('*').eq('id', session_id).execute
+            )
             return new_session.data[0] if new_session.data else None
             
         except Exception as e:
             logger.error(f"❌ Failed to get/create Meet session for meeting {meeting_id}: {e}")
             return None
     
-    async def _find_meet_link_for_meeting(self, meeting: Dict) -> Optional[str]:
+    async def _find_meet_link_for_meeting(self, meeting: Dict,
+                                          calendar_events: Optional[List[Dict]] = None) -> Optional[str]:
         """Try to find Google Meet link for a meeting"""
         meeting_id = meeting['id']
         
@@ -259,11 +321,11 @@ class AutomaticAttendanceEngine:
             # Strategy 2: Search calendar events for this meeting
             if self.calendar_integration:
                 try:
-                    # Look for calendar events on the meeting date
-                    meeting_date = datetime.fromisoformat(meeting['meeting_date'])
-                    
-                    # Get events for the day
-                    events = await self._get_calendar_events_for_date(meeting_date.date())
+                    # Events for the meeting date (shared across the batch when provided)
+                    events = calendar_events
+                    if events is None:
+                        meeting_date = datetime.fromisoformat(meeting['meeting_date'])
+                        events = await self._get_calendar_events_for_date(meeting_date.date())
                     
                     # Look for events that might match this meeting
                     for event in events:
@@ -295,16 +357,7 @@ class AutomaticAttendanceEngine:
             time_min = datetime.combine(target_date, datetime.min.time()).isoformat() + 'Z'
             time_max = datetime.combine(target_date, datetime.max.time()).isoformat() + 'Z'
             
-            events_result = self.calendar_integration.service.events().list(
-                calendarId='primary',
-                timeMin=time_min,
-                timeMax=time_max,
-                maxResults=50,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            return events_result.get('items', [])
+            return await self.calendar_integration.list_events(time_min, time_max, max_results=50)
             
         except Exception as e:
             logger.error(f"❌ Failed to get calendar events for {target_date}: {e}")
@@ -343,11 +396,24 @@ class AutomaticAttendanceEngine:
         """Process automatic attendance for multiple historical days"""
         end_date = date.today() - timedelta(days=1)  # Start from yesterday
         start_date = end_date - timedelta(days=days_back - 1)
+        return await self.backfill(start_date, end_date)
+    
+    async def backfill(self, start_date: date, end_date: date,
+                       max_concurrent_days: int = None) -> Dict[str, Any]:
+        """
+        Process attendance for a range of days, several days at a time
+        
+        Days finished by an earlier run are skipped, and each day is checkpointed as
+        soon as it is done, so an interrupted backfill resumes where it stopped.
+        Concurrency is bounded to stay within the Admin Reports API quota.
+        """
+        max_concurrent_days = max_concurrent_days or self.max_concurrent_days
         
         logger.info(f"🔄 Processing historical attendance data from {start_date} to {end_date}")
         
         total_results = {
             'days_processed': 0,
+            'days_skipped': 0,
             'total_meetings': 0,
             'total_participants': 0,
             'total_records_created': 0,
@@ -355,27 +421,48 @@ class AutomaticAttendanceEngine:
             'total_errors': 0
         }
         
+        done = self.sync_state.processed_days(start_date, end_date)
+        days = []
         current_date = start_date
         while current_date <= end_date:
-            try:
-                logger.info(f"📅 Processing {current_date}")
-                
-                day_result = await self.process_meetings_for_date(current_date)
-                
-                # Aggregate results
-                total_results['days_processed'] += 1
-                total_results['total_meetings'] += day_result.total_meetings_processed
-                total_results['total_participants'] += day_result.total_participants_found
-                total_results['total_records_created'] += day_result.attendance_records_created
-                total_results['total_records_updated'] += day_result.attendance_records_updated
-                total_results['total_errors'] += len(day_result.errors)
-                
-            except Exception as e:
-                logger.error(f"❌ Failed to process {current_date}: {e}")
-                total_results['total_errors'] += 1
-            
+            if current_date in done:
+                total_results['days_skipped'] += 1
+            else:
+                days.append(current_date)
             current_date += timedelta(days=1)
         
+        if total_results['days_skipped']:
+            logger.info(f"⏭️ Resuming backfill: {total_results['days_skipped']} days already processed")
+        
+        if days:
+            self.correlation_engine.refresh_matcher()
+        
+        semaphore = asyncio.Semaphore(max_concurrent_days)
+        
+        async def process_day(day: date):
+            async with semaphore:
+                try:
+                    logger.info(f"📅 Processing {day}")
+                    
+                    day_result = await self.process_meetings_for_date(day, refresh_matcher=False)
+                    
+                    # Aggregate results
+                    total_results['days_processed'] += 1
+                    total_results['total_meetings'] += day_result.total_meetings_processed
+                    total_results['total_participants'] += day_result.total_participants_found
+                    total_results['total_records_created'] += day_result.attendance_records_created
+                    total_results['total_records_updated'] += day_result.attendance_records_updated
+                    total_results['total_errors'] += len(day_result.errors)
+                    
+                    if not day_result.errors:
+                        self.sync_state.mark_attendance_processed(day)
+                    
+                except Exception as e:
+                    logger.error(f"❌ Failed to process {day}: {e}")
+                    total_results['total_errors'] += 1
+        
+        await asyncio.gather(*(process_day(day) for day in days))
+        
         logger.info(f"✅ Historical processing complete: {total_results}")
         return total_results
     
@@ -429,10 +516,36 @@ async def example_usage():
     except Exception as e:
         print(f"❌ Example failed: {e}")
 
+async def run_backfill(days_back: int, concurrency: int):
+    """Backfill attendance for the last `days_back` days (resumes an interrupted run)"""
+    from telbot import Config
+    from supabase import create_client
+    
+    config = Config()
+    supabase = create_client(config.supabase_url, config.supabase_key)
+    
+    engine = AutomaticAttendanceEngine(supabase)
+    engine.max_concurrent_days = concurrency
+    await engine.initialize()
+    
+    results = await engine.process_historical_data(days_back)
+    print(f"📊 Backfill results: {results}")
+
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Automatic Attendance Processing Engine")
+    parser.add_argument('--backfill', type=int, metavar='DAYS', help='Backfill attendance for the last DAYS days')
+    parser.add_argument('--concurrency', type=int, default=3, help='Days fetched at once during a backfill')
+    
+    args = parser.parse_args()
+    
     print("Automatic Attendance Processing Engine")
     print("=" * 50)
     print("Orchestrates automatic Google Meet attendance detection")
     
-    # Run example if executed directly
-    asyncio.run(example_usage())
\ No newline at end of file
+    if args.backfill:
+        asyncio.run(run_backfill(args.backfill, args.concurrency))
+    else:
+        # Run example if executed directly
+        asyncio.run(example_usage())
\ No newline at end of file
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Email Delivery Throughput Benchmark
+Drains queued email deliveries through DeliveryEngine and EmailDeliveryService against a
+local fake Resend server (per-email vs batched sends)
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from delivery_workers import ChannelConfig, DeliveryEngine
+from email_delivery_service import EmailDeliveryService
+
+class FakeResendHandler(BaseHTTPRequestHandler):
+    """Accepts /emails and /emails/batch; answers 429 for every Nth request when configured
+
+    Like Resend, a batch holding an invalid recipient (`invalid` in the address) is rejected
+    as a whole with 422, and so is a single email to one.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        with server.lock:
+            server.requests += 1
+            throttle = server.throttle_every and server.requests % server.throttle_every == 0
+
+        time.sleep(server.latency)
+
+        if throttle:
+            self._respond(429, {"message": "Too many requests"}, {"retry-after": "0.2"})
+            return
+
+        payload = json.loads(body)
+        recipients = [to for email in (payload if self.path == "/emails/batch" else [payload]) for to in email["to"]]
+        if any("invalid" in to for to in recipients):
+            with server.lock:
+                server.rejected += 1
+            self._respond(422, {"message": "Invalid `to` field"})
+            return
+
+        if self.path == "/emails/batch":
+            with server.lock:
+                server.emails += len(payload)
+            self._respond(200, {"data": [{"id": str(uuid.uuid4())} for _ in payload]})
+        else:
+            with server.lock:
+                server.emails += 1
+            self._respond(200, {"id": str(uuid.uuid4())})
+
+    def _respond(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_resend(latency_ms: int, throttle_every: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeResendHandler)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.emails = 0
+    server.rejected = 0
+    server.latency = latency_ms / 1000
+    server.throttle_every = throttle_every
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class QueuedDeliveryEngine(DeliveryEngine):
+    """DeliveryEngine claiming from an in-memory list instead of message_deliveries"""
+
+    def __init__(self, deliveries, channels):
+        super().__init__(None, channels)
+        self.pending = list(deliveries)
+
+    def claim(self, channel, limit):
+        claimed, self.pending = self.pending[:limit], self.pending[limit:]
+        return claimed
+
+async def run_case(base_url: str, emails: int, use_batch: bool, requests_per_second: float, invalid_every: int) -> dict:
+    service = EmailDeliveryService("re_test", base_url=base_url, use_batch=use_batch, requests_per_second=requests_per_second)
+
+    async def send(delivery):
+        return await service.send_nurture_email(
+            to_email=delivery["recipient_address"],
+            subject="Benchmark",
+            content=delivery["message_content"],
+            user_name="Benchmark",
+            tracking_id=delivery["id"]
+        )
+
+    deliveries = [{
+        "id": str(uuid.uuid4()),
+        "recipient_address": f"{'invalid' if invalid_every and i % invalid_every == 0 else 'user'}{i}@example.com",
+        "message_content": "Benchmark message"
+    } for i in range(1, emails + 1)]
+
+    # Same email channel as UnifiedNurtureController._get_delivery_engine
+    batch_size = service.MAX_BATCH_SIZE
+    engine = QueuedDeliveryEngine(deliveries, [
+        ChannelConfig("email", send, concurrency=batch_size, rate_per_second=None, claim_batch_size=batch_size)
+    ])
+
+    started = time.perf_counter()
+    totals = await engine.run_once()
+    elapsed = time.perf_counter() - started
+    await service.close()
+
+    return {
+        "mode": "batch" if use_batch else "single",
+        "sent": totals["email_sent"],
+        "failed": totals["email_failed"],
+        "seconds": round(elapsed, 2),
+        "emails_per_second": round(emails / elapsed, 1),
+        **service.get_client_stats()
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark EmailDeliveryService against a fake Resend server")
+    parser.add_argument("--emails", type=int, default=500)
+    parser.add_argument("--latency-ms", type=int, default=40, help="Simulated Resend response time")
+    parser.add_argument("--rate", type=float, default=10.0, help="Client request pacing (requests/second)")
+    parser.add_argument("--throttle-every", type=int, default=0, help="Answer every Nth request with 429")
+    parser.add_argument("--invalid-every", type=int, default=0, help="Make every Nth recipient invalid (rejected with 422)")
+    args = parser.parse_args()
+
+    for use_batch in (False, True):
+        server = start_fake_resend(args.latency_ms, args.throttle_every)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        result = await run_case(base_url, args.emails, use_batch, args.rate, args.invalid_every)
+        result["server_requests"] = server.requests
+        result["server_rejected"] = server.rejected
+        server.shutdown()
+        print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
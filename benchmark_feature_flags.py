@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Feature Flag Evaluation Benchmark
+Measures FeatureFlagEngine evaluations per second on one core for each flag type
+"""
+
+import argparse
+import json
+import time
+
+from feature_flag_engine import FeatureFlagEngine, stable_bucket
+
+SAMPLE_FLAGS = [
+    {"feature_id": "all_users", "flag": "enabled", "rollout_strategy": "all_users"},
+    {"feature_id": "percentage", "flag": "enabled", "rollout_strategy": "percentage", "rollout_percentage": 30},
+    {"feature_id": "role_based", "flag": "enabled", "rollout_strategy": "role_based", "target_user_roles": ["admin", "beta"]},
+    {"feature_id": "ab_test", "flag": "a_b_test", "rollout_strategy": "all_users", "ab_test_active": True,
+     "ab_test_groups": {"control": {"percentage": 50, "enabled": False}, "variant": {"percentage": 50, "enabled": True}}},
+    {"feature_id": "gradual_rollout", "flag": "gradual_rollout", "rollout_strategy": "percentage", "rollout_percentage": 50},
+    {"feature_id": "user_segment", "flag": "user_segment", "rollout_strategy": "user_list",
+     "target_user_ids": [str(i) for i in range(0, 10000, 7)], "excluded_user_ids": ["3"], "target_user_roles": ["beta"]},
+]
+
+def run_case(engine: FeatureFlagEngine, feature_id: str, users: int, evaluations: int) -> dict:
+    evaluate = engine.evaluate
+    roles = ["user"]
+
+    started = time.perf_counter()
+    enabled = 0
+    for i in range(evaluations):
+        if evaluate(feature_id, i % users, roles)[0]:
+            enabled += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        "feature": feature_id,
+        "evaluations_per_second": round(evaluations / elapsed),
+        "enabled_share": round(enabled / evaluations, 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FeatureFlagEngine evaluations")
+    parser.add_argument("--evaluations", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=10000, help="Distinct users cycled through")
+    args = parser.parse_args()
+
+    engine = FeatureFlagEngine(None)
+    engine.install(SAMPLE_FLAGS)
+
+    results = [run_case(engine, flag["feature_id"], args.users, args.evaluations) for flag in SAMPLE_FLAGS]
+
+    # Cold bucketing cost (every user new), the worst case for hashed strategies
+    started = time.perf_counter()
+    for i in range(args.users):
+        stable_bucket("cold", i)
+    results.append({"feature": "stable_bucket (uncached)",
+                    "evaluations_per_second": round(args.users / (time.perf_counter() - started))})
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+# In-Memory Communication Gate for The Progress Method
+# Answers "should this user get this message?" from memory instead of three queries per message
+
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Any
+from supabase import Client
+from analytics_rollups import stream_rows
+
+logger = logging.getLogger(__name__)
+
+# Max messages per rolling 24 h by communication style (unknown styles get 2)
+STYLE_DAILY_LIMITS = {
+    "high_touch": 3,
+    "balanced": 2,
+    "light_touch": 1,
+    "meeting_only": 1
+}
+
+# Message types still sent to users with low engagement
+ENGAGEMENT_EXEMPT_TYPES = ("meeting_prep", "admin")
+
+LOW_ENGAGEMENT_THRESHOLD = 0.3
+ENGAGEMENT_DAYS = 14
+FREQUENCY_HOURS = 24
+
+def _epoch(value: Any) -> Optional[float]:
+    """Epoch seconds for an ISO timestamp (naive values are local time, like datetime.now())"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+class BucketRing:
+    """Fixed number of time buckets; slots belonging to an older period are reset on write
+
+    `window` periods are summed, plus the current one, so a rolling window is counted
+    conservatively (up to one period too long, never too short).
+    """
+
+    __slots__ = ("period", "periods", "counts")
+
+    def __init__(self, period_seconds: int, window: int):
+        self.period = period_seconds
+        self.periods = [-1] * (window + 1)
+        self.counts = [0] * (window + 1)
+
+    def add(self, at: float, amount: int = 1):
+        period = int(at // self.period)
+        slot = period % len(self.counts)
+        if self.periods[slot] != period:
+            # Older than the ring can hold
+            if period < self.periods[slot]:
+                return
+            self.periods[slot] = period
+            self.counts[slot] = 0
+        self.counts[slot] += amount
+
+    def total(self, now: float) -> int:
+        current = int(now // self.period)
+        oldest = current - len(self.counts) + 1
+        return sum(count for period, count in zip(self.periods, self.counts) if oldest <= period <= current)
+
+    def to_dict(self) -> Dict[str, List[int]]:
+        return {"periods": list(self.periods), "counts": list(self.counts)}
+
+    def load(self, data: Dict[str, List[int]]):
+        if len(data.get("periods", [])) == len(self.counts):
+            self.periods = list(data["periods"])
+            self.counts = list(data["counts"])
+
+    def merge(self, other: "BucketRing"):
+        """Add another ring's counts slot by slot (the newer period wins a slot)"""
+        for slot, (period, count) in enumerate(zip(other.periods, other.counts)):
+            if period == self.periods[slot]:
+                self.counts[slot] += count
+            elif period > self.periods[slot]:
+                self.periods[slot] = period
+                self.counts[slot] = count
+
+class UserGateState:
+    """Preferences, hourly sent counts and daily engagement counts for one user"""
+
+    __slots__ = ("style", "enabled_types", "pause_until", "has_preferences", "loaded_at",
+                 "hourly_sent", "daily_sent", "daily_responded", "daily_clicked",
+                 "last_sent_at", "last_responded")
+
+    def __init__(self):
+        self.style = "balanced"
+        self.enabled_types: frozenset = frozenset()
+        self.pause_until: Optional[float] = None
+        self.has_preferences = False
+        self.loaded_at = 0.0
+        self.hourly_sent = BucketRing(3600, FREQUENCY_HOURS)
+        self.daily_sent = BucketRing(86400, ENGAGEMENT_DAYS)
+        self.daily_responded = BucketRing(86400, ENGAGEMENT_DAYS)
+        self.daily_clicked = BucketRing(86400, ENGAGEMENT_DAYS)
+        self.last_sent_at: Optional[float] = None
+        self.last_responded = False
+
+    def set_preferences(self, prefs: Optional[Dict[str, Any]]):
+        self.has_preferences = prefs is not None
+        if prefs is None:
+            return
+        enabled = prefs.get("enabled_message_types") or []
+        if isinstance(enabled, str):
+            enabled = json.loads(enabled)
+        self.style = prefs.get("communication_style") or "balanced"
+        self.enabled_types = frozenset(enabled)
+        self.pause_until = _epoch(prefs.get("pause_until"))
+
+    def engagement_score(self, now: float) -> float:
+        """Same formula as CommunicationPreferences._calculate_engagement_score"""
+        sent = self.daily_sent.total(now)
+        if sent == 0:
+            return 0.5
+        response_rate = self.daily_responded.total(now) / sent
+        click_rate = self.daily_clicked.total(now) / sent
+        return min(1.0, response_rate * 0.7 + click_rate * 0.3)
+
+    def decide(self, message_type: str, now: float) -> Dict[str, Any]:
+        if not self.has_preferences:
+            return {"should_send": True, "reason": "default_balanced"}
+
+        if self.style == "paused" and self.pause_until and self.pause_until > now:
+            return {"should_send": False, "reason": "user_paused"}
+
+        if message_type not in self.enabled_types:
+            return {"should_send": False, "reason": "message_type_disabled"}
+
+        if self.hourly_sent.total(now) >= STYLE_DAILY_LIMITS.get(self.style, 2):
+            return {"should_send": False, "reason": "frequency_limit_reached"}
+
+        engagement_score = self.engagement_score(now)
+        if engagement_score < LOW_ENGAGEMENT_THRESHOLD and message_type not in ENGAGEMENT_EXEMPT_TYPES:
+            return {"should_send": False, "reason": "low_engagement_protection"}
+
+        return {"should_send": True, "reason": "all_checks_passed", "engagement_score": engagement_score}
+
+    def record_sent(self, at: float, responded: bool = False, clicked: bool = False):
+        self.hourly_sent.add(at)
+        self.daily_sent.add(at)
+        if responded:
+            self.daily_responded.add(at)
+        if clicked:
+            self.daily_clicked.add(at)
+        if self.last_sent_at is None or at >= self.last_sent_at:
+            self.last_sent_at = at
+            self.last_responded = responded
+
+    def record_response(self) -> bool:
+        """Mirror of log_user_response: marks the latest message as responded (once)"""
+        if self.last_sent_at is None or self.last_responded:
+            return False
+        self.daily_responded.add(self.last_sent_at)
+        self.last_responded = True
+        return True
+
+    def to_checkpoint(self) -> Dict[str, Any]:
+        return {
+            "hourly_sent": self.hourly_sent.to_dict(),
+            "daily_sent": self.daily_sent.to_dict(),
+            "daily_responded": self.daily_responded.to_dict(),
+            "daily_clicked": self.daily_clicked.to_dict(),
+            "last_sent_at": self.last_sent_at,
+            "last_responded": self.last_responded
+        }
+
+    def load_checkpoint(self, data: Dict[str, Any]):
+        self.hourly_sent.load(data.get("hourly_sent") or {})
+        self.daily_sent.load(data.get("daily_sent") or {})
+        self.daily_responded.load(data.get("daily_responded") or {})
+        self.daily_clicked.load(data.get("daily_clicked") or {})
+        self.last_sent_at = data.get("last_sent_at")
+        self.last_responded = bool(data.get("last_responded"))
+
+    def merge(self, other: "UserGateState"):
+        """Add the counters of another state (a checkpoint delta) to this one"""
+        self.hourly_sent.merge(other.hourly_sent)
+        self.daily_sent.merge(other.daily_sent)
+        self.daily_responded.merge(other.daily_responded)
+        self.daily_clicked.merge(other.daily_clicked)
+        if other.last_sent_at is None:
+            return
+        if self.last_sent_at is None or other.last_sent_at > self.last_sent_at:
+            self.last_sent_at = other.last_sent_at
+            self.last_responded = other.last_responded
+        elif other.last_sent_at == self.last_sent_at:
+            self.last_responded = self.last_responded or other.last_responded
+
+def merge_checkpoint(stored: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Checkpoint state with a delta's counters added (same rules as merge_communication_gate_state)"""
+    merged, other = UserGateState(), UserGateState()
+    merged.load_checkpoint(stored or {})
+    other.load_checkpoint(delta or {})
+    merged.merge(other)
+    return merged.to_checkpoint()
+
+class CommunicationGate:
+    """Per-user gate state held in memory, warmed set-wise and checkpointed behind
+
+    Users are warmed on first use (one preferences query and one message_analytics or
+    checkpoint query per batch of users). After that `check` / `check_many` make no
+    queries: log_message_sent / log_user_response update the counters and preference
+    writes update the cached preferences. After `prefs_ttl_seconds` a user is warmed
+    again, re-reading preferences and counters so sends by other processes are seen.
+
+    Each process checkpoints only the counts it recorded itself since its last
+    checkpoint, every `checkpoint_interval_seconds`; merge_communication_gate_state adds
+    them to the stored counters, so concurrent processes never overwrite each other.
+    A restart replays only the message_analytics rows written since the last checkpoint.
+    """
+
+    def __init__(self, supabase_client: Client, prefs_ttl_seconds: int = 300,
+                 checkpoint_interval_seconds: int = 60, batch_size: int = 200):
+        self.supabase = supabase_client
+        self.prefs_ttl = prefs_ttl_seconds
+        self.checkpoint_interval = checkpoint_interval_seconds
+        self.batch_size = batch_size
+
+        self._users: Dict[int, UserGateState] = {}
+        # Counts recorded by this process since its last checkpoint, per user
+        self._pending: Dict[int, UserGateState] = {}
+        self._checkpointer: Optional[asyncio.Task] = None
+        self._checkpoint_available = True
+        self._merge_rpc_available = True
+
+        self.stats = {"checks": 0, "warmed": 0, "refreshed": 0, "checkpoints": 0,
+                      "rows_checkpointed": 0, "checkpoint_errors": 0}
+
+    # ---------------------------------------------------------------
+    # Decisions
+    # ---------------------------------------------------------------
+
+    def check(self, telegram_user_id: int, message_type: str) -> Dict[str, Any]:
+        """Gate decision for one user (warms the user on first use)"""
+        return self.check_many([telegram_user_id], message_type)[telegram_user_id]
+
+    def check_many(self, telegram_user_ids: Iterable[int], message_type: str) -> Dict[int, Dict[str, Any]]:
+        """Gate decisions for a whole audience; cold or stale users are loaded in bulk first"""
+        user_ids = list(dict.fromkeys(telegram_user_ids))
+        self.ensure_loaded(user_ids)
+
+        now = time.time()
+        self.stats["checks"] += len(user_ids)
+        return {user_id: self._users[user_id].decide(message_type, now) for user_id in user_ids}
+
+    def engagement_score(self, telegram_user_id: int) -> float:
+        self.ensure_loaded([telegram_user_id])
+        return self._users[telegram_user_id].engagement_score(time.time())
+
+    # ---------------------------------------------------------------
+    # Updates from CommunicationPreferences
+    # ---------------------------------------------------------------
+
+    def record_sent(self, telegram_user_id: int, sent_at: Optional[float] = None):
+        state = self._users.get(telegram_user_id)
+        if state is None:
+            # Warmed later from message_analytics, which already holds this row
+            return
+        sent_at = sent_at or time.time()
+        state.record_sent(sent_at)
+        delta = self._pending_delta(telegram_user_id)
+        if delta is not None:
+            delta.record_sent(sent_at)
+
+    def record_response(self, telegram_user_id: int):
+        state = self._users.get(telegram_user_id)
+        if state is None or not state.record_response():
+            return
+        delta = self._pending_delta(telegram_user_id)
+        if delta is not None:
+            delta.daily_responded.add(state.last_sent_at)
+            delta.last_sent_at = state.last_sent_at
+            delta.last_responded = True
+
+    def update_preferences(self, telegram_user_id: int, changes: Dict[str, Any]):
+        """Apply a preferences write to the cached copy (no-op for users not in memory)"""
+        state = self._users.get(telegram_user_id)
+        if state is None:
+            return
+        if not state.has_preferences:
+            # Only a full preferences upsert creates the row
+            if "communication_style" in changes and "enabled_message_types" in changes:
+                state.set_preferences(changes)
+            return
+        if "communication_style" in changes:
+            state.style = changes["communication_style"]
+        if "enabled_message_types" in changes:
+            enabled = changes["enabled_message_types"]
+            state.enabled_types = frozenset(json.loads(enabled) if isinstance(enabled, str) else enabled)
+        if "pause_until" in changes:
+            state.pause_until = _epoch(changes["pause_until"])
+
+    def invalidate(self, telegram_user_id: int):
+        # Pending counts are kept: they still have to reach the checkpoint
+        self._users.pop(telegram_user_id, None)
+
+    # ---------------------------------------------------------------
+    # Warming
+    # ---------------------------------------------------------------
+
+    def ensure_loaded(self, telegram_user_ids: List[int]):
+        now = time.time()
+        cold = [user_id for user_id in telegram_user_ids if user_id not in self._users]
+        stale = [user_id for user_id in telegram_user_ids
+                 if user_id in self._users and now - self._users[user_id].loaded_at > self.prefs_ttl]
+
+        for start in range(0, len(cold), self.batch_size):
+            self._warm(cold[start:start + self.batch_size])
+        for start in range(0, len(stale), self.batch_size):
+            self._warm(stale[start:start + self.batch_size], refresh=True)
+
+    def _load_preferences(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        result = self.supabase.table("communication_preferences").select(
+            "telegram_user_id, communication_style, enabled_message_types, pause_until"
+        ).in_("telegram_user_id", user_ids).execute()
+        return {row["telegram_user_id"]: row for row in result.data or []}
+
+    def _warm(self, user_ids: List[int], refresh: bool = False):
+        """Build user states from preferences, checkpoints and newer message_analytics rows
+
+        Refreshing rebuilds a cached user the same way, so counts other processes
+        checkpointed or logged since the last load are picked up.
+        """
+        prefs = self._load_preferences(user_ids)
+        checkpoints = self._load_checkpoints(user_ids)
+
+        states = {}
+        now = time.time()
+        for user_id in user_ids:
+            state = UserGateState()
+            state.set_preferences(prefs.get(user_id))
+            state.loaded_at = now
+            if user_id in checkpoints:
+                state.load_checkpoint(checkpoints[user_id]["state"])
+            states[user_id] = state
+
+        self._replay_analytics(states, checkpoints, now)
+
+        self._users.update(states)
+        self.stats["refreshed" if refresh else "warmed"] += len(user_ids)
+
+    def _replay_analytics(self, states: Dict[int, UserGateState], checkpoints: Dict[int, Dict[str, Any]], now: float):
+        """Fill counters from message_analytics rows newer than each user's checkpoint"""
+        window_start = datetime.fromtimestamp(now - ENGAGEMENT_DAYS * 86400).isoformat()
+        checkpointed_at = {user_id: _epoch(row["checkpointed_at"]) for user_id, row in checkpoints.items()}
+
+        if len(checkpointed_at) == len(states) and all(checkpointed_at.values()):
+            # Every user has a checkpoint: only rows sent or answered after the oldest one
+            since = datetime.fromtimestamp(min(checkpointed_at.values())).isoformat()
+            newer = lambda query: query.or_(f"sent_at.gt.{since},responded_at.gt.{since}")
+        else:
+            newer = lambda query: query.gte("sent_at", window_start)
+
+        # Paged by id: a warm batch covers up to 14 days of messages, past the API row cap
+        rows = stream_rows(lambda: newer(self.supabase.table("message_analytics").select(
+            "id, telegram_user_id, sent_at, user_responded, clicked_link, responded_at"
+        ).in_("telegram_user_id", list(states))).order("id"))
+
+        for row in rows:
+            user_id = row["telegram_user_id"]
+            sent_at = _epoch(row.get("sent_at"))
+            if sent_at is None or sent_at < now - ENGAGEMENT_DAYS * 86400:
+                continue
+
+            state = states[user_id]
+            since = checkpointed_at.get(user_id)
+            if since is None or sent_at > since:
+                state.record_sent(sent_at, bool(row.get("user_responded")), bool(row.get("clicked_link")))
+            elif row.get("user_responded") and (_epoch(row.get("responded_at")) or 0) > since:
+                # Response to a message already counted in the checkpoint
+                state.daily_responded.add(sent_at)
+                if sent_at == state.last_sent_at:
+                    state.last_responded = True
+
+    # ---------------------------------------------------------------
+    # Checkpointing
+    # ---------------------------------------------------------------
+
+    def _load_checkpoints(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        if not self._checkpoint_available:
+            return {}
+        try:
+            return self._fetch_checkpoints(user_ids)
+        except Exception as e:
+            self._checkpoint_failed(e)
+            return {}
+
+    def _fetch_checkpoints(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        result = self.supabase.table("communication_gate_state").select(
+            "telegram_user_id, state, checkpointed_at"
+        ).in_("telegram_user_id", user_ids).execute()
+
+        checkpoints = {}
+        for row in result.data or []:
+            state = row.get("state")
+            if isinstance(state, str):
+                state = json.loads(state)
+            checkpoints[row["telegram_user_id"]] = {"state": state or {}, "checkpointed_at": row["checkpointed_at"]}
+        return checkpoints
+
+    def _checkpoint_failed(self, error: Exception):
+        """Stop checkpointing if the table is not deployed; other errors only skip this round"""
+        message = str(error)
+        if "communication_gate_state" in message or "42P01" in message or "PGRST205" in message:
+            logger.warning(f"communication_gate_state unavailable, gate will warm from message_analytics: {error}")
+            self._checkpoint_available = False
+        else:
+            logger.error(f"Error checkpointing communication gate: {error}")
+        self.stats["checkpoint_errors"] += 1
+
+    def _pending_delta(self, telegram_user_id: int) -> Optional[UserGateState]:
+        """This process's uncheckpointed counts for a user (None while checkpointing is off)"""
+        if not self._checkpoint_available:
+            return None
+        delta = self._pending.get(telegram_user_id)
+        if delta is None:
+            delta = self._pending[telegram_user_id] = UserGateState()
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return delta
+        if self._checkpointer is None or self._checkpointer.done():
+            self._checkpointer = asyncio.create_task(self._checkpoint_loop())
+        return delta
+
+    async def _checkpoint_loop(self):
+        """Checkpoint every interval while there are changes; exits once idle"""
+        while self._pending:
+            await asyncio.sleep(self.checkpoint_interval)
+            self.checkpoint()
+
+    def checkpoint(self) -> int:
+        """Add this process's pending counts to the stored checkpoints in one request"""
+        if not self._pending or not self._checkpoint_available:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        checkpointed_at = datetime.now().isoformat()
+        rows = [{
+            "telegram_user_id": user_id,
+            "state": delta.to_checkpoint(),
+            "checkpointed_at": checkpointed_at
+        } for user_id, delta in pending.items()]
+
+        try:
+            self._merge_checkpoints(rows)
+        except Exception as e:
+            self._checkpoint_failed(e)
+            if self._checkpoint_available:
+                # Keep the counts for the next round, together with anything recorded meanwhile
+                for user_id, delta in pending.items():
+                    if user_id in self._pending:
+                        delta.merge(self._pending[user_id])
+                    self._pending[user_id] = delta
+            return 0
+
+        self.stats["checkpoints"] += 1
+        self.stats["rows_checkpointed"] += len(rows)
+        return len(rows)
+
+    def _merge_checkpoints(self, rows: List[Dict[str, Any]]):
+        if self._merge_rpc_available:
+            try:
+                self.supabase.rpc("merge_communication_gate_state", {"deltas": rows}).execute()
+                return
+            except Exception as e:
+                if "merge_communication_gate_state" in str(e) or "PGRST202" in str(e):
+                    logger.warning(f"merge_communication_gate_state RPC unavailable, merging checkpoints here: {e}")
+                    self._merge_rpc_available = False
+                else:
+                    raise
+
+        # Fallback: read, add and write back (not atomic across processes, but never drops this process's counts)
+        stored = self._fetch_checkpoints([row["telegram_user_id"] for row in rows])
+        merged = [{**row, "state": merge_checkpoint(stored.get(row["telegram_user_id"], {}).get("state"), row["state"])}
+                  for row in rows]
+        self.supabase.table("communication_gate_state").upsert(merged, on_conflict="telegram_user_id").execute()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "users_in_memory": len(self._users),
+            "dirty": len(self._pending),
+            "checkpoint_available": self._checkpoint_available,
+            "merge_rpc_available": self._merge_rpc_available
+        }
@@ -0,0 +1,178 @@
+# Shared Row Count Service for The Progress Method
+# Head-only counts (no row payloads), batched through one RPC and cached briefly
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import datetime, timedelta
+from supabase import Client
+from request_memo import memoize
+
+logger = logging.getLogger(__name__)
+
+# Filter operators understood by both the REST path and the count_rows_batch RPC
+COUNT_FILTER_OPS = ("eq", "neq", "gt", "gte", "lt", "lte", "is_null", "not_null")
+
+@dataclass(frozen=True)
+class CountSpec:
+    """One count request: a table plus simple column filters"""
+    table: str
+    filters: Tuple[Tuple[str, str, Any], ...] = ()  # (op, column, value)
+    mode: str = "exact"  # exact | planned | estimated
+
+    @classmethod
+    def build(cls, table: str, mode: str = "exact", **filters) -> "CountSpec":
+        """CountSpec.build("users", gte={"created_at": since}, not_null=["email"])"""
+        items = []
+        for op, value in filters.items():
+            if op not in COUNT_FILTER_OPS:
+                raise ValueError(f"Unsupported count filter: {op}")
+            if op in ("is_null", "not_null"):
+                items.extend((op, column, None) for column in value)
+            else:
+                items.extend((op, column, column_value) for column, column_value in value.items())
+        return cls(table, tuple(sorted(items, key=lambda f: (f[0], f[1]))), mode)
+
+    def to_rpc(self) -> Dict[str, Any]:
+        return {
+            "table": self.table,
+            "mode": self.mode,
+            "filters": [{"op": op, "column": column, "value": value} for op, column, value in self.filters]
+        }
+
+@dataclass
+class _CachedCount:
+    value: int
+    expires_at: float
+
+class CountService:
+    """Head-only row counts with short-TTL caching and RPC batching"""
+
+    def __init__(self, supabase_client: Client, ttl_seconds: float = 30.0, max_cached_counts: int = 1000):
+        self.supabase = supabase_client
+        self.ttl_seconds = ttl_seconds
+        self.max_cached_counts = max_cached_counts
+        self._cache: Dict[CountSpec, _CachedCount] = {}
+        self._rpc_available = True
+        self.stats = {"requests": 0, "cache_hits": 0, "rpc_batches": 0, "head_requests": 0}
+
+    @staticmethod
+    def since(days: float = 0, hours: float = 0, minutes: float = 0) -> str:
+        """ISO timestamp for a lookback window, floored to the minute so it is cacheable"""
+        moment = datetime.now() - timedelta(days=days, hours=hours, minutes=minutes)
+        return moment.replace(second=0, microsecond=0).isoformat()
+
+    async def count(self, table: str, mode: str = "exact", **filters) -> int:
+        """Count rows of one table matching the given filters"""
+        spec = CountSpec.build(table, mode=mode, **filters)
+        # Identical counts within one request scope share a single lookup
+        results = await memoize(("count", spec), lambda: self.count_many({"count": spec}))
+        if results["count"] is None:
+            raise RuntimeError(f"Count failed for table {table}")
+        return results["count"]
+
+    async def count_many(self, specs: Dict[str, CountSpec]) -> Dict[str, Optional[int]]:
+        """Count several queries at once; cached values are reused, the rest go in one RPC
+
+        A query that fails (e.g. a missing table) comes back as None and is not cached.
+        """
+        return await memoize(("count_many", tuple(sorted(specs.items()))), lambda: self._count_many(specs))
+
+    async def _count_many(self, specs: Dict[str, CountSpec]) -> Dict[str, Optional[int]]:
+        """Resolve counts from the TTL cache, fetching the rest"""
+        now = time.monotonic()
+        results: Dict[str, int] = {}
+        missing: Dict[CountSpec, List[str]] = {}
+
+        for key, spec in specs.items():
+            self.stats["requests"] += 1
+            cached = self._cache.get(spec)
+            if cached and cached.expires_at > now:
+                self.stats["cache_hits"] += 1
+                results[key] = cached.value
+            else:
+                missing.setdefault(spec, []).append(key)
+
+        if missing:
+            fetched = await self._fetch_counts(list(missing.keys()))
+            now = time.monotonic()
+            self._evict(now)
+            expires_at = now + self.ttl_seconds
+            for spec, value in fetched.items():
+                if value is not None:
+                    self._cache.pop(spec, None)
+                    self._cache[spec] = _CachedCount(value, expires_at)
+                    if len(self._cache) > self.max_cached_counts:
+                        # Oldest entry first (dicts keep insertion order)
+                        del self._cache[next(iter(self._cache))]
+                for key in missing[spec]:
+                    results[key] = value
+
+        return results
+
+    def _evict(self, now: float):
+        """Drop expired counts (since() windows produce new specs every minute)"""
+        expired = [spec for spec, cached in self._cache.items() if cached.expires_at <= now]
+        for spec in expired:
+            del self._cache[spec]
+
+    def invalidate(self, table: Optional[str] = None):
+        """Drop cached counts for a table (or everything)"""
+        if table is None:
+            self._cache.clear()
+        else:
+            self._cache = {spec: cached for spec, cached in self._cache.items() if spec.table != table}
+
+    async def _fetch_counts(self, specs: List[CountSpec]) -> Dict[CountSpec, Optional[int]]:
+        """Fetch uncached counts - one RPC when there are several, head requests otherwise"""
+        if len(specs) > 1 and self._rpc_available:
+            try:
+                result = self.supabase.rpc("count_rows_batch", {"queries": [spec.to_rpc() for spec in specs]}).execute()
+                counts = result.data or []
+                self.stats["rpc_batches"] += 1
+                return {spec: int(counts[i] or 0) for i, spec in enumerate(specs)}
+            except Exception as e:
+                if "count_rows_batch" in str(e) or "PGRST202" in str(e):
+                    # RPC not deployed - use head requests from now on
+                    logger.warning(f"count_rows_batch RPC unavailable, using head requests: {e}")
+                    self._rpc_available = False
+                else:
+                    logger.warning(f"Batched count failed, retrying individually: {e}")
+
+        return {spec: self._head_count(spec) for spec in specs}
+
+    def _head_count(self, spec: CountSpec) -> Optional[int]:
+        """Single count request that transfers no rows"""
+        self.stats["head_requests"] += 1
+        try:
+            query = self.supabase.table(spec.table).select("*", count=spec.mode, head=True)
+
+            for op, column, value in spec.filters:
+                if op == "is_null":
+                    query = query.is_(column, "null")
+                elif op == "not_null":
+                    query = query.not_.is_(column, "null")
+                else:
+                    query = getattr(query, op)(column, value)
+
+            result = query.execute()
+            return result.count or 0
+
+        except Exception as e:
+            logger.error(f"Error counting {spec.table}: {e}")
+            return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "cached_counts": len(self._cache), "rpc_available": self._rpc_available}
+
+# One shared service per Supabase client in the process
+_count_services: Dict[int, CountService] = {}
+
+def get_count_service(supabase_client: Client) -> CountService:
+    """Get (or create) the shared count service for a Supabase client"""
+    service = _count_services.get(id(supabase_client))
+    if service is None or service.supabase is not supabase_client:
+        service = CountService(supabase_client)
+        _count_services[id(supabase_client)] = service
+    return service
@@ -0,0 +1,8 @@
+-- Keyset pagination indexes for the admin list APIs
+-- Pages are ordered by (created_at DESC, id DESC), see admin_pagination.py
+
+CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_commitments_created_at_id ON commitments(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_commitments_status_created_at_id ON commitments(status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_commitments_user_created_at_id ON commitments(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_user_roles_role_active ON user_roles(role_type, user_id) WHERE is_active = true;
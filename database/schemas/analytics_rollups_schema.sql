@@ -0,0 +1,181 @@
+-- Daily analytics rollups (analytics_rollups.py)
+-- Maintained by triggers as deliveries and sequence states change, so dashboards read
+-- a handful of rows per day instead of scanning message_deliveries / user_sequence_state.
+
+-- ---------------------------------------------------------------
+-- Delivery rollups: rows per (scheduled day, sequence, channel) by current status
+-- ---------------------------------------------------------------
+
+CREATE TABLE IF NOT EXISTS delivery_daily_rollups (
+    day DATE NOT NULL,
+    sequence_type TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    scheduled INTEGER NOT NULL DEFAULT 0,
+    pending INTEGER NOT NULL DEFAULT 0,
+    sending INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    delivered INTEGER NOT NULL DEFAULT 0,
+    opened INTEGER NOT NULL DEFAULT 0,
+    clicked INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    bounced INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (day, sequence_type, channel)
+);
+
+CREATE OR REPLACE FUNCTION bump_delivery_rollup(
+    p_day DATE, p_sequence_type TEXT, p_channel TEXT,
+    p_status TEXT, p_failure_reason TEXT, p_delta INTEGER
+)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO delivery_daily_rollups AS r (
+        day, sequence_type, channel, scheduled, pending, sending, sent, delivered, opened, clicked, failed, bounced
+    ) VALUES (
+        p_day, p_sequence_type, p_channel, p_delta,
+        CASE WHEN p_status = 'pending' THEN p_delta ELSE 0 END,
+        CASE WHEN p_status = 'sending' THEN p_delta ELSE 0 END,
+        CASE WHEN p_status = 'sent' THEN p_delta ELSE 0 END,
+        CASE WHEN p_status = 'delivered' THEN p_delta ELSE 0 END,
+        CASE WHEN p_status = 'opened' THEN p_delta ELSE 0 END,
+        CASE WHEN p_status = 'clicked' THEN p_delta ELSE 0 END,
+        CASE WHEN p_status IN ('failed', 'bounced') THEN p_delta ELSE 0 END,
+        CASE WHEN p_status = 'bounced' OR (p_status = 'failed' AND p_failure_reason ILIKE '%bounce%') THEN p_delta ELSE 0 END
+    )
+    ON CONFLICT (day, sequence_type, channel) DO UPDATE SET
+        scheduled = r.scheduled + EXCLUDED.scheduled,
+        pending = r.pending + EXCLUDED.pending,
+        sending = r.sending + EXCLUDED.sending,
+        sent = r.sent + EXCLUDED.sent,
+        delivered = r.delivered + EXCLUDED.delivered,
+        opened = r.opened + EXCLUDED.opened,
+        clicked = r.clicked + EXCLUDED.clicked,
+        failed = r.failed + EXCLUDED.failed,
+        bounced = r.bounced + EXCLUDED.bounced,
+        updated_at = NOW();
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION track_delivery_rollup()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_delivery_rollup(DATE(OLD.scheduled_at), OLD.sequence_type, OLD.channel,
+                                     OLD.delivery_status, OLD.failure_reason, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_delivery_rollup(DATE(NEW.scheduled_at), NEW.sequence_type, NEW.channel,
+                                     NEW.delivery_status, NEW.failure_reason, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS message_deliveries_rollup ON message_deliveries;
+CREATE TRIGGER message_deliveries_rollup
+    AFTER INSERT OR DELETE OR UPDATE OF delivery_status, scheduled_at, failure_reason, sequence_type, channel
+    ON message_deliveries
+    FOR EACH ROW EXECUTE FUNCTION track_delivery_rollup();
+
+-- ---------------------------------------------------------------
+-- Sequence rollups: rows per (start day, sequence) by lifecycle state
+-- ---------------------------------------------------------------
+
+-- Columns the sequence rollup reads (written by NurtureSequences.stop_sequence / trigger_sequence)
+ALTER TABLE user_sequence_state ADD COLUMN IF NOT EXISTS stopped_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE user_sequence_state ADD COLUMN IF NOT EXISTS created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+CREATE TABLE IF NOT EXISTS sequence_daily_rollups (
+    day DATE NOT NULL,
+    sequence_type TEXT NOT NULL,
+    started INTEGER NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    stopped INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (day, sequence_type)
+);
+
+CREATE OR REPLACE FUNCTION bump_sequence_rollup(
+    p_day DATE, p_sequence_type TEXT, p_completed BOOLEAN, p_stopped BOOLEAN, p_active BOOLEAN, p_delta INTEGER
+)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO sequence_daily_rollups AS r (day, sequence_type, started, active, completed, stopped)
+    VALUES (
+        p_day, p_sequence_type, p_delta,
+        CASE WHEN NOT p_completed AND NOT p_stopped AND p_active THEN p_delta ELSE 0 END,
+        CASE WHEN p_completed THEN p_delta ELSE 0 END,
+        CASE WHEN NOT p_completed AND p_stopped THEN p_delta ELSE 0 END
+    )
+    ON CONFLICT (day, sequence_type) DO UPDATE SET
+        started = r.started + EXCLUDED.started,
+        active = r.active + EXCLUDED.active,
+        completed = r.completed + EXCLUDED.completed,
+        stopped = r.stopped + EXCLUDED.stopped,
+        updated_at = NOW();
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION track_sequence_rollup()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_sequence_rollup(DATE(COALESCE(OLD.started_at, OLD.created_at)), OLD.sequence_type,
+                                     OLD.completed_at IS NOT NULL, OLD.stopped_at IS NOT NULL, COALESCE(OLD.is_active, false), -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_sequence_rollup(DATE(COALESCE(NEW.started_at, NEW.created_at)), NEW.sequence_type,
+                                     NEW.completed_at IS NOT NULL, NEW.stopped_at IS NOT NULL, COALESCE(NEW.is_active, false), 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS user_sequence_state_rollup ON user_sequence_state;
+CREATE TRIGGER user_sequence_state_rollup
+    AFTER INSERT OR DELETE OR UPDATE OF is_active, completed_at, stopped_at, sequence_type
+    ON user_sequence_state
+    FOR EACH ROW EXECUTE FUNCTION track_sequence_rollup();
+
+-- ---------------------------------------------------------------
+-- One-off backfill from the raw tables
+-- ---------------------------------------------------------------
+
+TRUNCATE delivery_daily_rollups;
+INSERT INTO delivery_daily_rollups (day, sequence_type, channel, scheduled, pending, sending, sent, delivered, opened, clicked, failed, bounced)
+SELECT
+    DATE(scheduled_at), sequence_type, channel,
+    COUNT(*),
+    COUNT(*) FILTER (WHERE delivery_status = 'pending'),
+    COUNT(*) FILTER (WHERE delivery_status = 'sending'),
+    COUNT(*) FILTER (WHERE delivery_status = 'sent'),
+    COUNT(*) FILTER (WHERE delivery_status = 'delivered'),
+    COUNT(*) FILTER (WHERE delivery_status = 'opened'),
+    COUNT(*) FILTER (WHERE delivery_status = 'clicked'),
+    COUNT(*) FILTER (WHERE delivery_status IN ('failed', 'bounced')),
+    COUNT(*) FILTER (WHERE delivery_status = 'bounced' OR (delivery_status = 'failed' AND failure_reason ILIKE '%bounce%'))
+FROM message_deliveries
+GROUP BY DATE(scheduled_at), sequence_type, channel;
+
+TRUNCATE sequence_daily_rollups;
+INSERT INTO sequence_daily_rollups (day, sequence_type, started, active, completed, stopped)
+SELECT
+    DATE(COALESCE(started_at, created_at)), sequence_type,
+    COUNT(*),
+    COUNT(*) FILTER (WHERE completed_at IS NULL AND stopped_at IS NULL AND is_active),
+    COUNT(*) FILTER (WHERE completed_at IS NOT NULL),
+    COUNT(*) FILTER (WHERE completed_at IS NULL AND stopped_at IS NOT NULL)
+FROM user_sequence_state
+GROUP BY DATE(COALESCE(started_at, created_at)), sequence_type;
+
+GRANT SELECT ON delivery_daily_rollups TO service_role;
+GRANT SELECT ON sequence_daily_rollups TO service_role;
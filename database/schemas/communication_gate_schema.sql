@@ -0,0 +1,97 @@
+-- Checkpoints for communication_gate.py
+-- The gate keeps per-user sent / engagement counters in memory; this table lets a
+-- restarted process resume from the last checkpoint and replay only newer
+-- message_analytics rows instead of scanning 14 days per user.
+
+CREATE TABLE IF NOT EXISTS communication_gate_state (
+    telegram_user_id BIGINT PRIMARY KEY,
+    state JSONB NOT NULL DEFAULT '{}',
+    checkpointed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Warm-up replay reads rows sent or answered after a checkpoint, per user
+CREATE INDEX IF NOT EXISTS idx_msg_analytics_user_sent ON message_analytics(telegram_user_id, sent_at);
+CREATE INDEX IF NOT EXISTS idx_msg_analytics_user_responded ON message_analytics(telegram_user_id, responded_at)
+    WHERE responded_at IS NOT NULL;
+
+GRANT SELECT, INSERT, UPDATE ON communication_gate_state TO service_role;
+
+-- Checkpoints are written as increments: each process sends only the counts it recorded
+-- since its own last checkpoint, and they are added to the stored rings here, so
+-- concurrent processes never overwrite each other's counts.
+-- Ring slots: equal periods add up, a newer period replaces an older one.
+CREATE OR REPLACE FUNCTION merge_communication_gate_ring(stored JSONB, delta JSONB)
+RETURNS JSONB
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT CASE
+        WHEN delta IS NULL THEN stored
+        WHEN stored IS NULL OR jsonb_array_length(stored->'periods') <> jsonb_array_length(delta->'periods') THEN delta
+        ELSE (
+            SELECT jsonb_build_object(
+                'periods', jsonb_agg(GREATEST(sp, dp) ORDER BY i),
+                'counts', jsonb_agg(CASE WHEN sp = dp THEN sc + dc WHEN dp > sp THEN dc ELSE sc END ORDER BY i)
+            )
+            FROM (
+                SELECT i,
+                       (stored->'periods'->>i)::BIGINT AS sp, (delta->'periods'->>i)::BIGINT AS dp,
+                       (stored->'counts'->>i)::INTEGER AS sc, (delta->'counts'->>i)::INTEGER AS dc
+                FROM generate_series(0, jsonb_array_length(delta->'periods') - 1) i
+            ) slots
+        )
+    END;
+$$;
+
+CREATE OR REPLACE FUNCTION merge_communication_gate_checkpoint(stored JSONB, delta JSONB)
+RETURNS JSONB
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT jsonb_build_object(
+        'hourly_sent', merge_communication_gate_ring(stored->'hourly_sent', delta->'hourly_sent'),
+        'daily_sent', merge_communication_gate_ring(stored->'daily_sent', delta->'daily_sent'),
+        'daily_responded', merge_communication_gate_ring(stored->'daily_responded', delta->'daily_responded'),
+        'daily_clicked', merge_communication_gate_ring(stored->'daily_clicked', delta->'daily_clicked'),
+        'last_sent_at', CASE
+            WHEN (delta->>'last_sent_at') IS NULL THEN stored->'last_sent_at'
+            WHEN (stored->>'last_sent_at') IS NULL THEN delta->'last_sent_at'
+            ELSE to_jsonb(GREATEST((stored->>'last_sent_at')::DOUBLE PRECISION, (delta->>'last_sent_at')::DOUBLE PRECISION))
+        END,
+        'last_responded', CASE
+            WHEN (delta->>'last_sent_at') IS NULL THEN COALESCE((stored->>'last_responded')::BOOLEAN, FALSE)
+            WHEN (stored->>'last_sent_at') IS NULL
+                 OR (delta->>'last_sent_at')::DOUBLE PRECISION > (stored->>'last_sent_at')::DOUBLE PRECISION
+                THEN COALESCE((delta->>'last_responded')::BOOLEAN, FALSE)
+            WHEN (delta->>'last_sent_at')::DOUBLE PRECISION = (stored->>'last_sent_at')::DOUBLE PRECISION
+                THEN COALESCE((stored->>'last_responded')::BOOLEAN, FALSE) OR COALESCE((delta->>'last_responded')::BOOLEAN, FALSE)
+            ELSE COALESCE((stored->>'last_responded')::BOOLEAN, FALSE)
+        END
+    );
+$$;
+
+-- deltas: [{telegram_user_id, state, checkpointed_at}]; returns the number of users merged
+CREATE OR REPLACE FUNCTION merge_communication_gate_state(deltas JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY INVOKER
+SET search_path = public
+AS $$
+DECLARE
+    merged INTEGER;
+BEGIN
+    INSERT INTO communication_gate_state AS g (telegram_user_id, state, checkpointed_at)
+    SELECT (d->>'telegram_user_id')::BIGINT, d->'state', (d->>'checkpointed_at')::TIMESTAMPTZ
+    FROM jsonb_array_elements(deltas) d
+    ON CONFLICT (telegram_user_id) DO UPDATE
+    SET state = merge_communication_gate_checkpoint(g.state, EXCLUDED.state),
+        checkpointed_at = GREATEST(g.checkpointed_at, EXCLUDED.checkpointed_at);
+
+    GET DIAGNOSTICS merged = ROW_COUNT;
+    RETURN merged;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION merge_communication_gate_state(JSONB) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION merge_communication_gate_state(JSONB) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION merge_communication_gate_state(JSONB) TO service_role;
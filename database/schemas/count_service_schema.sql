@@ -0,0 +1,80 @@
+-- Batched row counts for count_service.py
+-- count_rows_batch takes a JSON array of {table, mode, filters:[{op, column, value}]}
+-- and returns one count per query, in order, without transferring any rows.
+-- It runs with the caller's privileges (RLS applies) and only the service role may call it,
+-- since the table, columns and filters are all chosen by the caller.
+
+CREATE OR REPLACE FUNCTION count_rows_batch(queries JSONB)
+RETURNS BIGINT[]
+LANGUAGE plpgsql
+STABLE
+SECURITY INVOKER
+SET search_path = public
+AS $$
+DECLARE
+    q JSONB;
+    f JSONB;
+    sql TEXT;
+    conditions TEXT[];
+    op TEXT;
+    result BIGINT;
+    results BIGINT[] := '{}';
+BEGIN
+    FOR q IN SELECT * FROM jsonb_array_elements(queries)
+    LOOP
+        conditions := '{}';
+
+        FOR f IN SELECT * FROM jsonb_array_elements(COALESCE(q->'filters', '[]'::jsonb))
+        LOOP
+            op := CASE f->>'op'
+                WHEN 'eq' THEN '='
+                WHEN 'neq' THEN '<>'
+                WHEN 'gt' THEN '>'
+                WHEN 'gte' THEN '>='
+                WHEN 'lt' THEN '<'
+                WHEN 'lte' THEN '<='
+                WHEN 'is_null' THEN 'IS NULL'
+                WHEN 'not_null' THEN 'IS NOT NULL'
+                ELSE NULL
+            END;
+
+            IF op IS NULL THEN
+                RAISE EXCEPTION 'Unsupported count filter: %', f->>'op';
+            END IF;
+
+            IF op IN ('IS NULL', 'IS NOT NULL') THEN
+                conditions := conditions || format('%I %s', f->>'column', op);
+            ELSE
+                -- Compare as text cast to the column type so timestamps, booleans and uuids all work
+                conditions := conditions || format('%1$I %2$s CAST(%3$L AS %4$s)',
+                    f->>'column', op, f->>'value',
+                    (SELECT format_type(a.atttypid, a.atttypmod)
+                       FROM pg_attribute a
+                      WHERE a.attrelid = (q->>'table')::regclass
+                        AND a.attname = f->>'column'
+                        AND NOT a.attisdropped));
+            END IF;
+        END LOOP;
+
+        IF q->>'mode' IN ('planned', 'estimated') AND array_length(conditions, 1) IS NULL THEN
+            -- Planner estimate for whole-table counts on large tables
+            SELECT GREATEST(reltuples, 0)::BIGINT INTO result
+              FROM pg_class WHERE oid = (q->>'table')::regclass;
+        ELSE
+            sql := format('SELECT count(*) FROM %I', q->>'table');
+            IF array_length(conditions, 1) IS NOT NULL THEN
+                sql := sql || ' WHERE ' || array_to_string(conditions, ' AND ');
+            END IF;
+            EXECUTE sql INTO result;
+        END IF;
+
+        results := results || result;
+    END LOOP;
+
+    RETURN results;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION count_rows_batch(JSONB) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION count_rows_batch(JSONB) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION count_rows_batch(JSONB) TO service_role;
@@ -0,0 +1,49 @@
+-- Lease-based claiming for message_deliveries (delivery_workers.py)
+-- A worker moves due rows to 'sending' with a lease; expired leases become claimable again.
+
+ALTER TABLE message_deliveries ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE message_deliveries ADD COLUMN IF NOT EXISTS leased_by TEXT;
+
+ALTER TABLE message_deliveries DROP CONSTRAINT IF EXISTS message_deliveries_delivery_status_check;
+ALTER TABLE message_deliveries ADD CONSTRAINT message_deliveries_delivery_status_check
+    CHECK (delivery_status IN ('pending', 'sending', 'sent', 'delivered', 'failed', 'bounced', 'opened', 'clicked'));
+
+CREATE INDEX IF NOT EXISTS idx_message_deliveries_claim ON message_deliveries(channel, scheduled_at) WHERE delivery_status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_message_deliveries_lease ON message_deliveries(channel, lease_expires_at) WHERE delivery_status = 'sending';
+
+CREATE OR REPLACE FUNCTION claim_message_deliveries(
+    p_channel TEXT,
+    p_limit INTEGER,
+    p_lease_seconds INTEGER,
+    p_worker_id TEXT
+)
+RETURNS SETOF message_deliveries
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE message_deliveries d
+    SET delivery_status = 'sending',
+        lease_expires_at = NOW() + make_interval(secs => p_lease_seconds),
+        leased_by = p_worker_id,
+        updated_at = NOW()
+    WHERE d.id IN (
+        SELECT id FROM message_deliveries
+        WHERE channel = p_channel
+          AND (
+              (delivery_status = 'pending' AND scheduled_at <= NOW())
+              OR (delivery_status = 'sending' AND lease_expires_at < NOW())
+          )
+        ORDER BY scheduled_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING d.*;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION claim_message_deliveries(TEXT, INTEGER, INTEGER, TEXT) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION claim_message_deliveries(TEXT, INTEGER, INTEGER, TEXT) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION claim_message_deliveries(TEXT, INTEGER, INTEGER, TEXT) TO service_role;
@@ -0,0 +1,58 @@
+-- Bulk delivery status updates for delivery_status_buffer.py
+-- updates: [{id, status: 'sent'|'failed', at, tracking_id?, reason?, retryable?}]
+-- Failed rows get an atomic attempt_count increment and are either rescheduled with
+-- exponential backoff (retry_base_seconds * 2^(attempt-1)) or marked failed.
+-- Returns the rescheduled rows so the caller can put them back on its deadline scheduler.
+
+CREATE OR REPLACE FUNCTION apply_delivery_status_updates(updates JSONB, retry_base_seconds INTEGER DEFAULT 60)
+RETURNS TABLE(id UUID, retry_at TIMESTAMP WITH TIME ZONE)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    UPDATE message_deliveries d
+    SET delivery_status = 'sent',
+        sent_at = (u->>'at')::timestamptz,
+        tracking_id = COALESCE(u->>'tracking_id', d.tracking_id),
+        lease_expires_at = NULL,
+        updated_at = NOW()
+    FROM jsonb_array_elements(updates) u
+    WHERE u->>'status' = 'sent'
+      AND d.id = (u->>'id')::uuid;
+
+    RETURN QUERY
+    WITH failed AS (
+    UPDATE message_deliveries d
+    SET delivery_status = CASE
+            WHEN COALESCE((u->>'retryable')::boolean, true) AND d.attempt_count < d.max_attempts THEN 'pending'
+            ELSE 'failed'
+        END,
+        attempt_count = CASE
+            WHEN COALESCE((u->>'retryable')::boolean, true) AND d.attempt_count < d.max_attempts THEN d.attempt_count + 1
+            ELSE d.attempt_count
+        END,
+        scheduled_at = CASE
+            WHEN COALESCE((u->>'retryable')::boolean, true) AND d.attempt_count < d.max_attempts
+                THEN NOW() + make_interval(secs => retry_base_seconds * power(2, d.attempt_count - 1))
+            ELSE d.scheduled_at
+        END,
+        failed_at = CASE
+            WHEN COALESCE((u->>'retryable')::boolean, true) AND d.attempt_count < d.max_attempts THEN d.failed_at
+            ELSE (u->>'at')::timestamptz
+        END,
+        failure_reason = u->>'reason',
+        lease_expires_at = NULL,
+        updated_at = NOW()
+    FROM jsonb_array_elements(updates) u
+    WHERE u->>'status' = 'failed'
+      AND d.id = (u->>'id')::uuid
+    RETURNING d.id, d.delivery_status, d.scheduled_at
+    )
+    SELECT failed.id, failed.scheduled_at FROM failed WHERE failed.delivery_status = 'pending';
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION apply_delivery_status_updates(JSONB, INTEGER) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION apply_delivery_status_updates(JSONB, INTEGER) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION apply_delivery_status_updates(JSONB, INTEGER) TO service_role;
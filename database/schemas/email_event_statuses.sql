@@ -0,0 +1,34 @@
+-- Bulk email status updates for email_webhook_buffer.py
+-- updates: [{tracking_id, status, time_column: 'sent_at'|'delivered_at'|'opened_at'|'clicked_at'|'failed_at', at, reason?}]
+-- Each delivery gets its own event time; the caller only sends rows that move forward.
+-- Returns the number of rows updated.
+
+CREATE OR REPLACE FUNCTION apply_email_event_statuses(updates JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY INVOKER
+SET search_path = public
+AS $$
+DECLARE
+    updated INTEGER;
+BEGIN
+    UPDATE message_deliveries d
+    SET delivery_status = u->>'status',
+        sent_at = CASE WHEN u->>'time_column' = 'sent_at' THEN (u->>'at')::timestamptz ELSE d.sent_at END,
+        delivered_at = CASE WHEN u->>'time_column' = 'delivered_at' THEN (u->>'at')::timestamptz ELSE d.delivered_at END,
+        opened_at = CASE WHEN u->>'time_column' = 'opened_at' THEN (u->>'at')::timestamptz ELSE d.opened_at END,
+        clicked_at = CASE WHEN u->>'time_column' = 'clicked_at' THEN (u->>'at')::timestamptz ELSE d.clicked_at END,
+        failed_at = CASE WHEN u->>'time_column' = 'failed_at' THEN (u->>'at')::timestamptz ELSE d.failed_at END,
+        failure_reason = COALESCE(u->>'reason', d.failure_reason),
+        updated_at = NOW()
+    FROM jsonb_array_elements(updates) u
+    WHERE d.tracking_id = u->>'tracking_id';
+
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION apply_email_event_statuses(JSONB) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION apply_email_event_statuses(JSONB) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION apply_email_event_statuses(JSONB) TO service_role;
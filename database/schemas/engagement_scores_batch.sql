@@ -0,0 +1,114 @@
+-- Batch engagement scoring for engagement_scorer.py
+-- engagement_score_inputs returns the 30-day counts behind calculate_engagement_score
+-- for many users in one call; the scorer turns them into all five score types,
+-- appends them to engagement_scores (the history) and upserts them into
+-- current_engagement_scores, one row per (user_id, score_type).
+
+CREATE TABLE IF NOT EXISTS current_engagement_scores (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    score_type TEXT NOT NULL CHECK (score_type IN ('overall', 'telegram', 'email', 'attendance', 'commitment')),
+    score NUMERIC(5,2) NOT NULL CHECK (score >= 0 AND score <= 100),
+    factors JSONB DEFAULT '{}',
+    calculated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    valid_until TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (user_id, score_type)
+);
+
+ALTER TABLE current_engagement_scores ENABLE ROW LEVEL SECURITY;
+CREATE POLICY IF NOT EXISTS "Service role full access to current_engagement_scores" ON current_engagement_scores FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY IF NOT EXISTS "Users can view own current engagement scores" ON current_engagement_scores FOR SELECT USING (user_id = auth.uid());
+GRANT SELECT, INSERT, UPDATE, DELETE ON current_engagement_scores TO service_role;
+
+-- Seed from the latest history row per user and type
+INSERT INTO current_engagement_scores (user_id, score_type, score, factors, calculated_at, valid_until)
+SELECT DISTINCT ON (user_id, score_type) user_id, score_type, score, factors, calculated_at, valid_until
+FROM engagement_scores
+ORDER BY user_id, score_type, calculated_at DESC, id DESC
+ON CONFLICT (user_id, score_type) DO NOTHING;
+
+-- The summary reads one current row per score type instead of every valid history row
+CREATE OR REPLACE VIEW user_engagement_summary AS
+SELECT 
+    u.id as user_id,
+    u.first_name,
+    u.email as user_email,
+    u.telegram_user_id,
+    COALESCE(es_overall.score, 50.0) as overall_engagement_score,
+    COALESCE(es_telegram.score, 0) as telegram_engagement_score,
+    COALESCE(es_email.score, 0) as email_engagement_score,
+    COALESCE(es_attendance.score, 0) as attendance_engagement_score,
+    COALESCE(es_commitment.score, 0) as commitment_engagement_score,
+    get_preferred_channel(u.id) as preferred_channel,
+    uep.is_verified as email_verified,
+    uep.opt_in_sequences as email_opt_in,
+    COUNT(md.id) as total_messages_sent,
+    COUNT(md.id) FILTER (WHERE md.delivery_status = 'opened') as messages_opened,
+    MAX(md.sent_at) as last_message_sent
+FROM users u
+LEFT JOIN current_engagement_scores es_overall ON u.id = es_overall.user_id AND es_overall.score_type = 'overall' AND (es_overall.valid_until IS NULL OR es_overall.valid_until > NOW())
+LEFT JOIN current_engagement_scores es_telegram ON u.id = es_telegram.user_id AND es_telegram.score_type = 'telegram' AND (es_telegram.valid_until IS NULL OR es_telegram.valid_until > NOW())
+LEFT JOIN current_engagement_scores es_email ON u.id = es_email.user_id AND es_email.score_type = 'email' AND (es_email.valid_until IS NULL OR es_email.valid_until > NOW())
+LEFT JOIN current_engagement_scores es_attendance ON u.id = es_attendance.user_id AND es_attendance.score_type = 'attendance' AND (es_attendance.valid_until IS NULL OR es_attendance.valid_until > NOW())
+LEFT JOIN current_engagement_scores es_commitment ON u.id = es_commitment.user_id AND es_commitment.score_type = 'commitment' AND (es_commitment.valid_until IS NULL OR es_commitment.valid_until > NOW())
+LEFT JOIN user_email_preferences uep ON u.id = uep.user_id
+LEFT JOIN message_deliveries md ON u.id = md.user_id AND md.sent_at > NOW() - INTERVAL '30 days'
+GROUP BY u.id, u.first_name, u.email, u.telegram_user_id, es_overall.score, es_telegram.score, es_email.score, es_attendance.score, es_commitment.score, uep.is_verified, uep.opt_in_sequences;
+
+-- Indexes for the per-user 30-day counts
+CREATE INDEX IF NOT EXISTS idx_message_deliveries_user_sent ON message_deliveries(user_id, sent_at);
+CREATE INDEX IF NOT EXISTS idx_meeting_attendance_user_created ON meeting_attendance(user_id, created_at) WHERE attended = TRUE;
+CREATE INDEX IF NOT EXISTS idx_commitments_user_created ON commitments(user_id, created_at) WHERE status = 'completed';
+
+CREATE OR REPLACE FUNCTION engagement_score_inputs(user_ids UUID[])
+RETURNS TABLE(
+    user_id UUID,
+    telegram_interactions BIGINT,
+    email_interactions BIGINT,
+    meetings_attended BIGINT,
+    commitments_completed BIGINT
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH ids AS (
+        SELECT DISTINCT unnest(user_ids) AS user_id
+    ),
+    deliveries AS (
+        SELECT d.user_id,
+               COUNT(*) FILTER (WHERE d.channel = 'telegram' AND d.delivery_status IN ('delivered', 'opened')) AS telegram_interactions,
+               COUNT(*) FILTER (WHERE d.channel = 'email' AND d.delivery_status IN ('delivered', 'opened', 'clicked')) AS email_interactions
+        FROM message_deliveries d
+        JOIN ids ON ids.user_id = d.user_id
+        WHERE d.sent_at > NOW() - INTERVAL '30 days'
+        GROUP BY d.user_id
+    ),
+    attendance AS (
+        SELECT a.user_id, COUNT(*) AS meetings_attended
+        FROM meeting_attendance a
+        JOIN ids ON ids.user_id = a.user_id
+        WHERE a.attended = TRUE AND a.created_at > NOW() - INTERVAL '30 days'
+        GROUP BY a.user_id
+    ),
+    completed AS (
+        SELECT c.user_id, COUNT(*) AS commitments_completed
+        FROM commitments c
+        JOIN ids ON ids.user_id = c.user_id
+        WHERE c.status = 'completed' AND c.created_at > NOW() - INTERVAL '30 days'
+        GROUP BY c.user_id
+    )
+    SELECT ids.user_id,
+           COALESCE(deliveries.telegram_interactions, 0),
+           COALESCE(deliveries.email_interactions, 0),
+           COALESCE(attendance.meetings_attended, 0),
+           COALESCE(completed.commitments_completed, 0)
+    FROM ids
+    LEFT JOIN deliveries ON deliveries.user_id = ids.user_id
+    LEFT JOIN attendance ON attendance.user_id = ids.user_id
+    LEFT JOIN completed ON completed.user_id = ids.user_id;
+$$;
+
+REVOKE EXECUTE ON FUNCTION engagement_score_inputs(UUID[]) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION engagement_score_inputs(UUID[]) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION engagement_score_inputs(UUID[]) TO service_role;
@@ -0,0 +1,22 @@
+-- Aggregated feature usage counters for feature_usage_sink.py
+-- deltas: [{feature_id, usage_count, last_used}] - one entry per feature per flush.
+-- Increments are applied atomically, so concurrent workers never lose counts.
+
+CREATE OR REPLACE FUNCTION apply_feature_usage_deltas(deltas JSONB)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    UPDATE feature_flags f
+    SET usage_count = COALESCE(f.usage_count, 0) + (d->>'usage_count')::INTEGER,
+        last_used = GREATEST(f.last_used, (d->>'last_used')::timestamptz)
+    FROM jsonb_array_elements(deltas) d
+    WHERE f.feature_id = d->>'feature_id';
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION apply_feature_usage_deltas(JSONB) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION apply_feature_usage_deltas(JSONB) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION apply_feature_usage_deltas(JSONB) TO service_role;
@@ -0,0 +1,17 @@
+-- Incremental Admin Reports sync (meet_sync_state.py)
+-- meet_reports_sync keeps one row per day and application; last_event_time is the
+-- high-water mark the next run resumes from, and attendance_processed_at lets an
+-- interrupted backfill skip the days it already finished.
+
+ALTER TABLE meet_reports_sync ADD COLUMN IF NOT EXISTS last_event_time TIMESTAMP WITH TIME ZONE;
+ALTER TABLE meet_reports_sync ADD COLUMN IF NOT EXISTS attendance_processed_at TIMESTAMP WITH TIME ZONE;
+
+-- Upserts target (sync_date, application_name) and (event_id)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_meet_reports_sync_day_app ON meet_reports_sync(sync_date, application_name);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_meet_audit_events_event_id ON meet_audit_events(event_id);
+
+-- Per-day event index rebuilds read one day of one event type
+CREATE INDEX IF NOT EXISTS idx_meet_audit_events_type_time ON meet_audit_events(event_type, event_time);
+
+GRANT SELECT, INSERT, UPDATE ON meet_reports_sync TO service_role;
+GRANT SELECT, INSERT ON meet_audit_events TO service_role;
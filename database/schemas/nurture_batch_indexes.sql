@@ -0,0 +1,5 @@
+-- Indexes for the batched nurture pipeline (NurtureSequences.process_pending_messages)
+
+CREATE INDEX IF NOT EXISTS idx_user_sequence_state_due ON user_sequence_state(next_message_at) WHERE is_active = true;
+CREATE INDEX IF NOT EXISTS idx_commitments_user_created_at ON commitments(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_commitments_user_status ON commitments(user_id, status);
@@ -0,0 +1,21 @@
+-- User directory delta polling support
+-- The in-memory user directory (user_directory.py) polls users by updated_at
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+
+CREATE OR REPLACE FUNCTION set_users_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_set_updated_at ON users;
+CREATE TRIGGER users_set_updated_at
+    BEFORE UPDATE ON users
+    FOR EACH ROW EXECUTE FUNCTION set_users_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_users_updated_at ON users(updated_at);
+CREATE INDEX IF NOT EXISTS idx_user_roles_active_user ON user_roles(user_id) WHERE is_active = true;
+CREATE INDEX IF NOT EXISTS idx_pod_memberships_active_user ON pod_memberships(user_id) WHERE is_active = true;
@@ -0,0 +1,179 @@
+# Write-Behind Delivery Status Buffer for The Progress Method
+# Collects message_deliveries transitions and applies them in bulk through one RPC
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple, Any
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+class DeliveryStatusBuffer:
+    """Buffers sent / failed transitions and flushes every `max_batch` rows or `flush_interval_ms`
+
+    Failures are resolved in the database: `apply_delivery_status_updates` increments
+    attempt_count atomically and either reschedules the row with exponential backoff
+    (retry_base_seconds * 2^(attempt-1)) or marks it failed once max_attempts is reached.
+    """
+
+    def __init__(self, supabase_client: Client, max_batch: int = 100, flush_interval_ms: int = 500,
+                 retry_base_seconds: int = 60):
+        self.supabase = supabase_client
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval_ms / 1000
+        self.retry_base_seconds = retry_base_seconds
+
+        # Last transition per delivery id wins
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._full = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._rpc_available = True
+
+        # Called with (delivery_id, retry_at) for rows rescheduled by a flush
+        self.on_retry: Optional[Callable[[str, Any], None]] = None
+
+        self.stats = {"recorded": 0, "flushes": 0, "rows_flushed": 0, "flush_errors": 0}
+
+    # ---------------------------------------------------------------
+    # Recording
+    # ---------------------------------------------------------------
+
+    def record_sent(self, delivery_id: str, tracking_id: Optional[str] = None):
+        self._add({
+            "id": delivery_id,
+            "status": "sent",
+            "at": datetime.now().isoformat(),
+            "tracking_id": tracking_id
+        })
+
+    def record_failed(self, delivery_id: str, reason: str, retryable: bool = True):
+        self._add({
+            "id": delivery_id,
+            "status": "failed",
+            "at": datetime.now().isoformat(),
+            "reason": reason,
+            "retryable": retryable
+        })
+
+    def _add(self, update: Dict[str, Any]):
+        self._pending[update["id"]] = update
+        self.stats["recorded"] += 1
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (CLI / sync caller) - write through
+            self._flush_now()
+            return
+
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+
+    # ---------------------------------------------------------------
+    # Flushing
+    # ---------------------------------------------------------------
+
+    async def _flush_loop(self):
+        """Flush when a batch fills up or the interval elapses; exits once idle"""
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            self._flush_now()
+
+    async def flush(self) -> int:
+        """Write all buffered transitions now"""
+        return self._flush_now()
+
+    def _flush_now(self) -> int:
+        if not self._pending:
+            return 0
+
+        updates = list(self._pending.values())
+        self._pending = {}
+
+        try:
+            if self._rpc_available:
+                try:
+                    result = self.supabase.rpc("apply_delivery_status_updates", {
+                        "updates": updates,
+                        "retry_base_seconds": self.retry_base_seconds
+                    }).execute()
+                    retries = [(row["id"], row["retry_at"]) for row in result.data or []]
+                except Exception as e:
+                    if "apply_delivery_status_updates" in str(e) or "PGRST202" in str(e):
+                        logger.warning(f"apply_delivery_status_updates RPC unavailable, using direct updates: {e}")
+                        self._rpc_available = False
+                        retries = self._apply_directly(updates)
+                    else:
+                        raise
+            else:
+                retries = self._apply_directly(updates)
+
+        except Exception as e:
+            logger.error(f"Error flushing {len(updates)} delivery status updates: {e}")
+            self.stats["flush_errors"] += 1
+            # Put them back without clobbering newer transitions
+            for update in updates:
+                self._pending.setdefault(update["id"], update)
+            return 0
+
+        self.stats["flushes"] += 1
+        self.stats["rows_flushed"] += len(updates)
+
+        if self.on_retry:
+            for delivery_id, retry_at in retries:
+                self.on_retry(delivery_id, retry_at)
+
+        return len(updates)
+
+    def _apply_directly(self, updates: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """Fallback without the RPC: one update for all sent rows, guarded updates for failures"""
+        sent = [u for u in updates if u["status"] == "sent"]
+        if sent:
+            # The bulk update uses one sent_at; tracking ids go per row
+            self.supabase.table("message_deliveries").update({
+                "delivery_status": "sent",
+                "sent_at": max(u["at"] for u in sent),
+                "lease_expires_at": None
+            }).in_("id", [u["id"] for u in sent]).execute()
+            for u in sent:
+                if u.get("tracking_id"):
+                    self.supabase.table("message_deliveries").update({"tracking_id": u["tracking_id"]}).eq("id", u["id"]).execute()
+
+        retries = []
+        failed = [u for u in updates if u["status"] == "failed"]
+        if not failed:
+            return retries
+
+        rows = self.supabase.table("message_deliveries").select("id, attempt_count, max_attempts").in_(
+            "id", [u["id"] for u in failed]
+        ).execute()
+        attempts = {row["id"]: row for row in rows.data or []}
+
+        for u in failed:
+            row = attempts.get(u["id"])
+            if not row:
+                continue
+            attempt = row.get("attempt_count") or 1
+            update = {"failure_reason": u["reason"], "lease_expires_at": None}
+            if u.get("retryable", True) and attempt < (row.get("max_attempts") or 3):
+                update["delivery_status"] = "pending"
+                update["attempt_count"] = attempt + 1
+                update["scheduled_at"] = (datetime.now() + timedelta(seconds=self.retry_base_seconds * 2 ** (attempt - 1))).isoformat()
+                retries.append((u["id"], update["scheduled_at"]))
+            else:
+                update["delivery_status"] = "failed"
+                update["failed_at"] = u["at"]
+            # Compare-and-set on attempt_count keeps concurrent writers from double counting
+            self.supabase.table("message_deliveries").update(update).eq("id", u["id"]).eq("attempt_count", attempt).execute()
+
+        return retries
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": len(self._pending), "rpc_available": self._rpc_available}
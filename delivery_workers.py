@@ -0,0 +1,219 @@
+# Multi-Channel Delivery Workers for The Progress Method
+# Per-channel worker pools that claim message_deliveries rows with a lease and send them concurrently
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Any
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ChannelConfig:
+    """Concurrency and rate limits for one delivery channel
+
+    `rate_per_second` limits sends per delivery; None leaves pacing to `send` itself
+    (e.g. a client that coalesces deliveries and rate-limits its own HTTP requests).
+    """
+    channel: str
+    send: Callable[[Dict], Awaitable[bool]]
+    concurrency: int
+    rate_per_second: Optional[float]
+    claim_batch_size: int = 50
+
+class RateLimiter:
+    """Token bucket shared by the workers of one channel"""
+
+    def __init__(self, rate_per_second: float, burst: Optional[float] = None):
+        self.rate = rate_per_second
+        self.capacity = burst or max(1.0, rate_per_second)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class ChannelStats:
+    """Throughput and send latency for one channel"""
+
+    def __init__(self, window: int = 1000):
+        self.claimed = 0
+        self.sent = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.latencies_ms: Deque[float] = deque(maxlen=window)
+
+    def record(self, success: bool, latency_ms: float):
+        if success:
+            self.sent += 1
+        else:
+            self.failed += 1
+        self.latencies_ms.append(latency_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 1)
+
+        processed = self.sent + self.failed
+        return {
+            "claimed": self.claimed,
+            "sent": self.sent,
+            "failed": self.failed,
+            "throughput_per_second": round(processed / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": round(latencies[-1], 1) if latencies else None}
+        }
+
+class DeliveryEngine:
+    """Claims due deliveries per channel with a lease and drains them through bounded worker pools
+
+    A claimed row is moved to `sending` with `lease_expires_at`; rows whose lease ran out
+    (e.g. the process died mid-send) become claimable again, so several processes can
+    share the queue without sending the same row twice.
+    """
+
+    def __init__(self, supabase_client: Client, channels: List[ChannelConfig], lease_seconds: int = 120):
+        self.supabase = supabase_client
+        self.channels = {config.channel: config for config in channels}
+        self.lease_seconds = lease_seconds
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.limiters = {config.channel: RateLimiter(config.rate_per_second)
+                         for config in channels if config.rate_per_second}
+        self.stats = {config.channel: ChannelStats() for config in channels}
+        self._rpc_available = True
+
+    async def run_once(self) -> Dict[str, int]:
+        """Drain every due delivery; channels run side by side, each with its own pool"""
+        results = await asyncio.gather(*(self._drain_channel(config) for config in self.channels.values()))
+
+        totals = {"total_processed": 0}
+        for channel, (sent, failed) in zip(self.channels, results):
+            totals[f"{channel}_sent"] = sent
+            totals[f"{channel}_failed"] = failed
+            totals["total_processed"] += sent + failed
+        return totals
+
+    async def _drain_channel(self, config: ChannelConfig):
+        """Claim batches for one channel and feed them to its workers until nothing is due"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=config.claim_batch_size * 2)
+        stats = self.stats[config.channel]
+        limiter = self.limiters.get(config.channel)
+        counts = {"sent": 0, "failed": 0}
+        started = time.monotonic()
+
+        async def worker():
+            while True:
+                delivery = await queue.get()
+                try:
+                    if delivery is None:
+                        return
+                    if limiter:
+                        await limiter.acquire()
+                    sent_started = time.monotonic()
+                    try:
+                        success = await config.send(delivery)
+                    except Exception as e:
+                        logger.error(f"Error processing delivery {delivery['id']}: {e}")
+                        success = False
+                    stats.record(success, (time.monotonic() - sent_started) * 1000)
+                    counts["sent" if success else "failed"] += 1
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(config.concurrency)]
+        try:
+            while True:
+                claimed = self.claim(config.channel, config.claim_batch_size)
+                if not claimed:
+                    break
+                stats.claimed += len(claimed)
+                for delivery in claimed:
+                    await queue.put(delivery)
+                if len(claimed) < config.claim_batch_size:
+                    break
+        finally:
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        if counts["sent"] or counts["failed"]:
+            stats.busy_seconds += time.monotonic() - started
+        return counts["sent"], counts["failed"]
+
+    def claim(self, channel: str, limit: int) -> List[Dict]:
+        """Lease up to `limit` due rows of a channel to this worker"""
+        if self._rpc_available:
+            try:
+                result = self.supabase.rpc("claim_message_deliveries", {
+                    "p_channel": channel,
+                    "p_limit": limit,
+                    "p_lease_seconds": self.lease_seconds,
+                    "p_worker_id": self.worker_id
+                }).execute()
+                return result.data or []
+            except Exception as e:
+                if "claim_message_deliveries" in str(e) or "PGRST202" in str(e):
+                    logger.warning(f"claim_message_deliveries RPC unavailable, claiming with conditional updates: {e}")
+                    self._rpc_available = False
+                else:
+                    logger.error(f"Error claiming {channel} deliveries: {e}")
+                    return []
+
+        return self._claim_with_update(channel, limit)
+
+    def _claim_with_update(self, channel: str, limit: int) -> List[Dict]:
+        """Fallback claim: pick candidates, then lease only the rows still unclaimed"""
+        try:
+            now = datetime.now().isoformat()
+            claimable = f"and(delivery_status.eq.pending,scheduled_at.lte.{now}),and(delivery_status.eq.sending,lease_expires_at.lt.{now})"
+
+            candidates = self.supabase.table("message_deliveries").select("id").eq(
+                "channel", channel
+            ).or_(claimable).order("scheduled_at").limit(limit).execute()
+            ids = [row["id"] for row in candidates.data or []]
+            if not ids:
+                return []
+
+            # The filter is re-evaluated per row, so a row leased by another process in between is skipped
+            result = self.supabase.table("message_deliveries").update({
+                "delivery_status": "sending",
+                "lease_expires_at": (datetime.now() + timedelta(seconds=self.lease_seconds)).isoformat(),
+                "leased_by": self.worker_id
+            }).in_("id", ids).or_(claimable).execute()
+            return result.data or []
+
+        except Exception as e:
+            logger.error(f"Error claiming {channel} deliveries: {e}")
+            return []
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "lease_seconds": self.lease_seconds,
+            "claim_rpc_available": self._rpc_available,
+            "channels": {
+                channel: {
+                    "concurrency": config.concurrency,
+                    "rate_per_second": config.rate_per_second,
+                    **self.stats[channel].to_dict()
+                }
+                for channel, config in self.channels.items()
+            }
+        }
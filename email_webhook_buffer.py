@@ -0,0 +1,272 @@
+# Buffered Email Webhook Ingestion for The Progress Method
+# Acknowledge Resend webhooks immediately; dedup, collapse and write them in bulk
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+# Resend event type -> our event type
+WEBHOOK_EVENT_MAPPING = {
+    "email.sent": "sent",
+    "email.delivered": "delivered",
+    "email.bounced": "bounced",
+    "email.complained": "complaint",
+    "email.opened": "opened",
+    "email.clicked": "clicked"
+}
+
+# Delivery status each event moves to, with its timestamp column and how far along it is
+EVENT_STATUS = {
+    "sent": ("sent", "sent_at", 1),
+    "delivered": ("delivered", "delivered_at", 2),
+    "opened": ("opened", "opened_at", 3),
+    "clicked": ("clicked", "clicked_at", 4),
+    "bounced": ("failed", "failed_at", 5),
+    "complaint": ("failed", "failed_at", 5)
+}
+
+# Tracking ids per in_() filter, which travels in the request URL
+TRACKING_ID_CHUNK = 100
+
+STATUS_RANK = {"pending": 0, "sending": 0, "sent": 1, "delivered": 2, "opened": 3, "clicked": 4, "failed": 5, "bounced": 5}
+
+def parse_webhook_event(event_data: Dict[str, Any]) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+    """(tracking_id, mapped event type, data) for a Resend webhook, or None if it cannot be tracked"""
+    data = event_data.get("data", {}) or {}
+
+    tracking_id = None
+    for tag in data.get("tags", []) or []:
+        if tag.get("name") == "tracking_id":
+            tracking_id = tag.get("value")
+            break
+
+    if not tracking_id:
+        logger.warning("No tracking ID found in webhook event")
+        return None
+
+    mapped_event = WEBHOOK_EVENT_MAPPING.get(event_data.get("type"))
+    if not mapped_event:
+        logger.warning(f"Unknown event type: {event_data.get('type')}")
+        return None
+
+    return tracking_id, mapped_event, data
+
+class EmailWebhookBuffer:
+    """Bounded in-memory buffer of webhook events, flushed every `flush_interval_ms` or `flush_batch` events
+
+    Each flush dedups events by (tracking_id, event_type), moves every delivery to the
+    furthest state it reached (never backwards) stamped with that event's own time, and
+    writes one email_events insert plus one apply_email_event_statuses call. Lookups
+    and fallback updates filter at most TRACKING_ID_CHUNK tracking ids at a time. When the buffer is full, events
+    spill to an NDJSON file that is replayed once there is room again.
+    """
+
+    def __init__(self, supabase_client: Client, max_events: int = 10000, flush_batch: int = 500,
+                 flush_interval_ms: int = 1000, spill_path: str = "logs/email_webhook_spill.ndjson"):
+        self.supabase = supabase_client
+        self.max_events = max_events
+        self.flush_batch = flush_batch
+        self.flush_interval = flush_interval_ms / 1000
+        self.spill_path = spill_path
+
+        # (tracking_id, event_type) -> (event time, data); insertion ordered
+        self._events: Dict[Tuple[str, str], Tuple[str, Dict[str, Any]]] = {}
+        self._full = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._rpc_available = True
+
+        self.stats = {"accepted": 0, "duplicates": 0, "spilled": 0, "replayed": 0,
+                      "flushes": 0, "events_written": 0, "status_updates": 0, "flush_errors": 0}
+
+    def submit(self, event_data: Dict[str, Any]) -> bool:
+        """Queue one webhook payload; returns False if it cannot be tracked"""
+        parsed = parse_webhook_event(event_data)
+        if parsed is None:
+            return False
+
+        tracking_id, event_type, data = parsed
+        key = (tracking_id, event_type)
+        if key in self._events:
+            self.stats["duplicates"] += 1
+            return True
+
+        if len(self._events) >= self.max_events:
+            self._spill(event_data)
+        else:
+            # The webhook's own created_at is the event time; data.created_at is when the email was created
+            self._events[key] = (event_data.get("created_at") or datetime.now().isoformat(), data)
+            self.stats["accepted"] += 1
+
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if len(self._events) >= self.flush_batch:
+            self._full.set()
+        return True
+
+    # ---------------------------------------------------------------
+    # Spill file
+    # ---------------------------------------------------------------
+
+    def _spill(self, event_data: Dict[str, Any]):
+        try:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            with open(self.spill_path, "a") as f:
+                f.write(json.dumps(event_data) + "\n")
+            self.stats["spilled"] += 1
+        except OSError as e:
+            logger.error(f"Error spilling webhook event: {e}")
+
+    def _replay_spill(self):
+        """Move spilled events back into the buffer while there is room"""
+        if not os.path.exists(self.spill_path) or len(self._events) >= self.max_events:
+            return
+
+        replay_path = f"{self.spill_path}.replay"
+        try:
+            os.replace(self.spill_path, replay_path)
+            with open(replay_path) as f:
+                lines = f.readlines()
+            os.remove(replay_path)
+        except OSError as e:
+            logger.error(f"Error replaying webhook spill file: {e}")
+            return
+
+        for line in lines:
+            try:
+                self.submit(json.loads(line))
+                self.stats["replayed"] += 1
+            except json.JSONDecodeError:
+                logger.warning("Skipping malformed spilled webhook event")
+
+    # ---------------------------------------------------------------
+    # Flushing
+    # ---------------------------------------------------------------
+
+    async def _flush_loop(self):
+        while self._events:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write buffered events and status changes; returns number of events written"""
+        async with self._flush_lock:
+            if not self._events:
+                return 0
+
+            events = self._events
+            self._events = {}
+
+            try:
+                written = self._write(events)
+            except Exception as e:
+                logger.error(f"Error flushing {len(events)} webhook events: {e}")
+                self.stats["flush_errors"] += 1
+                for key, value in events.items():
+                    self._events.setdefault(key, value)
+                return 0
+
+            self.stats["flushes"] += 1
+            self.stats["events_written"] += written
+            self._replay_spill()
+            return written
+
+    def _write(self, events: Dict[Tuple[str, str], Tuple[str, Dict[str, Any]]]) -> int:
+        tracking_ids = list({tracking_id for tracking_id, _ in events})
+
+        by_tracking = {}
+        for start in range(0, len(tracking_ids), TRACKING_ID_CHUNK):
+            deliveries = self.supabase.table("message_deliveries").select(
+                "id, tracking_id, delivery_status"
+            ).in_("tracking_id", tracking_ids[start:start + TRACKING_ID_CHUNK]).execute()
+            by_tracking.update({row["tracking_id"]: row for row in deliveries.data or []})
+
+        # Furthest state per delivery
+        furthest: Dict[str, Tuple[str, str]] = {}
+        for (tracking_id, event_type), (event_time, _) in events.items():
+            current = furthest.get(tracking_id)
+            if current is None or EVENT_STATUS[event_type][2] > EVENT_STATUS[current[0]][2]:
+                furthest[tracking_id] = (event_type, event_time)
+
+        # Only rows that move forward, each stamped with the time of the event that moved it
+        updates = []
+        for tracking_id, (event_type, event_time) in furthest.items():
+            delivery = by_tracking.get(tracking_id)
+            if not delivery:
+                continue
+            if EVENT_STATUS[event_type][2] <= STATUS_RANK.get(delivery["delivery_status"], 0):
+                continue
+            status, time_column, _ = EVENT_STATUS[event_type]
+            update = {"tracking_id": tracking_id, "status": status, "time_column": time_column, "at": event_time}
+            if status == "failed":
+                update["reason"] = f"Email {event_type}"
+            updates.append(update)
+
+        if updates:
+            self._apply_statuses(updates)
+            self.stats["status_updates"] += len(updates)
+
+        # All events of the flush in one insert
+        records = []
+        for (tracking_id, event_type), (event_time, data) in events.items():
+            delivery = by_tracking.get(tracking_id)
+            if not delivery:
+                logger.warning(f"No delivery found for tracking ID: {tracking_id}")
+                continue
+            records.append({
+                "delivery_id": delivery["id"],
+                "event_type": event_type,
+                "event_time": event_time,
+                "event_data": json.dumps(data),
+                "user_agent": data.get("user_agent"),
+                "ip_address": data.get("ip_address")
+            })
+
+        if records:
+            self.supabase.table("email_events").insert(records).execute()
+        return len(records)
+
+    def _apply_statuses(self, updates: List[Dict[str, Any]]):
+        if self._rpc_available:
+            try:
+                self.supabase.rpc("apply_email_event_statuses", {"updates": updates}).execute()
+                return
+            except Exception as e:
+                if "apply_email_event_statuses" in str(e) or "PGRST202" in str(e):
+                    logger.warning(f"apply_email_event_statuses RPC unavailable, using direct updates: {e}")
+                    self._rpc_available = False
+                else:
+                    raise
+
+        # Fallback: one update per (state, event time), TRACKING_ID_CHUNK rows at a time
+        groups: Dict[Tuple[str, str, str, Optional[str]], List[str]] = {}
+        for u in updates:
+            groups.setdefault((u["status"], u["time_column"], u["at"], u.get("reason")), []).append(u["tracking_id"])
+
+        now = datetime.now().isoformat()
+        for (status, time_column, event_time, reason), ids in groups.items():
+            update_data = {"delivery_status": status, time_column: event_time, "updated_at": now}
+            if reason:
+                update_data["failure_reason"] = reason
+            for start in range(0, len(ids), TRACKING_ID_CHUNK):
+                self.supabase.table("message_deliveries").update(update_data).in_(
+                    "tracking_id", ids[start:start + TRACKING_ID_CHUNK]
+                ).execute()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "buffered": len(self._events),
+            "spill_file_exists": os.path.exists(self.spill_path),
+            "rpc_available": self._rpc_available
+        }
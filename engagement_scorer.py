@@ -0,0 +1,176 @@
+# Batch Engagement Scoring for The Progress Method
+# Computes every engagement score type for many users at once and stores them in bulk
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Any
+from supabase import Client
+
+from analytics_rollups import stream_rows
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Input columns, with points per interaction (each component is capped at 25 points),
+# in the same order as the calculate_engagement_score database function
+SCORE_INPUTS = ("telegram_interactions", "email_interactions", "meetings_attended", "commitments_completed")
+POINTS_PER_INTERACTION = (2.0, 3.0, 5.0, 2.0)
+COMPONENT_CAP = 25.0
+COMPONENT_SCORE_TYPES = ("telegram", "email", "attendance", "commitment")
+SCORE_TYPES = ("overall",) + COMPONENT_SCORE_TYPES
+
+def compute_scores(counts: List[List[int]]) -> List[Dict[str, float]]:
+    """All five score types per row of SCORE_INPUTS counts (0-100, as calculate_engagement_score)"""
+    if not counts:
+        return []
+
+    if NUMPY_AVAILABLE:
+        components = np.minimum(COMPONENT_CAP, np.asarray(counts, dtype=float) * np.asarray(POINTS_PER_INTERACTION))
+        scores = np.clip(np.column_stack([components.sum(axis=1), components * 4]), 0, 100).round(2)
+        return [dict(zip(SCORE_TYPES, row)) for row in scores.tolist()]
+
+    results = []
+    for row in counts:
+        components = [min(COMPONENT_CAP, count * points) for count, points in zip(row, POINTS_PER_INTERACTION)]
+        values = [sum(components)] + [component * 4 for component in components]
+        results.append(dict(zip(SCORE_TYPES, (round(max(0.0, min(100.0, value)), 2) for value in values))))
+    return results
+
+class EngagementScorer:
+    """Scores users in batches: one input query (RPC or set-wise fallback) and two writes per batch
+
+    Scores are appended to engagement_scores, which keeps the history, and upserted into
+    current_engagement_scores (one row per user and score type). Without that table
+    only the history is written.
+    """
+
+    def __init__(self, supabase_client: Client, batch_size: int = 500, valid_hours: int = 24):
+        self.supabase = supabase_client
+        self.batch_size = batch_size
+        self.valid_hours = valid_hours
+        self._rpc_available = True
+        self._current_available = True
+
+        self.stats = {"users_scored": 0, "rows_written": 0, "batches": 0, "errors": 0}
+
+    async def refresh(self, user_ids: List[str]) -> int:
+        """Compute and store all score types for `user_ids`; returns number of users scored"""
+        user_ids = list(dict.fromkeys(user_ids))
+        scored = 0
+        for start in range(0, len(user_ids), self.batch_size):
+            batch = user_ids[start:start + self.batch_size]
+            try:
+                scored += self._refresh_batch(batch)
+            except Exception as e:
+                logger.error(f"Error refreshing engagement scores for {len(batch)} users: {e}")
+                self.stats["errors"] += 1
+        return scored
+
+    async def refresh_active_users(self) -> int:
+        """Nightly mode: rescore every active user, one batch at a time"""
+        query_factory = lambda: self.supabase.table("users").select("id").eq("is_active", True).order("id")
+
+        batch: List[str] = []
+        scored = 0
+        for row in stream_rows(query_factory, self.batch_size):
+            batch.append(row["id"])
+            if len(batch) >= self.batch_size:
+                scored += await self.refresh(batch)
+                batch = []
+        if batch:
+            scored += await self.refresh(batch)
+
+        logger.info(f"📊 Refreshed engagement scores for {scored} active users")
+        return scored
+
+    def _refresh_batch(self, user_ids: List[str]) -> int:
+        inputs = self._load_inputs(user_ids)
+        counts = [[inputs.get(user_id, {}).get(column, 0) for column in SCORE_INPUTS] for user_id in user_ids]
+
+        now = datetime.now()
+        calculated_at = now.isoformat()
+        valid_until = (now + timedelta(hours=self.valid_hours)).isoformat()
+
+        rows = []
+        for user_id, user_counts, scores in zip(user_ids, counts, compute_scores(counts)):
+            factors = dict(zip(SCORE_INPUTS, user_counts))
+            for score_type, score in scores.items():
+                rows.append({
+                    "user_id": user_id,
+                    "score_type": score_type,
+                    "score": score,
+                    "factors": factors,
+                    "calculated_at": calculated_at,
+                    "valid_until": valid_until
+                })
+
+        self.supabase.table("engagement_scores").insert(rows).execute()
+        if self._current_available:
+            try:
+                self.supabase.table("current_engagement_scores").upsert(rows, on_conflict="user_id,score_type").execute()
+            except Exception as e:
+                if "current_engagement_scores" in str(e) or "42P01" in str(e) or "PGRST205" in str(e):
+                    logger.warning(f"current_engagement_scores unavailable, storing score history only: {e}")
+                    self._current_available = False
+                else:
+                    raise
+
+        self.stats["batches"] += 1
+        self.stats["users_scored"] += len(user_ids)
+        self.stats["rows_written"] += len(rows)
+        return len(user_ids)
+
+    # ---------------------------------------------------------------
+    # Inputs
+    # ---------------------------------------------------------------
+
+    def _load_inputs(self, user_ids: List[str]) -> Dict[str, Dict[str, int]]:
+        """30-day interaction counts per user"""
+        if self._rpc_available:
+            try:
+                result = self.supabase.rpc("engagement_score_inputs", {"user_ids": user_ids}).execute()
+                return {row["user_id"]: row for row in result.data or []}
+            except Exception as e:
+                if "engagement_score_inputs" in str(e) or "PGRST202" in str(e):
+                    logger.warning(f"engagement_score_inputs RPC unavailable, counting set-wise: {e}")
+                    self._rpc_available = False
+                else:
+                    raise
+
+        return self._count_inputs(user_ids)
+
+    def _count_inputs(self, user_ids: List[str]) -> Dict[str, Dict[str, int]]:
+        """Fallback: one projected query per source table for the whole batch"""
+        cutoff = (datetime.now() - timedelta(days=30)).isoformat()
+        inputs: Dict[str, Dict[str, int]] = {user_id: {column: 0 for column in SCORE_INPUTS} for user_id in user_ids}
+
+        deliveries = lambda: self.supabase.table("message_deliveries").select(
+            "id, user_id, channel, delivery_status"
+        ).in_("user_id", user_ids).in_("delivery_status", ["delivered", "opened", "clicked"]).gt("sent_at", cutoff).order("id")
+        for row in stream_rows(deliveries):
+            if row["channel"] == "telegram" and row["delivery_status"] != "clicked":
+                inputs[row["user_id"]]["telegram_interactions"] += 1
+            elif row["channel"] == "email":
+                inputs[row["user_id"]]["email_interactions"] += 1
+
+        attendance = lambda: self.supabase.table("meeting_attendance").select(
+            "id, user_id"
+        ).in_("user_id", user_ids).eq("attended", True).gt("created_at", cutoff).order("id")
+        for row in stream_rows(attendance):
+            inputs[row["user_id"]]["meetings_attended"] += 1
+
+        commitments = lambda: self.supabase.table("commitments").select(
+            "id, user_id"
+        ).in_("user_id", user_ids).eq("status", "completed").gt("created_at", cutoff).order("id")
+        for row in stream_rows(commitments):
+            inputs[row["user_id"]]["commitments_completed"] += 1
+
+        return inputs
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "rpc_available": self._rpc_available, "numpy": NUMPY_AVAILABLE}
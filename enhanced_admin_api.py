@@ -5,9 +5,9 @@ Phase 2: Unified control and email delivery management
 """
 
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.security import APIKeyHeader
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 from typing import Optional, Dict, Any, List
 import os
 import logging
@@ -18,6 +18,10 @@ from pydantic import BaseModel
 from unified_nurture_controller import UnifiedNurtureController, DeliveryChannel
 from email_delivery_service import EmailDeliveryService
 from nurture_sequences import SequenceType
+from admin_pagination import fetch_keyset_page, fetch_active_roles, search_filter, ADMIN_USER_COLUMNS, ADMIN_COMMITMENT_COLUMNS, ADMIN_USER_SEARCH_COLUMNS
+from count_service import get_count_service, CountSpec
+from nurture_scheduler import start_nurture_scheduler
+from attendance_export import AttendanceExporter, EXPORT_FORMATS, export_filename
 
 # Load environment variables
 load_dotenv()
@@ -55,6 +59,26 @@ app = FastAPI(
     version="2.0.0"
 )
 
+nurture_scheduler = None
+
+@app.on_event("startup")
+async def start_scheduler():
+    """Fire nurture steps and scheduled deliveries at their deadlines"""
+    global nurture_scheduler
+    if nurture_controller and os.getenv("NURTURE_SCHEDULER_ENABLED", "true").lower() == "true":
+        nurture_scheduler = await start_nurture_scheduler(
+            supabase,
+            nurture_sequences=nurture_controller.nurture_sequences,
+            delivery_controller=nurture_controller
+        )
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    if nurture_scheduler:
+        await nurture_scheduler.stop()
+    if email_service and email_service.webhook_buffer:
+        await email_service.webhook_buffer.flush()
+
 # Admin authentication
 api_key_header = APIKeyHeader(name="X-Admin-Key", auto_error=False)
 
@@ -671,6 +695,27 @@ async def process_nurture_queue(admin: bool = Depends(verify_admin)):
         logger.error(f"Error processing nurture queue: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/admin/api/nurture/scheduler")
+async def get_nurture_scheduler_stats(admin: bool = Depends(verify_admin)):
+    """Deadline scheduler state (heap size, window, lateness)"""
+    if not nurture_scheduler:
+        return {"running": False}
+    return nurture_scheduler.get_stats()
+
+@app.get("/admin/api/nurture/delivery-workers")
+async def get_delivery_worker_stats(admin: bool = Depends(verify_admin)):
+    """Per-channel delivery throughput and latency"""
+    if not nurture_controller:
+        raise HTTPException(status_code=503, detail="Nurture controller not available")
+    return nurture_controller.get_delivery_stats()
+
+@app.get("/admin/api/email/webhook/stats")
+async def get_email_webhook_stats(admin: bool = Depends(verify_admin)):
+    """Webhook buffer counters (accepted, duplicates, spilled, written)"""
+    if not email_service or not email_service.webhook_buffer:
+        raise HTTPException(status_code=503, detail="Email service not available")
+    return email_service.webhook_buffer.get_stats()
+
 @app.get("/admin/api/email/stats")
 async def get_email_stats():
     """Get email delivery statistics"""
@@ -715,13 +760,16 @@ async def handle_email_webhook(webhook_data: Dict[str, Any]):
         if not email_service:
             raise HTTPException(status_code=503, detail="Email service not available")
         
-        success = await email_service.handle_webhook_event(webhook_data)
+        # Acknowledge right away; the webhook buffer writes events in bulk
+        accepted = email_service.enqueue_webhook_event(webhook_data)
         
-        if success:
-            return {"message": "Webhook processed successfully"}
+        if accepted:
+            return {"message": "Webhook accepted"}
         else:
             raise HTTPException(status_code=400, detail="Failed to process webhook")
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error handling email webhook: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -734,20 +782,17 @@ async def get_metrics():
         if not supabase:
             raise HTTPException(status_code=503, detail="Database not connected")
         
-        # Get user count
-        users = supabase.table("users").select("id", count="exact").execute()
-        total_users = users.count if users.count else 0
-        
-        # Get commitment counts
-        commitments = supabase.table("commitments").select("id", count="exact").execute()
-        total_commitments = commitments.count if commitments.count else 0
-        
-        active_commitments = supabase.table("commitments").select("id", count="exact").eq("status", "active").execute()
-        active_count = active_commitments.count if active_commitments.count else 0
-        
-        # Get pod count (using 'status' field instead of 'is_active')
-        pods = supabase.table("pods").select("id", count="exact").eq("status", "active").execute()
-        total_pods = pods.count if pods.count else 0
+        # All four counts in one batched, head-only request
+        counts = await get_count_service(supabase).count_many({
+            "total_users": CountSpec.build("users"),
+            "total_commitments": CountSpec.build("commitments"),
+            "active_commitments": CountSpec.build("commitments", eq={"status": "active"}),
+            "total_pods": CountSpec.build("pods", eq={"status": "active"})
+        })
+        total_users = counts["total_users"] or 0
+        total_commitments = counts["total_commitments"] or 0
+        active_count = counts["active_commitments"] or 0
+        total_pods = counts["total_pods"] or 0
         
         return {
             "total_users": total_users,
@@ -761,23 +806,27 @@ async def get_metrics():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/admin/api/users")
-async def get_users():
-    """Get all users"""
+async def get_users(cursor: Optional[str] = None, limit: int = 100, role: Optional[str] = None, search: Optional[str] = None):
+    """Get users, newest first, one keyset page at a time"""
     try:
         if not supabase:
             raise HTTPException(status_code=503, detail="Database not connected")
         
-        # Get users with their roles
-        users = supabase.table("users").select("*").order("created_at", desc=True).limit(100).execute()
+        # Role filter is an inner join so pages stay index range scans
+        if role:
+            query = supabase.table("users").select(f"{ADMIN_USER_COLUMNS}, user_roles!inner(role_type)").eq("user_roles.role_type", role).eq("user_roles.is_active", True)
+        else:
+            query = supabase.table("users").select(ADMIN_USER_COLUMNS)
+        
+        page = fetch_keyset_page(query, cursor, limit, or_filter=search_filter(search, ADMIN_USER_SEARCH_COLUMNS))
+        
+        # Get user roles for the whole page in one query
+        roles_by_user = fetch_active_roles(supabase, [user["id"] for user in page["rows"]])
         
-        # Get user roles
         user_data = []
-        for user in users.data:
+        for user in page["rows"]:
             user_id = user.get("id")
-            
-            # Get user roles
-            roles = supabase.table("user_roles").select("role").eq("user_id", user_id).eq("is_active", True).execute()
-            user_roles = [r["role"] for r in roles.data] if roles.data else ["unpaid"]
+            user_roles = roles_by_user.get(user_id) or ["unpaid"]
             
             user_data.append({
                 "id": user_id,
@@ -790,11 +839,62 @@ async def get_users():
                 "created_at": user.get("created_at")
             })
         
-        return {"users": user_data, "count": len(user_data)}
+        return {"users": user_data, "count": len(user_data), "next_cursor": page["next_cursor"], "has_more": page["has_more"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting users: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/admin/api/commitments")
+async def get_commitments(cursor: Optional[str] = None, limit: int = 50, status: Optional[str] = None, user_id: Optional[str] = None):
+    """Get commitments, newest first, one keyset page at a time"""
+    try:
+        if not supabase:
+            raise HTTPException(status_code=503, detail="Database not connected")
+        
+        query = supabase.table("commitments").select(ADMIN_COMMITMENT_COLUMNS)
+        if status:
+            query = query.eq("status", status)
+        if user_id:
+            query = query.eq("user_id", user_id)
+        
+        page = fetch_keyset_page(query, cursor, limit)
+        
+        return {"commitments": page["rows"], "count": len(page["rows"]), "next_cursor": page["next_cursor"], "has_more": page["has_more"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting commitments: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/api/attendance/export")
+async def export_attendance(format: str = "csv", pod_id: Optional[str] = None, start_date: Optional[str] = None,
+                            end_date: Optional[str] = None, user_id: Optional[str] = None, gzip: bool = False,
+                            admin: bool = Depends(verify_admin)):
+    """Stream attendance as CSV or NDJSON (all pods unless pod_id is given), optionally gzipped"""
+    if not supabase:
+        raise HTTPException(status_code=503, detail="Database not connected")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(sorted(EXPORT_FORMATS))}")
+    try:
+        for value in (start_date, end_date):
+            if value:
+                date.fromisoformat(value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {e}")
+    
+    # A sync iterator: Starlette pulls each page from a worker thread, off the event loop
+    chunks = AttendanceExporter(supabase).stream(
+        format, gzip, pod_id=pod_id, start_date=start_date, end_date=end_date, user_id=user_id
+    )
+    filename = export_filename(format, gzip, pod_id, start_date, end_date)
+    return StreamingResponse(
+        chunks,
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8001))
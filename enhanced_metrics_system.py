@@ -15,6 +15,8 @@ import statistics
 import uuid
 
 from supabase import Client
+from count_service import get_count_service
+from request_memo import request_scoped
 
 logger = logging.getLogger(__name__)
 
@@ -74,9 +76,11 @@ class EnhancedMetricsSystem:
     
     def __init__(self, supabase_client: Client):
         self.supabase = supabase_client
+        self.counts = get_count_service(supabase_client)
         self.custom_metrics = []
         self.business_kpis = []
         
+    @request_scoped("metrics.collect_progress_method_metrics")
     async def collect_progress_method_metrics(self) -> List[CustomMetric]:
         """Collect comprehensive Progress Method specific metrics"""
         metrics = []
@@ -118,8 +122,8 @@ class EnhancedMetricsSystem:
             week_ago = today - timedelta(days=7)
             
             # DAU
-            dau_result = self.supabase.table("users").select("id", count="exact").gte("last_activity_at", today.isoformat()).execute()
-            dau = dau_result.count if dau_result.count else 0
+            dau_result = await self.counts.count("users", gte={"last_activity_at": today.isoformat()})
+            dau = dau_result if dau_result else 0
             
             metrics.append(CustomMetric(
                 id="dau",
@@ -134,8 +138,8 @@ class EnhancedMetricsSystem:
             ))
             
             # WAU (Weekly Active Users)
-            wau_result = self.supabase.table("users").select("id", count="exact").gte("last_activity_at", week_ago.isoformat()).execute()
-            wau = wau_result.count if wau_result.count else 0
+            wau_result = await self.counts.count("users", gte={"last_activity_at": week_ago.isoformat()})
+            wau = wau_result if wau_result else 0
             
             metrics.append(CustomMetric(
                 id="wau",
@@ -167,8 +171,8 @@ class EnhancedMetricsSystem:
             
             # User Retention Rate (users active this week vs last week)
             last_week = week_ago - timedelta(days=7)
-            last_week_users = self.supabase.table("users").select("id", count="exact").gte("last_activity_at", last_week.isoformat()).lt("last_activity_at", week_ago.isoformat()).execute()
-            last_week_count = last_week_users.count if last_week_users.count else 1
+            last_week_users = await self.counts.count("users", gte={"last_activity_at": last_week.isoformat()}, lt={"last_activity_at": week_ago.isoformat()})
+            last_week_count = last_week_users if last_week_users else 1
             
             retention_rate = (wau / last_week_count) * 100 if last_week_count > 0 else 0
             
@@ -198,8 +202,8 @@ class EnhancedMetricsSystem:
             week_ago = today - timedelta(days=7)
             
             # Commitment Creation Rate
-            new_commitments = self.supabase.table("commitments").select("id", count="exact").gte("created_at", today.isoformat()).execute()
-            daily_commitments = new_commitments.count if new_commitments.count else 0
+            new_commitments = await self.counts.count("commitments", gte={"created_at": today.isoformat()})
+            daily_commitments = new_commitments if new_commitments else 0
             
             metrics.append(CustomMetric(
                 id="daily_commitment_creation",
@@ -213,8 +217,8 @@ class EnhancedMetricsSystem:
             ))
             
             # Commitment Completion Rate
-            completed_commitments = self.supabase.table("commitments").select("id", count="exact").eq("status", "completed").gte("completed_at", today.isoformat()).execute()
-            daily_completions = completed_commitments.count if completed_commitments.count else 0
+            completed_commitments = await self.counts.count("commitments", eq={"status": "completed"}, gte={"completed_at": today.isoformat()})
+            daily_completions = completed_commitments if completed_commitments else 0
             
             completion_rate = (daily_completions / daily_commitments * 100) if daily_commitments > 0 else 0
             
@@ -257,11 +261,11 @@ class EnhancedMetricsSystem:
                 ))
             
             # SMART Goal Adoption Rate (assuming commitments with AI analysis are SMART)
-            smart_commitments = self.supabase.table("commitments").select("id", count="exact").not_.is_("smart_analysis", "null").gte("created_at", week_ago.isoformat()).execute()
-            total_commitments_week = self.supabase.table("commitments").select("id", count="exact").gte("created_at", week_ago.isoformat()).execute()
+            smart_commitments = await self.counts.count("commitments", gte={"created_at": week_ago.isoformat()}, not_null=["smart_analysis"])
+            total_commitments_week = await self.counts.count("commitments", gte={"created_at": week_ago.isoformat()})
             
-            smart_count = smart_commitments.count if smart_commitments.count else 0
-            total_count = total_commitments_week.count if total_commitments_week.count else 1
+            smart_count = smart_commitments if smart_commitments else 0
+            total_count = total_commitments_week if total_commitments_week else 1
             
             smart_adoption_rate = (smart_count / total_count * 100) if total_count > 0 else 0
             
@@ -287,8 +291,8 @@ class EnhancedMetricsSystem:
         
         try:
             # Active Pods
-            active_pods = self.supabase.table("pods").select("id", count="exact").eq("is_active", True).execute()
-            pod_count = active_pods.count if active_pods.count else 0
+            active_pods = await self.counts.count("pods", eq={"is_active": True})
+            pod_count = active_pods if active_pods else 0
             
             metrics.append(CustomMetric(
                 id="active_pods",
@@ -301,11 +305,11 @@ class EnhancedMetricsSystem:
             ))
             
             # Pod Membership Rate
-            total_users = self.supabase.table("users").select("id", count="exact").execute()
-            pod_members = self.supabase.table("pod_memberships").select("user_id", count="exact").execute()
+            total_users = await self.counts.count("users")
+            pod_members = await self.counts.count("pod_memberships")
             
-            total_user_count = total_users.count if total_users.count else 1
-            member_count = pod_members.count if pod_members.count else 0
+            total_user_count = total_users if total_users else 1
+            member_count = pod_members if pod_members else 0
             
             pod_membership_rate = (member_count / total_user_count * 100) if total_user_count > 0 else 0
             
@@ -348,8 +352,8 @@ class EnhancedMetricsSystem:
             today = datetime.now().date()
             
             # AI Analysis Usage
-            ai_analyses = self.supabase.table("commitments").select("id", count="exact").not_.is_("smart_analysis", "null").gte("created_at", today.isoformat()).execute()
-            ai_usage_count = ai_analyses.count if ai_analyses.count else 0
+            ai_analyses = await self.counts.count("commitments", gte={"created_at": today.isoformat()}, not_null=["smart_analysis"])
+            ai_usage_count = ai_analyses if ai_analyses else 0
             
             metrics.append(CustomMetric(
                 id="daily_ai_usage",
@@ -362,8 +366,8 @@ class EnhancedMetricsSystem:
             ))
             
             # AI Analysis Success Rate (assuming non-null smart_analysis means success)
-            total_commitments_today = self.supabase.table("commitments").select("id", count="exact").gte("created_at", today.isoformat()).execute()
-            total_today = total_commitments_today.count if total_commitments_today.count else 1
+            total_commitments_today = await self.counts.count("commitments", gte={"created_at": today.isoformat()})
+            total_today = total_commitments_today if total_commitments_today else 1
             
             ai_success_rate = (ai_usage_count / total_today * 100) if total_today > 0 else 0
             
@@ -394,11 +398,11 @@ class EnhancedMetricsSystem:
             month_ago = today - timedelta(days=30)
             
             # User Growth Rate
-            new_users_week = self.supabase.table("users").select("id", count="exact").gte("created_at", week_ago.isoformat()).execute()
-            new_users_month = self.supabase.table("users").select("id", count="exact").gte("created_at", month_ago.isoformat()).execute()
+            new_users_week = await self.counts.count("users", gte={"created_at": week_ago.isoformat()})
+            new_users_month = await self.counts.count("users", gte={"created_at": month_ago.isoformat()})
             
-            weekly_growth = new_users_week.count if new_users_week.count else 0
-            monthly_growth = new_users_month.count if new_users_month.count else 1
+            weekly_growth = new_users_week if new_users_week else 0
+            monthly_growth = new_users_month if new_users_month else 1
             
             growth_rate = (weekly_growth / (monthly_growth / 4) * 100) if monthly_growth > 0 else 0
             
@@ -448,7 +452,7 @@ class EnhancedMetricsSystem:
             week_ago = today - timedelta(days=7)
             
             # Onboarding Completion Rate
-            new_users = self.supabase.table("users").select("id", count="exact").gte("created_at", week_ago.isoformat()).execute()
+            new_users = await self.counts.count("users", gte={"created_at": week_ago.isoformat()})
             users_with_commitments = self.supabase.table("users").select("id").gte("created_at", week_ago.isoformat()).execute()
             
             if users_with_commitments.data:
@@ -458,7 +462,7 @@ class EnhancedMetricsSystem:
             else:
                 unique_users_with_commitments = 0
             
-            new_user_count = new_users.count if new_users.count else 1
+            new_user_count = new_users if new_users else 1
             onboarding_rate = (unique_users_with_commitments / new_user_count * 100) if new_user_count > 0 else 0
             
             metrics.append(CustomMetric(
@@ -492,6 +496,7 @@ class EnhancedMetricsSystem:
             
         return metrics
     
+    @request_scoped("metrics.generate_business_kpis")
     async def generate_business_kpis(self) -> List[BusinessKPI]:
         """Generate key business performance indicators"""
         kpis = []
@@ -499,13 +504,13 @@ class EnhancedMetricsSystem:
         try:
             # Monthly Active Users (MAU)
             month_ago = (datetime.now() - timedelta(days=30)).date()
-            mau_result = self.supabase.table("users").select("id", count="exact").gte("last_activity_at", month_ago.isoformat()).execute()
-            current_mau = mau_result.count if mau_result.count else 0
+            mau_result = await self.counts.count("users", gte={"last_activity_at": month_ago.isoformat()})
+            current_mau = mau_result if mau_result else 0
             
             # Get previous month for trend
             two_months_ago = (datetime.now() - timedelta(days=60)).date()
-            prev_mau_result = self.supabase.table("users").select("id", count="exact").gte("last_activity_at", two_months_ago.isoformat()).lt("last_activity_at", month_ago.isoformat()).execute()
-            prev_mau = prev_mau_result.count if prev_mau_result.count else 1
+            prev_mau_result = await self.counts.count("users", gte={"last_activity_at": two_months_ago.isoformat()}, lt={"last_activity_at": month_ago.isoformat()})
+            prev_mau = prev_mau_result if prev_mau_result else 1
             
             mau_trend = ((current_mau - prev_mau) / prev_mau * 100) if prev_mau > 0 else 0
             mau_direction = "up" if mau_trend > 5 else "down" if mau_trend < -5 else "stable"
@@ -523,11 +528,11 @@ class EnhancedMetricsSystem:
             ))
             
             # Monthly Commitment Completion Rate
-            monthly_commitments = self.supabase.table("commitments").select("id", count="exact").gte("created_at", month_ago.isoformat()).execute()
-            monthly_completed = self.supabase.table("commitments").select("id", count="exact").eq("status", "completed").gte("completed_at", month_ago.isoformat()).execute()
+            monthly_commitments = await self.counts.count("commitments", gte={"created_at": month_ago.isoformat()})
+            monthly_completed = await self.counts.count("commitments", eq={"status": "completed"}, gte={"completed_at": month_ago.isoformat()})
             
-            total_monthly = monthly_commitments.count if monthly_commitments.count else 1
-            completed_monthly = monthly_completed.count if monthly_completed.count else 0
+            total_monthly = monthly_commitments if monthly_commitments else 1
+            completed_monthly = monthly_completed if monthly_completed else 0
             
             monthly_completion_rate = (completed_monthly / total_monthly * 100) if total_monthly > 0 else 0
             
@@ -544,8 +549,8 @@ class EnhancedMetricsSystem:
             ))
             
             # Platform Adoption Score
-            total_users = self.supabase.table("users").select("id", count="exact").execute()
-            total_user_count = total_users.count if total_users.count else 1
+            total_users = await self.counts.count("users")
+            total_user_count = total_users if total_users else 1
             
             adoption_score = min(100, (current_mau / total_user_count * 100)) if total_user_count > 0 else 0
             
@@ -568,6 +573,7 @@ class EnhancedMetricsSystem:
             logger.error(f"❌ Error generating business KPIs: {e}")
             return []
     
+    @request_scoped("metrics.get_metrics_summary")
     async def get_metrics_summary(self) -> Dict[str, Any]:
         """Get comprehensive metrics summary"""
         try:
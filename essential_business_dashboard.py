@@ -8,10 +8,11 @@ import os
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.security import APIKeyHeader
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Optional, Dict, Any, List
 import asyncio
 from supabase import create_client
+from count_service import get_count_service, CountService, CountSpec
 
 # Initialize Supabase
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -353,29 +354,28 @@ async def get_essential_metrics() -> Dict[str, Any]:
     
     try:
         # Get real data from database
-        now = datetime.now()
-        seven_days_ago = now - timedelta(days=7)
-        thirty_days_ago = now - timedelta(days=30)
+        # Growth and conversion counts in one batched, head-only request
+        counts = await get_count_service(supabase).count_many({
+            "total_users": CountSpec.build("users"),
+            "new_users_7d": CountSpec.build("users", gte={"created_at": CountService.since(days=7)}),
+            "new_users_30d": CountSpec.build("users", gte={"created_at": CountService.since(days=30)}),
+            "form_submissions": CountSpec.build("form_submissions"),
+            "onboarding_calls": CountSpec.build("users", not_null=["onboarding_call_date"])
+        })
         
-        # Growth metrics
-        total_users_result = supabase.table('users').select('id').execute()
-        total_users = len(total_users_result.data) if total_users_result.data else 0
-        
-        new_users_7d_result = supabase.table('users').select('id').gte('created_at', seven_days_ago.isoformat()).execute()
-        new_users_7d = len(new_users_7d_result.data) if new_users_7d_result.data else 0
-        
-        new_users_30d_result = supabase.table('users').select('id').gte('created_at', thirty_days_ago.isoformat()).execute()
-        new_users_30d = len(new_users_30d_result.data) if new_users_30d_result.data else 0
+        total_users = counts["total_users"] or 0
+        new_users_7d = counts["new_users_7d"] or 0
+        new_users_30d = counts["new_users_30d"] or 0
         
         # Calculate growth rates
         weekly_growth_rate = (new_users_7d / max(total_users - new_users_7d, 1)) * 100 if total_users > 0 else 0
         monthly_growth_rate = (new_users_30d / max(total_users - new_users_30d, 1)) * 100 if total_users > 0 else 0
         
         # Form submissions vs onboarding calls
-        form_submissions = supabase.table('form_submissions').select('id').execute()
-        onboarding_calls = supabase.table('users').select('id').not_.is_('onboarding_call_date', 'null').execute()
+        form_submissions = counts["form_submissions"] or 0
+        onboarding_calls = counts["onboarding_calls"] or 0
         
-        form_to_onboarding = (len(onboarding_calls.data) / max(len(form_submissions.data), 1)) * 100 if form_submissions.data else 0
+        form_to_onboarding = (onboarding_calls / max(form_submissions, 1)) * 100 if form_submissions else 0
         
         return {
             "growth": {
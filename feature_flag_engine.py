@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Progress Method - Feature Flag Evaluation Engine
+Immutable in-memory snapshots of feature_flags with deterministic user bucketing
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Iterable, Mapping, Optional, Tuple
+
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+DISABLED = (False, None)
+ENABLED = (True, None)
+
+# Buckets remembered per flag before the memo is reset
+MAX_MEMOIZED_BUCKETS = 100000
+
+def stable_bucket(salt: str, user_id: Any) -> float:
+    """Bucket in [0, 100) for a user, identical in every process and worker
+
+    Python's hash() is salted per process; blake2b is in the standard library, so all
+    workers agree on the bucket whatever optional packages they have installed.
+    """
+    digest = hashlib.blake2b(f"{salt}:{user_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % 10000 / 100
+
+def _json_field(value: Any, default: Any) -> Any:
+    """JSONB columns hold either JSON values or JSON-encoded strings (create_feature writes strings)"""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return json.loads(value or "null") or default
+    return value
+
+def _epoch(value: Any) -> Optional[float]:
+    if not value:
+        return None
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+@dataclass(frozen=True)
+class CompiledFlag:
+    """One feature_flags row reduced to what evaluation needs"""
+    feature_id: str
+    flag: str
+    rollout_strategy: str
+    rollout_percentage: float
+    created_at: Optional[float]
+    rollout_target_date: Optional[float]
+    target_user_ids: FrozenSet[str]
+    target_user_roles: FrozenSet[str]
+    excluded_user_ids: FrozenSet[str]
+    ab_test_active: bool
+    ab_groups: Tuple[Tuple[float, str, bool], ...]   # (cumulative percentage, group, enabled)
+    _buckets: Dict[Any, float] = field(default_factory=dict, compare=False, repr=False)
+
+    def bucket(self, user_id: Any) -> float:
+        """Memoized stable_bucket for this flag (hashing dominates evaluation cost)"""
+        buckets = self._buckets
+        bucket = buckets.get(user_id)
+        if bucket is None:
+            if len(buckets) >= MAX_MEMOIZED_BUCKETS:
+                buckets.clear()
+            bucket = buckets[user_id] = stable_bucket(self.feature_id, user_id)
+        return bucket
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "CompiledFlag":
+        cumulative = 0.0
+        ab_groups = []
+        for group_name, group_config in _json_field(row.get("ab_test_groups"), {}).items():
+            cumulative += float(group_config.get("percentage", 0))
+            ab_groups.append((cumulative, group_name, bool(group_config.get("enabled", False))))
+
+        return cls(
+            feature_id=row["feature_id"],
+            flag=row["flag"],
+            rollout_strategy=row["rollout_strategy"],
+            rollout_percentage=float(row.get("rollout_percentage") if row.get("rollout_percentage") is not None else 100.0),
+            created_at=_epoch(row.get("created_at")),
+            rollout_target_date=_epoch(row.get("rollout_target_date")),
+            target_user_ids=frozenset(str(user_id) for user_id in _json_field(row.get("target_user_ids"), [])),
+            target_user_roles=frozenset(_json_field(row.get("target_user_roles"), [])),
+            excluded_user_ids=frozenset(str(user_id) for user_id in _json_field(row.get("excluded_user_ids"), [])),
+            ab_test_active=bool(row.get("ab_test_active")),
+            ab_groups=tuple(ab_groups)
+        )
+
+    def evaluate(self, user_id: Any, user_roles: Optional[Iterable[str]] = None) -> Tuple[bool, Optional[str]]:
+        """Same rules as FeatureControlSystem.is_feature_enabled, without any I/O"""
+        flag = self.flag
+        if flag == "enabled":
+            return self._check_rollout_strategy(user_id, user_roles)
+        if flag == "a_b_test":
+            if not self.ab_test_active or not self.ab_groups:
+                return DISABLED
+            bucket = self.bucket(user_id)
+            for cumulative, group_name, enabled in self.ab_groups:
+                if bucket < cumulative:
+                    return enabled, group_name
+            return DISABLED
+        if flag == "gradual_rollout":
+            return self.bucket(user_id) < self._current_percentage(time.time()), None
+        if flag == "user_segment":
+            user_key = str(user_id)
+            if user_key in self.excluded_user_ids:
+                return DISABLED
+            if user_key in self.target_user_ids:
+                return ENABLED
+            if user_roles and self.target_user_roles and not self.target_user_roles.isdisjoint(user_roles):
+                return ENABLED
+        return DISABLED
+
+    def _check_rollout_strategy(self, user_id: Any, user_roles: Optional[Iterable[str]]) -> Tuple[bool, Optional[str]]:
+        strategy = self.rollout_strategy
+        if strategy == "all_users":
+            return ENABLED
+        if strategy == "percentage":
+            return self.bucket(user_id) < self.rollout_percentage, None
+        if strategy == "user_list":
+            return str(user_id) in self.target_user_ids, None
+        if strategy == "role_based":
+            return bool(user_roles) and not self.target_user_roles.isdisjoint(user_roles), None
+        if strategy == "time_based":
+            return self.rollout_target_date is None or time.time() >= self.rollout_target_date, None
+        return DISABLED
+
+    def _current_percentage(self, now: float) -> float:
+        """Rollout percentage ramps linearly from created_at to rollout_target_date"""
+        target = self.rollout_target_date
+        if target is None:
+            return self.rollout_percentage
+        if now >= target:
+            return 100.0
+        if self.created_at is None or target <= self.created_at:
+            return self.rollout_percentage
+        return min((now - self.created_at) / (target - self.created_at), 1.0) * self.rollout_percentage
+
+@dataclass(frozen=True)
+class FlagSnapshot:
+    """All active flags at one version; replaced as a whole, never mutated"""
+    version: Tuple[Optional[str], int]   # (latest updated_at, active flag count)
+    flags: Mapping[str, CompiledFlag]
+    loaded_at: float
+
+EMPTY_SNAPSHOT = FlagSnapshot(version=(None, -1), flags=MappingProxyType({}), loaded_at=0.0)
+
+class FeatureFlagEngine:
+    """Evaluates feature flags against an in-memory snapshot of every active feature_flags row
+
+    The snapshot is loaded with one query and swapped atomically. A background task
+    checks a cheap version (newest updated_at plus active row count) every
+    `refresh_seconds` and reloads only when it changed; writers call `reload()`
+    after changing a flag so their own process sees it immediately.
+    """
+
+    def __init__(self, supabase_client: Client, refresh_seconds: float = 30.0):
+        self.supabase = supabase_client
+        self.refresh_seconds = refresh_seconds
+        self.snapshot = EMPTY_SNAPSHOT
+        self._refresher: Optional[asyncio.Task] = None
+
+        self.stats = {"loads": 0, "version_checks": 0, "load_errors": 0}
+
+    # ---------------------------------------------------------------
+    # Evaluation
+    # ---------------------------------------------------------------
+
+    def evaluate(self, feature_id: str, user_id: Any, user_roles: Optional[Iterable[str]] = None) -> Tuple[bool, Optional[str]]:
+        """(enabled, A/B group) for a user; unknown or inactive features are disabled"""
+        compiled = self.snapshot.flags.get(feature_id)
+        if compiled is None:
+            return DISABLED
+        return compiled.evaluate(user_id, user_roles)
+
+    def ensure_loaded(self):
+        """Load the first snapshot and start background refreshes (when an event loop is running)"""
+        if self.snapshot is EMPTY_SNAPSHOT:
+            self.reload()
+        if self._refresher is None or self._refresher.done():
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    # ---------------------------------------------------------------
+    # Loading
+    # ---------------------------------------------------------------
+
+    def _current_version(self) -> Tuple[Optional[str], int]:
+        result = self.supabase.table("feature_flags").select("updated_at", count="exact").eq(
+            "is_active", True
+        ).order("updated_at", desc=True).limit(1).execute()
+        latest = result.data[0]["updated_at"] if result.data else None
+        return latest, result.count or 0
+
+    def reload(self) -> bool:
+        """Load every active flag in one query and swap in a new snapshot"""
+        try:
+            result = self.supabase.table("feature_flags").select(
+                "feature_id, flag, rollout_strategy, rollout_percentage, rollout_target_date, created_at, updated_at, "
+                "target_user_ids, target_user_roles, excluded_user_ids, ab_test_active, ab_test_groups"
+            ).eq("is_active", True).execute()
+        except Exception as e:
+            logger.error(f"❌ Error loading feature flag snapshot: {e}")
+            self.stats["load_errors"] += 1
+            return False
+
+        rows = result.data or []
+        latest = max((row["updated_at"] for row in rows if row.get("updated_at")), default=None)
+        self.install(rows, (latest, len(rows)))
+        return True
+
+    def install(self, rows: Iterable[Dict[str, Any]], version: Tuple[Optional[str], int] = (None, 0)):
+        """Compile rows into a new snapshot and swap it in"""
+        flags = {}
+        for row in rows:
+            try:
+                flags[row["feature_id"]] = CompiledFlag.from_row(row)
+            except (ValueError, TypeError, AttributeError) as e:
+                # A malformed flag stays disabled instead of breaking the whole snapshot
+                logger.error(f"❌ Skipping malformed feature flag {row.get('feature_id')}: {e}")
+
+        self.snapshot = FlagSnapshot(version=version, flags=MappingProxyType(flags), loaded_at=time.time())
+        self.stats["loads"] += 1
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                self.stats["version_checks"] += 1
+                if self._current_version() != self.snapshot.version:
+                    self.reload()
+            except Exception as e:
+                logger.error(f"❌ Error checking feature flag version: {e}")
+                self.stats["load_errors"] += 1
+
+    async def stop(self):
+        if self._refresher:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "flags": len(self.snapshot.flags),
+            "version": self.snapshot.version,
+            "snapshot_age_seconds": round(time.time() - self.snapshot.loaded_at, 1) if self.snapshot.loaded_at else None,
+            "refreshing": bool(self._refresher and not self._refresher.done())
+        }
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Progress Method - Feature Usage Sink
+Fixed-size ring buffer of feature usage events, written behind in batches
+"""
+
+import asyncio
+import json
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+# Allowed by the feature_usage_events.event_type check constraint
+USAGE_EVENT_TYPES = frozenset({"access", "success", "error", "conversion"})
+
+class FeatureUsageSink:
+    """Ring buffer of usage events; `record` never waits on the database
+
+    When the buffer is full the oldest event is dropped (and counted). A background
+    flusher drains up to `batch_size` events every `flush_interval_ms` (or as soon as a
+    batch is full): one users lookup for the unknown telegram ids, one bulk insert into
+    feature_usage_events, and one apply_feature_usage_deltas RPC carrying the
+    aggregated usage_count increments per feature.
+
+    The two writes fail independently: a failed insert puts the batch back in the
+    buffer, while increments whose RPC failed are kept (merged per feature) and
+    retried on their own, so inserted events are never written twice. Consecutive
+    failures back off exponentially (flush_interval * 2^failures, up to
+    max_backoff_ms), and events or increments still failing after `max_retries`
+    retries are dropped and counted.
+    """
+
+    def __init__(self, supabase_client: Client, capacity: int = 10000, batch_size: int = 500,
+                 flush_interval_ms: int = 1000, max_cached_users: int = 50000,
+                 max_retries: int = 5, max_backoff_ms: int = 30000):
+        self.supabase = supabase_client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_cached_users = max_cached_users
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff_ms / 1000
+
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+        self._user_ids: Dict[int, Optional[str]] = {}
+        self._full = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._rpc_available = True
+        # usage_count increments whose events are already inserted, by feature_id
+        self._pending_deltas: Dict[str, Dict[str, Any]] = {}
+        self._delta_attempts = 0
+        self._failures = 0
+
+        self.stats = {"recorded": 0, "dropped": 0, "rejected": 0, "flushes": 0,
+                      "events_written": 0, "flush_errors": 0, "retries_exhausted": 0,
+                      "deltas_dropped": 0}
+
+    def record(self, feature_id: str, user_telegram_id: int, event_type: str,
+               metadata: Dict[str, Any] = None, ab_test_group: str = None):
+        """Queue one usage event and return immediately"""
+        if event_type not in USAGE_EVENT_TYPES:
+            logger.warning(f"⚠️ Ignoring feature usage event with unsupported type '{event_type}' for {feature_id}")
+            self.stats["rejected"] += 1
+            return
+
+        if len(self._events) == self._events.maxlen:
+            self.stats["dropped"] += 1
+        self._events.append({
+            "feature_id": feature_id,
+            "user_telegram_id": user_telegram_id,
+            "event_type": event_type,
+            "metadata": json.dumps(metadata or {}),
+            "ab_test_group": ab_test_group,
+            "timestamp": datetime.now().isoformat()
+        })
+        self.stats["recorded"] += 1
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop to flush from; events wait for the next flush() call
+            return
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if len(self._events) >= self.batch_size:
+            self._full.set()
+
+    # ---------------------------------------------------------------
+    # Flushing
+    # ---------------------------------------------------------------
+
+    async def _flush_loop(self):
+        """Flush when a batch fills up or the interval elapses; exits once idle"""
+        while self._events or self._pending_deltas:
+            if self._failures:
+                # Backing off: a full buffer does not bring the next attempt forward
+                await asyncio.sleep(self._retry_delay())
+            else:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+            if not self._events:
+                await self._flush_batch()
+                continue
+            while self._events and await self._flush_batch():
+                if len(self._events) < self.batch_size:
+                    break
+
+    def _retry_delay(self) -> float:
+        return min(self.flush_interval * 2 ** self._failures, self.max_backoff)
+
+    async def flush(self) -> int:
+        """Write everything buffered now (used at shutdown); returns events written"""
+        written = 0
+        while self._events:
+            batch_written = await self._flush_batch()
+            if not batch_written:
+                break
+            written += batch_written
+        if self._pending_deltas:
+            await self._flush_batch()
+        return written
+
+    async def _flush_batch(self) -> int:
+        """Insert one batch of events, then apply its (and any earlier unapplied) usage increments"""
+        async with self._flush_lock:
+            batch = [self._events.popleft() for _ in range(min(self.batch_size, len(self._events)))]
+            if batch:
+                try:
+                    self._insert(batch)
+                except Exception as e:
+                    logger.error(f"❌ Error flushing {len(batch)} feature usage events: {e}")
+                    self.stats["flush_errors"] += 1
+                    self._failures += 1
+                    self._requeue(batch)
+                    return 0
+
+                self.stats["flushes"] += 1
+                self.stats["events_written"] += len(batch)
+                self._add_deltas(batch)
+
+            if self._pending_deltas:
+                try:
+                    self._apply_deltas(list(self._pending_deltas.values()))
+                except Exception as e:
+                    logger.error(f"❌ Error applying usage counts for {len(self._pending_deltas)} features: {e}")
+                    self.stats["flush_errors"] += 1
+                    self._failures += 1
+                    self._delta_attempts += 1
+                    if self._delta_attempts > self.max_retries:
+                        logger.error(f"❌ Giving up on usage counts for {len(self._pending_deltas)} features after {self.max_retries} retries")
+                        self.stats["deltas_dropped"] += sum(delta["usage_count"] for delta in self._pending_deltas.values())
+                        self._pending_deltas.clear()
+                        self._delta_attempts = 0
+                    return len(batch)
+                self._pending_deltas.clear()
+                self._delta_attempts = 0
+
+            self._failures = 0
+            return len(batch)
+
+    def _requeue(self, batch: List[Dict[str, Any]]):
+        """Put a failed batch back at the front while there is room; newer events keep priority"""
+        retry = []
+        for event in batch:
+            event["_attempts"] = event.get("_attempts", 0) + 1
+            if event["_attempts"] > self.max_retries:
+                self.stats["retries_exhausted"] += 1
+            else:
+                retry.append(event)
+
+        room = self._events.maxlen - len(self._events)
+        self.stats["dropped"] += max(0, len(retry) - room)
+        self._events.extendleft(reversed(retry[len(retry) - room:] if room < len(retry) else retry))
+
+    def _insert(self, batch: List[Dict[str, Any]]):
+        self._resolve_user_ids({event["user_telegram_id"] for event in batch})
+        for event in batch:
+            event["user_id"] = self._user_ids.get(event["user_telegram_id"])
+
+        rows = [{key: value for key, value in event.items() if key != "_attempts"} for event in batch]
+        self.supabase.table("feature_usage_events").insert(rows).execute()
+
+    def _add_deltas(self, batch: List[Dict[str, Any]]):
+        """Fold the access events of an inserted batch into the pending usage_count increments"""
+        for event in batch:
+            if event["event_type"] != "access":
+                continue
+            delta = self._pending_deltas.setdefault(event["feature_id"], {"feature_id": event["feature_id"], "usage_count": 0, "last_used": event["timestamp"]})
+            delta["usage_count"] += 1
+            delta["last_used"] = max(delta["last_used"], event["timestamp"])
+
+    def _resolve_user_ids(self, telegram_ids: set):
+        """Map telegram ids to users.id with one query for the ids not seen before"""
+        missing = [telegram_id for telegram_id in telegram_ids if telegram_id not in self._user_ids]
+        if not missing:
+            return
+
+        if len(self._user_ids) + len(missing) > self.max_cached_users:
+            self._user_ids.clear()
+
+        result = self.supabase.table("users").select("id, telegram_user_id").in_("telegram_user_id", missing).execute()
+        found = {row["telegram_user_id"]: row["id"] for row in result.data or []}
+        for telegram_id in missing:
+            self._user_ids[telegram_id] = found.get(telegram_id)
+
+    def _apply_deltas(self, deltas: List[Dict[str, Any]]):
+        if self._rpc_available:
+            try:
+                self.supabase.rpc("apply_feature_usage_deltas", {"deltas": deltas}).execute()
+                return
+            except Exception as e:
+                if "apply_feature_usage_deltas" in str(e) or "PGRST202" in str(e):
+                    logger.warning(f"⚠️ apply_feature_usage_deltas RPC unavailable, updating counters directly: {e}")
+                    self._rpc_available = False
+                else:
+                    raise
+
+        # Fallback: read-modify-write per feature (not atomic across processes)
+        current = self.supabase.table("feature_flags").select("feature_id, usage_count").in_(
+            "feature_id", [delta["feature_id"] for delta in deltas]
+        ).execute()
+        counts = {row["feature_id"]: row.get("usage_count") or 0 for row in current.data or []}
+        for delta in deltas:
+            if delta["feature_id"] not in counts:
+                continue
+            self.supabase.table("feature_flags").update({
+                "usage_count": counts[delta["feature_id"]] + delta["usage_count"],
+                "last_used": delta["last_used"]
+            }).eq("feature_id", delta["feature_id"]).execute()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "buffered": len(self._events),
+            "capacity": self._events.maxlen,
+            "pending_deltas": len(self._pending_deltas),
+            "rpc_available": self._rpc_available
+        }
@@ -7,19 +7,34 @@ Automatically detects Google Meet attendance using Admin Reports API
 import asyncio
 import json
 import logging
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta, date, timezone
 from typing import Dict, List, Optional, Any, Tuple
 import os
 import re
-from dataclasses import dataclass
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from google.auth.transport.requests import Request
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from safety_controls import safety_controls
+from google_api_executor import google_api_executor
 
 logger = logging.getLogger(__name__)
 
+def rfc3339(moment: datetime) -> str:
+    """Admin Reports startTime/endTime format (UTC, millisecond precision)"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    """[start, end) of a UTC day; the end is clamped to now because the API rejects future times"""
+    start = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+    end = min(start + timedelta(days=1), datetime.now(timezone.utc))
+    return start, end
+
 @dataclass
 class MeetEvent:
     """Represents a Google Meet audit event"""
@@ -53,10 +68,29 @@ class MeetParticipant:
     location_country: Optional[str]
     call_rating: Optional[int]
 
+@dataclass
+class MeetEventIndex:
+    """Meet audit events for one (date range, event types) query, indexed by meet_code"""
+    events: List[MeetEvent]
+    by_meet_code: Dict[str, List[MeetEvent]]
+    fetched_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def build(cls, events: List[MeetEvent]) -> "MeetEventIndex":
+        by_meet_code: Dict[str, List[MeetEvent]] = {}
+        for event in events:
+            if event.meet_code:
+                by_meet_code.setdefault(event.meet_code, []).append(event)
+        return cls(events=events, by_meet_code=by_meet_code)
+
+    def events_for(self, meet_code: str) -> List[MeetEvent]:
+        return self.by_meet_code.get(meet_code, [])
+
 class GoogleAdminReports:
     """Google Admin Reports API integration for Meet attendance tracking"""
     
-    def __init__(self, service_account_file: str = None, user_email: str = None):
+    def __init__(self, service_account_file: str = None, user_email: str = None,
+                 live_cache_seconds: int = 300, max_cached_ranges: int = 32):
         self.service_account_file = service_account_file or os.getenv('GOOGLE_MEET_SERVICE_ACCOUNT_FILE')
         self.user_email = user_email or os.getenv('GOOGLE_CALENDAR_USER_EMAIL')
         
@@ -69,6 +103,15 @@ class GoogleAdminReports:
         self.service = None
         self.credentials = None
         
+        # Audit log pages fetched once per (start, end, event types, max_results) and shared
+        # by every session sync. Ranges reaching today are still growing, so they expire
+        # after live_cache_seconds; past ranges stay until evicted (LRU).
+        self.live_cache_seconds = live_cache_seconds
+        self.max_cached_ranges = max_cached_ranges
+        self._event_cache: "OrderedDict[Tuple, MeetEventIndex]" = OrderedDict()
+        self._fetch_locks: Dict[Tuple, asyncio.Lock] = {}
+        self.cache_stats = {'hits': 0, 'misses': 0, 'api_pages': 0}
+        
         logger.info("📊 Google Admin Reports API integration initialized")
     
     async def initialize(self):
@@ -100,7 +143,8 @@ class GoogleAdminReports:
                              start_date: date = None,
                              end_date: date = None,
                              event_types: List[str] = None,
-                             max_results: int = 1000) -> List[MeetEvent]:
+                             max_results: int = 1000,
+                             use_cache: bool = True) -> List[MeetEvent]:
         """
         Retrieve Google Meet audit events from Admin Reports API
         
@@ -109,10 +153,26 @@ class GoogleAdminReports:
             end_date: End date for events (defaults to today)
             event_types: List of event types to filter ('call_ended', 'call_started')
             max_results: Maximum number of events to retrieve
+            use_cache: Reuse events already fetched for the same query
         
         Returns:
             List of MeetEvent objects
         """
+        index = await self.get_meet_event_index(start_date, end_date, event_types, max_results, use_cache)
+        return index.events
+    
+    async def get_meet_event_index(self,
+                                   start_date: date = None,
+                                   end_date: date = None,
+                                   event_types: List[str] = None,
+                                   max_results: int = 1000,
+                                   use_cache: bool = True) -> MeetEventIndex:
+        """
+        Meet audit events for a date range, indexed by meet_code
+        
+        The audit log is paged through once per query and the index is cached, so
+        syncing many sessions for the same day costs one download of that day.
+        """
         if not self.service:
             raise RuntimeError("Admin Reports API not initialized")
         
@@ -125,12 +185,91 @@ class GoogleAdminReports:
         if not event_types:
             event_types = ['call_ended']  # Focus on completed calls for attendance
         
+        key = (start_date, end_date, tuple(sorted(event_types)), max_results)
+        
+        if use_cache:
+            index = self._cached_index(key)
+            if index is not None:
+                return index
+        
+        # Concurrent callers for the same range wait for one download
+        lock = self._fetch_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if use_cache:
+                index = self._cached_index(key)
+                if index is not None:
+                    return index
+            
+            self.cache_stats['misses'] += 1
+            range_start, _ = day_bounds(start_date)
+            _, range_end = day_bounds(end_date)
+            events = await self._fetch_meet_events(range_start, range_end, list(key[2]), max_results)
+            return self._store_index(key, MeetEventIndex.build(events))
+    
+    def _cached_index(self, key: Tuple) -> Optional[MeetEventIndex]:
+        index = self._event_cache.get(key)
+        if not index:
+            return None
+        
+        end_date = key[1]
+        if end_date >= date.today() and time.time() - index.fetched_at > self.live_cache_seconds:
+            del self._event_cache[key]
+            return None
+        
+        self._event_cache.move_to_end(key)
+        self.cache_stats['hits'] += 1
+        return index
+    
+    def clear_event_cache(self):
+        """Drop all cached audit events (e.g. before re-syncing a day)"""
+        self._event_cache.clear()
+    
+    def prime_event_index(self, start_date: date, end_date: date, event_types: List[str],
+                          events: List[MeetEvent], max_results: int = 1000) -> MeetEventIndex:
+        """Install events obtained elsewhere (e.g. the stored audit log) as the cached index for a query"""
+        key = (start_date, end_date, tuple(sorted(event_types)), max_results)
+        return self._store_index(key, MeetEventIndex.build(events))
+    
+    def _store_index(self, key: Tuple, index: MeetEventIndex) -> MeetEventIndex:
+        self._event_cache[key] = index
+        self._event_cache.move_to_end(key)
+        while len(self._event_cache) > self.max_cached_ranges:
+            evicted, _ = self._event_cache.popitem(last=False)
+            self._fetch_locks.pop(evicted, None)
+        return index
+    
+    async def get_meet_events_between(self, start_time: datetime, end_time: datetime,
+                                      event_types: List[str] = None,
+                                      max_results: Optional[int] = None) -> List[MeetEvent]:
+        """
+        Meet audit events in [start_time, end_time) at sub-day precision (never cached)
+        
+        Used by incremental syncs that resume from the last processed event time.
+        """
+        if not self.service:
+            raise RuntimeError("Admin Reports API not initialized")
+        if start_time >= end_time:
+            return []
+        return await self._fetch_meet_events(start_time, end_time, event_types or ['call_ended'], max_results)
+    
+    def events_from_raw(self, items: List[dict]) -> List[MeetEvent]:
+        """Rebuild MeetEvents from stored raw API payloads (meet_audit_events.event_data)"""
+        events = []
+        for item in items:
+            meet_event = self._parse_meet_event(item)
+            if meet_event:
+                events.append(meet_event)
+        return events
+    
+    async def _fetch_meet_events(self, range_start: datetime, range_end: datetime,
+                                 event_types: List[str], max_results: Optional[int]) -> List[MeetEvent]:
+        """Page through the Admin Reports API for one query (max_results None = no limit)"""
         events = []
         
         try:
-            # Format dates for API (YYYY-MM-DD)
-            start_time = start_date.strftime('%Y-%m-%d')
-            end_time = end_date.strftime('%Y-%m-%d')
+            # RFC 3339 timestamps, so a sync can resume part way through a day
+            start_time = rfc3339(range_start)
+            end_time = rfc3339(range_end)
             
             logger.info(f"🔍 Fetching Meet events from {start_time} to {end_time}")
             
@@ -144,7 +283,7 @@ class GoogleAdminReports:
                     'applicationName': 'meet',
                     'startTime': start_time,
                     'endTime': end_time,
-                    'maxResults': min(max_results - total_events, 1000)  # API limit is 1000 per page
+                    'maxResults': 1000 if max_results is None else min(max_results - total_events, 1000)  # API limit is 1000 per page
                 }
                 
                 if next_page_token:
@@ -158,7 +297,10 @@ class GoogleAdminReports:
                         event_filters.append(f"meet:{event_type}")
                     request_params['eventName'] = ','.join(event_filters)
                 
-                response = self.service.activities().list(**request_params).execute()
+                response = await google_api_executor.execute(
+                    self.service.activities().list(**request_params), self.credentials, 'admin.activities.list'
+                )
+                self.cache_stats['api_pages'] += 1
                 
                 items = response.get('items', [])
                 logger.info(f"📊 Retrieved {len(items)} events from API")
@@ -175,7 +317,7 @@ class GoogleAdminReports:
                 
                 # Check if we have more pages
                 next_page_token = response.get('nextPageToken')
-                if not next_page_token or total_events >= max_results:
+                if not next_page_token or (max_results is not None and total_events >= max_results):
                     break
             
             logger.info(f"✅ Retrieved {len(events)} Meet events")
@@ -280,11 +422,9 @@ class GoogleAdminReports:
         Returns:
             List of MeetParticipant objects
         """
-        # Get all Meet events for the date range
-        events = await self.get_meet_events(start_date, end_date, ['call_ended'])
-        
-        # Filter events for this specific Meet code
-        meet_events = [e for e in events if e.meet_code == meet_code]
+        # All Meet events for the date range, fetched once and shared across sessions
+        index = await self.get_meet_event_index(start_date, end_date, ['call_ended'])
+        meet_events = index.events_for(meet_code)
         
         participants = []
         
@@ -319,12 +459,17 @@ class GoogleAdminReports:
         logger.info(f"📊 Found {len(participants)} participants for Meet {meet_code}")
         return participants
     
-    async def sync_meet_data_for_date(self, sync_date: date) -> Dict[str, int]:
+    async def sync_meet_data_for_date(self, sync_date: date, sync_state=None) -> Dict[str, int]:
         """
         Sync all Meet data for a specific date
         
+        With a MeetSyncState the sync is incremental: only events after the day's
+        high-water mark are fetched, stored idempotently in meet_audit_events, and the
+        mark is advanced. Days already closed are skipped.
+        
         Args:
             sync_date: Date to sync Meet data for
+            sync_state: Optional MeetSyncState holding per-day checkpoints
         
         Returns:
             Dictionary with sync statistics
@@ -332,33 +477,36 @@ class GoogleAdminReports:
         stats = {
             'total_events': 0,
             'processed_events': 0,
+            'new_events': 0,
             'matched_meetings': 0,
             'new_participants': 0,
+            'skipped': False,
             'errors': 0
         }
+        event_types = ['call_ended', 'call_started']
         
         try:
-            # Get all Meet events for the date
-            events = await self.get_meet_events(
-                start_date=sync_date,
-                end_date=sync_date,
-                event_types=['call_ended', 'call_started']
-            )
+            checkpoint = sync_state.get_day(sync_date) if sync_state else None
+            if checkpoint and checkpoint.get('sync_status') == 'completed':
+                logger.info(f"⏭️ Meet data for {sync_date} already synced")
+                stats['skipped'] = True
+                return stats
+            
+            # Only events after the high-water mark (the whole day on the first run)
+            _, day_end = day_bounds(sync_date)
+            since = sync_state.resume_time(sync_date, checkpoint) if sync_state else day_bounds(sync_date)[0]
+            events = await self.get_meet_events_between(since, day_end, event_types)
             
             stats['total_events'] = len(events)
             
-            for event in events:
-                try:
-                    # Process each event
-                    # This would integrate with the database and correlation system
-                    # For now, just count as processed
-                    stats['processed_events'] += 1
-                    
-                except Exception as e:
-                    logger.error(f"❌ Failed to process event {event.event_id}: {e}")
-                    stats['errors'] += 1
+            if sync_state:
+                stats['new_events'] = sync_state.store_events(events)
+                last_event_time = max((event.event_time for event in events), default=None)
+                sync_state.save_day(sync_date, checkpoint, event_types, last_event_time, stats['new_events'])
+            
+            stats['processed_events'] = len(events)
             
-            logger.info(f"✅ Meet data sync completed for {sync_date}: {stats}")
+            logger.info(f"✅ Meet data sync completed for {sync_date} (from {rfc3339(since)}): {stats}")
             return stats
             
         except Exception as e:
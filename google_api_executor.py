@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Google API Executor
+Runs blocking googleapiclient requests on a dedicated, bounded thread pool
+"""
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, Optional
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+# 403 reasons Google uses for quota and rate limits (other 403s are permission errors)
+QUOTA_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded", "dailyLimitExceeded")
+TRANSIENT_STATUSES = (500, 502, 503, 504)
+
+# Latencies kept per operation for percentiles
+LATENCY_SAMPLES = 500
+
+def is_quota_error(error: Exception) -> bool:
+    if not isinstance(error, HttpError):
+        return False
+    status = getattr(error.resp, "status", None)
+    if status == 429:
+        return True
+    if status == 403:
+        content = error.content.decode("utf-8", "replace") if isinstance(error.content, bytes) else str(error.content)
+        return any(reason in content for reason in QUOTA_REASONS)
+    return False
+
+def is_transient_error(error: Exception) -> bool:
+    if isinstance(error, HttpError):
+        return getattr(error.resp, "status", None) in TRANSIENT_STATUSES
+    return isinstance(error, (ConnectionError, TimeoutError, socket.timeout, httplib2.HttpLib2Error))
+
+class GoogleApiExecutor:
+    """
+    Executes googleapiclient requests off the event loop
+
+    httplib2.Http is not thread-safe, so every worker thread keeps its own
+    AuthorizedHttp per credentials object and passes it to request.execute().
+    Quota errors (429 / rate-limit 403s) are always retried with exponential backoff
+    and jitter; 5xx and connection errors are retried only for idempotent requests.
+    Backoff sleeps happen on the event loop, so they never hold a worker thread.
+    """
+
+    def __init__(self, max_workers: int = 4, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 32.0, timeout: float = 60.0):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._local = threading.local()
+
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+
+    async def execute(self, request, credentials=None, operation: str = None, idempotent: bool = True) -> Any:
+        """Run `request.execute()` on the pool and return its response"""
+        operation = operation or getattr(request, "methodId", None) or "google_api"
+        loop = asyncio.get_running_loop()
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = await loop.run_in_executor(self._get_pool(), self._execute_in_thread, request, credentials)
+                self._record(operation, time.perf_counter() - started)
+                return response
+            except Exception as e:
+                self._record(operation, time.perf_counter() - started, error=True)
+                retryable = is_quota_error(e) or (idempotent and is_transient_error(e))
+                if not retryable or attempt >= self.max_retries:
+                    raise
+
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                attempt += 1
+                self.metrics[operation]["retries"] += 1
+                logger.warning(f"⏳ {operation} failed ({e}); retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def _execute_in_thread(self, request, credentials):
+        return request.execute(http=self._thread_http(credentials), num_retries=0)
+
+    def _thread_http(self, credentials) -> httplib2.Http:
+        """This thread's own HTTP client for `credentials` (None = unauthenticated)"""
+        clients = getattr(self._local, "clients", None)
+        if clients is None:
+            clients = self._local.clients = {}
+
+        key = id(credentials)
+        client = clients.get(key)
+        if client is None or client[0] is not credentials:
+            http = httplib2.Http(timeout=self.timeout)
+            client = clients[key] = (credentials, AuthorizedHttp(credentials, http=http) if credentials else http)
+        return client[1]
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="google-api")
+        return self._pool
+
+    def _record(self, operation: str, seconds: float, error: bool = False):
+        metrics = self.metrics.get(operation)
+        if metrics is None:
+            metrics = self.metrics[operation] = {
+                "calls": 0, "errors": 0, "retries": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                "recent": deque(maxlen=LATENCY_SAMPLES)
+            }
+        metrics["calls"] += 1
+        metrics["errors"] += int(error)
+        metrics["total_seconds"] += seconds
+        metrics["max_seconds"] = max(metrics["max_seconds"], seconds)
+        recent: Deque[float] = metrics["recent"]
+        recent.append(seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Latency and error metrics per operation"""
+        stats = {}
+        for operation, metrics in self.metrics.items():
+            recent = sorted(metrics["recent"])
+            stats[operation] = {
+                "calls": metrics["calls"],
+                "errors": metrics["errors"],
+                "retries": metrics["retries"],
+                "avg_ms": round(metrics["total_seconds"] / metrics["calls"] * 1000, 1),
+                "p50_ms": round(recent[len(recent) // 2] * 1000, 1) if recent else None,
+                "p95_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 1) if recent else None,
+                "max_ms": round(metrics["max_seconds"] * 1000, 1)
+            }
+        return {"max_workers": self.max_workers, "operations": stats}
+
+    def shutdown(self, wait: bool = True):
+        if self._pool:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+# Shared by every Google integration so the total number of concurrent API calls stays bounded
+google_api_executor = GoogleApiExecutor(
+    max_workers=int(os.getenv('GOOGLE_API_MAX_WORKERS', '4')),
+    max_retries=int(os.getenv('GOOGLE_API_MAX_RETRIES', '5'))
+)
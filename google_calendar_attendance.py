@@ -15,6 +15,7 @@ from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from safety_controls import safety_controls, safe_send_calendar_invite
+from google_api_executor import google_api_executor
 
 logger = logging.getLogger(__name__)
 
@@ -134,12 +135,16 @@ class GoogleCalendarAttendance:
                 send_invites = 'none'  # Keep safe even in production
                 logger.info(f"🔒 Production mode: Would send invites to {len(authorized_attendees)} authorized attendees")
             
-            created_event = self.service.events().insert(
-                calendarId='primary',
-                body=event,
-                conferenceDataVersion=1,  # Required for Google Meet integration
-                sendUpdates=send_invites  # SAFETY CONTROLLED
-            ).execute()
+            # Not idempotent: only quota rejections are retried
+            created_event = await google_api_executor.execute(
+                self.service.events().insert(
+                    calendarId='primary',
+                    body=event,
+                    conferenceDataVersion=1,  # Required for Google Meet integration
+                    sendUpdates=send_invites  # SAFETY CONTROLLED
+                ),
+                self.credentials, 'calendar.events.insert', idempotent=False
+            )
             
             # Log what happened for audit trail
             logger.info(f"📅 Calendar event created: {event['summary']}")
@@ -191,10 +196,10 @@ class GoogleCalendarAttendance:
                 await self.initialize()
             
             # Get the event details
-            event = self.service.events().get(
-                calendarId=calendar_id,
-                eventId=event_id
-            ).execute()
+            event = await google_api_executor.execute(
+                self.service.events().get(calendarId=calendar_id, eventId=event_id),
+                self.credentials, 'calendar.events.get'
+            )
             
             attendance_data = []
             
@@ -283,16 +288,11 @@ class GoogleCalendarAttendance:
             time_max = now + timedelta(days=days_ahead)
             
             # Search for pod meetings
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=now.isoformat() + 'Z',
-                timeMax=time_max.isoformat() + 'Z',
-                q='Pod Meeting',  # Search for events with "Pod Meeting" in title
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            events = events_result.get('items', [])
+            events = await self.list_events(
+                now.isoformat() + 'Z',
+                time_max.isoformat() + 'Z',
+                q='Pod Meeting'  # Search for events with "Pod Meeting" in title
+            )
             
             upcoming_meetings = []
             for event in events:
@@ -314,6 +314,28 @@ class GoogleCalendarAttendance:
             logger.error(f"❌ Error getting upcoming meetings: {e}")
             return []
     
+    async def list_events(self, time_min: str, time_max: str, max_results: int = None,
+                          calendar_id: str = 'primary', **filters) -> List[Dict[str, Any]]:
+        """Single events between two RFC 3339 times, ordered by start time"""
+        if not self.service:
+            await self.initialize()
+        
+        params = {
+            'calendarId': calendar_id,
+            'timeMin': time_min,
+            'timeMax': time_max,
+            'singleEvents': True,
+            'orderBy': 'startTime',
+            **filters
+        }
+        if max_results:
+            params['maxResults'] = max_results
+        
+        events_result = await google_api_executor.execute(
+            self.service.events().list(**params), self.credentials, 'calendar.events.list'
+        )
+        return events_result.get('items', [])
+    
     async def _match_email_to_user(self, email: str) -> Optional[str]:
         """Match email to user in our system"""
         try:
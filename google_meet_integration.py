@@ -14,6 +14,7 @@ from google.auth.transport.requests import Request
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from google_api_executor import google_api_executor
 
 logger = logging.getLogger(__name__)
 
@@ -82,7 +83,10 @@ class GoogleMeetIntegration:
             }
             
             # Create the space
-            space = self.service.spaces().create(body=space_request).execute()
+            # Not idempotent: only quota rejections are retried
+            space = await google_api_executor.execute(
+                self.service.spaces().create(body=space_request), self.credentials, 'meet.spaces.create', idempotent=False
+            )
             
             space_info = {
                 'space_id': space['name'],  # Format: spaces/{space_id}
@@ -111,9 +115,10 @@ class GoogleMeetIntegration:
                 await self.initialize()
             
             # Get participant sessions
-            participants_response = self.service.spaces().participants().list(
-                parent=space_id
-            ).execute()
+            participants_response = await google_api_executor.execute(
+                self.service.spaces().participants().list(parent=space_id),
+                self.credentials, 'meet.participants.list'
+            )
             
             participants = []
             
@@ -144,9 +149,12 @@ class GoogleMeetIntegration:
                 await self.initialize()
             
             # Get participant sessions
-            sessions_response = self.service.spaces().participants().participantSessions().list(
-                parent=f"{space_id}/participants/{participant_id}"
-            ).execute()
+            sessions_response = await google_api_executor.execute(
+                self.service.spaces().participants().participantSessions().list(
+                    parent=f"{space_id}/participants/{participant_id}"
+                ),
+                self.credentials, 'meet.participantSessions.list'
+            )
             
             sessions = []
             for session in sessions_response.get('participantSessions', []):
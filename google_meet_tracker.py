@@ -2,13 +2,15 @@
 # Tracks pod member attendance at weekly Google Meet calls
 
 import logging
-from typing import Dict, List, Optional, Set
+from typing import Dict, Iterator, List, Optional, Set
 from datetime import datetime, timedelta, date
 from supabase import Client
 import json
 import re
 from urllib.parse import urlparse, parse_qs
 
+from attendance_export import AttendanceExporter
+
 logger = logging.getLogger(__name__)
 
 class GoogleMeetTracker:
@@ -500,4 +502,8 @@ See you on the call! 🚀
             
         except Exception as e:
             logger.error(f"Error exporting attendance data: {e}")
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
+    
+    def stream_attendance_export(self, export_format: str = "csv", compress: bool = False, **filters) -> Iterator[bytes]:
+        """CSV / NDJSON attendance export streamed page by page, across all pods unless pod_id is given"""
+        return AttendanceExporter(self.supabase).stream(export_format, compress, **filters)
\ No newline at end of file
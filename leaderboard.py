@@ -5,6 +5,8 @@ import logging
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta, date
 from supabase import Client
+from user_directory import get_user_directory
+from analytics_rollups import stream_rows
 
 logger = logging.getLogger(__name__)
 
@@ -20,31 +22,43 @@ class Leaderboard:
             today = date.today()
             week_start = today - timedelta(days=today.weekday())
             
-            # Get all users and their weekly stats
-            users = self.supabase.table("users").select("*").execute()
+            # User names come from the in-memory directory
+            directory = get_user_directory(self.supabase)
+            if not directory.loaded:
+                await directory.load()
+            
+            # Stream this week's commitments for everyone, page by page
+            week_commitments = lambda: self.supabase.table("commitments").select(
+                "id, user_id, status"
+            ).gte("created_at", week_start.isoformat()).order("id")
+            
+            user_weekly_stats = {}
+            for commitment in stream_rows(week_commitments):
+                stats = user_weekly_stats.setdefault(commitment["user_id"], {"total": 0, "completed": 0})
+                stats["total"] += 1
+                if commitment.get("status") == "completed":
+                    stats["completed"] += 1
             
             leaderboard_data = []
             
-            for user in users.data:
-                user_id = user["id"]
+            for user_id, stats in user_weekly_stats.items():
+                user = directory.get_by_id(user_id)
+                if not user:
+                    continue
                 
-                # Get this week's commitments
-                week_commitments = self.supabase.table("commitments").select("*").eq("user_id", user_id).gte("created_at", week_start.isoformat()).execute()
+                total = stats["total"]
+                completed = stats["completed"]
+                rate = (completed / total * 100) if total > 0 else 0
                 
-                if week_commitments.data:
-                    total = len(week_commitments.data)
-                    completed = len([c for c in week_commitments.data if c.get("status") == "completed"])
-                    rate = (completed / total * 100) if total > 0 else 0
-                    
-                    leaderboard_data.append({
-                        "telegram_user_id": user.get("telegram_user_id"),
-                        "name": user.get("first_name", "Anonymous"),
-                        "username": user.get("username"),
-                        "completed": completed,
-                        "total": total,
-                        "rate": round(rate, 1),
-                        "points": completed * 10 + total * 2
-                    })
+                leaderboard_data.append({
+                    "telegram_user_id": user.telegram_user_id,
+                    "name": user.first_name or "Anonymous",
+                    "username": user.username,
+                    "completed": completed,
+                    "total": total,
+                    "rate": round(rate, 1),
+                    "points": completed * 10 + total * 2
+                })
             
             # Sort by points (highest first)
             leaderboard_data.sort(key=lambda x: x["points"], reverse=True)
@@ -19,6 +19,8 @@ from essential_business_dashboard import add_business_metrics_routes
 from nurture_control_dashboard import add_nurture_control_routes
 from retro_admin_dashboard import add_retro_admin_routes
 from retro_superadmin_dashboard import add_superadmin_routes
+from admin_pagination import fetch_keyset_page, fetch_active_roles, search_filter, ADMIN_USER_COLUMNS, ADMIN_COMMITMENT_COLUMNS, ADMIN_USER_SEARCH_COLUMNS
+from count_service import get_count_service, CountSpec
 # Load environment
 load_dotenv()
 
@@ -70,6 +72,13 @@ app = FastAPI(
     version="2.0.0"
 )
 
+@app.on_event("startup")
+async def warm_caches():
+    """Warm process-wide caches before serving traffic"""
+    if supabase:
+        from user_directory import warm_user_directory
+        await warm_user_directory(supabase)
+
 # Admin authentication
 api_key_header = APIKeyHeader(name="X-Admin-Key", auto_error=False)
 
@@ -1419,20 +1428,17 @@ async def get_metrics():
         if not supabase:
             raise HTTPException(status_code=503, detail="Database not connected")
         
-        # Get user count
-        users = supabase.table("users").select("id", count="exact").execute()
-        total_users = users.count if users.count else 0
-        
-        # Get commitment counts
-        commitments = supabase.table("commitments").select("id", count="exact").execute()
-        total_commitments = commitments.count if commitments.count else 0
-        
-        active_commitments = supabase.table("commitments").select("id", count="exact").eq("status", "active").execute()
-        active_count = active_commitments.count if active_commitments.count else 0
-        
-        # Get pod count
-        pods = supabase.table("pods").select("id", count="exact").eq("status", "active").execute()
-        total_pods = pods.count if pods.count else 0
+        # All four counts in one batched, head-only request
+        counts = await get_count_service(supabase).count_many({
+            "total_users": CountSpec.build("users"),
+            "total_commitments": CountSpec.build("commitments"),
+            "active_commitments": CountSpec.build("commitments", eq={"status": "active"}),
+            "total_pods": CountSpec.build("pods", eq={"status": "active"})
+        })
+        total_users = counts["total_users"] or 0
+        total_commitments = counts["total_commitments"] or 0
+        active_count = counts["active_commitments"] or 0
+        total_pods = counts["total_pods"] or 0
         
         return {
             "total_users": total_users,
@@ -1446,23 +1452,27 @@ async def get_metrics():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/admin/api/users")
-async def get_users():
-    """Get all users with their roles"""
+async def get_users(cursor: Optional[str] = None, limit: int = 100, role: Optional[str] = None, search: Optional[str] = None):
+    """Get users with their roles, newest first, one keyset page at a time"""
     try:
         if not supabase:
             raise HTTPException(status_code=503, detail="Database not connected")
         
-        # Get users
-        users = supabase.table("users").select("*").order("created_at", desc=True).limit(100).execute()
+        # Role filter is an inner join so pages stay index range scans
+        if role:
+            query = supabase.table("users").select(f"{ADMIN_USER_COLUMNS}, user_roles!inner(role_type)").eq("user_roles.role_type", role).eq("user_roles.is_active", True)
+        else:
+            query = supabase.table("users").select(ADMIN_USER_COLUMNS)
+        
+        page = fetch_keyset_page(query, cursor, limit, or_filter=search_filter(search, ADMIN_USER_SEARCH_COLUMNS))
+        
+        # Roles for the whole page in one batched query
+        roles_by_user = fetch_active_roles(supabase, [user["id"] for user in page["rows"]])
         
-        # Get user roles for each user
         user_data = []
-        for user in users.data:
+        for user in page["rows"]:
             user_id = user.get("id")
-            
-            # Get user roles
-            roles = supabase.table("user_roles").select("role_type").eq("user_id", user_id).eq("is_active", True).execute()
-            user_roles = [r["role_type"] for r in roles.data] if roles.data else ["unpaid"]
+            user_roles = roles_by_user.get(user_id) or ["unpaid"]
             
             user_data.append({
                 "id": user_id,
@@ -1474,21 +1484,31 @@ async def get_users():
                 "created_at": user.get("created_at")
             })
         
-        return {"users": user_data, "count": len(user_data)}
+        return {"users": user_data, "count": len(user_data), "next_cursor": page["next_cursor"], "has_more": page["has_more"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting users: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/admin/api/commitments")
-async def get_commitments():
-    """Get recent commitments"""
+async def get_commitments(cursor: Optional[str] = None, limit: int = 50, status: Optional[str] = None, user_id: Optional[str] = None):
+    """Get commitments, newest first, one keyset page at a time"""
     try:
         if not supabase:
             raise HTTPException(status_code=503, detail="Database not connected")
         
-        commitments = supabase.table("commitments").select("*").order("created_at", desc=True).limit(50).execute()
+        query = supabase.table("commitments").select(ADMIN_COMMITMENT_COLUMNS)
+        if status:
+            query = query.eq("status", status)
+        if user_id:
+            query = query.eq("user_id", user_id)
+        
+        page = fetch_keyset_page(query, cursor, limit)
         
-        return {"commitments": commitments.data, "count": len(commitments.data)}
+        return {"commitments": page["rows"], "count": len(page["rows"]), "next_cursor": page["next_cursor"], "has_more": page["has_more"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting commitments: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -329,6 +329,9 @@ async def lifespan(app: FastAPI):
             automated_scheduler.stop_scheduler()
             logger.info("⏰ Automated scheduler stopped")
             
+        if feature_system:
+            await feature_system.close()
+            
         if bot.session:
             await bot.session.close()
         logger.info("🛑 Bot shutdown completed")
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Meet Sync State
+Per-day high-water marks and checkpoints for incremental Admin Reports syncs
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta, date, timezone
+from typing import Dict, List, Optional, Any, Set
+from supabase import Client
+
+from analytics_rollups import stream_rows
+from google_admin_reports import MeetEvent, day_bounds
+
+logger = logging.getLogger(__name__)
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+class MeetSyncState:
+    """
+    Sync progress stored in meet_reports_sync (one row per day and application)
+
+    last_event_time is the high-water mark: the next run asks the API only for events
+    after it, minus `lag_minutes` because audit events can be published late. Events
+    land in meet_audit_events keyed by event_id, so overlapping fetches are harmless.
+    A day is closed (sync_status 'completed') once it is older than the lag window,
+    and attendance_processed_at records that a backfill finished the day.
+    """
+
+    def __init__(self, supabase_client: Client, application_name: str = 'meet',
+                 lag_minutes: int = 180, write_batch_size: int = 500):
+        self.supabase = supabase_client
+        self.application_name = application_name
+        self.lag = timedelta(minutes=lag_minutes)
+        self.write_batch_size = write_batch_size
+        self.available = True
+
+    # ---------------------------------------------------------------
+    # Day checkpoints
+    # ---------------------------------------------------------------
+
+    def get_day(self, sync_date: date) -> Optional[Dict[str, Any]]:
+        """Checkpoint row for a day, or None when the day was never synced"""
+        if not self.available:
+            return None
+        try:
+            result = self.supabase.table('meet_reports_sync').select(
+                'sync_date, sync_status, last_event_time, total_events_processed, attendance_processed_at'
+            ).eq('sync_date', sync_date.isoformat()).eq('application_name', self.application_name).execute()
+        except Exception as e:
+            self._table_failed('meet_reports_sync', e)
+            return None
+        return result.data[0] if result.data else None
+
+    def resume_time(self, sync_date: date, checkpoint: Optional[Dict[str, Any]]) -> datetime:
+        """Where the next fetch for a day starts: the high-water mark minus the lag window"""
+        day_start, _ = day_bounds(sync_date)
+        last_event_time = _parse_time((checkpoint or {}).get('last_event_time'))
+        if not last_event_time:
+            return day_start
+        return max(day_start, last_event_time - self.lag)
+
+    def is_closed(self, sync_date: date) -> bool:
+        """True once late events can no longer arrive for the day"""
+        day_start, _ = day_bounds(sync_date)
+        return day_start + timedelta(days=1) + self.lag <= datetime.now(timezone.utc)
+
+    def save_day(self, sync_date: date, checkpoint: Optional[Dict[str, Any]], event_types: List[str],
+                 last_event_time: Optional[datetime], new_events: int) -> bool:
+        """Advance the day's high-water mark (it never moves backwards)"""
+        if not self.available:
+            return False
+
+        previous = _parse_time((checkpoint or {}).get('last_event_time'))
+        if previous and (not last_event_time or previous > last_event_time):
+            last_event_time = previous
+
+        closed = self.is_closed(sync_date)
+        now = datetime.now(timezone.utc).isoformat()
+        row = {
+            'sync_date': sync_date.isoformat(),
+            'application_name': self.application_name,
+            'event_types': event_types,
+            'sync_status': 'completed' if closed else 'running',
+            'last_event_time': last_event_time.isoformat() if last_event_time else None,
+            'total_events_processed': ((checkpoint or {}).get('total_events_processed') or 0) + new_events,
+            'completed_at': now if closed else None,
+            'updated_at': now
+        }
+        try:
+            self.supabase.table('meet_reports_sync').upsert(row, on_conflict='sync_date,application_name').execute()
+            return True
+        except Exception as e:
+            self._table_failed('meet_reports_sync', e)
+            return False
+
+    def mark_attendance_processed(self, sync_date: date):
+        """Backfill checkpoint: attendance for this day is done and need not be redone on resume"""
+        if not self.available:
+            return
+        try:
+            self.supabase.table('meet_reports_sync').update({
+                'attendance_processed_at': datetime.now(timezone.utc).isoformat()
+            }).eq('sync_date', sync_date.isoformat()).eq('application_name', self.application_name).execute()
+        except Exception as e:
+            self._table_failed('meet_reports_sync', e)
+
+    def processed_days(self, start_date: date, end_date: date) -> Set[date]:
+        """Days in the range whose attendance a previous (possibly interrupted) backfill finished"""
+        if not self.available:
+            return set()
+        try:
+            result = self.supabase.table('meet_reports_sync').select('sync_date').eq(
+                'application_name', self.application_name
+            ).gte('sync_date', start_date.isoformat()).lte('sync_date', end_date.isoformat()).eq(
+                'sync_status', 'completed'
+            ).not_.is_('attendance_processed_at', 'null').execute()
+        except Exception as e:
+            self._table_failed('meet_reports_sync', e)
+            return set()
+        return {date.fromisoformat(row['sync_date']) for row in result.data or []}
+
+    # ---------------------------------------------------------------
+    # Audit events
+    # ---------------------------------------------------------------
+
+    def store_events(self, events: List[MeetEvent]) -> int:
+        """Insert events not stored yet; returns how many were new"""
+        if not self.available or not events:
+            return 0
+
+        rows = {}
+        for event in events:
+            if not event.event_id:
+                continue
+            rows[event.event_id] = {
+                'event_id': event.event_id,
+                'event_type': event.event_type,
+                'event_time': event.event_time.isoformat(),
+                'user_email': event.user_email,
+                'meet_code': event.meet_code,
+                'organizer_email': event.organizer_email,
+                'participant_email': event.participant_email,
+                'event_data': event.raw_data
+            }
+
+        rows = list(rows.values())
+        inserted = 0
+        for start in range(0, len(rows), self.write_batch_size):
+            result = self.supabase.table('meet_audit_events').upsert(
+                rows[start:start + self.write_batch_size], on_conflict='event_id', ignore_duplicates=True
+            ).execute()
+            inserted += len(result.data or [])
+        return inserted
+
+    def load_event_data(self, sync_date: date, event_types: List[str]) -> Optional[List[dict]]:
+        """Raw payloads stored for a day, or None when the day has not been synced"""
+        if not self.get_day(sync_date):
+            return None
+
+        day_start, day_end = day_bounds(sync_date)
+        query_factory = lambda: self.supabase.table('meet_audit_events').select('id, event_data').in_(
+            'event_type', event_types
+        ).gte('event_time', day_start.isoformat()).lt('event_time', day_end.isoformat()).order('id')
+        return [
+            json.loads(row['event_data']) if isinstance(row['event_data'], str) else row['event_data']
+            for row in stream_rows(query_factory) if row.get('event_data')
+        ]
+
+    def _table_failed(self, table: str, error: Exception):
+        if table in str(error) or any(code in str(error) for code in ('PGRST205', '42P01', '42703')):
+            logger.warning(f"⚠️ {table} sync checkpoints unavailable, falling back to full-day fetches: {error}")
+            self.available = False
+        else:
+            raise error
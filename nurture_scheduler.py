@@ -0,0 +1,325 @@
+# Nurture Deadline Scheduler for The Progress Method
+# Fires sequence steps and scheduled deliveries close to their deadline instead of polling with lte(now)
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Any
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+# Entry kinds
+SEQUENCE_STEP = "sequence_step"   # user_sequence_state.next_message_at
+DELIVERY = "delivery"             # message_deliveries.scheduled_at (pending)
+
+def parse_deadline(value: Any) -> Optional[float]:
+    """Epoch seconds for a datetime or an ISO timestamp (naive values are local time, like datetime.now())"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        logger.warning(f"Unparseable deadline: {value}")
+        return None
+
+class NurtureScheduler:
+    """Min-heap of upcoming deadlines, loaded in windows and fired within ~tick_seconds
+
+    Only deadlines inside the current window (now + window_minutes) are held in memory.
+    Each window is loaded with one range query per table; entries added by trigger_sequence
+    and by the batch processors are pushed directly. Rows written by other processes (telbot
+    runs its own NurtureSequences) are picked up by a catch-up read of the loaded window
+    every `catchup_seconds`. Superseded heap entries are skipped lazily (the latest deadline
+    per key lives in `_deadlines`).
+    """
+
+    def __init__(self, supabase_client: Client, nurture_sequences=None, delivery_controller=None,
+                 window_minutes: int = 15, tick_seconds: float = 1.0, retry_seconds: int = 300,
+                 page_size: int = 1000, catchup_seconds: float = 30.0):
+        self.supabase = supabase_client
+        self.nurture_sequences = nurture_sequences
+        self.delivery_controller = delivery_controller
+        self.window = timedelta(minutes=window_minutes)
+        self.tick_seconds = tick_seconds
+        self.retry_seconds = retry_seconds
+        self.page_size = page_size
+        self.catchup_seconds = catchup_seconds
+        self._last_catchup = time.monotonic()
+
+        self._heap: List[Tuple[float, int, str, str]] = []  # (deadline, seq, kind, row_id)
+        self._deadlines: Dict[Tuple[str, str], float] = {}
+        self._counter = itertools.count()
+        self._loaded_until: Dict[str, Optional[datetime]] = {SEQUENCE_STEP: None, DELIVERY: None}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {"loaded": 0, "caught_up": 0, "requeued": 0, "scheduled": 0, "fired": 0, "batches": 0,
+                      "max_lateness_ms": 0.0}
+
+    # ---------------------------------------------------------------
+    # Scheduling hooks
+    # ---------------------------------------------------------------
+
+    def schedule(self, kind: str, row_id: str, deadline: Any) -> None:
+        """Add or move the deadline for one row; None removes it"""
+        due = parse_deadline(deadline)
+        if due is None:
+            self.cancel(kind, row_id)
+            return
+
+        key = (kind, row_id)
+        if self._deadlines.get(key) == due:
+            return
+
+        # Deadlines past the loaded window are picked up by the next window load
+        loaded_until = self._loaded_until.get(kind)
+        if loaded_until is not None and due > loaded_until.timestamp():
+            self._deadlines.pop(key, None)
+            return
+
+        self._deadlines[key] = due
+        heapq.heappush(self._heap, (due, next(self._counter), kind, row_id))
+        self.stats["scheduled"] += 1
+
+        if self._heap[0][3] == row_id:
+            self._wakeup.set()
+
+    def schedule_step(self, state_id: str, next_message_at: Any) -> None:
+        self.schedule(SEQUENCE_STEP, state_id, next_message_at)
+
+    def schedule_delivery(self, delivery_id: str, scheduled_at: Any) -> None:
+        self.schedule(DELIVERY, delivery_id, scheduled_at)
+
+    def cancel(self, kind: str, row_id: str) -> None:
+        self._deadlines.pop((kind, row_id), None)
+
+    # ---------------------------------------------------------------
+    # Window loading
+    # ---------------------------------------------------------------
+
+    def _sources(self):
+        """(kind, query factory, deadline column) for every table the scheduler watches"""
+        if self.nurture_sequences is not None:
+            yield (
+                SEQUENCE_STEP,
+                lambda: self.supabase.table("user_sequence_state").select("id, next_message_at").eq("is_active", True),
+                "next_message_at"
+            )
+        if self.delivery_controller is not None:
+            yield (
+                DELIVERY,
+                lambda: self.supabase.table("message_deliveries").select("id, scheduled_at").eq("delivery_status", "pending"),
+                "scheduled_at"
+            )
+
+    def load_window(self) -> int:
+        """Load deadlines up to now + window; the first load also picks up overdue rows"""
+        horizon = datetime.now() + self.window
+        loaded = 0
+        for kind, query_factory, column in self._sources():
+            loaded += self._load_range(kind, self._loaded_until[kind], horizon, query_factory, column)
+
+        self.stats["loaded"] += loaded
+        return loaded
+
+    def catch_up(self) -> int:
+        """Re-read everything up to the loaded horizons and schedule rows not tracked yet
+
+        Covers rows inserted (or moved into the window) by other processes after their
+        window was loaded, and rows dropped because their deadline moved. Rows already
+        tracked, including those waiting for a retry, are left as they are.
+        """
+        found = 0
+        for kind, query_factory, column in self._sources():
+            loaded_until = self._loaded_until[kind]
+            if loaded_until is not None:
+                found += self._load_range(kind, None, loaded_until, query_factory, column, untracked_only=True)
+
+        self._last_catchup = time.monotonic()
+        self.stats["caught_up"] += found
+        return found
+
+    def _load_range(self, kind: str, since: Optional[datetime], horizon: datetime, query_factory, column: str,
+                    untracked_only: bool = False) -> int:
+        """Page through one (since, horizon] range query and push every row"""
+        loaded = 0
+        offset = 0
+        # Widen the window before pushing so schedule() accepts rows up to the horizon
+        self._loaded_until[kind] = horizon
+        while True:
+            query = query_factory().lte(column, horizon.isoformat())
+            if since is not None:
+                query = query.gt(column, since.isoformat())
+            result = query.order(column).order("id").range(offset, offset + self.page_size - 1).execute()
+            rows = result.data or []
+            for row in rows:
+                if untracked_only and (kind, row["id"]) in self._deadlines:
+                    continue
+                self.schedule(kind, row["id"], row[column])
+                loaded += 1
+            if len(rows) < self.page_size:
+                break
+            offset += self.page_size
+        return loaded
+
+    # ---------------------------------------------------------------
+    # Run loop
+    # ---------------------------------------------------------------
+
+    def start(self) -> None:
+        """Load the first window and start firing on the running event loop"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        logger.info("⏰ Nurture scheduler started")
+        while True:
+            try:
+                if self._window_needs_reload():
+                    loaded = self.load_window()
+                    if loaded:
+                        logger.info(f"⏰ Loaded {loaded} nurture deadlines (window to {self._loaded_until_any()})")
+                elif time.monotonic() - self._last_catchup >= self.catchup_seconds:
+                    found = self.catch_up()
+                    if found:
+                        logger.info(f"⏰ Caught up {found} nurture deadlines written elsewhere")
+
+                await self.fire_due()
+            except Exception as e:
+                logger.error(f"Error in nurture scheduler: {e}")
+
+            await self._sleep_until_next()
+
+    def _window_needs_reload(self) -> bool:
+        # Reload when half of the window has elapsed so the heap never runs dry
+        refresh_at = datetime.now() + self.window / 2
+        return any(loaded_until is None or loaded_until <= refresh_at for loaded_until in self._active_windows())
+
+    def _active_windows(self) -> List[Optional[datetime]]:
+        windows = []
+        if self.nurture_sequences is not None:
+            windows.append(self._loaded_until[SEQUENCE_STEP])
+        if self.delivery_controller is not None:
+            windows.append(self._loaded_until[DELIVERY])
+        return windows
+
+    def _loaded_until_any(self) -> Optional[str]:
+        windows = [w for w in self._active_windows() if w is not None]
+        return min(windows).isoformat() if windows else None
+
+    async def _sleep_until_next(self):
+        """Sleep until the earliest deadline (capped at tick_seconds) or until a nearer one is pushed"""
+        timeout = self.tick_seconds
+        if self._heap:
+            timeout = max(0.0, min(timeout, self._heap[0][0] - time.time()))
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def fire_due(self) -> int:
+        """Pop every due entry and hand them to the batch processors"""
+        now = time.time()
+        due: Dict[str, List[str]] = {SEQUENCE_STEP: [], DELIVERY: []}
+
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, kind, row_id = heapq.heappop(self._heap)
+            key = (kind, row_id)
+            if self._deadlines.get(key) != deadline:
+                continue  # superseded or cancelled
+
+            # Keep a retry entry; the processors move or cancel it when the row is handled
+            retry_at = now + self.retry_seconds
+            self._deadlines[key] = retry_at
+            heapq.heappush(self._heap, (retry_at, next(self._counter), kind, row_id))
+
+            due[kind].append(row_id)
+            self.stats["max_lateness_ms"] = max(self.stats["max_lateness_ms"], round((now - deadline) * 1000, 1))
+
+        fired = 0
+        if due[SEQUENCE_STEP]:
+            fired += await self._fire_sequence_steps(due[SEQUENCE_STEP])
+        if due[DELIVERY]:
+            fired += await self._fire_deliveries(due[DELIVERY])
+
+        self.stats["fired"] += fired
+        return fired
+
+    async def _fire_sequence_steps(self, state_ids: List[str]) -> int:
+        processed = 0
+        for chunk in self._chunks(state_ids):
+            # Re-check the rows: they may have been advanced or stopped since they were loaded
+            result = self.supabase.table("user_sequence_state").select(
+                "id, user_id, sequence_type, current_step, last_message_sent_at, next_message_at"
+            ).in_("id", chunk).eq("is_active", True).execute()
+
+            now = time.time()
+            rows = []
+            active_ids = set()
+            for row in result.data or []:
+                active_ids.add(row["id"])
+                deadline = parse_deadline(row["next_message_at"])
+                if deadline is not None and deadline <= now:
+                    rows.append(row)
+                else:
+                    # Moved by someone else: re-queue at the new deadline (or drop it if there is none)
+                    self.schedule(SEQUENCE_STEP, row["id"], row["next_message_at"])
+                    self.stats["requeued"] += 1
+            for state_id in chunk:
+                if state_id not in active_ids:
+                    self.cancel(SEQUENCE_STEP, state_id)
+
+            if rows:
+                processed += await self.nurture_sequences._process_pending_batch(rows)
+                self.stats["batches"] += 1
+        return processed
+
+    async def _fire_deliveries(self, delivery_ids: List[str]) -> int:
+        # Deliveries are leased per channel by the controller, which drains everything due
+        for delivery_id in delivery_ids:
+            self.cancel(DELIVERY, delivery_id)
+
+        stats = await self.delivery_controller.process_pending_deliveries()
+        self.stats["batches"] += 1
+        return stats.get("total_processed", 0)
+
+    def _chunks(self, ids: List[str], size: int = 200):
+        for i in range(0, len(ids), size):
+            yield ids[i:i + size]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "pending_entries": len(self._deadlines),
+            "heap_size": len(self._heap),
+            "next_deadline": datetime.fromtimestamp(self._heap[0][0]).isoformat() if self._heap else None,
+            "loaded_until": {kind: until.isoformat() if until else None for kind, until in self._loaded_until.items()},
+            "running": bool(self._task and not self._task.done())
+        }
+
+async def start_nurture_scheduler(supabase_client: Client, nurture_sequences=None, delivery_controller=None) -> NurtureScheduler:
+    """Create a scheduler, attach it to the nurture components and start it"""
+    scheduler = NurtureScheduler(supabase_client, nurture_sequences=nurture_sequences, delivery_controller=delivery_controller)
+    if nurture_sequences is not None:
+        nurture_sequences.scheduler = scheduler
+    if delivery_controller is not None:
+        delivery_controller.attach_scheduler(scheduler)
+    scheduler.start()
+    return scheduler
@@ -7,9 +7,21 @@ from datetime import datetime, timedelta, date
 from supabase import Client
 import json
 from enum import Enum
+from analytics_rollups import AnalyticsRollups, stream_rows
+from sequence_plans import SequencePlan, StepPlan, shared_plans
 
 logger = logging.getLogger(__name__)
 
+# Condition ids _evaluate_condition understands; sequences using anything else are rejected at load
+NURTURE_CONDITIONS = frozenset({
+    "no_commitments_yet",
+    "has_commitments_no_pod",
+    "not_pod_member",
+    "commitment_not_done",
+    "commitment_still_open",
+    "still_inactive"
+})
+
 class SequenceType(Enum):
     """Types of nurture sequences"""
     ONBOARDING = "onboarding"           # New user → first commitment
@@ -25,7 +37,11 @@ class NurtureSequences:
     
     def __init__(self, supabase_client: Client):
         self.supabase = supabase_client
-        self.sequences = self._define_sequences()
+        # Compiled once per process and shared with UnifiedNurtureController
+        self.plans = shared_plans("nurture", self._define_sequences, NURTURE_CONDITIONS)
+        self.analytics = AnalyticsRollups(supabase_client)
+        # Optional NurtureScheduler (see nurture_scheduler.py) notified of new deadlines
+        self.scheduler = None
     
     def _define_sequences(self) -> Dict[str, Dict]:
         """Define all nurture sequences with their messages and timing"""
@@ -228,9 +244,9 @@ See you at the next call! 📞""",
         """Trigger a nurture sequence for a user"""
         try:
             sequence_key = sequence_type.value
-            sequence = self.sequences.get(sequence_key)
+            plan = self.plans.get(sequence_key)
             
-            if not sequence:
+            if not plan:
                 logger.warning(f"Unknown sequence type: {sequence_key}")
                 return False
             
@@ -249,7 +265,7 @@ See you at the next call! 📞""",
                 "started_at": datetime.now().isoformat(),
                 "context": json.dumps(context or {}),
                 "is_active": True,
-                "next_message_at": self._calculate_next_message_time(sequence, 0)
+                "next_message_at": self._calculate_next_message_time(plan, 0)
             }
             
             result = self.supabase.table("user_sequence_state").insert(sequence_state).execute()
@@ -257,6 +273,9 @@ See you at the next call! 📞""",
             if result.data:
                 logger.info(f"✅ Started sequence '{sequence_key}' for user {user_id}")
                 
+                if self.scheduler:
+                    self.scheduler.schedule_step(result.data[0]["id"], sequence_state["next_message_at"])
+                
                 # Send first message if it's immediate
                 await self._process_immediate_messages(user_id, sequence_key)
                 return True
@@ -269,71 +288,104 @@ See you at the next call! 📞""",
     async def _process_immediate_messages(self, user_id: str, sequence_type: str):
         """Process messages that should be sent immediately"""
         try:
-            sequence = self.sequences[sequence_type]
-            immediate_messages = [msg for msg in sequence["messages"] if msg["delay_hours"] == 0]
+            plan = self.plans[sequence_type]
             
-            for message_data in immediate_messages:
-                if await self._should_send_message(user_id, message_data):
-                    await self._send_sequence_message(user_id, message_data)
+            for index in plan.immediate_steps:
+                step = plan.steps[index]
+                if await self._should_send_message(user_id, step):
+                    await self._send_sequence_message(user_id, step)
                     
         except Exception as e:
             logger.error(f"Error processing immediate messages: {e}")
     
-    async def _should_send_message(self, user_id: str, message_data: Dict) -> bool:
+    async def _should_send_message(self, user_id: str, step: StepPlan) -> bool:
         """Check if message should be sent based on conditions"""
-        condition = message_data.get("condition")
+        condition = step.condition
         if not condition:
             return True
         
         try:
-            if condition == "no_commitments_yet":
-                commitments = self.supabase.table("commitments").select("id").eq("user_id", user_id).limit(1).execute()
-                return len(commitments.data) == 0
-            
-            elif condition == "has_commitments_no_pod":
-                commitments = self.supabase.table("commitments").select("id").eq("user_id", user_id).limit(1).execute()
-                has_commitments = len(commitments.data) > 0
-                
-                pod_membership = self.supabase.table("pod_memberships").select("id").eq("user_id", user_id).limit(1).execute()
-                has_pod = len(pod_membership.data) > 0
-                
-                return has_commitments and not has_pod
-            
-            elif condition == "not_pod_member":
-                pod_membership = self.supabase.table("pod_memberships").select("id").eq("user_id", user_id).limit(1).execute()
-                return len(pod_membership.data) == 0
-            
-            elif condition == "commitment_not_done":
-                # Check if user has any pending commitments
-                pending = self.supabase.table("commitments").select("id").eq("user_id", user_id).neq("status", "completed").limit(1).execute()
-                return len(pending.data) > 0
-            
-            elif condition == "still_inactive":
-                # Check if user is still inactive
-                recent_activity = self.supabase.table("commitments").select("id").eq("user_id", user_id).gte("created_at", (datetime.now() - timedelta(days=3)).isoformat()).execute()
-                return len(recent_activity.data) == 0
+            facts = await self._prefetch_condition_facts([user_id], {condition})
+            return self._evaluate_condition(condition, user_id, facts)
             
         except Exception as e:
             logger.error(f"Error checking message condition: {e}")
             
         return True
     
-    async def _send_sequence_message(self, user_id: str, message_data: Dict) -> bool:
+    async def _prefetch_condition_facts(self, user_ids: List[str], conditions: set) -> Dict[str, set]:
+        """Fetch the facts needed to evaluate conditions for a batch of users (one paged in_() query per fact)"""
+        facts = {}
+        if not user_ids:
+            return facts
+        
+        # Users can have any number of commitments, so every fact query is paged past the row cap
+        def user_ids_matching(query_factory) -> set:
+            return {row["user_id"] for row in stream_rows(query_factory)}
+        
+        if conditions & {"no_commitments_yet", "has_commitments_no_pod"}:
+            facts["has_commitments"] = user_ids_matching(
+                lambda: self.supabase.table("commitments").select("id, user_id").in_("user_id", user_ids).order("id")
+            )
+        
+        if conditions & {"has_commitments_no_pod", "not_pod_member"}:
+            facts["has_pod"] = user_ids_matching(
+                lambda: self.supabase.table("pod_memberships").select("id, user_id").in_("user_id", user_ids).order("id")
+            )
+        
+        if conditions & {"commitment_not_done", "commitment_still_open"}:
+            facts["has_pending_commitments"] = user_ids_matching(
+                lambda: self.supabase.table("commitments").select("id, user_id").in_("user_id", user_ids).neq("status", "completed").order("id")
+            )
+        
+        if "still_inactive" in conditions:
+            since = (datetime.now() - timedelta(days=3)).isoformat()
+            facts["recently_active"] = user_ids_matching(
+                lambda: self.supabase.table("commitments").select("id, user_id").in_("user_id", user_ids).gte("created_at", since).order("id")
+            )
+        
+        return facts
+    
+    def _evaluate_condition(self, condition: Optional[str], user_id: str, facts: Dict[str, set]) -> bool:
+        """Evaluate a message condition in memory from prefetched facts"""
+        if not condition:
+            return True
+        
+        if condition == "no_commitments_yet":
+            return user_id not in facts["has_commitments"]
+        
+        elif condition == "has_commitments_no_pod":
+            return user_id in facts["has_commitments"] and user_id not in facts["has_pod"]
+        
+        elif condition == "not_pod_member":
+            return user_id not in facts["has_pod"]
+        
+        elif condition in ("commitment_not_done", "commitment_still_open"):
+            return user_id in facts["has_pending_commitments"]
+        
+        elif condition == "still_inactive":
+            return user_id not in facts["recently_active"]
+        
+        return True
+    
+    async def _send_sequence_message(self, user_id: str, step: StepPlan, user: Optional[Dict] = None) -> bool:
         """Send a sequence message to user"""
         try:
-            # Get user's telegram ID
-            user_result = self.supabase.table("users").select("telegram_user_id, first_name").eq("id", user_id).execute()
-            if not user_result.data:
-                return False
-            
-            telegram_id = user_result.data[0]["telegram_user_id"]
-            user_name = user_result.data[0]["first_name"]
-            
-            # Process message template
-            message_text = message_data["message"]
-            if message_data.get("template"):
+            # Get user's telegram ID (batch callers pass the prefetched row)
+            if user is None:
+                user_result = self.supabase.table("users").select("telegram_user_id, first_name").eq("id", user_id).execute()
+                if not user_result.data:
+                    return False
+                user = user_result.data[0]
+            
+            telegram_id = user["telegram_user_id"]
+            user_name = user["first_name"]
+            
+            # Process message template (tokenised when the plan was compiled)
+            message_text = step.message
+            if step.is_template:
                 # Replace template variables (add more as needed)
-                message_text = message_text.replace("{user_name}", user_name)
+                message_text = step.render({"user_name": user_name or ""})
             
             # Log the message (in production, this would queue for actual sending)
             logger.info(f"📤 Nurture message to {telegram_id}: {message_text[:50]}...")
@@ -347,29 +399,40 @@ See you at the next call! 📞""",
             logger.error(f"Error sending sequence message: {e}")
             return False
     
-    def _calculate_next_message_time(self, sequence: Dict, current_step: int) -> str:
+    def _calculate_next_message_time(self, plan: SequencePlan, current_step: int) -> str:
         """Calculate when the next message should be sent"""
-        messages = sequence["messages"]
-        if current_step >= len(messages):
+        next_step = plan.step(current_step)
+        if next_step is None:
             return None
         
-        next_message = messages[current_step]
-        next_time = datetime.now() + timedelta(hours=next_message["delay_hours"])
+        next_time = datetime.now() + timedelta(hours=next_step.delay_hours)
         return next_time.isoformat()
     
-    async def process_pending_messages(self):
+    async def process_pending_messages(self, batch_size: int = 200):
         """Process all pending nurture messages (run this on a schedule)"""
         try:
-            # Get all active sequences with pending messages
+            # Get all active sequences with pending messages, one batch at a time
             now = datetime.now().isoformat()
             
-            pending = self.supabase.table("user_sequence_state").select("*").eq("is_active", True).lte("next_message_at", now).execute()
-            
             processed = 0
-            for sequence_state in pending.data:
-                success = await self._process_sequence_step(sequence_state)
-                if success:
-                    processed += 1
+            offset = 0
+            while True:
+                pending = self.supabase.table("user_sequence_state").select(
+                    "id, user_id, sequence_type, current_step, last_message_sent_at"
+                ).eq("is_active", True).lte("next_message_at", now).order("next_message_at").range(offset, offset + batch_size - 1).execute()
+                
+                rows = pending.data or []
+                if not rows:
+                    break
+                
+                batch_processed = await self._process_pending_batch(rows)
+                processed += batch_processed
+                
+                if len(rows) < batch_size:
+                    break
+                
+                # Advanced rows drop out of the lte(now) window; skip past the ones that failed
+                offset += len(rows) - batch_processed
             
             logger.info(f"📬 Processed {processed} nurture messages")
             return processed
@@ -378,60 +441,69 @@ See you at the next call! 📞""",
             logger.error(f"Error processing pending messages: {e}")
             return 0
     
-    async def _process_sequence_step(self, sequence_state: Dict) -> bool:
-        """Process the next step in a user's sequence"""
-        try:
-            sequence_type = sequence_state["sequence_type"]
-            current_step = sequence_state["current_step"]
-            user_id = sequence_state["user_id"]
+    async def _process_pending_batch(self, rows: List[Dict]) -> int:
+        """Evaluate and send one batch of due sequence steps, then write all state changes at once"""
+        now = datetime.now().isoformat()
+        
+        # Resolve each row's step and the conditions the batch needs
+        steps = []
+        conditions = set()
+        for state in rows:
+            plan = self.plans.get(state["sequence_type"])
+            step = plan.step(state["current_step"]) if plan else None
+            if step and step.condition:
+                conditions.add(step.condition)
+            steps.append((state, plan, step))
+        
+        # Prefetch facts and user rows for the whole batch
+        user_ids = list({state["user_id"] for state in rows})
+        facts = await self._prefetch_condition_facts(user_ids, conditions)
+        users_result = self.supabase.table("users").select("id, telegram_user_id, first_name").in_("id", user_ids).execute()
+        users = {user["id"]: user for user in users_result.data or []}
+        
+        updates = []
+        for state, plan, step in steps:
+            update = {
+                "id": state["id"],
+                "user_id": state["user_id"],
+                "sequence_type": state["sequence_type"],
+                "current_step": state["current_step"],
+                "last_message_sent_at": state.get("last_message_sent_at"),
+                "next_message_at": None,
+                "is_active": False,
+                "completed_at": now
+            }
             
-            sequence = self.sequences.get(sequence_type)
-            if not sequence or current_step >= len(sequence["messages"]):
+            if step is None:
                 # End of sequence
-                await self._complete_sequence(sequence_state["id"])
-                return True
-            
-            message_data = sequence["messages"][current_step]
-            
-            # Check conditions
-            if await self._should_send_message(user_id, message_data):
-                # Send message
-                success = await self._send_sequence_message(user_id, message_data)
-                
-                if success:
-                    # Update sequence state
-                    next_step = current_step + 1
-                    next_message_time = self._calculate_next_message_time(sequence, next_step)
-                    
-                    update_data = {
-                        "current_step": next_step,
-                        "last_message_sent_at": datetime.now().isoformat(),
-                        "next_message_at": next_message_time
-                    }
-                    
-                    if next_message_time is None:
-                        update_data["is_active"] = False
-                        update_data["completed_at"] = datetime.now().isoformat()
-                    
-                    self.supabase.table("user_sequence_state").update(update_data).eq("id", sequence_state["id"]).execute()
-                    
-                    return True
-            else:
-                # Skip this message, move to next
-                next_step = current_step + 1
-                next_message_time = self._calculate_next_message_time(sequence, next_step)
-                
-                self.supabase.table("user_sequence_state").update({
-                    "current_step": next_step,
-                    "next_message_at": next_message_time
-                }).eq("id", sequence_state["id"]).execute()
-                
-                return True
-            
-        except Exception as e:
-            logger.error(f"Error processing sequence step: {e}")
+                updates.append(update)
+                continue
+            
+            if self._evaluate_condition(step.condition, state["user_id"], facts):
+                user = users.get(state["user_id"])
+                if not user or not await self._send_sequence_message(state["user_id"], step, user=user):
+                    # Leave the row due so the next run retries it
+                    continue
+                update["last_message_sent_at"] = now
+            
+            # Sent or skipped - move to the next step
+            next_step = state["current_step"] + 1
+            next_message_time = self._calculate_next_message_time(plan, next_step)
+            update["current_step"] = next_step
+            update["next_message_at"] = next_message_time
+            if next_message_time is not None:
+                update["is_active"] = True
+                update["completed_at"] = None
+            updates.append(update)
+        
+        if updates:
+            self.supabase.table("user_sequence_state").upsert(updates, on_conflict="id").execute()
             
-        return False
+            if self.scheduler:
+                for update in updates:
+                    self.scheduler.schedule_step(update["id"], update["next_message_at"])
+        
+        return len(updates)
     
     async def _complete_sequence(self, sequence_state_id: str):
         """Mark sequence as completed"""
@@ -471,11 +543,11 @@ See you at the next call! 📞""",
             
             status_list = []
             for sequence in result.data:
-                sequence_def = self.sequences.get(sequence["sequence_type"])
-                total_messages = len(sequence_def["messages"]) if sequence_def else 0
+                plan = self.plans.get(sequence["sequence_type"])
+                total_messages = len(plan.steps) if plan else 0
                 
                 status_list.append({
-                    "sequence_name": sequence_def["name"] if sequence_def else sequence["sequence_type"],
+                    "sequence_name": plan.name if plan else sequence["sequence_type"],
                     "current_step": sequence["current_step"],
                     "total_steps": total_messages,
                     "progress": f"{sequence['current_step']}/{total_messages}",
@@ -506,46 +578,8 @@ See you at the next call! 📞""",
     async def get_sequence_analytics(self) -> Dict:
         """Get analytics on sequence performance"""
         try:
-            # Get sequence completion rates
-            all_sequences = self.supabase.table("user_sequence_state").select("*").execute()
-            
-            analytics = {
-                "total_sequences_started": len(all_sequences.data),
-                "sequence_stats": {},
-                "completion_rates": {},
-                "user_engagement": {}
-            }
-            
-            # Analyze by sequence type
-            for sequence in all_sequences.data:
-                seq_type = sequence["sequence_type"]
-                
-                if seq_type not in analytics["sequence_stats"]:
-                    analytics["sequence_stats"][seq_type] = {
-                        "started": 0,
-                        "completed": 0,
-                        "active": 0,
-                        "stopped": 0
-                    }
-                
-                analytics["sequence_stats"][seq_type]["started"] += 1
-                
-                if sequence.get("completed_at"):
-                    analytics["sequence_stats"][seq_type]["completed"] += 1
-                elif sequence.get("stopped_at"):
-                    analytics["sequence_stats"][seq_type]["stopped"] += 1
-                elif sequence["is_active"]:
-                    analytics["sequence_stats"][seq_type]["active"] += 1
-            
-            # Calculate completion rates
-            for seq_type, stats in analytics["sequence_stats"].items():
-                total_finished = stats["completed"] + stats["stopped"]
-                if total_finished > 0:
-                    analytics["completion_rates"][seq_type] = round((stats["completed"] / total_finished) * 100, 1)
-                else:
-                    analytics["completion_rates"][seq_type] = 0
-            
-            return analytics
+            # Per-sequence lifecycle counts from the daily rollups
+            return self.analytics.sequence_state_analytics()
             
         except Exception as e:
             logger.error(f"Error getting sequence analytics: {e}")
@@ -5,11 +5,12 @@ Based on behavioral analysis findings - designed to address 27.8% onboarding con
 """
 
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Mapping, Optional, Any
 from datetime import datetime, timedelta
 from supabase import Client
 import json
 from enum import Enum
+from sequence_plans import SequencePlan, shared_plans
 
 logger = logging.getLogger(__name__)
 
@@ -35,9 +36,13 @@ class OptimizedNurtureSequences:
     
     def __init__(self, supabase_client: Client):
         self.supabase = supabase_client
-        self.sequences = self._define_optimized_sequences()
         logger.info("🧠 Optimized Nurture Sequences v2.0 initialized")
     
+    @property
+    def plans(self) -> Mapping[str, SequencePlan]:
+        """Compiled sequences, built on first use only (nothing on the optimization path needs them)"""
+        return shared_plans("optimized", self._define_optimized_sequences)
+    
     def _define_optimized_sequences(self) -> Dict[str, Dict]:
         """Define optimized sequences based on behavioral analysis"""
         return {
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Participant Matcher
+In-memory matching of Google Meet participant emails to users, built once per sync run
+"""
+
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from supabase import Client
+
+from analytics_rollups import stream_rows
+
+logger = logging.getLogger(__name__)
+
+# participant_email_mapping.confidence_level -> confidence score
+MAPPING_CONFIDENCE = {'high': 0.9, 'medium': 0.7, 'low': 0.5}
+DOMAIN_MATCH_CONFIDENCE = 0.8
+
+NGRAM = 3
+# Characters PostgREST's ilike treats as wildcards (* is its URL-safe alias for %)
+LIKE_WILDCARDS = re.compile(r'[%_*]')
+
+@dataclass
+class ParticipantMatch:
+    """Represents a matched participant between Meet and our user system"""
+    meet_participant_email: str
+    user_id: Optional[str]
+    user_email: Optional[str]
+    confidence_score: float  # 0.0 to 1.0
+    match_method: str  # 'exact_email', 'domain_match', 'manual_mapping', 'no_match'
+
+def _ngrams(text: str) -> Set[str]:
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+def _like_regex(fragment: str) -> re.Pattern:
+    """Regex equivalent to ILIKE '%fragment%' (fragment is already lower case)"""
+    parts = []
+    for char in fragment:
+        if char in '%*':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile('.*' + ''.join(parts) + '.*', re.DOTALL)
+
+class ParticipantMatcher:
+    """
+    Snapshot of users and participant_email_mapping with hash and n-gram indexes
+
+    Matching follows the same order and confidence scores as the per-participant
+    queries it replaces: exact email (1.0), manual mapping (0.9 / 0.7 / 0.5), then for
+    organization addresses a users.email ILIKE '%local-part%' similarity match (0.8).
+    The similarity fallback checks the exact local part first, then narrows candidates
+    by trigram postings before confirming with the ILIKE-equivalent pattern.
+    """
+
+    def __init__(self, users: Iterable[Tuple[str, Optional[str]]],
+                 mappings: Iterable[Tuple[str, str, Optional[str]]], domain: Optional[str] = None):
+        self.domain = domain
+        self.built_at = time.time()
+
+        # Directory order (stable candidate ordering for the similarity fallback)
+        self._user_ids: List[str] = []
+        self._user_emails: List[str] = []
+        self.by_id: Dict[str, int] = {}
+        self.by_email: Dict[str, int] = {}
+        self.by_local_part: Dict[str, List[int]] = {}
+        self.ngrams: Dict[str, List[int]] = {}
+
+        for user_id, email in users:
+            if user_id in self.by_id:
+                continue
+            position = len(self._user_ids)
+            self._user_ids.append(user_id)
+            self._user_emails.append(email)
+            self.by_id[user_id] = position
+            if not email:
+                continue
+
+            self.by_email.setdefault(email, position)
+            lowered = email.lower()
+            self.by_local_part.setdefault(lowered.split('@', 1)[0], []).append(position)
+            for gram in _ngrams(lowered):
+                self.ngrams.setdefault(gram, []).append(position)
+
+        # external_email -> (user_id, confidence_level); the first mapping wins
+        self.mappings: Dict[str, Tuple[str, Optional[str]]] = {}
+        for external_email, user_id, confidence_level in mappings:
+            self.mappings.setdefault(external_email, (user_id, confidence_level))
+
+    @classmethod
+    def load(cls, supabase_client: Client, domain: Optional[str] = None,
+             user_directory=None) -> 'ParticipantMatcher':
+        """Build from the loaded UserDirectory when one is given, else from a users projection"""
+        started = time.time()
+
+        if user_directory is not None and user_directory.loaded:
+            users = [(user.id, user.email) for user in user_directory.by_id.values()]
+        else:
+            users = [
+                (row['id'], row.get('email'))
+                for row in stream_rows(lambda: supabase_client.table('users').select('id, email').order('id'))
+            ]
+
+        mappings = [
+            (row['external_email'], row['user_id'], row.get('confidence_level'))
+            for row in stream_rows(lambda: supabase_client.table('participant_email_mapping').select(
+                'id, external_email, user_id, confidence_level'
+            ).order('id'))
+        ]
+
+        matcher = cls(users, mappings, domain)
+        logger.info(f"👥 Participant matcher built: {len(users)} users, {len(mappings)} mappings "
+                    f"in {time.time() - started:.2f}s")
+        return matcher
+
+    def match(self, participant_email: str) -> ParticipantMatch:
+        email = participant_email.lower().strip()
+
+        position = self.by_email.get(email)
+        if position is not None:
+            return self._matched(email, position, 1.0, 'exact_email')
+
+        mapping = self.mappings.get(email)
+        if mapping:
+            user_id, confidence_level = mapping
+            position = self.by_id.get(user_id)
+            if position is not None:
+                return self._matched(email, position, MAPPING_CONFIDENCE.get(confidence_level, 0.5), 'manual_mapping')
+
+        if self.domain and email.endswith(f'@{self.domain}'):
+            position = self._similar_user(email.replace(f'@{self.domain}', ''))
+            if position is not None:
+                return self._matched(email, position, DOMAIN_MATCH_CONFIDENCE, 'domain_match')
+
+        return ParticipantMatch(
+            meet_participant_email=email,
+            user_id=None,
+            user_email=None,
+            confidence_score=0.0,
+            match_method='no_match'
+        )
+
+    def match_many(self, participant_emails: Iterable[str]) -> Dict[str, ParticipantMatch]:
+        """Matches keyed by the participant email as given"""
+        matches = {}
+        for email in participant_emails:
+            if email not in matches:
+                matches[email] = self.match(email)
+        return matches
+
+    def _similar_user(self, base_email: str) -> Optional[int]:
+        """First user (directory order) whose email matches ILIKE '%base_email%'"""
+        if not LIKE_WILDCARDS.search(base_email):
+            exact_local = self.by_local_part.get(base_email)
+            if exact_local:
+                return exact_local[0]
+
+        pattern = _like_regex(base_email)
+        grams = set()
+        for segment in LIKE_WILDCARDS.split(base_email):
+            grams |= _ngrams(segment)
+
+        if grams:
+            postings = sorted((self.ngrams.get(gram, []) for gram in grams), key=len)
+            if not postings[0]:
+                return None
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    return None
+            candidates = sorted(candidates)
+        else:
+            # Too short to index: scan every user with an email
+            candidates = range(len(self._user_ids))
+
+        for position in candidates:
+            email = self._user_emails[position]
+            if email and pattern.fullmatch(email.lower()):
+                return position
+        return None
+
+    def _matched(self, email: str, position: int, confidence: float, method: str) -> ParticipantMatch:
+        return ParticipantMatch(
+            meet_participant_email=email,
+            user_id=self._user_ids[position],
+            user_email=self._user_emails[position],
+            confidence_score=confidence,
+            match_method=method
+        )
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.built_at
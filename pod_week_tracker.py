@@ -9,11 +9,31 @@ import json
 
 logger = logging.getLogger(__name__)
 
+# One joined select that resolves a pod week together with its linked commitments
+POD_WEEK_AGGREGATE_SELECT = """
+    *,
+    pod_week_commitments(
+        *,
+        commitments(commitment, status, smart_score, created_at),
+        users(id, first_name, username)
+    )
+"""
+
 class PodWeekTracker:
     """Manages pod weeks and tracks commitments within pod cycles"""
     
     def __init__(self, supabase_client: Client):
         self.supabase = supabase_client
+        
+        # Per-pod, per-week aggregates keyed by (pod_id, week_number)
+        self.week_cache: Dict[Tuple[str, int], Dict] = {}
+        # pod_id -> (week_number, date the week was resolved as current)
+        self.current_week_index: Dict[str, Tuple[int, date]] = {}
+        # pod_id -> highest cached week_number
+        self.latest_week_index: Dict[str, int] = {}
+        # commitment_id -> (pod_id, week_number) for completion updates
+        self.commitment_index: Dict[str, Tuple[str, int]] = {}
+        self.cache_duration = timedelta(minutes=10)
     
     async def create_pod_week_tables(self):
         """Create necessary tables for pod week tracking"""
@@ -31,11 +51,17 @@ class PodWeekTracker:
         try:
             current_date = date.today()
             
-            # Find current week
-            result = self.supabase.table("pod_weeks").select("*").eq("pod_id", pod_id).lte("week_start_date", current_date.isoformat()).gte("week_end_date", current_date.isoformat()).execute()
+            # Serve from the aggregate cache when this week was already resolved today
+            cached = self._get_cached_week(pod_id, current=True)
+            if cached:
+                return cached["pod_week"]
+            
+            # Find current week (joined with its commitments to repair the cache)
+            result = self.supabase.table("pod_weeks").select(POD_WEEK_AGGREGATE_SELECT).eq("pod_id", pod_id).lte("week_start_date", current_date.isoformat()).gte("week_end_date", current_date.isoformat()).execute()
             
             if result.data:
-                return result.data[0]
+                aggregate = self._store_week_aggregate(pod_id, result.data[0], current=True)
+                return aggregate["pod_week"]
             
             # If no current week, create one
             return await self._create_current_week(pod_id)
@@ -94,7 +120,10 @@ class PodWeekTracker:
             
             if result.data:
                 logger.info(f"Created new pod week {week_number} for pod {pod_id}")
-                return result.data[0]
+                
+                # Warm the aggregate cache - a new week has no commitments yet
+                aggregate = self._store_week_aggregate(pod_id, {**result.data[0], "pod_week_commitments": []}, current=True)
+                return aggregate["pod_week"]
             
         except Exception as e:
             logger.error(f"Error creating current week: {e}")
@@ -122,6 +151,20 @@ class PodWeekTracker:
             
             if result.data:
                 logger.info(f"Linked commitment {commitment_id} to pod week {pod_week['week_number']}")
+                
+                # Fetch the joined row once so the cached aggregate stays complete
+                link_result = self.supabase.table("pod_week_commitments").select("""
+                    *,
+                    commitments(commitment, status, smart_score, created_at),
+                    users(id, first_name, username)
+                """).eq("id", result.data[0]["id"]).execute()
+                
+                aggregate = self.week_cache.get((pod_id, pod_week["week_number"]))
+                if aggregate and link_result.data:
+                    self._add_commitment_to_aggregate(aggregate, link_result.data[0])
+                else:
+                    self.invalidate_pod_week_cache(pod_id)
+                
                 return True
                 
         except Exception as e:
@@ -129,29 +172,138 @@ class PodWeekTracker:
             
         return False
     
+    def mark_commitment_completed(self, commitment_id: str) -> None:
+        """Update cached pod week aggregates after a commitment is completed"""
+        key = self.commitment_index.get(commitment_id)
+        if not key or key not in self.week_cache:
+            return
+        
+        aggregate = self.week_cache[key]
+        for link in aggregate["commitments"]:
+            if link.get("commitment_id") != commitment_id:
+                continue
+            
+            commit_data = link.get("commitments") or {}
+            if commit_data.get("status") != "completed":
+                commit_data["status"] = "completed"
+                link["commitments"] = commit_data
+                member = aggregate["members"].get(link["user_id"])
+                if member:
+                    member["completed_commitments"] += 1
+    
+    def invalidate_pod_week_cache(self, pod_id: Optional[str] = None) -> None:
+        """Drop cached pod week aggregates for one pod (or all pods)"""
+        keys = [key for key in self.week_cache if pod_id is None or key[0] == pod_id]
+        for key in keys:
+            del self.week_cache[key]
+        
+        self.commitment_index = {
+            commitment_id: key for commitment_id, key in self.commitment_index.items()
+            if key in self.week_cache
+        }
+        
+        if pod_id is None:
+            self.current_week_index.clear()
+            self.latest_week_index.clear()
+        else:
+            self.current_week_index.pop(pod_id, None)
+            self.latest_week_index.pop(pod_id, None)
+    
+    def _get_cached_week(self, pod_id: str, week_number: Optional[int] = None, current: bool = False) -> Optional[Dict]:
+        """Return a fresh cached aggregate for the requested pod week, if any"""
+        if current:
+            current_entry = self.current_week_index.get(pod_id)
+            if not current_entry or current_entry[1] != date.today():
+                return None
+            week_number = current_entry[0]
+        elif week_number is None:
+            week_number = self.latest_week_index.get(pod_id)
+            if week_number is None:
+                return None
+        
+        aggregate = self.week_cache.get((pod_id, week_number))
+        if not aggregate or datetime.now() - aggregate["loaded_at"] > self.cache_duration:
+            return None
+        
+        return aggregate
+    
+    async def _load_week_aggregate(self, pod_id: str, week_number: Optional[int] = None) -> Optional[Dict]:
+        """Resolve a pod week (by number, or the latest) from cache, repairing it with one joined query"""
+        cached = self._get_cached_week(pod_id, week_number)
+        if cached:
+            return cached
+        
+        query = self.supabase.table("pod_weeks").select(POD_WEEK_AGGREGATE_SELECT).eq("pod_id", pod_id)
+        if week_number:
+            query = query.eq("week_number", week_number)
+        else:
+            query = query.order("week_number", desc=True).limit(1)
+        
+        result = query.execute()
+        if not result.data:
+            return None
+        
+        return self._store_week_aggregate(pod_id, result.data[0])
+    
+    def _store_week_aggregate(self, pod_id: str, pod_week_row: Dict, current: bool = False) -> Dict:
+        """Build and cache the aggregate for a pod week row with embedded commitments"""
+        pod_week = {k: v for k, v in pod_week_row.items() if k != "pod_week_commitments"}
+        week_number = pod_week["week_number"]
+        
+        aggregate = {
+            "pod_week": pod_week,
+            "commitments": [],
+            "members": {},
+            "loaded_at": datetime.now()
+        }
+        
+        links = sorted(pod_week_row.get("pod_week_commitments") or [], key=lambda c: c.get("created_at") or "")
+        for link in links:
+            self._add_commitment_to_aggregate(aggregate, link)
+        
+        self.week_cache[(pod_id, week_number)] = aggregate
+        if week_number >= self.latest_week_index.get(pod_id, 0):
+            self.latest_week_index[pod_id] = week_number
+        if current:
+            self.current_week_index[pod_id] = (week_number, date.today())
+        
+        return aggregate
+    
+    def _add_commitment_to_aggregate(self, aggregate: Dict, link: Dict) -> None:
+        """Add one joined pod_week_commitments row to an aggregate's member stats"""
+        user_id = link["user_id"]
+        user_data = link.get("users") or {}
+        commit_data = link.get("commitments") or {}
+        
+        aggregate["commitments"].append(link)
+        if link.get("commitment_id"):
+            pod_week = aggregate["pod_week"]
+            self.commitment_index[link["commitment_id"]] = (pod_week["pod_id"], pod_week["week_number"])
+        
+        if user_id not in aggregate["members"]:
+            aggregate["members"][user_id] = {
+                "first_name": user_data.get("first_name"),
+                "username": user_data.get("username"),
+                "total_commitments": 0,
+                "completed_commitments": 0,
+                "smart_scores": []
+            }
+        
+        member = aggregate["members"][user_id]
+        member["total_commitments"] += 1
+        if commit_data.get("status") == "completed":
+            member["completed_commitments"] += 1
+        if commit_data.get("smart_score"):
+            member["smart_scores"].append(commit_data["smart_score"])
+    
     async def get_pod_week_commitments(self, pod_id: str, week_number: Optional[int] = None) -> List[Dict]:
         """Get all commitments for a pod week"""
         try:
-            # Get pod week
-            if week_number:
-                pod_week_query = self.supabase.table("pod_weeks").select("*").eq("pod_id", pod_id).eq("week_number", week_number)
-            else:
-                pod_week_query = self.supabase.table("pod_weeks").select("*").eq("pod_id", pod_id).order("week_number", desc=True).limit(1)
-            
-            pod_week_result = pod_week_query.execute()
-            if not pod_week_result.data:
+            aggregate = await self._load_week_aggregate(pod_id, week_number)
+            if not aggregate:
                 return []
             
-            pod_week = pod_week_result.data[0]
-            
-            # Get commitments for this week using Supabase joins
-            result = self.supabase.table("pod_week_commitments").select("""
-                *,
-                commitments(commitment, status, smart_score, created_at),
-                users(first_name, username)
-            """).eq("pod_week_id", pod_week["id"]).order("created_at").execute()
-            
-            return result.data if result.data else []
+            return list(aggregate["commitments"])
             
         except Exception as e:
             logger.error(f"Error getting pod week commitments: {e}")
@@ -164,13 +316,9 @@ class PodWeekTracker:
             if not pod_week:
                 return {}
             
-            # Get user's commitments for this week
-            user_commitments = self.supabase.table("pod_week_commitments").select("""
-                *,
-                commitments(commitment, status, smart_score, created_at)
-            """).eq("pod_week_id", pod_week["id"]).eq("user_id", user_id).execute()
-            
-            commitments_data = user_commitments.data if user_commitments.data else []
+            # User's commitments for this week come from the cached aggregate
+            aggregate = self.week_cache.get((pod_id, pod_week["week_number"]), {})
+            commitments_data = [c for c in aggregate.get("commitments", []) if str(c["user_id"]) == str(user_id)]
             
             total_commitments = len(commitments_data)
             completed_commitments = len([c for c in commitments_data if c["commitments"]["status"] == "completed"])
@@ -197,50 +345,17 @@ class PodWeekTracker:
     async def get_pod_week_leaderboard(self, pod_id: str, week_number: Optional[int] = None) -> List[Dict]:
         """Get leaderboard for pod week"""
         try:
-            pod_week = await self.get_current_pod_week(pod_id) if not week_number else None
-            if not pod_week and not week_number:
-                return []
-            
-            # Get all users' performance for this week
             if week_number:
-                pod_week_query = self.supabase.table("pod_weeks").select("id").eq("pod_id", pod_id).eq("week_number", week_number)
+                aggregate = await self._load_week_aggregate(pod_id, week_number)
             else:
-                pod_week_query = self.supabase.table("pod_weeks").select("id").eq("pod_id", pod_id).order("week_number", desc=True).limit(1)
+                pod_week = await self.get_current_pod_week(pod_id)
+                aggregate = self.week_cache.get((pod_id, pod_week["week_number"])) if pod_week else None
             
-            pod_week_result = pod_week_query.execute()
-            if not pod_week_result.data:
+            if not aggregate:
                 return []
             
-            pod_week_id = pod_week_result.data[0]["id"]
-            
-            # Get pod week commitments with user and commitment data
-            commitments_result = self.supabase.table("pod_week_commitments").select("""
-                *,
-                users(first_name, username, id),
-                commitments(status, smart_score)
-            """).eq("pod_week_id", pod_week_id).execute()
-            
-            # Aggregate user performance
-            user_stats = {}
-            for commitment in commitments_result.data:
-                user_id = commitment["user_id"]
-                user_data = commitment["users"]
-                commit_data = commitment["commitments"]
-                
-                if user_id not in user_stats:
-                    user_stats[user_id] = {
-                        "first_name": user_data["first_name"],
-                        "username": user_data["username"],
-                        "total_commitments": 0,
-                        "completed_commitments": 0,
-                        "smart_scores": []
-                    }
-                
-                user_stats[user_id]["total_commitments"] += 1
-                if commit_data["status"] == "completed":
-                    user_stats[user_id]["completed_commitments"] += 1
-                if commit_data["smart_score"]:
-                    user_stats[user_id]["smart_scores"].append(commit_data["smart_score"])
+            # User performance is pre-aggregated in the cache
+            user_stats = aggregate["members"]
             
             # Calculate scores and rankings
             leaderboard = []
@@ -0,0 +1,131 @@
+# Request-Scoped Query Memoisation for The Progress Method
+# Dedups identical queries within one request or scheduled job (contextvar based)
+
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+class RequestMemo:
+    """Per-request memo of query results; concurrent identical lookups share one fetch task"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.monotonic()
+        self._futures: Dict[Hashable, asyncio.Task] = {}
+        self.round_trips = 0
+        self.saved_round_trips = 0
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        """Return the memoised result for key, running fetch only for the first caller"""
+        task = self._futures.get(key)
+        if task is not None:
+            self.saved_round_trips += 1
+        else:
+            # The fetch runs as its own task so a cancelled caller doesn't cancel the other waiters
+            task = asyncio.ensure_future(self._fetch(key, fetch))
+            task.add_done_callback(_retrieve_exception)
+            self._futures[key] = task
+            self.round_trips += 1
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        try:
+            result = fetch()
+            if inspect.isawaitable(result):
+                result = await result
+        except BaseException:
+            # Failed lookups are not memoised - the next caller retries
+            self._futures.pop(key, None)
+            raise
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "scope": self.name,
+            "round_trips": self.round_trips,
+            "saved_round_trips": self.saved_round_trips,
+            "distinct_queries": len(self._futures),
+            "duration_ms": round((time.monotonic() - self.started_at) * 1000, 1)
+        }
+
+def _retrieve_exception(task: asyncio.Future) -> None:
+    # Every waiter may have been cancelled; mark a failed fetch's exception retrieved
+    if not task.cancelled():
+        task.exception()
+
+_current_memo: ContextVar[Optional[RequestMemo]] = ContextVar("request_memo", default=None)
+
+def current_memo() -> Optional[RequestMemo]:
+    """The memo of the active request scope, if any"""
+    return _current_memo.get()
+
+@asynccontextmanager
+async def request_scope(name: str):
+    """Open a memo scope; nested scopes reuse the outer one"""
+    existing = _current_memo.get()
+    if existing is not None:
+        yield existing
+        return
+
+    memo = RequestMemo(name)
+    token = _current_memo.set(memo)
+    try:
+        yield memo
+    finally:
+        _current_memo.reset(token)
+        stats = memo.get_stats()
+        if stats["saved_round_trips"]:
+            logger.info(f"🧠 {name}: {stats['round_trips']} queries, {stats['saved_round_trips']} round trips saved by request memo")
+
+def request_scoped(name: Optional[str] = None):
+    """Decorator running an async function (endpoint, scheduled job) inside a memo scope"""
+    def decorator(func):
+        scope_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            async with request_scope(scope_name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+async def memoize(key: Hashable, fetch: Callable[[], Any]) -> Any:
+    """Run fetch through the active memo scope (or directly when there is none)"""
+    memo = _current_memo.get()
+    if memo is None:
+        result = fetch()
+        return await result if inspect.isawaitable(result) else result
+    return await memo.get_or_fetch(key, fetch)
+
+def _query_key(query) -> Optional[Hashable]:
+    """Identity of a postgrest request builder: method, path, params and Prefer header"""
+    try:
+        return (
+            getattr(query, "http_method", "GET"),
+            str(query.path),
+            str(query.params),
+            query.headers.get("prefer", "") if hasattr(query, "headers") else ""
+        )
+    except AttributeError:
+        return None
+
+async def memo_execute(query) -> Any:
+    """Execute a Supabase query builder, deduplicated within the active request scope"""
+    key = _query_key(query)
+    if key is None:
+        return query.execute()
+    return await memoize(("query",) + key, query.execute)
+
+def add_request_memo_middleware(app):
+    """Give every HTTP request of a FastAPI app its own memo scope"""
+    @app.middleware("http")
+    async def request_memo_middleware(request, call_next):
+        async with request_scope(f"{request.method} {request.url.path}"):
+            return await call_next(request)
@@ -0,0 +1,147 @@
+# Compiled Nurture Sequence Plans for The Progress Method
+# Sequence definitions are validated and compiled once into immutable plans shared by every controller
+
+import logging
+import re
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+def tokenize_template(text: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """Split a message into (literal, placeholder) pairs; the last pair has no placeholder"""
+    parts = []
+    position = 0
+    for match in PLACEHOLDER.finditer(text):
+        parts.append((text[position:match.start()], match.group(1)))
+        position = match.end()
+    parts.append((text[position:], None))
+    return tuple(parts)
+
+@dataclass(frozen=True)
+class StepPlan:
+    """One message of a sequence, with its timing resolved"""
+    index: int
+    delay_hours: float                 # after the previous step
+    offset_hours: float                # after the sequence started
+    message: str
+    condition: Optional[str]
+    is_template: bool
+    tokens: Tuple[Tuple[str, Optional[str]], ...]
+    data: Mapping[str, Any]            # the original definition (read-only)
+
+    @property
+    def placeholders(self) -> Tuple[str, ...]:
+        return tuple(name for _, name in self.tokens if name)
+
+    def render(self, variables: Dict[str, Any]) -> str:
+        """Substitute known placeholders; unknown ones are left as written"""
+        return "".join(
+            literal if name is None else literal + (str(variables[name]) if name in variables else "{" + name + "}")
+            for literal, name in self.tokens
+        )
+
+@dataclass(frozen=True)
+class SequencePlan:
+    """A validated sequence: steps in order plus the indexes callers used to rebuild per call"""
+    key: str
+    name: str
+    trigger: Optional[str]
+    steps: Tuple[StepPlan, ...]
+    immediate_steps: Tuple[int, ...]   # indexes of steps with no delay
+    conditions: frozenset              # every condition id used by the steps
+    data: Mapping[str, Any]
+
+    @property
+    def duration_hours(self) -> float:
+        return self.steps[-1].offset_hours if self.steps else 0.0
+
+    def step(self, index: int) -> Optional[StepPlan]:
+        """Step at `index`, or None once the sequence is finished"""
+        return self.steps[index] if 0 <= index < len(self.steps) else None
+
+def compile_sequence(key: str, definition: Dict[str, Any], known_conditions: Optional[Iterable[str]] = None) -> SequencePlan:
+    """Validate one sequence definition and compile it; raises ValueError on a bad definition"""
+    known = frozenset(known_conditions) if known_conditions is not None else None
+
+    name = definition.get("name")
+    if not isinstance(name, str) or not name:
+        raise ValueError(f"Sequence '{key}' has no name")
+
+    messages = definition.get("messages")
+    if not isinstance(messages, list) or not messages:
+        raise ValueError(f"Sequence '{key}' has no messages")
+
+    steps = []
+    offset = 0.0
+    for index, message_data in enumerate(messages):
+        where = f"Sequence '{key}' step {index}"
+
+        delay = message_data.get("delay_hours")
+        if isinstance(delay, bool) or not isinstance(delay, (int, float)) or delay < 0:
+            raise ValueError(f"{where}: delay_hours must be a non-negative number, got {delay!r}")
+
+        text = message_data.get("message")
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError(f"{where}: empty message")
+
+        condition = message_data.get("condition")
+        if condition is not None:
+            if not isinstance(condition, str) or not condition:
+                raise ValueError(f"{where}: condition must be a condition id, got {condition!r}")
+            if known is not None and condition not in known:
+                raise ValueError(f"{where}: unknown condition '{condition}'")
+
+        offset += delay
+        steps.append(StepPlan(
+            index=index,
+            delay_hours=float(delay),
+            offset_hours=offset,
+            message=text,
+            condition=condition,
+            is_template=bool(message_data.get("template")),
+            tokens=tokenize_template(text),
+            data=MappingProxyType(dict(message_data))
+        ))
+
+    return SequencePlan(
+        key=key,
+        name=name,
+        trigger=definition.get("trigger"),
+        steps=tuple(steps),
+        immediate_steps=tuple(step.index for step in steps if step.delay_hours == 0),
+        conditions=frozenset(step.condition for step in steps if step.condition),
+        data=MappingProxyType({k: v for k, v in definition.items() if k != "messages"})
+    )
+
+def compile_sequences(definitions: Dict[str, Dict[str, Any]],
+                      known_conditions: Optional[Iterable[str]] = None) -> Mapping[str, SequencePlan]:
+    """Compile every definition; all errors are reported together"""
+    known = frozenset(known_conditions) if known_conditions is not None else None
+    plans = {}
+    errors = []
+    for key, definition in definitions.items():
+        try:
+            plans[key] = compile_sequence(key, definition, known)
+        except ValueError as e:
+            errors.append(str(e))
+
+    if errors:
+        raise ValueError("Invalid nurture sequences:\n" + "\n".join(errors))
+    return MappingProxyType(plans)
+
+# Compiled plan sets by name, so every controller instance shares one copy
+_plan_sets: Dict[str, Mapping[str, SequencePlan]] = {}
+
+def shared_plans(name: str, define: Callable[[], Dict[str, Dict[str, Any]]],
+                 known_conditions: Optional[Iterable[str]] = None) -> Mapping[str, SequencePlan]:
+    """Compile the definitions from `define` on first use and return the shared plans afterwards"""
+    plans = _plan_sets.get(name)
+    if plans is None:
+        plans = compile_sequences(define(), known_conditions)
+        _plan_sets[name] = plans
+        logger.info(f"🧩 Compiled {len(plans)} '{name}' nurture sequence plans")
+    return plans
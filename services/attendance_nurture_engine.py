@@ -6,7 +6,7 @@ Connects meeting attendance data to automated nurture sequences
 
 import asyncio
 import logging
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta, date, timezone
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from enum import Enum
@@ -16,9 +16,14 @@ from supabase import create_client, Client
 from nurture_sequences import NurtureSequences, SequenceType
 from pod_weekly_nurture import PodWeeklyNurture, WeeklyMoment
 from safety_controls import safety_controls
+from analytics_rollups import stream_rows
 
 logger = logging.getLogger(__name__)
 
+# Users (or pods) per history query, and the streak length whose end triggers a nudge
+HISTORY_BATCH_SIZE = 200
+MIN_STREAK_LENGTH = 3
+
 class AttendanceTrigger(Enum):
     """Attendance events that trigger nurture sequences"""
     FIRST_MEETING_ATTENDED = "first_meeting_attended"
@@ -108,51 +113,61 @@ class AttendanceNurtureEngine:
         return stats
     
     async def _get_attendance_data(self, sync_date: date) -> List[Dict[str, Any]]:
-        """Get attendance data for analysis"""
+        """Get attendance data for analysis (a fixed number of queries for the whole day)"""
         
         try:
             # Get meetings for the date
             meetings_result = self.supabase.table('pod_meetings').select(
-                'id, pod_id, meeting_date, status, created_at'
+                'id, pod_id, meeting_date, meeting_time, status, created_at'
             ).eq('meeting_date', sync_date.isoformat()).execute()
             
             meetings = meetings_result.data
             logger.info(f"📋 Found {len(meetings)} meetings for {sync_date}")
             
-            attendance_data = []
-            
-            for meeting in meetings:
-                # Get attendance records for this meeting
-                attendance_result = self.supabase.table('meeting_attendance').select(
-                    'user_id, attended, duration_minutes'
-                ).eq('meeting_id', meeting['id']).execute()
-                
-                # Get Meet session data if available
-                try:
-                    meet_sessions_result = self.supabase.table('meet_sessions').select(
-                        'meet_code, session_start, session_end, participant_count'
-                    ).eq('meeting_id', meeting['id']).execute()
-                except Exception as e:
-                    logger.debug(f"Meet sessions query failed (table may not exist): {e}")
-                    meet_sessions_result = type('MockResult', (), {'data': []})  # Empty result
-                
-                # Get Meet participants if available
-                try:
-                    meet_participants_result = self.supabase.table('meet_participants').select(
-                        'email, joined_at, left_at, duration_minutes'
-                    ).eq('meeting_id', meeting['id']).execute()
-                except Exception as e:
-                    logger.debug(f"Meet participants query failed (table may not exist): {e}")
-                    meet_participants_result = type('MockResult', (), {'data': []})  # Empty result
+            if not meetings:
+                return []
+            
+            meeting_ids = [meeting['id'] for meeting in meetings]
+            
+            # Attendance records for every meeting of the day
+            attendance_by_meeting: Dict[str, List[Dict[str, Any]]] = {}
+            attendance_query = lambda: self.supabase.table('meeting_attendance').select(
+                'id, meeting_id, user_id, attended, duration_minutes'
+            ).in_('meeting_id', meeting_ids).order('id')
+            for record in stream_rows(attendance_query):
+                attendance_by_meeting.setdefault(record['meeting_id'], []).append(record)
+            
+            # Meet sessions and their participants, if the Meet tables exist
+            sessions_by_meeting: Dict[str, List[Dict[str, Any]]] = {}
+            participants_by_meeting: Dict[str, List[Dict[str, Any]]] = {}
+            try:
+                sessions_result = self.supabase.table('meet_sessions').select(
+                    'id, meeting_id, meet_code, started_at, ended_at, participant_count'
+                ).in_('meeting_id', meeting_ids).execute()
+                session_meetings = {}
+                for session in sessions_result.data or []:
+                    sessions_by_meeting.setdefault(session['meeting_id'], []).append(session)
+                    session_meetings[session['id']] = session['meeting_id']
                 
-                attendance_data.append({
-                    'meeting': meeting,
-                    'attendance_records': attendance_result.data,
-                    'meet_sessions': meet_sessions_result.data,
-                    'meet_participants': meet_participants_result.data
-                })
+                if session_meetings:
+                    participants_query = lambda: self.supabase.table('meet_participants').select(
+                        'id, meet_session_id, email:participant_email, joined_at, left_at, duration_minutes'
+                    ).in_('meet_session_id', list(session_meetings)).order('id')
+                    for participant in stream_rows(participants_query):
+                        meeting_id = session_meetings[participant['meet_session_id']]
+                        participants_by_meeting.setdefault(meeting_id, []).append(participant)
+            except Exception as e:
+                logger.debug(f"Meet session data unavailable (tables may not exist): {e}")
             
-            return attendance_data
+            return [
+                {
+                    'meeting': meeting,
+                    'attendance_records': attendance_by_meeting.get(meeting['id'], []),
+                    'meet_sessions': sessions_by_meeting.get(meeting['id'], []),
+                    'meet_participants': participants_by_meeting.get(meeting['id'], [])
+                }
+                for meeting in meetings
+            ]
             
         except Exception as e:
             logger.error(f"❌ Error getting attendance data: {e}")
@@ -162,36 +177,44 @@ class AttendanceNurtureEngine:
         """Analyze attendance patterns and generate trigger events"""
         
         events = []
+        if not attendance_data:
+            return events
+        
+        # Members of every pod meeting today, the pods' meeting schedules and the members'
+        # attended meetings, up front; a scheduled meeting without an attended record is a miss
+        members_by_pod = await self._get_members_by_pod({data['meeting']['pod_id'] for data in attendance_data})
+        last_day = max(data['meeting']['meeting_date'] for data in attendance_data)
+        schedules = self._get_pod_schedules(list(members_by_pod), self._week_end(last_day))
+        attended_meetings = self._get_attended_meetings({
+            member['user_id'] for members in members_by_pod.values() for member in members
+        })
         
         for meeting_data in attendance_data:
             meeting = meeting_data['meeting']
-            attendance_records = meeting_data['attendance_records']
-            meet_participants = meeting_data['meet_participants']
             
-            # Get pod members for this meeting
-            pod_members = await self._get_pod_members(meeting['pod_id'])
+            # Per-meeting indexes; the first record per key wins, as with a linear scan
+            attendance_by_user: Dict[str, Dict[str, Any]] = {}
+            for record in meeting_data['attendance_records']:
+                attendance_by_user.setdefault(record['user_id'], record)
+            participants_by_email: Dict[str, Dict[str, Any]] = {}
+            for participant in meeting_data['meet_participants']:
+                participants_by_email.setdefault(participant['email'], participant)
             
-            for member in pod_members:
+            for member in members_by_pod.get(meeting['pod_id'], []):
                 user_id = member['user_id']
+                schedule = schedules.get(meeting['pod_id'], [])
+                attended = attended_meetings.get(user_id, set())
                 
                 # Check if user attended
-                user_attendance = next(
-                    (record for record in attendance_records if record['user_id'] == user_id),
-                    None
-                )
-                
-                user_meet_data = next(
-                    (participant for participant in meet_participants 
-                     if participant['email'] == member.get('email')),
-                    None
-                )
+                user_attendance = attendance_by_user.get(user_id)
+                user_meet_data = participants_by_email.get(member.get('email'))
                 
                 # Generate attendance events based on patterns
                 if user_attendance and user_attendance['attended']:
                     # User attended - check for patterns
                     
                     # Check if this is their first meeting
-                    if await self._is_first_meeting_attendance(user_id):
+                    if self._is_first_meeting_attendance(attended):
                         events.append(AttendanceEvent(
                             user_id=user_id,
                             trigger_type=AttendanceTrigger.FIRST_MEETING_ATTENDED,
@@ -206,7 +229,10 @@ class AttendanceNurtureEngine:
                     # Check arrival time (if Meet data available)
                     if user_meet_data and user_meet_data.get('joined_at'):
                         join_time = datetime.fromisoformat(user_meet_data['joined_at'])
-                        meeting_time = datetime.fromisoformat(f"{meeting['meeting_date']}T{meeting.get('meeting_time', '18:00:00')}")
+                        if join_time.tzinfo:
+                            # Meetings are scheduled in UTC
+                            join_time = join_time.astimezone(timezone.utc).replace(tzinfo=None)
+                        meeting_time = datetime.fromisoformat(f"{meeting['meeting_date']}T{meeting.get('meeting_time') or '18:00:00'}")
                         
                         minutes_early = (meeting_time - join_time).total_seconds() / 60
                         
@@ -234,7 +260,7 @@ class AttendanceNurtureEngine:
                             ))
                     
                     # Check for perfect week attendance
-                    if await self._check_perfect_week_attendance(user_id, meeting['meeting_date']):
+                    if self._check_perfect_week_attendance(schedule, attended, meeting['meeting_date']):
                         events.append(AttendanceEvent(
                             user_id=user_id,
                             trigger_type=AttendanceTrigger.WEEK_PERFECT_ATTENDANCE,
@@ -257,13 +283,14 @@ class AttendanceNurtureEngine:
                     ))
                     
                     # Check if this breaks a streak
-                    if await self._check_streak_broken(user_id):
+                    previous_streak = self._get_previous_streak(schedule, attended, meeting['meeting_date'])
+                    if self._check_streak_broken(previous_streak):
                         events.append(AttendanceEvent(
                             user_id=user_id,
                             trigger_type=AttendanceTrigger.STREAK_BROKEN,
                             meeting_id=meeting['id'],
                             event_time=datetime.now(),
-                            metadata={'previous_streak_length': await self._get_previous_streak(user_id)}
+                            metadata={'previous_streak_length': previous_streak}
                         ))
         
         logger.info(f"📊 Generated {len(events)} attendance events")
@@ -528,16 +555,17 @@ Your next meeting is your comeback moment. Ready to start a new streak? 🔥"""
     
     # Helper methods for attendance pattern analysis
     
-    async def _get_pod_members(self, pod_id: str) -> List[Dict[str, Any]]:
-        """Get all members of a pod"""
+    async def _get_all_active_pod_members(self) -> List[Dict[str, Any]]:
+        """Get all active pod members across all pods"""
         try:
             result = self.supabase.table('pod_memberships').select(
-                'user_id, users(telegram_user_id, first_name, email)'
-            ).eq('pod_id', pod_id).execute()
+                'user_id, pod_id, users(telegram_user_id, first_name, email)'
+            ).execute()
             
             return [
                 {
                     'user_id': member['user_id'],
+                    'pod_id': member['pod_id'],
                     'telegram_user_id': member['users']['telegram_user_id'],
                     'first_name': member['users']['first_name'],
                     'email': member['users']['email']
@@ -545,75 +573,100 @@ Your next meeting is your comeback moment. Ready to start a new streak? 🔥"""
                 for member in result.data
             ]
         except Exception as e:
-            logger.error(f"❌ Error getting pod members: {e}")
+            logger.error(f"❌ Error getting all pod members: {e}")
             return []
     
-    async def _get_all_active_pod_members(self) -> List[Dict[str, Any]]:
-        """Get all active pod members across all pods"""
+    async def _get_members_by_pod(self, pod_ids) -> Dict[str, List[Dict[str, Any]]]:
+        """Members of several pods in one query, grouped by pod"""
+        members_by_pod: Dict[str, List[Dict[str, Any]]] = {pod_id: [] for pod_id in pod_ids}
+        if not members_by_pod:
+            return members_by_pod
         try:
-            result = self.supabase.table('pod_memberships').select(
-                'user_id, pod_id, users(telegram_user_id, first_name, email)'
-            ).execute()
-            
-            return [
-                {
+            query_factory = lambda: self.supabase.table('pod_memberships').select(
+                'id, user_id, pod_id, users(telegram_user_id, first_name, email)'
+            ).in_('pod_id', list(members_by_pod)).order('id')
+            for member in stream_rows(query_factory):
+                members_by_pod[member['pod_id']].append({
                     'user_id': member['user_id'],
-                    'pod_id': member['pod_id'],
                     'telegram_user_id': member['users']['telegram_user_id'],
                     'first_name': member['users']['first_name'],
                     'email': member['users']['email']
-                }
-                for member in result.data
-            ]
+                })
         except Exception as e:
-            logger.error(f"❌ Error getting all pod members: {e}")
-            return []
+            logger.error(f"❌ Error getting pod members: {e}")
+        return members_by_pod
     
-    async def _is_first_meeting_attendance(self, user_id: str) -> bool:
+    def _get_pod_schedules(self, pod_ids, until: str) -> Dict[str, List[Tuple[str, str]]]:
+        """(meeting_date, meeting_id) of every meeting each pod held or scheduled up to `until`, oldest first"""
+        schedules: Dict[str, List[Tuple[str, str]]] = {}
+        for start in range(0, len(pod_ids), HISTORY_BATCH_SIZE):
+            batch = pod_ids[start:start + HISTORY_BATCH_SIZE]
+            query_factory = lambda: self.supabase.table('pod_meetings').select(
+                'id, pod_id, meeting_date, status'
+            ).in_('pod_id', batch).lte('meeting_date', until).order('id')
+            try:
+                for meeting in stream_rows(query_factory):
+                    if meeting.get('status') == 'cancelled':
+                        continue
+                    schedules.setdefault(meeting['pod_id'], []).append((meeting['meeting_date'], meeting['id']))
+            except Exception as e:
+                logger.error(f"❌ Error getting pod meeting schedules: {e}")
+        
+        for schedule in schedules.values():
+            schedule.sort()
+        return schedules
+    
+    def _get_attended_meetings(self, user_ids) -> Dict[str, set]:
+        """Ids of the meetings each user attended, for all users in a few queries"""
+        attended: Dict[str, set] = {}
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), HISTORY_BATCH_SIZE):
+            batch = user_ids[start:start + HISTORY_BATCH_SIZE]
+            query_factory = lambda: self.supabase.table('meeting_attendance').select(
+                'id, user_id, meeting_id'
+            ).in_('user_id', batch).eq('attended', True).order('id')
+            try:
+                for record in stream_rows(query_factory):
+                    attended.setdefault(record['user_id'], set()).add(record['meeting_id'])
+            except Exception as e:
+                logger.error(f"❌ Error getting attendance history: {e}")
+        return attended
+    
+    @staticmethod
+    def _week_end(meeting_date: str) -> str:
+        date_obj = datetime.strptime(meeting_date, '%Y-%m-%d').date()
+        return (date_obj + timedelta(days=6 - date_obj.weekday())).isoformat()
+    
+    def _is_first_meeting_attendance(self, attended: set) -> bool:
         """Check if this is user's first meeting attendance"""
-        try:
-            result = self.supabase.table('meeting_attendance').select('id').eq(
-                'user_id', user_id
-            ).eq('attended', True).execute()
-            
-            return len(result.data) == 1  # Only one attendance record (this one)
-        except:
-            return False
+        return len(attended) == 1  # Only one attended meeting (this one)
     
-    async def _check_perfect_week_attendance(self, user_id: str, meeting_date: str) -> bool:
-        """Check if user has perfect attendance for the week"""
-        try:
-            # Get start of week (Monday)
-            date_obj = datetime.strptime(meeting_date, '%Y-%m-%d').date()
-            week_start = date_obj - timedelta(days=date_obj.weekday())
-            week_end = week_start + timedelta(days=6)
-            
-            # Get all meetings for user this week
-            result = self.supabase.table('meeting_attendance').select(
-                'attended'
-            ).eq('user_id', user_id).gte(
-                'meeting_date', week_start.isoformat()
-            ).lte(
-                'meeting_date', week_end.isoformat()
-            ).execute()
-            
-            if not result.data:
-                return False
-            
-            # Check if all attended
-            return all(record['attended'] for record in result.data)
-        except:
+    def _check_perfect_week_attendance(self, schedule: List[Tuple[str, str]], attended: set, meeting_date: str) -> bool:
+        """Attended every meeting the pod holds in the week of `meeting_date`, checked at its last one"""
+        # Get start of week (Monday)
+        date_obj = datetime.strptime(meeting_date, '%Y-%m-%d').date()
+        week_start = (date_obj - timedelta(days=date_obj.weekday())).isoformat()
+        week_end = self._week_end(meeting_date)
+        
+        week = [(day, meeting_id) for day, meeting_id in schedule if week_start <= day <= week_end]
+        if not week or week[-1][0] != meeting_date:
             return False
+        return all(meeting_id in attended for _, meeting_id in week)
     
-    async def _check_streak_broken(self, user_id: str) -> bool:
+    def _check_streak_broken(self, previous_streak: int) -> bool:
         """Check if user's attendance streak was broken"""
-        # Simplified - in production would track streaks in separate table
-        return False
+        return previous_streak >= MIN_STREAK_LENGTH
     
-    async def _get_previous_streak(self, user_id: str) -> int:
-        """Get user's previous attendance streak length"""
-        # Simplified - would calculate from attendance history
-        return 3
+    def _get_previous_streak(self, schedule: List[Tuple[str, str]], attended: set, meeting_date: str) -> int:
+        """Consecutive scheduled meetings attended before `meeting_date`"""
+        streak = 0
+        for day, meeting_id in reversed(schedule):
+            if day >= meeting_date:
+                continue
+            if meeting_id not in attended:
+                break
+            streak += 1
+        return streak
     
     # Weekly nurture message generators
     
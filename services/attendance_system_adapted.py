@@ -14,6 +14,8 @@ from enum import Enum
 import uuid
 from supabase import Client
 
+from attendance_matrix import AttendanceMatrix, ABSENT, ATTENDED, band, first_match, ratio
+
 logger = logging.getLogger(__name__)
 
 class AttendanceStatus(Enum):
@@ -36,6 +38,11 @@ class AttendancePattern(Enum):
     FREQUENT_MISSER = "frequent_misser"      # 20-50% attendance
     GHOST_MEMBER = "ghost_member"            # <20% attendance
 
+# Attendance rate cutoffs for the patterns above, lowest band first
+PATTERN_CUTOFFS = (0.20, 0.50, 0.80, 0.95)
+PATTERN_BANDS = (AttendancePattern.GHOST_MEMBER, AttendancePattern.FREQUENT_MISSER, AttendancePattern.INCONSISTENT,
+                 AttendancePattern.REGULAR_ATTENDER, AttendancePattern.PERFECT_ATTENDER)
+
 class EngagementLevel(Enum):
     HIGH = "high"
     MODERATE = "moderate"
@@ -297,33 +304,31 @@ class AttendanceSystemAdapted:
         try:
             cutoff_date = (datetime.now() - timedelta(weeks=weeks_back)).isoformat()
             
-            # Get all meetings for this pod
+            # Get all meetings for this pod, oldest first (matrix column order)
             meetings_result = self.supabase.table("pod_meetings").select("*").eq("pod_id", pod_id).gte("created_at", cutoff_date).execute()
-            total_meetings = len(meetings_result.data) if meetings_result.data else 0
+            meetings = sorted(meetings_result.data or [], key=lambda m: (m["meeting_date"], m["created_at"]))
+            total_meetings = len(meetings)
             
             # Get all attendance records for these meetings
-            if meetings_result.data:
-                meeting_ids = [m["id"] for m in meetings_result.data]
+            if meetings:
+                meeting_ids = [m["id"] for m in meetings]
                 attendance_result = self.supabase.table("meeting_attendance").select("*").in_("meeting_id", meeting_ids).execute()
                 attendance_records = attendance_result.data or []
             else:
                 attendance_records = []
             
-            # Get pod members count
+            # Get pod members
             members_result = self.supabase.table("pod_memberships").select("user_id").eq("pod_id", pod_id).eq("is_active", True).execute()
-            member_count = len(members_result.data) if members_result.data else 0
+            member_ids = [member["user_id"] for member in members_result.data or []]
+            member_count = len(member_ids)
             
             # Calculate metrics
             total_possible_attendance = total_meetings * member_count
             total_actual_attendance = len([r for r in attendance_records if r["attended"]])
             pod_attendance_rate = total_actual_attendance / total_possible_attendance if total_possible_attendance > 0 else 0
             
-            # Get member analytics
-            member_analytics = []
-            if members_result.data:
-                for member in members_result.data:
-                    analytics = await self.calculate_user_attendance_analytics(member["user_id"], pod_id, weeks_back)
-                    member_analytics.append(analytics)
+            # Member analytics from the members × meetings matrix, no per-member queries
+            member_analytics = self._matrix_analytics(pod_id, weeks_back, member_ids, meetings, attendance_records)
             
             # Identify high performers and at-risk members
             high_performers = [a for a in member_analytics if a.attendance_pattern == AttendancePattern.PERFECT_ATTENDER]
@@ -346,6 +351,92 @@ class AttendanceSystemAdapted:
             logger.error(f"❌ Error generating pod summary: {e}")
             return {"error": str(e)}
     
+    def _matrix_analytics(self, pod_id: str, weeks_back: int, member_ids: List[str],
+                          meetings: List[Dict[str, Any]], attendance_records: List[Dict[str, Any]]) -> List[AttendanceAnalytics]:
+        """AttendanceAnalytics for every member in whole-matrix passes (same rules as calculate_user_attendance_analytics)"""
+        if not meetings:
+            return [self._create_empty_analytics(user_id, pod_id) for user_id in member_ids]
+        
+        matrix = AttendanceMatrix(member_ids, [m["id"] for m in meetings], (
+            (
+                record["user_id"],
+                record["meeting_id"],
+                ATTENDED if record["attended"] else ABSENT,
+                (record["duration_minutes"] or 0) if record["attended"] else None,
+                None,
+                False
+            )
+            for record in attendance_records
+        ))
+        stats = matrix.stats()
+        
+        total_scheduled = len(meetings)
+        rates = ratio(stats["attended"], [total_scheduled] * len(member_ids))
+        patterns = band(rates, PATTERN_CUTOFFS, PATTERN_BANDS)
+        engagement_levels = first_match(
+            [
+                [rate >= 0.85 and duration >= 45 for rate, duration in zip(rates, stats["average_duration"])],
+                [rate >= 0.65 and duration >= 30 for rate, duration in zip(rates, stats["average_duration"])],
+                [rate >= 0.35 for rate in rates]
+            ],
+            [EngagementLevel.HIGH, EngagementLevel.MODERATE, EngagementLevel.LOW],
+            EngagementLevel.CRITICAL
+        )
+        prediction_scores = [
+            min(1.0, max(0.1, recent_rate * 1.1)) if records else 0.5
+            for recent_rate, records in zip(ratio(stats["recent_attended"], stats["recent_records"]), stats["records"])
+        ]
+        
+        created_at = {
+            (record["user_id"], record["meeting_id"]): record["created_at"]
+            for record in attendance_records if record["attended"]
+        }
+        
+        now = datetime.now()
+        analytics_list = []
+        for i, user_id in enumerate(member_ids):
+            risk_flags = []
+            if rates[i] < 0.5:
+                risk_flags.append("low_attendance_rate")
+            if stats["records"][i] >= 6 and stats["trend_recent"][i] / 3 < stats["trend_earlier"][i] / 3 - 0.3:
+                risk_flags.append("declining_trend")
+            if not stats["attended_recently"][i]:
+                risk_flags.append("recent_no_show")
+            
+            last_column = stats["last_attended"][i]
+            last_attendance = None
+            if last_column >= 0:
+                last_attendance = datetime.fromisoformat(
+                    created_at[(user_id, matrix.meeting_ids[last_column])].replace('Z', '+00:00')
+                )
+            
+            analytics = AttendanceAnalytics(
+                user_id=user_id,
+                pod_id=pod_id,
+                total_scheduled_meetings=total_scheduled,
+                meetings_attended=stats["attended"][i],
+                meetings_missed=total_scheduled - stats["attended"][i],
+                attendance_rate=rates[i],
+                average_duration=stats["average_duration"][i],
+                current_streak=stats["current_streak"][i],
+                longest_streak=stats["longest_streak"][i],
+                attendance_pattern=patterns[i],
+                engagement_level=engagement_levels[i],
+                last_attendance_date=last_attendance,
+                prediction_score=prediction_scores[i],
+                risk_flags=risk_flags,
+                calculated_at=now
+            )
+            analytics_list.append(analytics)
+            
+            # Same cache entry calculate_user_attendance_analytics would have written
+            self.analytics_cache[f"{user_id}:{pod_id}:{weeks_back}"] = {
+                "analytics": analytics,
+                "expires_at": now + self.cache_expiry
+            }
+        
+        return analytics_list
+    
     async def generate_attendance_insights(self, pod_id: str = None, user_id: str = None) -> List[AttendanceInsight]:
         """Generate AI-driven insights about attendance patterns"""
         insights = []
@@ -14,8 +14,14 @@ from enum import Enum
 import uuid
 from supabase import Client
 
+from attendance_matrix import AttendanceMatrix, ABSENT, ATTENDED, band, first_match, ratio
+from analytics_rollups import stream_rows
+
 logger = logging.getLogger(__name__)
 
+# Sessions per attendance_records in_() filter
+SESSION_BATCH_SIZE = 100
+
 class AttendanceStatus(Enum):
     PRESENT = "present"
     ABSENT = "absent"
@@ -37,6 +43,11 @@ class AttendancePattern(Enum):
     FREQUENT_MISSER = "frequent_misser"      # 20-50% attendance
     GHOST_MEMBER = "ghost_member"            # <20% attendance
 
+# Attendance rate cutoffs for the patterns above, lowest band first
+PATTERN_CUTOFFS = (0.20, 0.50, 0.80, 0.95)
+PATTERN_BANDS = (AttendancePattern.GHOST_MEMBER, AttendancePattern.FREQUENT_MISSER, AttendancePattern.INCONSISTENT,
+                 AttendancePattern.REGULAR_ATTENDER, AttendancePattern.PERFECT_ATTENDER)
+
 class EngagementLevel(Enum):
     HIGH = "high"              # Active participant, arrives on time
     MODERATE = "moderate"      # Consistent but passive
@@ -416,28 +427,24 @@ class AutomatedAttendanceSystem:
         try:
             cutoff_date = datetime.now() - timedelta(weeks=weeks_back)
             
-            # Get all meetings for this pod
-            meetings = await self._get_pod_meetings(pod_id, cutoff_date)
+            # Get all meetings for this pod, oldest first (matrix column order)
+            meetings = sorted(await self._get_pod_meetings(pod_id, cutoff_date), key=lambda m: m.scheduled_start)
             
-            # Get all attendance records
-            attendance_records = []
-            for meeting in meetings:
-                session_records = await self._get_session_attendance(meeting.session_id)
-                attendance_records.extend(session_records)
+            # Get all attendance records in one call
+            attendance_records = await self._get_sessions_attendance([meeting.session_id for meeting in meetings])
+            pod_members = await self._get_pod_members(pod_id)
             
             # Calculate pod-level metrics
             total_meetings = len(meetings)
-            total_possible_attendance = total_meetings * await self._get_pod_member_count(pod_id)
+            total_possible_attendance = total_meetings * len(pod_members)
             total_actual_attendance = len([r for r in attendance_records if r.attendance_status != AttendanceStatus.ABSENT])
             
             pod_attendance_rate = total_actual_attendance / total_possible_attendance if total_possible_attendance > 0 else 0
             
-            # Get member-level analytics
-            member_analytics = []
-            pod_members = await self._get_pod_members(pod_id)
-            for member in pod_members:
-                analytics = await self.calculate_user_attendance_analytics(member["user_id"], pod_id, weeks_back)
-                member_analytics.append(analytics)
+            # Member-level analytics from the members × meetings matrix
+            member_analytics = self._matrix_analytics(
+                pod_id, [member["user_id"] for member in pod_members], meetings, attendance_records
+            )
             
             # Identify patterns and trends
             high_performers = [a for a in member_analytics if a.attendance_pattern == AttendancePattern.PERFECT_ATTENDER]
@@ -461,6 +468,95 @@ class AutomatedAttendanceSystem:
             logger.error(f"❌ Error generating pod attendance summary: {e}")
             return {"error": str(e)}
     
+    def _matrix_analytics(self, pod_id: str, member_ids: List[str], meetings: List[MeetingSession],
+                          attendance_records: List[AttendanceRecord]) -> List[AttendanceAnalytics]:
+        """AttendanceAnalytics for every member in whole-matrix passes (same rules as calculate_user_attendance_analytics)"""
+        scheduled_starts = {meeting.session_id: meeting.scheduled_start for meeting in meetings}
+        
+        def cell(record: AttendanceRecord):
+            present = record.attendance_status != AttendanceStatus.ABSENT
+            timed = present and record.joined_at is not None
+            return (
+                record.user_id,
+                record.session_id,
+                ATTENDED if present else ABSENT,
+                record.minutes_present if timed else None,
+                (record.joined_at - scheduled_starts[record.session_id]).total_seconds() / 60 if timed else None,
+                record.was_late
+            )
+        
+        matrix = AttendanceMatrix(member_ids, [meeting.session_id for meeting in meetings], (
+            cell(record) for record in attendance_records if record.session_id in scheduled_starts
+        ))
+        stats = matrix.stats()
+        
+        # Rates are over each member's own records, as in calculate_user_attendance_analytics
+        rates = ratio(stats["attended"], stats["records"])
+        patterns = band(rates, PATTERN_CUTOFFS, PATTERN_BANDS)
+        offsets, durations = stats["average_offset"], stats["average_duration"]
+        engagement_levels = first_match(
+            [
+                [rate >= 0.85 and offset <= 5 and duration >= 45 for rate, offset, duration in zip(rates, offsets, durations)],
+                [rate >= 0.65 and offset <= 10 for rate, offset in zip(rates, offsets)],
+                [rate >= 0.35 for rate in rates]
+            ],
+            [EngagementLevel.HIGH, EngagementLevel.MODERATE, EngagementLevel.LOW],
+            EngagementLevel.CRITICAL
+        )
+        recent_rates = ratio(stats["recent_attended"], stats["recent_records"])
+        late_rates = ratio(stats["late_count"], stats["records"])
+        
+        joined_at = {
+            (record.user_id, record.session_id): record.joined_at
+            for record in attendance_records if record.attendance_status != AttendanceStatus.ABSENT
+        }
+        
+        now = datetime.now()
+        analytics_list = []
+        for i, user_id in enumerate(member_ids):
+            records = stats["records"][i]
+            if not records:
+                analytics_list.append(self._create_empty_analytics(user_id, pod_id))
+                continue
+            
+            risk_flags = []
+            if rates[i] < 0.5:
+                risk_flags.append("low_attendance_rate")
+            if records >= 6 and stats["trend_recent"][i] / 3 < stats["trend_earlier"][i] / 3 - 0.3:
+                risk_flags.append("declining_trend")
+            if late_rates[i] > 0.5:
+                risk_flags.append("chronic_lateness")
+            if not stats["attended_recently"][i]:
+                risk_flags.append("recent_no_show")
+            
+            last_column = stats["last_attended"][i]
+            analytics = AttendanceAnalytics(
+                user_id=user_id,
+                pod_id=pod_id,
+                total_scheduled_meetings=records,
+                meetings_attended=stats["attended"][i],
+                meetings_missed=records - stats["attended"][i],
+                attendance_rate=rates[i],
+                average_arrival_offset=offsets[i],
+                average_duration_present=durations[i],
+                current_streak=stats["current_streak"][i],
+                longest_streak=stats["longest_streak"][i],
+                attendance_pattern=patterns[i],
+                engagement_level=engagement_levels[i],
+                last_attendance_date=joined_at[(user_id, matrix.meeting_ids[last_column])] if last_column >= 0 else None,
+                prediction_score=min(1.0, max(0.1, recent_rates[i] * 1.1)),
+                risk_flags=risk_flags,
+                calculated_at=now
+            )
+            analytics_list.append(analytics)
+            
+            self.analytics_cache[f"{user_id}:{pod_id}"] = {
+                "analytics": analytics,
+                "expires_at": now + self.cache_expiry
+            }
+        
+        return analytics_list
+    
     # Helper methods for database operations
     async def _store_meeting_session(self, session: MeetingSession):
         """Store meeting session in database"""
@@ -751,6 +847,45 @@ class AutomatedAttendanceSystem:
         # Implementation depends on actual database schema
         return []
     
+    async def _get_sessions_attendance(self, session_ids: List[str]) -> List[AttendanceRecord]:
+        """Get attendance records for several sessions, SESSION_BATCH_SIZE sessions per query"""
+        records = []
+        try:
+            for start in range(0, len(session_ids), SESSION_BATCH_SIZE):
+                batch = session_ids[start:start + SESSION_BATCH_SIZE]
+                rows = stream_rows(lambda: self.supabase.table("attendance_records").select("*").in_(
+                    "session_id", batch
+                ).order("record_id"))
+                records.extend(self._attendance_record_from_row(row) for row in rows)
+        except Exception as e:
+            logger.error(f"Error getting attendance for {len(session_ids)} sessions: {e}")
+        return records
+    
+    @staticmethod
+    def _attendance_record_from_row(row: Dict[str, Any]) -> AttendanceRecord:
+        """AttendanceRecord from an attendance_records row (as written by _store_attendance_record)"""
+        def parse_time(value):
+            return datetime.fromisoformat(value.replace("Z", "+00:00")) if value else None
+        
+        platform_data = row.get("platform_data")
+        return AttendanceRecord(
+            record_id=row["record_id"],
+            session_id=row["session_id"],
+            user_id=row["user_id"],
+            pod_id=row["pod_id"],
+            attendance_status=AttendanceStatus(row["attendance_status"]),
+            joined_at=parse_time(row.get("joined_at")),
+            left_at=parse_time(row.get("left_at")),
+            minutes_present=row.get("minutes_present") or 0,
+            was_late=bool(row.get("was_late")),
+            left_early=bool(row.get("left_early")),
+            engagement_notes=row.get("engagement_notes"),
+            commitment_shared=bool(row.get("commitment_shared")),
+            auto_detected=bool(row.get("auto_detected")),
+            created_at=parse_time(row.get("created_at")) or datetime.now(),
+            platform_data=json.loads(platform_data) if isinstance(platform_data, str) else platform_data or {}
+        )
+    
     async def _get_user_attendance_history(self, user_id: str, pod_id: str, since_date: datetime) -> List[AttendanceRecord]:
         """Get user's attendance history"""
         # Implementation depends on actual database schema
@@ -11,6 +11,8 @@ from supabase import Client
 import json
 from enum import Enum
 
+from communication_gate import CommunicationGate
+
 logger = logging.getLogger(__name__)
 
 class CommunicationStyle(Enum):
@@ -40,6 +42,7 @@ class CommunicationPreferences:
     def __init__(self, supabase_client: Client):
         self.supabase = supabase_client
         self.communication_matrix = self._define_communication_matrix()
+        self.gate = CommunicationGate(supabase_client)
     
     def _define_communication_matrix(self) -> Dict[str, List[str]]:
         """Define what messages each style receives"""
@@ -87,6 +90,7 @@ class CommunicationPreferences:
                 preferences_data, 
                 on_conflict="telegram_user_id"
             ).execute()
+            self.gate.update_preferences(telegram_user_id, preferences_data)
             
             # Log the preference change
             await self._log_preference_change(telegram_user_id, style.value, "user_initiated")
@@ -100,77 +104,28 @@ class CommunicationPreferences:
     
     async def should_send_message(self, telegram_user_id: int, message_type: MessageType) -> Dict[str, Any]:
         """Check if user should receive this type of message"""
+        return (await self.should_send_messages([telegram_user_id], message_type))[telegram_user_id]
+    
+    async def should_send_messages(self, telegram_user_ids: List[int], message_type: MessageType) -> Dict[int, Dict[str, Any]]:
+        """Check a whole audience at once (preferences, 24h frequency limit, engagement protection)"""
         try:
-            # Get user preferences
-            prefs_result = self.supabase.table("communication_preferences").select("*").eq("telegram_user_id", telegram_user_id).execute()
-            
-            if not prefs_result.data:
-                # Default to balanced for new users
-                await self.set_user_communication_style(telegram_user_id, CommunicationStyle.BALANCED)
-                return {"should_send": True, "reason": "default_balanced"}
-            
-            prefs = prefs_result.data[0]
-            
-            # Check if paused
-            if prefs["communication_style"] == "paused":
-                pause_until = prefs.get("pause_until")
-                if pause_until and datetime.fromisoformat(pause_until) > datetime.now():
-                    return {"should_send": False, "reason": "user_paused"}
-            
-            # Check message type allowlist
-            enabled_types = json.loads(prefs["enabled_message_types"])
-            if message_type.value not in enabled_types:
-                return {"should_send": False, "reason": "message_type_disabled"}
-            
-            # Check recent message frequency
-            recent_messages = await self._get_recent_message_count(telegram_user_id, hours=24)
-            
-            # Frequency limits based on style
-            style_limits = {
-                "high_touch": 3,    # Max 3 per day
-                "balanced": 2,      # Max 2 per day  
-                "light_touch": 1,   # Max 1 per day
-                "meeting_only": 1   # Max 1 per day
-            }
-            
-            style = prefs["communication_style"]
-            if recent_messages >= style_limits.get(style, 2):
-                return {"should_send": False, "reason": "frequency_limit_reached"}
-            
-            # Check user engagement score
-            engagement_score = await self._calculate_engagement_score(telegram_user_id)
-            
-            # If user has low engagement, reduce frequency
-            if engagement_score < 0.3 and message_type not in [MessageType.MEETING_PREP, MessageType.ADMIN]:
-                return {"should_send": False, "reason": "low_engagement_protection"}
-            
-            return {"should_send": True, "reason": "all_checks_passed", "engagement_score": engagement_score}
-            
+            decisions = self.gate.check_many(telegram_user_ids, message_type.value)
         except Exception as e:
             logger.error(f"Error checking message permission: {e}")
-            return {"should_send": False, "reason": "error"}
+            return {user_id: {"should_send": False, "reason": "error"} for user_id in telegram_user_ids}
+        
+        # Default to balanced for new users
+        for user_id, decision in decisions.items():
+            if decision["reason"] == "default_balanced":
+                await self.set_user_communication_style(user_id, CommunicationStyle.BALANCED)
+        
+        return decisions
     
     async def _calculate_engagement_score(self, telegram_user_id: int) -> float:
         """Calculate user engagement score (0.0 to 1.0)"""
         try:
-            # Get recent message responses
-            recent_responses = self.supabase.table("message_analytics").select("*").eq("telegram_user_id", telegram_user_id).gte("sent_at", (datetime.now() - timedelta(days=14)).isoformat()).execute()
-            
-            if not recent_responses.data:
-                return 0.5  # Neutral score for new users
-            
-            total_sent = len(recent_responses.data)
-            responses = sum(1 for msg in recent_responses.data if msg.get("user_responded", False))
-            clicks = sum(1 for msg in recent_responses.data if msg.get("clicked_link", False))
-            
-            # Calculate engagement metrics
-            response_rate = responses / total_sent if total_sent > 0 else 0
-            click_rate = clicks / total_sent if total_sent > 0 else 0
-            
-            # Weight response rate higher than click rate
-            engagement_score = (response_rate * 0.7) + (click_rate * 0.3)
-            
-            return min(1.0, engagement_score)
+            # 14-day response / click rates, kept in memory by the gate
+            return self.gate.engagement_score(telegram_user_id)
             
         except Exception as e:
             logger.error(f"Error calculating engagement score: {e}")
@@ -202,6 +157,8 @@ class CommunicationPreferences:
             }
             
             result = self.supabase.table("message_analytics").insert(analytics_data).execute()
+            if result.data:
+                self.gate.record_sent(telegram_user_id)
             return bool(result.data)
             
         except Exception as e:
@@ -221,6 +178,7 @@ class CommunicationPreferences:
                     "response_type": response_type,
                     "responded_at": datetime.now().isoformat()
                 }).eq("id", message_id).execute()
+                self.gate.record_response(telegram_user_id)
                 
                 return True
             
@@ -268,11 +226,13 @@ class CommunicationPreferences:
         try:
             pause_until = (datetime.now() + timedelta(days=duration_days)).isoformat()
             
-            result = self.supabase.table("communication_preferences").update({
+            changes = {
                 "communication_style": "paused",
                 "pause_until": pause_until,
                 "last_updated": datetime.now().isoformat()
-            }).eq("telegram_user_id", telegram_user_id).execute()
+            }
+            result = self.supabase.table("communication_preferences").update(changes).eq("telegram_user_id", telegram_user_id).execute()
+            self.gate.update_preferences(telegram_user_id, changes)
             
             await self._log_preference_change(telegram_user_id, "paused", f"user_paused_{duration_days}d")
             
@@ -285,11 +245,13 @@ class CommunicationPreferences:
     async def resume_communications(self, telegram_user_id: int, new_style: CommunicationStyle = CommunicationStyle.BALANCED) -> bool:
         """Resume communications after pause"""
         try:
-            result = self.supabase.table("communication_preferences").update({
+            changes = {
                 "communication_style": new_style.value,
                 "pause_until": None,
                 "last_updated": datetime.now().isoformat()
-            }).eq("telegram_user_id", telegram_user_id).execute()
+            }
+            result = self.supabase.table("communication_preferences").update(changes).eq("telegram_user_id", telegram_user_id).execute()
+            self.gate.update_preferences(telegram_user_id, changes)
             
             await self._log_preference_change(telegram_user_id, new_style.value, "user_resumed")
             
@@ -6,14 +6,26 @@ Phase 2: Multi-channel nurture sequence delivery
 
 import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Union
+import math
+import string
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Any, Union, Tuple
 import httpx
 import json
+from email_webhook_buffer import EmailWebhookBuffer, parse_webhook_event
+from analytics_rollups import AnalyticsRollups
 import uuid
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 class EmailEventType(Enum):
@@ -25,36 +37,163 @@ class EmailEventType(Enum):
     OPEN = "email.opened"
     CLICK = "email.clicked"
 
+def _compile_format(template: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """Pre-parse a str.format template into (literal, field) pairs"""
+    parts = []
+    for literal, field_name, format_spec, conversion in string.Formatter().parse(template):
+        if format_spec or conversion:
+            raise ValueError(f"Unsupported template field: {field_name}")
+        parts.append((literal, field_name))
+    return tuple(parts)
+
+def _render_compiled(parts: Tuple[Tuple[str, Optional[str]], ...], variables: Dict[str, Any]) -> str:
+    return "".join(literal if field_name is None else literal + str(variables[field_name]) for literal, field_name in parts)
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date); None if unusable"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+        return max(0.0, seconds) if math.isfinite(seconds) else None
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
 @dataclass
 class EmailTemplate:
-    """Email template configuration"""
+    """Email template configuration (str.format syntax, parsed once)"""
     template_id: str
     subject_template: str
     html_template: str
     text_template: str
     template_variables: List[str]
+    _compiled: Dict[str, Tuple] = field(init=False, repr=False, default_factory=dict)
+    
+    def __post_init__(self):
+        self._compiled = {
+            "subject": _compile_format(self.subject_template),
+            "html": _compile_format(self.html_template),
+            "text": _compile_format(self.text_template)
+        }
+    
+    def render(self, variables: Dict[str, Any]) -> Tuple[str, str, str]:
+        """Render (subject, html, text) - same output as str.format, without re-parsing"""
+        return (
+            _render_compiled(self._compiled["subject"], variables),
+            _render_compiled(self._compiled["html"], variables),
+            _render_compiled(self._compiled["text"], variables)
+        )
+
+class AdaptivePacer:
+    """Spaces API requests and slows down on 429 responses, recovering gradually"""
+    
+    def __init__(self, requests_per_second: float = 2.0, max_interval: float = 10.0):
+        self.base_interval = 1.0 / requests_per_second
+        self.max_interval = max_interval
+        self.interval = self.base_interval
+        self.next_slot = 0.0
+        self.throttled = 0
+        self._lock = asyncio.Lock()
+    
+    async def wait(self):
+        """Reserve the next request slot and sleep until it"""
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+    
+    def on_success(self):
+        self.interval = max(self.base_interval, self.interval * 0.9)
+    
+    def on_throttled(self, retry_after: Optional[float] = None):
+        self.throttled += 1
+        self.interval = min(self.max_interval, self.interval * 2)
+        pause = retry_after if retry_after is not None else self.interval
+        self.next_slot = max(self.next_slot, time.monotonic() + pause)
 
 class EmailDeliveryService:
     """
     Email delivery service using Resend API with tracking and personalization
     """
     
-    def __init__(self, api_key: str, from_email: str = "noreply@progressmethod.com"):
+    # Resend accepts up to 100 emails per /emails/batch request
+    MAX_BATCH_SIZE = 100
+    
+    def __init__(
+        self,
+        api_key: str,
+        from_email: str = "noreply@progressmethod.com",
+        base_url: str = "https://api.resend.com",
+        use_batch: bool = True,
+        batch_window_ms: int = 50,
+        requests_per_second: float = 2.0,
+        max_retries: int = 3
+    ):
         self.api_key = api_key
         self.from_email = from_email
-        self.base_url = "https://api.resend.com"
+        self.base_url = base_url
         self.supabase = None  # Will be injected
         
         # Email templates for nurture sequences
         self.templates = self._define_email_templates()
         
+        # Long-lived pooled HTTP client, created on first use
+        self._client: Optional[httpx.AsyncClient] = None
+        self.pacer = AdaptivePacer(requests_per_second)
+        self.max_retries = max_retries
+        
+        # Sends arriving within batch_window_ms are coalesced into one batch request
+        self.use_batch = use_batch
+        self.batch_window = batch_window_ms / 1000
+        self._batch: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._batch_timer: Optional[asyncio.Task] = None
+        
+        self.stats = {"emails": 0, "requests": 0, "batches": 0, "throttled": 0, "errors": 0}
+        
+        # Webhook events are buffered and written in bulk once a Supabase client is set
+        self.webhook_buffer: Optional[EmailWebhookBuffer] = None
+        
         logger.info("📧 Email Delivery Service initialized")
     
     def set_supabase_client(self, supabase_client):
         """Inject Supabase client for tracking"""
         self.supabase = supabase_client
+        self.webhook_buffer = EmailWebhookBuffer(supabase_client)
+        self.analytics = AnalyticsRollups(supabase_client)
         logger.info("🔗 Supabase client connected to email service")
     
+    def _get_client(self) -> httpx.AsyncClient:
+        """Shared keep-alive client (HTTP/2 when the h2 package is installed)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+                timeout=30.0
+            )
+        return self._client
+    
+    async def close(self):
+        """Flush pending batched sends and close the HTTP client"""
+        if self._batch:
+            await self._flush_batch()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
     def _define_email_templates(self) -> Dict[str, EmailTemplate]:
         """Define email templates for different sequence types"""
         return {
@@ -270,10 +409,8 @@ Unsubscribe: {unsubscribe_url}
                 "cta_text": f"\n{cta_text}: {cta_url}\n" if cta_text else ""
             }
             
-            # Render templates
-            html_content = template.html_template.format(**template_vars)
-            text_content = template.text_template.format(**template_vars)
-            email_subject = template.subject_template.format(**template_vars)
+            # Render the precompiled templates
+            email_subject, html_content, text_content = template.render(template_vars)
             
             # Send email via Resend
             success = await self._send_via_resend(
@@ -314,109 +451,178 @@ Unsubscribe: {unsubscribe_url}
         text_content: str,
         tracking_id: str
     ) -> bool:
-        """Send email via Resend API"""
+        """Send email via Resend API (coalesced into batch requests when enabled)"""
+        
+        payload = {
+            "from": self.from_email,
+            "to": [to_email],
+            "subject": subject,
+            "html": html_content,
+            "text": text_content,
+            "tags": [
+                {"name": "category", "value": "nurture_sequence"},
+                {"name": "tracking_id", "value": tracking_id}
+            ]
+        }
+        self.stats["emails"] += 1
         
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "from": self.from_email,
-                "to": [to_email],
-                "subject": subject,
-                "html": html_content,
-                "text": text_content,
-                "tags": [
-                    {"name": "category", "value": "nurture_sequence"},
-                    {"name": "tracking_id", "value": tracking_id}
-                ]
-            }
+            if self.use_batch:
+                email_id = await self._enqueue_batch(payload)
+            else:
+                email_id = await self._send_single(payload)
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/emails",
-                    headers=headers,
-                    json=payload,
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    email_id = result.get("id")
-                    
-                    # Store email tracking info
-                    if self.supabase:
-                        await self._store_email_tracking(tracking_id, email_id, to_email)
-                    
-                    logger.debug(f"📧 Email sent via Resend: {email_id}")
-                    return True
-                else:
-                    logger.error(f"Resend API error: {response.status_code} - {response.text}")
-                    return False
+            if email_id:
+                logger.debug(f"📧 Email sent via Resend: {email_id}")
+                return True
+            return False
                     
         except Exception as e:
             logger.error(f"Error sending via Resend: {e}")
             return False
     
+    async def _send_single(self, payload: Dict[str, Any]) -> Optional[str]:
+        """POST one email to /emails"""
+        response = await self._post("/emails", payload)
+        if response is None:
+            return None
+        
+        email_id = response.json().get("id")
+        await self._store_email_tracking_many([self._payload_tracking_id(payload)])
+        return email_id
+    
+    async def _enqueue_batch(self, payload: Dict[str, Any]) -> Optional[str]:
+        """Queue one email for the next batch request and wait for its Resend id"""
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append((payload, future))
+        
+        if len(self._batch) >= self.MAX_BATCH_SIZE:
+            asyncio.create_task(self._flush_batch())
+        elif self._batch_timer is None or self._batch_timer.done():
+            self._batch_timer = asyncio.create_task(self._flush_after_window())
+        
+        return await future
+    
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.batch_window)
+        await self._flush_batch()
+    
+    async def _flush_batch(self):
+        """Send up to MAX_BATCH_SIZE queued emails in one /emails/batch request"""
+        while self._batch:
+            entries = self._batch[:self.MAX_BATCH_SIZE]
+            self._batch = self._batch[self.MAX_BATCH_SIZE:]
+            
+            try:
+                response, status = await self._request("/emails/batch", [payload for payload, _ in entries])
+                results = response.json().get("data", []) if response is not None else []
+                self.stats["batches"] += 1
+                if response is None and status and 400 <= status < 500 and status != 429 and len(entries) > 1:
+                    # Resend validates the whole batch, so one bad recipient rejects every email in it
+                    logger.warning(f"Resend rejected a batch of {len(entries)} ({status}), sending its emails one by one")
+                    results = [await self._send_rejected_member(payload) for payload, _ in entries]
+            except Exception as e:
+                logger.error(f"Error sending Resend batch: {e}")
+                results = []
+            
+            sent_tracking_ids = []
+            for index, (payload, future) in enumerate(entries):
+                email_id = results[index].get("id") if index < len(results) else None
+                if email_id:
+                    sent_tracking_ids.append(self._payload_tracking_id(payload))
+                if not future.done():
+                    future.set_result(email_id)
+            
+            if sent_tracking_ids:
+                await self._store_email_tracking_many(sent_tracking_ids)
+    
+    async def _send_rejected_member(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Resend one email of a rejected batch on its own, as a batch result entry"""
+        response = await self._post("/emails", payload)
+        return response.json() if response is not None else {}
+    
+    async def _post(self, path: str, body: Any) -> Optional[httpx.Response]:
+        """POST to Resend, pacing requests and backing off on 429"""
+        response, _ = await self._request(path, body)
+        return response
+    
+    async def _request(self, path: str, body: Any) -> Tuple[Optional[httpx.Response], Optional[int]]:
+        """POST to Resend; the response when it succeeded, and the last status code either way"""
+        client = self._get_client()
+        
+        for attempt in range(self.max_retries + 1):
+            await self.pacer.wait()
+            self.stats["requests"] += 1
+            response = await client.post(path, json=body)
+            
+            if response.status_code == 429:
+                self.stats["throttled"] += 1
+                self.pacer.on_throttled(_parse_retry_after(response.headers.get("retry-after")))
+                logger.warning(f"Resend rate limited (attempt {attempt + 1}), slowing to {1 / self.pacer.interval:.2f} req/s")
+                continue
+            
+            if response.status_code == 200:
+                self.pacer.on_success()
+                return response, response.status_code
+            
+            self.stats["errors"] += 1
+            logger.error(f"Resend API error: {response.status_code} - {response.text}")
+            return None, response.status_code
+        
+        self.stats["errors"] += 1
+        logger.error(f"Resend API still rate limited after {self.max_retries} retries")
+        return None, 429
+    
+    @staticmethod
+    def _payload_tracking_id(payload: Dict[str, Any]) -> Optional[str]:
+        for tag in payload.get("tags", []):
+            if tag["name"] == "tracking_id":
+                return tag["value"]
+        return None
+    
     async def _store_email_tracking(self, tracking_id: str, email_id: str, recipient: str):
         """Store email tracking information"""
+        await self._store_email_tracking_many([tracking_id])
+    
+    async def _store_email_tracking_many(self, tracking_ids: List[str]):
+        """Mark the delivery records of sent emails in one update"""
         try:
-            if not self.supabase:
+            tracking_ids = [t for t in tracking_ids if t]
+            if not self.supabase or not tracking_ids:
                 return
             
-            tracking_data = {
-                "tracking_id": tracking_id,
-                "email_id": email_id,
-                "recipient": recipient,
-                "sent_at": datetime.now().isoformat(),
-                "metadata": json.dumps({"provider": "resend"})
-            }
-            
-            # Update delivery record if it exists
+            now = datetime.now().isoformat()
             self.supabase.table("message_deliveries").update({
                 "delivery_status": "sent",
-                "sent_at": datetime.now().isoformat(),
-                "tracking_id": tracking_id
-            }).eq("tracking_id", tracking_id).execute()
+                "sent_at": now
+            }).in_("tracking_id", tracking_ids).execute()
             
         except Exception as e:
             logger.error(f"Error storing email tracking: {e}")
     
+    def get_client_stats(self) -> Dict[str, Any]:
+        """Request, batch and throttling counters for the Resend client"""
+        return {
+            **self.stats,
+            "http2": HTTP2_AVAILABLE,
+            "current_requests_per_second": round(1 / self.pacer.interval, 2),
+            "queued": len(self._batch)
+        }
+    
+    def enqueue_webhook_event(self, event_data: Dict[str, Any]) -> bool:
+        """Accept a Resend webhook for buffered bulk processing (nothing is recorded without Supabase)"""
+        if self.webhook_buffer is None:
+            return parse_webhook_event(event_data) is not None
+        return self.webhook_buffer.submit(event_data)
+    
     async def handle_webhook_event(self, event_data: Dict[str, Any]) -> bool:
-        """Handle Resend webhook events"""
+        """Handle one Resend webhook event synchronously"""
         try:
-            event_type = event_data.get("type")
-            data = event_data.get("data", {})
-            
-            # Extract tracking information
-            tags = data.get("tags", [])
-            tracking_id = None
-            
-            for tag in tags:
-                if tag.get("name") == "tracking_id":
-                    tracking_id = tag.get("value")
-                    break
-            
-            if not tracking_id:
-                logger.warning("No tracking ID found in webhook event")
+            parsed = parse_webhook_event(event_data)
+            if parsed is None:
                 return False
             
-            # Map Resend events to our event types
-            event_mapping = {
-                "email.sent": "sent",
-                "email.delivered": "delivered", 
-                "email.bounced": "bounced",
-                "email.complained": "complaint",
-                "email.opened": "opened",
-                "email.clicked": "clicked"
-            }
-            
-            mapped_event = event_mapping.get(event_type)
-            if not mapped_event:
-                logger.warning(f"Unknown event type: {event_type}")
-                return False
+            tracking_id, mapped_event, data = parsed
             
             # Update delivery status
             await self._update_delivery_status(tracking_id, mapped_event, data)
@@ -424,7 +630,7 @@ Unsubscribe: {unsubscribe_url}
             # Store email event
             await self._store_email_event(tracking_id, mapped_event, data)
             
-            logger.info(f"📨 Processed email event: {event_type} for tracking ID {tracking_id}")
+            logger.info(f"📨 Processed email event: {event_data.get('type')} for tracking ID {tracking_id}")
             return True
             
         except Exception as e:
@@ -584,32 +790,8 @@ Unsubscribe: {unsubscribe_url}
             if not self.supabase:
                 return {"error": "Database not connected"}
             
-            cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
-            
-            # Get email deliveries
-            result = self.supabase.table("message_deliveries").select("*").eq(
-                "channel", "email"
-            ).gte("scheduled_at", cutoff_date).execute()
-            
-            deliveries = result.data
-            
-            stats = {
-                "period_days": days,
-                "total_scheduled": len(deliveries),
-                "sent": len([d for d in deliveries if d["delivery_status"] in ["sent", "delivered", "opened", "clicked"]]),
-                "delivered": len([d for d in deliveries if d["delivery_status"] in ["delivered", "opened", "clicked"]]),
-                "opened": len([d for d in deliveries if d["delivery_status"] in ["opened", "clicked"]]),
-                "clicked": len([d for d in deliveries if d["delivery_status"] == "clicked"]),
-                "bounced": len([d for d in deliveries if d["delivery_status"] == "failed" and "bounce" in d.get("failure_reason", "").lower()]),
-                "failed": len([d for d in deliveries if d["delivery_status"] == "failed"])
-            }
-            
-            # Calculate rates
-            stats["delivery_rate"] = round((stats["delivered"] / stats["sent"] * 100) if stats["sent"] > 0 else 0, 2)
-            stats["open_rate"] = round((stats["opened"] / stats["delivered"] * 100) if stats["delivered"] > 0 else 0, 2)
-            stats["click_rate"] = round((stats["clicked"] / stats["opened"] * 100) if stats["opened"] > 0 else 0, 2)
-            
-            return stats
+            # Daily rollups (or one streaming pass over the raw rows)
+            return self.analytics.email_delivery_stats(days)
             
         except Exception as e:
             logger.error(f"Error getting delivery stats: {e}")
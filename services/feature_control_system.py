@@ -14,6 +14,8 @@ from enum import Enum
 import uuid
 
 from supabase import Client
+from feature_flag_engine import FeatureFlagEngine
+from feature_usage_sink import FeatureUsageSink
 
 logger = logging.getLogger(__name__)
 
@@ -78,9 +80,10 @@ class FeatureControlSystem:
     
     def __init__(self, supabase_client: Client):
         self.supabase = supabase_client
-        self._features_cache = {}
-        self._cache_expiry = datetime.now()
-        self._cache_duration = timedelta(minutes=5)
+        # All active flags evaluated in memory from a background-refreshed snapshot
+        self.engine = FeatureFlagEngine(supabase_client)
+        # Usage events are buffered and written behind in batches
+        self.usage_sink = FeatureUsageSink(supabase_client)
         
     async def initialize_feature_tables(self):
         """Initialize feature control database tables"""
@@ -221,202 +224,24 @@ class FeatureControlSystem:
     async def is_feature_enabled(self, feature_id: str, user_telegram_id: int, user_roles: List[str] = None) -> Tuple[bool, Optional[str]]:
         """Check if a feature is enabled for a specific user"""
         try:
-            feature = await self._get_feature(feature_id)
-            
-            if not feature or not feature.is_active:
-                return False, None
-            
-            # Check basic flag status
-            if feature.flag == FeatureFlag.DISABLED:
-                return False, None
-            elif feature.flag == FeatureFlag.ENABLED:
-                return await self._check_rollout_strategy(feature, user_telegram_id, user_roles)
-            elif feature.flag == FeatureFlag.A_B_TEST:
-                return await self._handle_ab_test(feature, user_telegram_id)
-            elif feature.flag == FeatureFlag.GRADUAL_ROLLOUT:
-                return await self._handle_gradual_rollout(feature, user_telegram_id)
-            elif feature.flag == FeatureFlag.USER_SEGMENT:
-                return await self._handle_user_segment(feature, user_telegram_id, user_roles)
-            
-            return False, None
+            self.engine.ensure_loaded()
+            return self.engine.evaluate(feature_id, user_telegram_id, user_roles)
             
         except Exception as e:
             logger.error(f"❌ Error checking feature {feature_id}: {e}")
             return False, None
     
-    async def _get_feature(self, feature_id: str) -> Optional[Feature]:
-        """Get feature from cache or database"""
-        # Check cache first
-        if (datetime.now() < self._cache_expiry and 
-            feature_id in self._features_cache):
-            return self._features_cache[feature_id]
-        
-        try:
-            result = self.supabase.table("feature_flags").select("*").eq("feature_id", feature_id).eq("is_active", True).execute()
-            
-            if result.data:
-                feature_data = result.data[0]
-                feature = Feature(
-                    id=feature_data["feature_id"],
-                    name=feature_data["name"],
-                    description=feature_data["description"],
-                    flag=FeatureFlag(feature_data["flag"]),
-                    rollout_strategy=RolloutStrategy(feature_data["rollout_strategy"]),
-                    config=json.loads(feature_data["config"] or "{}"),
-                    created_at=datetime.fromisoformat(feature_data["created_at"]),
-                    updated_at=datetime.fromisoformat(feature_data["updated_at"]),
-                    created_by=feature_data["created_by"],
-                    is_active=feature_data["is_active"],
-                    ab_test_groups=json.loads(feature_data["ab_test_groups"]) if feature_data["ab_test_groups"] else None,
-                    ab_test_active=feature_data["ab_test_active"],
-                    rollout_percentage=float(feature_data["rollout_percentage"]),
-                    rollout_target_date=datetime.fromisoformat(feature_data["rollout_target_date"]) if feature_data["rollout_target_date"] else None,
-                    target_user_roles=json.loads(feature_data["target_user_roles"] or "[]"),
-                    target_user_ids=json.loads(feature_data["target_user_ids"] or "[]"),
-                    excluded_user_ids=json.loads(feature_data["excluded_user_ids"] or "[]"),
-                    usage_count=feature_data["usage_count"],
-                    success_rate=float(feature_data["success_rate"]),
-                    last_used=datetime.fromisoformat(feature_data["last_used"]) if feature_data["last_used"] else None
-                )
-                
-                # Update cache
-                self._features_cache[feature_id] = feature
-                self._cache_expiry = datetime.now() + self._cache_duration
-                
-                return feature
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"❌ Error retrieving feature {feature_id}: {e}")
-            return None
-    
-    async def _check_rollout_strategy(self, feature: Feature, user_telegram_id: int, user_roles: List[str] = None) -> Tuple[bool, Optional[str]]:
-        """Check if user meets rollout strategy criteria"""
-        if feature.rollout_strategy == RolloutStrategy.ALL_USERS:
-            return True, None
-        elif feature.rollout_strategy == RolloutStrategy.PERCENTAGE:
-            # Use user ID hash for consistent percentage assignment
-            user_hash = hash(str(user_telegram_id)) % 100
-            return user_hash < feature.rollout_percentage, None
-        elif feature.rollout_strategy == RolloutStrategy.USER_LIST:
-            return str(user_telegram_id) in feature.target_user_ids, None
-        elif feature.rollout_strategy == RolloutStrategy.ROLE_BASED:
-            if not user_roles:
-                return False, None
-            return any(role in feature.target_user_roles for role in user_roles), None
-        elif feature.rollout_strategy == RolloutStrategy.TIME_BASED:
-            if feature.rollout_target_date:
-                return datetime.now() >= feature.rollout_target_date, None
-            return True, None
-        
-        return False, None
-    
-    async def _handle_ab_test(self, feature: Feature, user_telegram_id: int) -> Tuple[bool, Optional[str]]:
-        """Handle A/B testing logic"""
-        if not feature.ab_test_active or not feature.ab_test_groups:
-            return False, None
-        
-        # Assign user to A/B test group based on consistent hash
-        user_hash = hash(str(user_telegram_id)) % 100
-        
-        cumulative_percentage = 0
-        for group_name, group_config in feature.ab_test_groups.items():
-            group_percentage = group_config.get("percentage", 0)
-            cumulative_percentage += group_percentage
-            
-            if user_hash < cumulative_percentage:
-                # Check if this group should see the feature
-                group_enabled = group_config.get("enabled", False)
-                return group_enabled, group_name
-        
-        return False, None
-    
-    async def _handle_gradual_rollout(self, feature: Feature, user_telegram_id: int) -> Tuple[bool, Optional[str]]:
-        """Handle gradual rollout logic"""
-        # Calculate current rollout percentage based on time
-        if feature.rollout_target_date:
-            now = datetime.now()
-            if now >= feature.rollout_target_date:
-                current_percentage = 100.0
-            else:
-                # Calculate gradual increase over time
-                start_date = feature.created_at
-                total_duration = (feature.rollout_target_date - start_date).total_seconds()
-                elapsed_duration = (now - start_date).total_seconds()
-                
-                if total_duration > 0:
-                    time_progress = min(elapsed_duration / total_duration, 1.0)
-                    current_percentage = time_progress * feature.rollout_percentage
-                else:
-                    current_percentage = feature.rollout_percentage
-        else:
-            current_percentage = feature.rollout_percentage
-        
-        # Use consistent hash for user assignment
-        user_hash = hash(str(user_telegram_id)) % 100
-        return user_hash < current_percentage, None
-    
-    async def _handle_user_segment(self, feature: Feature, user_telegram_id: int, user_roles: List[str] = None) -> Tuple[bool, Optional[str]]:
-        """Handle user segment targeting"""
-        # Check if user is excluded
-        if str(user_telegram_id) in feature.excluded_user_ids:
-            return False, None
-        
-        # Check if user is in target list
-        if feature.target_user_ids and str(user_telegram_id) in feature.target_user_ids:
-            return True, None
-        
-        # Check role-based targeting
-        if feature.target_user_roles and user_roles:
-            if any(role in feature.target_user_roles for role in user_roles):
-                return True, None
-        
-        # If no specific targeting, deny access
-        return False, None
-    
     async def log_feature_usage(self, feature_id: str, user_telegram_id: int, event_type: str, metadata: Dict[str, Any] = None, ab_test_group: str = None):
-        """Log feature usage event"""
+        """Log feature usage event (buffered; usage_count is incremented when the batch is written)"""
         try:
-            # Get user UUID
-            user_result = self.supabase.table("users").select("id").eq("telegram_user_id", user_telegram_id).execute()
-            user_id = user_result.data[0]["id"] if user_result.data else None
-            
-            event_data = {
-                "feature_id": feature_id,
-                "user_id": user_id,
-                "user_telegram_id": user_telegram_id,
-                "event_type": event_type,
-                "metadata": json.dumps(metadata or {}),
-                "ab_test_group": ab_test_group,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            self.supabase.table("feature_usage_events").insert(event_data).execute()
-            
-            # Update feature usage statistics
-            await self._update_feature_stats(feature_id, event_type)
-            
+            self.usage_sink.record(feature_id, user_telegram_id, event_type, metadata, ab_test_group)
         except Exception as e:
             logger.error(f"❌ Error logging feature usage: {e}")
     
-    async def _update_feature_stats(self, feature_id: str, event_type: str):
-        """Update feature usage statistics"""
-        try:
-            if event_type == "access":
-                # Increment usage count
-                self.supabase.table("feature_flags").update({
-                    "usage_count": "usage_count + 1",
-                    "last_used": datetime.now().isoformat()
-                }).eq("feature_id", feature_id).execute()
-            
-            elif event_type in ["success", "error"]:
-                # Update success rate
-                # This would require more complex calculation - implement as needed
-                pass
-                
-        except Exception as e:
-            logger.error(f"❌ Error updating feature stats: {e}")
+    async def close(self):
+        """Stop background refreshes and write any buffered usage events"""
+        await self.engine.stop()
+        await self.usage_sink.flush()
     
     async def get_all_features(self) -> List[Feature]:
         """Get all active features"""
@@ -527,9 +352,8 @@ class FeatureControlSystem:
         return dict(sorted(error_types.items(), key=lambda x: x[1], reverse=True)[:5])
     
     def _invalidate_cache(self):
-        """Invalidate the features cache"""
-        self._features_cache.clear()
-        self._cache_expiry = datetime.now()
+        """Reload the flag snapshot so this process sees its own changes immediately"""
+        self.engine.reload()
     
     # Convenience methods for common operations
     async def enable_feature(self, feature_id: str) -> bool:
@@ -14,6 +14,7 @@ import re
 from dataclasses import dataclass, asdict
 from supabase import Client
 from google_admin_reports import GoogleAdminReports, MeetEvent, MeetParticipant
+from participant_matcher import ParticipantMatch, ParticipantMatcher
 
 logger = logging.getLogger(__name__)
 
@@ -34,23 +35,20 @@ class MeetSession:
     sync_status: str
     last_sync_at: Optional[datetime]
 
-@dataclass
-class ParticipantMatch:
-    """Represents a matched participant between Meet and our user system"""
-    meet_participant_email: str
-    user_id: Optional[str]
-    user_email: Optional[str]
-    confidence_score: float  # 0.0 to 1.0
-    match_method: str  # 'exact_email', 'domain_match', 'manual_mapping', 'no_match'
-
 class MeetCorrelationEngine:
     """Correlates Google Meet sessions with pod meetings and processes attendance"""
     
-    def __init__(self, supabase_client: Client, admin_reports: GoogleAdminReports):
+    def __init__(self, supabase_client: Client, admin_reports: GoogleAdminReports,
+                 user_directory=None, matcher_max_age_seconds: int = 600):
         self.supabase = supabase_client
         self.admin_reports = admin_reports
         self.domain = None  # Will be set from organization domain
         
+        # Users and email mappings snapshot, rebuilt once per sync run
+        self.user_directory = user_directory
+        self.matcher: Optional[ParticipantMatcher] = None
+        self.matcher_max_age_seconds = matcher_max_age_seconds
+        
         logger.info("🔗 Meet Correlation Engine initialized")
     
     async def initialize(self):
@@ -64,6 +62,16 @@ class MeetCorrelationEngine:
             logger.error(f"❌ Failed to initialize correlation engine: {e}")
             raise
     
+    def refresh_matcher(self) -> ParticipantMatcher:
+        """Rebuild the participant matcher (call once at the start of a sync run)"""
+        self.matcher = ParticipantMatcher.load(self.supabase, self.domain, self.user_directory)
+        return self.matcher
+    
+    def _get_matcher(self) -> ParticipantMatcher:
+        if self.matcher is None or self.matcher.age_seconds > self.matcher_max_age_seconds:
+            return self.refresh_matcher()
+        return self.matcher
+    
     async def create_meet_session(self, meeting_id: str, meet_event_id: str, 
                                  meet_link: str, organizer_email: str) -> str:
         """
@@ -99,7 +107,7 @@ class MeetCorrelationEngine:
                 'sync_status': 'pending'
             }
             
-            result = self.supabase.table('meet_sessions').insert(session_data).execute()
+            await asyncio.to_thread(self.supabase.table('meet_sessions').insert(session_data).execute)
             
             logger.info(f"✅ Created Meet session {session_id} for meeting {meeting_id}")
             logger.info(f"   Meet code: {meet_code}, Link: {meet_link}")
@@ -130,92 +138,164 @@ class MeetCorrelationEngine:
             session_result = self.supabase.table('meet_sessions').select('*').eq('id', session_id).execute()
             if not session_result.data:
                 raise ValueError(f"Meet session {session_id} not found")
-            
-            session_data = session_result.data[0]
-            meet_code = session_data['meet_code']
-            
-            logger.info(f"🔄 Syncing Meet session {session_id} (code: {meet_code}) for {sync_date}")
-            
-            # Update sync status
-            await self._update_session_sync_status(session_id, 'syncing')
-            
-            # Get Meet events for this session
-            participants = await self.admin_reports.get_meet_participants(
-                meet_code, sync_date, sync_date
-            )
-            
-            if not participants:
-                logger.warning(f"⚠️ No Meet data found for session {session_id} on {sync_date}")
-                await self._update_session_sync_status(session_id, 'no_data')
-                return {'status': 'no_data', 'participants_found': 0}
-            
-            # Process participants and create attendance records
-            results = await self._process_session_participants(session_id, participants)
-            
-            # Update session statistics
-            await self._update_session_statistics(session_id, participants)
-            
-            # Mark as successfully synced
-            await self._update_session_sync_status(session_id, 'synced')
-            
-            logger.info(f"✅ Successfully synced Meet session {session_id}")
-            logger.info(f"   Found {len(participants)} participants, {results['matched_users']} matched to users")
-            
-            return {
-                'status': 'success',
-                'participants_found': len(participants),
-                'matched_users': results['matched_users'],
-                'new_attendance_records': results['new_records'],
-                'updated_records': results['updated_records']
-            }
-            
         except Exception as e:
             logger.error(f"❌ Failed to sync Meet session {session_id}: {e}")
             await self._update_session_sync_status(session_id, 'failed', str(e))
             return {'status': 'failed', 'error': str(e)}
+        
+        results = await self.sync_sessions(session_result.data, sync_date)
+        return results[session_id]
     
-    async def _process_session_participants(self, session_id: str, 
-                                          participants: List[MeetParticipant]) -> Dict[str, int]:
-        """Process Meet participants and create/update attendance records"""
-        results = {'matched_users': 0, 'new_records': 0, 'updated_records': 0}
-        
-        # Get session meeting ID
-        session_result = self.supabase.table('meet_sessions').select('meeting_id').eq('id', session_id).execute()
-        meeting_id = session_result.data[0]['meeting_id']
-        
-        for participant in participants:
-            try:
-                # Store raw participant data
-                participant_id = await self._store_meet_participant(session_id, participant)
-                
-                # Match participant to our user system
-                user_match = await self._match_participant_to_user(participant)
-                
-                if user_match.user_id:
-                    results['matched_users'] += 1
-                    
-                    # Create or update attendance record
-                    attendance_result = await self._create_attendance_record(
-                        meeting_id, user_match.user_id, participant_id, participant, user_match
+    async def sync_sessions(self, sessions: List[Dict], sync_date: date,
+                            max_concurrency: int = 10) -> Dict[str, Dict[str, Any]]:
+        """
+        Sync a batch of Meet sessions for one date; returns sync results by session id
+        
+        Participants are collected for all sessions concurrently (from the cached
+        audit log index and the in-memory matcher), then written with one
+        meet_participants upsert and one meeting_attendance upsert for the batch.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def collect(session: Dict) -> Tuple[Dict, Optional[List[MeetParticipant]], Optional[str]]:
+            async with semaphore:
+                try:
+                    logger.info(f"🔄 Syncing Meet session {session['id']} (code: {session['meet_code']}) for {sync_date}")
+                    await self._update_session_sync_status(session['id'], 'syncing')
+                    participants = await self.admin_reports.get_meet_participants(
+                        session['meet_code'], sync_date, sync_date
                     )
-                    
-                    if attendance_result == 'created':
-                        results['new_records'] += 1
-                    elif attendance_result == 'updated':
-                        results['updated_records'] += 1
-                
-            except Exception as e:
-                logger.error(f"❌ Failed to process participant {participant.email}: {e}")
+                    return session, participants, None
+                except Exception as e:
+                    return session, None, str(e)
+        
+        collected = await asyncio.gather(*(collect(session) for session in sessions))
+        
+        results: Dict[str, Dict[str, Any]] = {}
+        with_data: List[Tuple[Dict, List[MeetParticipant]]] = []
+        for session, participants, error in collected:
+            if error:
+                logger.error(f"❌ Failed to sync Meet session {session['id']}: {error}")
+                await self._update_session_sync_status(session['id'], 'failed', error)
+                results[session['id']] = {'status': 'failed', 'error': error}
+            elif not participants:
+                logger.warning(f"⚠️ No Meet data found for session {session['id']} on {sync_date}")
+                await self._update_session_sync_status(session['id'], 'no_data')
+                results[session['id']] = {'status': 'no_data', 'participants_found': 0}
+            else:
+                with_data.append((session, participants))
+        
+        if not with_data:
+            return results
+        
+        try:
+            # Blocking bulk writes run off the event loop
+            written = await asyncio.to_thread(self._write_session_batch, with_data)
+        except Exception as e:
+            logger.error(f"❌ Failed to write attendance for {len(with_data)} Meet sessions: {e}")
+            for session, _ in with_data:
+                await self._update_session_sync_status(session['id'], 'failed', str(e))
+                results[session['id']] = {'status': 'failed', 'error': str(e)}
+            return results
+        
+        for session, participants in with_data:
+            session_results = written[session['id']]
+            await asyncio.to_thread(self._finish_session, session['id'], participants)
+            
+            logger.info(f"✅ Successfully synced Meet session {session['id']}")
+            logger.info(f"   Found {len(participants)} participants, {session_results['matched_users']} matched to users")
+            
+            results[session['id']] = {
+                'status': 'success',
+                'participants_found': len(participants),
+                'matched_users': session_results['matched_users'],
+                'new_attendance_records': session_results['new_records'],
+                'updated_records': session_results['updated_records']
+            }
         
         return results
     
-    async def _store_meet_participant(self, session_id: str, 
-                                     participant: MeetParticipant) -> str:
-        """Store Meet participant data in database"""
-        participant_id = str(uuid.uuid4())
+    def _write_session_batch(self, sessions: List[Tuple[Dict, List[MeetParticipant]]]) -> Dict[str, Dict[str, int]]:
+        """Store participants and attendance for several sessions with one upsert per table"""
+        matcher = self._get_matcher()
+        results = {session['id']: {'matched_users': 0, 'new_records': 0, 'updated_records': 0} for session, _ in sessions}
+        
+        # Raw participant rows; (session, email, joined_at) is the table's natural key
+        participant_rows = {}
+        for session, participants in sessions:
+            for participant in participants:
+                key = (session['id'], participant.email, participant.joined_at)
+                participant_rows[key] = self._participant_row(session['id'], participant)
+        
+        stored = self.supabase.table('meet_participants').upsert(
+            list(participant_rows.values()), on_conflict='meet_session_id,participant_email,joined_at'
+        ).execute()
+        participant_ids = {
+            (row['meet_session_id'], row['participant_email'], self._parse_time(row['joined_at'])): row['id']
+            for row in stored.data or []
+        }
+        
+        # Highest-confidence match per (meeting, user); the earlier participant wins a tie
+        candidates: Dict[Tuple[str, str], Tuple[str, MeetParticipant, ParticipantMatch, Optional[str]]] = {}
+        for session, participants in sessions:
+            matches = matcher.match_many(p.email for p in participants)
+            for participant in participants:
+                user_match = matches[participant.email]
+                if not user_match.user_id:
+                    continue
+                results[session['id']]['matched_users'] += 1
+                participant_id = participant_ids.get((session['id'], participant.email, participant.joined_at))
+                key = (session['meeting_id'], user_match.user_id)
+                best = candidates.get(key)
+                if best is None or user_match.confidence_score > best[2].confidence_score:
+                    candidates[key] = (session['id'], participant, user_match, participant_id)
+        
+        if not candidates:
+            return results
         
-        participant_data = {
-            'id': participant_id,
+        meeting_ids = list({meeting_id for meeting_id, _ in candidates})
+        existing_result = self.supabase.table('meeting_attendance').select(
+            'meeting_id, user_id, confidence_score, detection_method'
+        ).in_('meeting_id', meeting_ids).in_('user_id', list({user_id for _, user_id in candidates})).execute()
+        existing = {(row['meeting_id'], row['user_id']): row for row in existing_result.data or []}
+        
+        attendance_rows = []
+        for (meeting_id, user_id), (session_id, participant, user_match, participant_id) in candidates.items():
+            current = existing.get((meeting_id, user_id))
+            if current:
+                # Only update if our confidence is higher or if existing was manual
+                existing_confidence = current.get('confidence_score') or 0.0
+                existing_method = current.get('detection_method') or 'manual'
+                if not (user_match.confidence_score > existing_confidence or existing_method == 'manual'):
+                    logger.info(f"⏭️ Skipped update for user {user_id} (lower confidence)")
+                    continue
+                results[session_id]['updated_records'] += 1
+            else:
+                results[session_id]['new_records'] += 1
+            
+            attendance_rows.append({
+                'meeting_id': meeting_id,
+                'user_id': user_id,
+                'attended': True,  # Present in Meet = attended
+                'duration_minutes': participant.duration_minutes,
+                'meet_participant_id': participant_id,
+                'detection_method': 'automatic_meet',
+                'meet_join_time': participant.joined_at.isoformat() if participant.joined_at else None,
+                'meet_leave_time': participant.left_at.isoformat() if participant.left_at else None,
+                'meet_duration_minutes': participant.duration_minutes,
+                'meet_reconnect_count': participant.reconnect_count,
+                'meet_device_type': participant.device_type,
+                'confidence_score': user_match.confidence_score
+            })
+        
+        if attendance_rows:
+            self.supabase.table('meeting_attendance').upsert(attendance_rows, on_conflict='meeting_id,user_id').execute()
+            logger.info(f"📝 Wrote {len(attendance_rows)} attendance records for {len(sessions)} Meet sessions")
+        
+        return results
+    
+    def _participant_row(self, session_id: str, participant: MeetParticipant) -> Dict[str, Any]:
+        return {
             'meet_session_id': session_id,
             'participant_email': participant.email,
             'participant_name': participant.display_name,
@@ -232,164 +312,28 @@ class MeetCorrelationEngine:
             'location_country': participant.location_country,
             'call_rating': participant.call_rating
         }
-        
-        # Check if participant already exists (prevent duplicates)
-        existing = self.supabase.table('meet_participants').select('id').eq(
-            'meet_session_id', session_id
-        ).eq('participant_email', participant.email).execute()
-        
-        if existing.data:
-            # Update existing record
-            self.supabase.table('meet_participants').update(participant_data).eq(
-                'id', existing.data[0]['id']
-            ).execute()
-            return existing.data[0]['id']
-        else:
-            # Create new record
-            result = self.supabase.table('meet_participants').insert(participant_data).execute()
-            return result.data[0]['id']
+    
+    @staticmethod
+    def _parse_time(value: Optional[str]) -> Optional[datetime]:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
     
     async def _match_participant_to_user(self, participant: MeetParticipant) -> ParticipantMatch:
         """Match a Meet participant to a user in our system"""
-        email = participant.email.lower().strip()
-        
-        # Try exact email match first
-        user_result = self.supabase.table('users').select('id, email').eq('email', email).execute()
-        if user_result.data:
-            return ParticipantMatch(
-                meet_participant_email=email,
-                user_id=user_result.data[0]['id'],
-                user_email=user_result.data[0]['email'],
-                confidence_score=1.0,
-                match_method='exact_email'
-            )
-        
-        # Try manual mapping table
-        mapping_result = self.supabase.table('participant_email_mapping').select(
-            'user_id, confidence_level'
-        ).eq('external_email', email).execute()
-        
-        if mapping_result.data:
-            mapping = mapping_result.data[0]
-            confidence = {'high': 0.9, 'medium': 0.7, 'low': 0.5}.get(
-                mapping['confidence_level'], 0.5
-            )
-            
-            # Get user details
-            user_result = self.supabase.table('users').select('id, email').eq(
-                'id', mapping['user_id']
-            ).execute()
-            
-            if user_result.data:
-                return ParticipantMatch(
-                    meet_participant_email=email,
-                    user_id=user_result.data[0]['id'],
-                    user_email=user_result.data[0]['email'],
-                    confidence_score=confidence,
-                    match_method='manual_mapping'
-                )
-        
-        # Try domain matching for internal users
-        if self.domain and email.endswith(f'@{self.domain}'):
-            # Look for similar emails in our system
-            base_email = email.replace(f'@{self.domain}', '')
-            like_pattern = f'%{base_email}%'
-            
-            similar_users = self.supabase.table('users').select('id, email').ilike(
-                'email', like_pattern
-            ).execute()
-            
-            if similar_users.data:
-                return ParticipantMatch(
-                    meet_participant_email=email,
-                    user_id=similar_users.data[0]['id'],
-                    user_email=similar_users.data[0]['email'],
-                    confidence_score=0.8,
-                    match_method='domain_match'
-                )
-        
-        # No match found
-        return ParticipantMatch(
-            meet_participant_email=email,
-            user_id=None,
-            user_email=None,
-            confidence_score=0.0,
-            match_method='no_match'
-        )
-    
-    async def _create_attendance_record(self, meeting_id: str, user_id: str, 
-                                       participant_id: str, participant: MeetParticipant,
-                                       user_match: ParticipantMatch) -> str:
-        """Create or update attendance record for matched participant"""
-        
-        # Check if attendance record already exists
-        existing = self.supabase.table('meeting_attendance').select('id').eq(
-            'meeting_id', meeting_id
-        ).eq('user_id', user_id).execute()
-        
-        attendance_data = {
-            'meeting_id': meeting_id,
-            'user_id': user_id,
-            'attended': True,  # Present in Meet = attended
-            'duration_minutes': participant.duration_minutes,
-            'meet_participant_id': participant_id,
-            'detection_method': 'automatic_meet',
-            'meet_join_time': participant.joined_at.isoformat() if participant.joined_at else None,
-            'meet_leave_time': participant.left_at.isoformat() if participant.left_at else None,
-            'meet_duration_minutes': participant.duration_minutes,
-            'meet_reconnect_count': participant.reconnect_count,
-            'meet_device_type': participant.device_type,
-            'confidence_score': user_match.confidence_score
-        }
-        
-        if existing.data:
-            # Update existing record only if this has higher confidence
-            existing_record = self.supabase.table('meeting_attendance').select(
-                'confidence_score, detection_method'
-            ).eq('id', existing.data[0]['id']).execute()
-            
-            existing_confidence = existing_record.data[0].get('confidence_score', 0.0)
-            existing_method = existing_record.data[0].get('detection_method', 'manual')
-            
-            # Only update if our confidence is higher or if existing was manual
-            if user_match.confidence_score > existing_confidence or existing_method == 'manual':
-                self.supabase.table('meeting_attendance').update(attendance_data).eq(
-                    'id', existing.data[0]['id']
-                ).execute()
-                
-                logger.info(f"📝 Updated attendance for user {user_id} (confidence: {user_match.confidence_score})")
-                return 'updated'
-            else:
-                logger.info(f"⏭️ Skipped update for user {user_id} (lower confidence)")
-                return 'skipped'
-        else:
-            # Create new attendance record
-            self.supabase.table('meeting_attendance').insert(attendance_data).execute()
-            
-            logger.info(f"✅ Created attendance for user {user_id} (confidence: {user_match.confidence_score})")
-            return 'created'
+        return self._get_matcher().match(participant.email)
     
-    async def _update_session_statistics(self, session_id: str, 
-                                        participants: List[MeetParticipant]):
-        """Update Meet session statistics"""
+    def _finish_session(self, session_id: str, participants: List[MeetParticipant]):
+        """Store session statistics and mark the session synced in one update"""
         total_minutes = sum(p.duration_minutes for p in participants)
-        participant_count = len(participants)
         
         # Calculate session duration from participants
-        if participants:
-            earliest_join = min(p.joined_at for p in participants if p.joined_at)
-            latest_leave = max(p.left_at for p in participants if p.left_at)
-            
-            if earliest_join and latest_leave:
-                session_duration = int((latest_leave - earliest_join).total_seconds() // 60)
-            else:
-                session_duration = None
-        else:
-            session_duration = None
+        joins = [p.joined_at for p in participants if p.joined_at]
+        leaves = [p.left_at for p in participants if p.left_at]
+        session_duration = int((max(leaves) - min(joins)).total_seconds() // 60) if joins and leaves else None
         
         update_data = {
-            'participant_count': participant_count,
+            'participant_count': len(participants),
             'total_minutes_all_participants': total_minutes,
+            'sync_status': 'synced',
             'last_sync_at': datetime.now().isoformat()
         }
         
@@ -408,7 +352,9 @@ class MeetCorrelationEngine:
         if error:
             update_data['sync_error'] = error
         
-        self.supabase.table('meet_sessions').update(update_data).eq('id', session_id).execute()
+        await asyncio.to_thread(
+            self.supabase.table('meet_sessions').update(update_data).eq('id', session_id).execute
+        )
     
     def _extract_meet_code(self, meet_link: str) -> Optional[str]:
         """Extract Meet code from Google Meet link"""
@@ -445,6 +391,11 @@ class MeetCorrelationEngine:
             
             logger.info(f"🔄 Syncing {len(pending_sessions.data)} pending Meet sessions")
             
+            if pending_sessions.data:
+                # One audit log download for the day and one user snapshot, shared by every session below
+                await self.admin_reports.get_meet_event_index(sync_date, sync_date, ['call_ended'])
+                self.refresh_matcher()
+            
             results = {
                 'total_sessions': len(pending_sessions.data),
                 'successful_syncs': 0,
@@ -452,19 +403,13 @@ class MeetCorrelationEngine:
                 'no_data_sessions': 0
             }
             
-            for session in pending_sessions.data:
-                try:
-                    sync_result = await self.sync_meet_session_data(session['id'], sync_date)
-                    
-                    if sync_result['status'] == 'success':
-                        results['successful_syncs'] += 1
-                    elif sync_result['status'] == 'no_data':
-                        results['no_data_sessions'] += 1
-                    else:
-                        results['failed_syncs'] += 1
-                        
-                except Exception as e:
-                    logger.error(f"❌ Failed to sync session {session['id']}: {e}")
+            sync_results = await self.sync_sessions(pending_sessions.data, sync_date)
+            for sync_result in sync_results.values():
+                if sync_result['status'] == 'success':
+                    results['successful_syncs'] += 1
+                elif sync_result['status'] == 'no_data':
+                    results['no_data_sessions'] += 1
+                else:
                     results['failed_syncs'] += 1
             
             logger.info(f"✅ Sync completed: {results}")
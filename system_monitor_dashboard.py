@@ -17,6 +17,8 @@ import traceback
 
 from supabase import Client
 import aiohttp
+from count_service import get_count_service, CountSpec
+from request_memo import request_scope, memo_execute, add_request_memo_middleware
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
@@ -78,6 +80,7 @@ class SystemMonitor:
     
     def __init__(self, supabase_client: Client):
         self.supabase = supabase_client
+        self.counts = get_count_service(supabase_client)
         self.start_time = datetime.now()
         self.metrics_cache = {}
         self.cache_duration = timedelta(minutes=5)
@@ -85,16 +88,19 @@ class SystemMonitor:
     async def get_system_overview(self) -> Dict[str, Any]:
         """Get complete system health overview"""
         try:
-            overview = {
-                "system_status": await self._get_overall_health(),
-                "uptime": self._get_uptime(),
-                "core_metrics": await self._get_core_metrics(),
-                "feature_status": await self._get_feature_status(),
-                "user_journey": await self._get_user_journey_health(),
-                "infrastructure": await self._get_infrastructure_status(),
-                "alerts": await self._get_active_alerts(),
-                "last_updated": datetime.now().isoformat()
-            }
+            # The sections below repeat many of the same counts - dedup them per overview
+            async with request_scope("system_overview") as memo:
+                overview = {
+                    "system_status": await self._get_overall_health(),
+                    "uptime": self._get_uptime(),
+                    "core_metrics": await self._get_core_metrics(),
+                    "feature_status": await self._get_feature_status(),
+                    "user_journey": await self._get_user_journey_health(),
+                    "infrastructure": await self._get_infrastructure_status(),
+                    "alerts": await self._get_active_alerts(),
+                    "last_updated": datetime.now().isoformat()
+                }
+                overview["query_stats"] = memo.get_stats()
             return overview
         except Exception as e:
             logger.error(f"Error getting system overview: {e}")
@@ -176,29 +182,18 @@ class SystemMonitor:
         try:
             metrics = {}
             
-            # Table sizes and record counts
+            # Table sizes and recent activity (last 24 hours) - one batched count request
             tables = ["users", "commitments", "pods", "pod_memberships", "meetings"]
-            for table in tables:
-                try:
-                    result = self.supabase.table(table).select("*", count="exact").execute()
-                    metrics[f"{table}_count"] = result.count
-                except:
-                    metrics[f"{table}_count"] = "error"
-            
-            # Recent activity (last 24 hours)
-            yesterday = (datetime.now() - timedelta(days=1)).isoformat()
-            
-            # New users
-            new_users = self.supabase.table("users").select("id", count="exact").gte("created_at", yesterday).execute()
-            metrics["new_users_24h"] = new_users.count
+            yesterday = self.counts.since(days=1)
             
-            # New commitments
-            new_commitments = self.supabase.table("commitments").select("id", count="exact").gte("created_at", yesterday).execute()
-            metrics["new_commitments_24h"] = new_commitments.count
+            specs = {f"{table}_count": CountSpec.build(table) for table in tables}
+            specs["new_users_24h"] = CountSpec.build("users", gte={"created_at": yesterday})
+            specs["new_commitments_24h"] = CountSpec.build("commitments", gte={"created_at": yesterday})
+            specs["completed_commitments_24h"] = CountSpec.build("commitments", gte={"completed_at": yesterday})
             
-            # Completed commitments
-            completed_commitments = self.supabase.table("commitments").select("id", count="exact").gte("completed_at", yesterday).execute()
-            metrics["completed_commitments_24h"] = completed_commitments.count
+            counts = await self.counts.count_many(specs)
+            for key, value in counts.items():
+                metrics[key] = value if value is not None else "error"
             
             return metrics
         except Exception as e:
@@ -246,22 +241,22 @@ class SystemMonitor:
     async def _get_recent_bot_activity(self) -> Dict[str, Any]:
         """Get recent bot activity metrics"""
         try:
-            yesterday = (datetime.now() - timedelta(days=1)).isoformat()
+            yesterday = self.counts.since(days=1)
             
             # Count recent commitments as proxy for bot activity
-            recent_commits = self.supabase.table("commitments").select("id", count="exact").gte("created_at", yesterday).execute()
+            recent_commits = await self.counts.count("commitments", gte={"created_at": yesterday})
             
             # Count recent completions
-            recent_completions = self.supabase.table("commitments").select("id", count="exact").gte("completed_at", yesterday).execute()
+            recent_completions = await self.counts.count("commitments", gte={"completed_at": yesterday})
             
             # Count active users (updated recently)
-            active_users = self.supabase.table("users").select("id", count="exact").gte("last_activity_at", yesterday).execute()
+            active_users = await self.counts.count("users", gte={"last_activity_at": yesterday})
             
             return {
-                "messages_24h": recent_commits.count + recent_completions.count,
-                "active_users_24h": active_users.count,
-                "new_commitments_24h": recent_commits.count,
-                "completions_24h": recent_completions.count
+                "messages_24h": recent_commits + recent_completions,
+                "active_users_24h": active_users,
+                "new_commitments_24h": recent_commits,
+                "completions_24h": recent_completions
             }
         except Exception as e:
             logger.error(f"Error getting bot activity: {e}")
@@ -414,16 +409,15 @@ class SystemMonitor:
         """Get usage statistics for a specific command/feature"""
         try:
             # For now, estimate usage based on related database activity
-            yesterday = (datetime.now() - timedelta(days=1)).isoformat()
-            
-            if command == "/commit":
-                result = self.supabase.table("commitments").select("created_at").gte("created_at", yesterday).execute()
-                usage_24h = len(result.data)
-                last_used = max([datetime.fromisoformat(r["created_at"]) for r in result.data]) if result.data else None
-            elif command == "/done":
-                result = self.supabase.table("commitments").select("completed_at").gte("completed_at", yesterday).execute()
-                usage_24h = len(result.data)
-                last_used = max([datetime.fromisoformat(r["completed_at"]) for r in result.data]) if result.data else None
+            yesterday = self.counts.since(days=1)
+            
+            usage_columns = {"/commit": "created_at", "/done": "completed_at"}
+            
+            if command in usage_columns:
+                column = usage_columns[command]
+                usage_24h = await self.counts.count("commitments", gte={column: yesterday})
+                latest = await memo_execute(self.supabase.table("commitments").select(column).gte(column, yesterday).order(column, desc=True).limit(1))
+                last_used = datetime.fromisoformat(latest.data[0][column]) if latest.data else None
             else:
                 # For other commands, we'd need actual usage logging
                 usage_24h = 0
@@ -475,26 +469,26 @@ class SystemMonitor:
             metrics = {}
             
             # Overall completion rate
-            total_commitments = self.supabase.table("commitments").select("id", count="exact").execute()
-            completed_commitments = self.supabase.table("commitments").select("id", count="exact").eq("status", "completed").execute()
+            total_commitments = await self.counts.count("commitments")
+            completed_commitments = await self.counts.count("commitments", eq={"status": "completed"})
             
-            if total_commitments.count > 0:
-                metrics["commitment_completion_rate"] = completed_commitments.count / total_commitments.count
+            if total_commitments > 0:
+                metrics["commitment_completion_rate"] = completed_commitments / total_commitments
             else:
                 metrics["commitment_completion_rate"] = 0
             
             # User retention (active in last 7 days)
-            week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-            total_users = self.supabase.table("users").select("id", count="exact").execute()
-            active_users = self.supabase.table("users").select("id", count="exact").gte("last_activity_at", week_ago).execute()
+            week_ago = self.counts.since(days=7)
+            total_users = await self.counts.count("users")
+            active_users = await self.counts.count("users", gte={"last_activity_at": week_ago})
             
-            if total_users.count > 0:
-                metrics["user_retention_rate"] = active_users.count / total_users.count
+            if total_users > 0:
+                metrics["user_retention_rate"] = active_users / total_users
             else:
                 metrics["user_retention_rate"] = 0
             
             # Average streak length
-            users = self.supabase.table("users").select("current_streak, longest_streak").execute()
+            users = await memo_execute(self.supabase.table("users").select("current_streak, longest_streak"))
             if users.data:
                 metrics["avg_current_streak"] = sum(u.get("current_streak", 0) for u in users.data) / len(users.data)
                 metrics["avg_longest_streak"] = sum(u.get("longest_streak", 0) for u in users.data) / len(users.data)
@@ -678,10 +672,10 @@ class SystemMonitor:
         try:
             if step_type == "registration":
                 # All users who registered
-                total_users = self.supabase.table("users").select("id", count="exact").execute()
+                total_users = await self.counts.count("users")
                 return UserJourneyStep(
                     step_name=step_name,
-                    user_count=total_users.count,
+                    user_count=total_users,
                     completion_rate=1.0,  # All registered users completed registration
                     avg_time_to_complete=None,
                     drop_off_rate=0.0,
@@ -690,17 +684,17 @@ class SystemMonitor:
             
             elif step_type == "first_commit":
                 # Users who made their first commitment
-                total_users = self.supabase.table("users").select("id", count="exact").execute()
-                users_with_commits = self.supabase.table("users").select("id", count="exact").not_.is_("first_commitment_at", "null").execute()
+                total_users = await self.counts.count("users")
+                users_with_commits = await self.counts.count("users", not_null=["first_commitment_at"])
                 
-                completion_rate = users_with_commits.count / total_users.count if total_users.count > 0 else 0
+                completion_rate = users_with_commits / total_users if total_users > 0 else 0
                 drop_off_rate = 1 - completion_rate
                 
                 status = HealthStatus.HEALTHY if completion_rate >= 0.7 else HealthStatus.WARNING
                 
                 return UserJourneyStep(
                     step_name=step_name,
-                    user_count=users_with_commits.count,
+                    user_count=users_with_commits,
                     completion_rate=completion_rate,
                     avg_time_to_complete=None,
                     drop_off_rate=drop_off_rate,
@@ -709,18 +703,18 @@ class SystemMonitor:
             
             elif step_type == "engagement":
                 # Users active in last 7 days
-                week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-                total_users = self.supabase.table("users").select("id", count="exact").execute()
-                active_users = self.supabase.table("users").select("id", count="exact").gte("last_activity_at", week_ago).execute()
+                week_ago = self.counts.since(days=7)
+                total_users = await self.counts.count("users")
+                active_users = await self.counts.count("users", gte={"last_activity_at": week_ago})
                 
-                completion_rate = active_users.count / total_users.count if total_users.count > 0 else 0
+                completion_rate = active_users / total_users if total_users > 0 else 0
                 drop_off_rate = 1 - completion_rate
                 
                 status = HealthStatus.HEALTHY if completion_rate >= 0.6 else HealthStatus.WARNING
                 
                 return UserJourneyStep(
                     step_name=step_name,
-                    user_count=active_users.count,
+                    user_count=active_users,
                     completion_rate=completion_rate,
                     avg_time_to_complete=None,
                     drop_off_rate=drop_off_rate,
@@ -729,17 +723,17 @@ class SystemMonitor:
             
             elif step_type == "retention":
                 # Users with current streak > 0
-                total_users = self.supabase.table("users").select("id", count="exact").execute()
-                retained_users = self.supabase.table("users").select("id", count="exact").gt("current_streak", 0).execute()
+                total_users = await self.counts.count("users")
+                retained_users = await self.counts.count("users", gt={"current_streak": 0})
                 
-                completion_rate = retained_users.count / total_users.count if total_users.count > 0 else 0
+                completion_rate = retained_users / total_users if total_users > 0 else 0
                 drop_off_rate = 1 - completion_rate
                 
                 status = HealthStatus.HEALTHY if completion_rate >= 0.4 else HealthStatus.WARNING
                 
                 return UserJourneyStep(
                     step_name=step_name,
-                    user_count=retained_users.count,
+                    user_count=retained_users,
                     completion_rate=completion_rate,
                     avg_time_to_complete=None,
                     drop_off_rate=drop_off_rate,
@@ -775,24 +769,24 @@ class SystemMonitor:
             # Check for system issues that need attention
             
             # Low user activity alert
-            yesterday = (datetime.now() - timedelta(days=1)).isoformat()
-            active_users = self.supabase.table("users").select("id", count="exact").gte("last_activity_at", yesterday).execute()
+            yesterday = self.counts.since(days=1)
+            active_users = await self.counts.count("users", gte={"last_activity_at": yesterday})
             
-            if active_users.count < 5:  # Threshold for concern
+            if active_users < 5:  # Threshold for concern
                 alerts.append({
                     "severity": "warning",
                     "component": "user_activity",
-                    "message": f"Low user activity: only {active_users.count} active users in last 24h",
+                    "message": f"Low user activity: only {active_users} active users in last 24h",
                     "timestamp": datetime.now().isoformat(),
                     "suggested_action": "Check bot functionality and user engagement"
                 })
             
             # Low commitment completion rate
-            total_commits = self.supabase.table("commitments").select("id", count="exact").gte("created_at", yesterday).execute()
-            completed_commits = self.supabase.table("commitments").select("id", count="exact").gte("completed_at", yesterday).execute()
+            total_commits = await self.counts.count("commitments", gte={"created_at": yesterday})
+            completed_commits = await self.counts.count("commitments", gte={"completed_at": yesterday})
             
-            if total_commits.count > 0:
-                completion_rate = completed_commits.count / total_commits.count
+            if total_commits > 0:
+                completion_rate = completed_commits / total_commits
                 if completion_rate < 0.3:
                     alerts.append({
                         "severity": "warning",
@@ -803,8 +797,8 @@ class SystemMonitor:
                     })
             
             # No new users alert
-            new_users = self.supabase.table("users").select("id", count="exact").gte("created_at", yesterday).execute()
-            if new_users.count == 0:
+            new_users = await self.counts.count("users", gte={"created_at": yesterday})
+            if new_users == 0:
                 alerts.append({
                     "severity": "info",
                     "component": "user_growth",
@@ -840,44 +834,44 @@ class SystemMonitor:
         
         try:
             # Total users
-            total_users = self.supabase.table("users").select("id", count="exact").execute()
+            total_users = await self.counts.count("users")
             metrics.append(SystemMetric(
                 name="total_users",
-                value=total_users.count,
+                value=total_users,
                 status=HealthStatus.HEALTHY,
                 last_updated=datetime.now(),
                 description="Total registered users"
             ))
             
             # Active users (last 7 days)
-            week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-            active_users = self.supabase.table("users").select("id", count="exact").gte("last_activity_at", week_ago).execute()
+            week_ago = self.counts.since(days=7)
+            active_users = await self.counts.count("users", gte={"last_activity_at": week_ago})
             
-            activity_rate = active_users.count / total_users.count if total_users.count > 0 else 0
+            activity_rate = active_users / total_users if total_users > 0 else 0
             status = HealthStatus.HEALTHY if activity_rate >= 0.6 else HealthStatus.WARNING
             
             metrics.append(SystemMetric(
                 name="weekly_active_users",
-                value=active_users.count,
+                value=active_users,
                 status=status,
                 last_updated=datetime.now(),
                 description="Users active in last 7 days",
-                target_value=int(total_users.count * 0.6)
+                target_value=int(total_users * 0.6)
             ))
             
             # Total commitments
-            total_commitments = self.supabase.table("commitments").select("id", count="exact").execute()
+            total_commitments = await self.counts.count("commitments")
             metrics.append(SystemMetric(
                 name="total_commitments",
-                value=total_commitments.count,
+                value=total_commitments,
                 status=HealthStatus.HEALTHY,
                 last_updated=datetime.now(),
                 description="Total commitments created"
             ))
             
             # Completion rate
-            completed_commitments = self.supabase.table("commitments").select("id", count="exact").eq("status", "completed").execute()
-            completion_rate = completed_commitments.count / total_commitments.count if total_commitments.count > 0 else 0
+            completed_commitments = await self.counts.count("commitments", eq={"status": "completed"})
+            completion_rate = completed_commitments / total_commitments if total_commitments > 0 else 0
             
             completion_status = HealthStatus.HEALTHY if completion_rate >= 0.6 else HealthStatus.WARNING
             
@@ -909,6 +903,9 @@ def create_dashboard_app(monitor: SystemMonitor) -> FastAPI:
     
     app = FastAPI(title="Progress Method - System Monitor", version="1.0.0")
     
+    # Each dashboard request gets its own query memo scope
+    add_request_memo_middleware(app)
+    
     @app.get("/", response_class=HTMLResponse)
     async def dashboard_home():
         """Main dashboard page"""
@@ -982,7 +982,10 @@ async def complete_commitment_callback(callback: CallbackQuery, state: FSMContex
     if not success:
         await callback.answer("❌ Error marking commitment complete. Please try again.", show_alert=True)
         return
-    
+
+    # Keep cached pod week leaderboards in sync
+    pod_tracker.mark_commitment_completed(commitment_id)
+
     # Check if this is their first completion for special celebration
     should_celebrate = await first_impression.should_trigger_celebration(user_id)
     
@@ -2036,6 +2039,12 @@ async def main():
     """Main function to run the bot"""
     try:
         await set_bot_commands()
+        
+        # Warm the shared user directory used by leaderboards and bulk paths
+        if supabase is not None:
+            from user_directory import warm_user_directory
+            await warm_user_directory(supabase)
+        
         logger.info("Bot started successfully!")
         await dp.start_polling(bot)
     except Exception as e:
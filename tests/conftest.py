@@ -29,6 +29,172 @@ def mock_supabase():
     mock.table.return_value.delete.return_value.execute.return_value.data = [{"id": "test-id"}]
     return mock
 
+class FakeResult:
+    """Response of an executed fake query"""
+
+    def __init__(self, data=None, count=None):
+        self.data = data
+        self.count = count
+
+class FakeQuery:
+    """Chained PostgREST-style builder over FakeSupabase's in-memory tables"""
+
+    FILTERS = {
+        "eq": lambda value, arg: value == arg,
+        "neq": lambda value, arg: value != arg,
+        "gt": lambda value, arg: value is not None and value > arg,
+        "gte": lambda value, arg: value is not None and value >= arg,
+        "lt": lambda value, arg: value is not None and value < arg,
+        "lte": lambda value, arg: value is not None and value <= arg,
+        "in_": lambda value, arg: value in arg,
+    }
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.payload = None
+        self.filters = []
+        self.order_by = []
+        self.limit_value = None
+        self.range_value = None
+        self.on_conflict = None
+
+    def select(self, *columns, **options):
+        return self
+
+    def insert(self, rows):
+        self.op, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict=None, **options):
+        self.op, self.payload = "upsert", rows
+        self.on_conflict = on_conflict
+        return self
+
+    def update(self, values):
+        self.op, self.payload = "update", values
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def __getattr__(self, name):
+        # eq / gt / in_ ... record a filter; anything else (or_, not_, ...) is accepted and ignored
+        if name in self.FILTERS:
+            def add_filter(column, value):
+                self.filters.append((name, column, value))
+                return self
+            return add_filter
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self
+
+    def order(self, column, desc=False):
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self.limit_value = count
+        return self
+
+    def range(self, start, end):
+        self.range_value = (start, end)
+        return self
+
+    def _matches(self, row):
+        # Filters on embedded resources ("pod_meetings.pod_id") are not simulated
+        return all(self.FILTERS[op](row.get(column), value) for op, column, value in self.filters if "." not in column)
+
+    def execute(self):
+        self.client.calls.append(self)
+        self.client.raise_if_failing(f"{self.table}.{self.op}")
+        rows = self.client.tables.setdefault(self.table, [])
+
+        if self.op in ("insert", "upsert"):
+            new_rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            keys = [key for key in (self.on_conflict or "").split(",") if key] if self.op == "upsert" else []
+            for new_row in new_rows:
+                existing = [row for row in rows if keys and all(row.get(key) == new_row.get(key) for key in keys)]
+                if existing:
+                    existing[0].update(new_row)
+                else:
+                    rows.append(dict(new_row))
+            return FakeResult(new_rows)
+        if self.op == "update":
+            matched = [row for row in rows if self._matches(row)]
+            for row in matched:
+                row.update(self.payload)
+            return FakeResult(matched)
+        if self.op == "delete":
+            matched = [row for row in rows if self._matches(row)]
+            self.client.tables[self.table] = [row for row in rows if row not in matched]
+            return FakeResult(matched)
+
+        matched = [row for row in rows if self._matches(row)]
+        for column, desc in reversed(self.order_by):
+            matched.sort(key=lambda row: row.get(column), reverse=desc)
+        if self.range_value:
+            matched = matched[self.range_value[0]:self.range_value[1] + 1]
+        if self.limit_value is not None:
+            matched = matched[:self.limit_value]
+        matched = matched[:self.client.max_rows]
+        return FakeResult(matched, count=len(matched))
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.client.rpc_calls.append((self.name, self.params))
+        self.client.raise_if_failing(f"rpc.{self.name}")
+        handler = self.client.rpc_handlers.get(self.name)
+        if handler is None:
+            raise Exception(f"PGRST202: Could not find the function {self.name}")
+        return FakeResult(handler(self.params))
+
+class FakeSupabase:
+    """In-memory Supabase client: tables are lists of dicts, responses are capped at `max_rows`
+
+    Executed queries are kept in `calls` and RPCs in `rpc_calls`. `rpc_handlers` maps an RPC
+    name to a function of its params (unknown RPCs fail like an undeployed function), and
+    `fail(key, times)` makes the next `times` executions of "table.op" or "rpc.name" raise.
+    """
+
+    def __init__(self, tables=None, max_rows=1000):
+        self.tables = {name: [dict(row) for row in rows] for name, rows in (tables or {}).items()}
+        self.max_rows = max_rows
+        self.calls = []
+        self.rpc_calls = []
+        self.rpc_handlers = {}
+        self.failures = {}
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRpc(self, name, params or {})
+
+    def fail(self, key, times=1, message="connection reset"):
+        self.failures[key] = (times, message)
+
+    def raise_if_failing(self, key):
+        times, message = self.failures.get(key, (0, None))
+        if times:
+            self.failures[key] = (times - 1, message)
+            raise Exception(message)
+
+    def executed(self, table, op="select"):
+        return [query for query in self.calls if query.table == table and query.op == op]
+
+@pytest.fixture
+def fake_supabase():
+    """In-memory Supabase client for code that pages, filters and writes in bulk"""
+    return FakeSupabase()
+
 @pytest.fixture
 def mock_telegram_bot():
     """Mock Telegram bot."""
@@ -0,0 +1,81 @@
+"""Tests for admin keyset pagination helpers."""
+
+import base64
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from admin_pagination import (
+    ADMIN_USER_SEARCH_COLUMNS, MAX_PAGE_SIZE, decode_cursor, encode_cursor, fetch_keyset_page,
+    quote_filter_value, search_filter
+)
+
+ROW = {"created_at": "2024-01-01T10:00:00+00:00", "id": "550e8400-e29b-41d4-a716-446655440000"}
+
+def raw_cursor(created_at, row_id):
+    return base64.urlsafe_b64encode(json.dumps([created_at, row_id]).encode()).decode().rstrip("=")
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(ROW)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (ROW["created_at"], ROW["id"])
+
+def test_cursor_accepts_zulu_time():
+    assert decode_cursor(raw_cursor("2024-01-01T10:00:00Z", ROW["id"]))[0] == "2024-01-01T10:00:00Z"
+
+@pytest.mark.parametrize("cursor", [
+    "not-base64!",
+    raw_cursor(None, ROW["id"]),
+    raw_cursor(ROW["created_at"], ""),
+    raw_cursor("2024-01-01,id.gt.0", ROW["id"]),
+    raw_cursor(ROW["created_at"], "1),or(id.gt.0"),
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+def test_quote_filter_value_escapes():
+    assert quote_filter_value('a,b."c"\\') == '"a,b.\\"c\\"\\\\"'
+
+def test_search_filter():
+    assert search_filter("", ADMIN_USER_SEARCH_COLUMNS) is None
+    assert search_filter("ann,x", ("first_name", "email")) == 'first_name.ilike."*ann,x*",email.ilike."*ann,x*"'
+
+def page_query(rows):
+    query = MagicMock()
+    query.or_.return_value = query
+    query.order.return_value = query
+    query.limit.return_value = query
+    query.execute.return_value.data = rows
+    return query
+
+def test_first_page_reports_next_cursor():
+    rows = [dict(ROW, id=f"550e8400-e29b-41d4-a716-44665544000{i}") for i in range(3)]
+    query = page_query(rows)
+
+    page = fetch_keyset_page(query, limit=2)
+
+    query.limit.assert_called_once_with(3)
+    query.or_.assert_not_called()
+    assert page["rows"] == rows[:2]
+    assert page["has_more"] is True
+    assert decode_cursor(page["next_cursor"]) == (rows[1]["created_at"], rows[1]["id"])
+
+def test_cursor_and_search_are_combined_in_one_or():
+    query = page_query([])
+    search = search_filter("ann", ("first_name",))
+
+    page = fetch_keyset_page(query, cursor=encode_cursor(ROW), limit=10, or_filter=search)
+
+    predicate = query.or_.call_args[0][0]
+    assert predicate == (
+        f'and(or({search}),created_at.lt."{ROW["created_at"]}"),'
+        f'and(or({search}),created_at.eq."{ROW["created_at"]}",id.lt.{ROW["id"]})'
+    )
+    assert page == {"rows": [], "next_cursor": None, "has_more": False}
+
+def test_limit_is_clamped():
+    query = page_query([])
+    fetch_keyset_page(query, limit=10 * MAX_PAGE_SIZE)
+    query.limit.assert_called_once_with(MAX_PAGE_SIZE + 1)
@@ -0,0 +1,64 @@
+"""Tests for the streaming attendance export."""
+
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from attendance_export import (
+    AttendanceExporter, EXPORT_COLUMNS, MAX_PAGE_SIZE, encode_rows, export_filename, gzip_chunks
+)
+
+def export_row(i):
+    return {column: None for column in EXPORT_COLUMNS} | {"attendance_id": i, "first_name": f"Member, {i}"}
+
+def attendance_client(fake_supabase, count, max_rows):
+    fake_supabase.max_rows = max_rows
+    fake_supabase.tables["meeting_attendance"] = [{
+        "id": i, "meeting_id": "m", "user_id": f"u{i}", "attended": True, "duration_minutes": 30,
+        "created_at": "2024-01-01", "pod_meetings": {"pod_id": "p"}, "users": {"first_name": "A"}
+    } for i in range(1, count + 1)]
+    return fake_supabase
+
+def test_csv_chunks_share_one_header():
+    chunks = list(encode_rows((export_row(i) for i in range(5)), "csv", rows_per_chunk=2))
+    assert len(chunks) == 3
+
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+    assert [row["attendance_id"] for row in rows] == ["0", "1", "2", "3", "4"]
+    assert rows[1]["first_name"] == "Member, 1"
+
+def test_ndjson_lines():
+    data = b"".join(encode_rows([export_row(1), export_row(2)], "ndjson")).decode()
+    assert [json.loads(line)["attendance_id"] for line in data.splitlines()] == [1, 2]
+
+def test_unknown_format():
+    with pytest.raises(ValueError, match="Unsupported export format"):
+        list(encode_rows([], "xml"))
+
+def test_empty_csv_is_header_only():
+    assert b"".join(encode_rows([], "csv")).decode().strip() == ",".join(EXPORT_COLUMNS)
+
+def test_gzip_chunks_round_trip():
+    chunks = [b"attendance_id\n", b"1\n" * 1000, b"", b"2\n"]
+    assert gzip.decompress(b"".join(gzip_chunks(chunks))) == b"".join(chunks)
+
+def test_export_filename():
+    assert export_filename("csv") == "attendance-all-pods.csv"
+    assert export_filename("ndjson", True, "pod1", start_date="2024-01-01") == "attendance-pod1-2024-01-01_end.ndjson.gz"
+
+def test_short_pages_do_not_end_the_export(fake_supabase):
+    # The server returns fewer rows than asked for; only an empty page means done
+    supabase = attendance_client(fake_supabase, count=7, max_rows=3)
+    rows = list(AttendanceExporter(supabase, page_size=5).iter_rows())
+    assert [row["attendance_id"] for row in rows] == list(range(1, 8))
+
+def test_page_size_is_clamped_to_server_cap(fake_supabase):
+    supabase = attendance_client(fake_supabase, count=2500, max_rows=MAX_PAGE_SIZE)
+    exporter = AttendanceExporter(supabase, page_size=5000)
+
+    assert exporter.page_size == MAX_PAGE_SIZE
+    assert len(list(exporter.iter_rows())) == 2500
+    assert {query.limit_value for query in supabase.executed("meeting_attendance")} == {MAX_PAGE_SIZE}
@@ -0,0 +1,96 @@
+"""Tests for the members x meetings attendance matrix (NumPy and pure-Python paths)."""
+
+import random
+
+import pytest
+
+import attendance_matrix
+from attendance_matrix import ABSENT, ATTENDED, AttendanceMatrix, STAT_NAMES, band, first_match, ratio
+
+@pytest.fixture(params=[True, False], ids=["numpy", "python"])
+def numpy_mode(request, monkeypatch):
+    if request.param and not attendance_matrix.NUMPY_AVAILABLE:
+        pytest.skip("NumPy not installed")
+    monkeypatch.setattr(attendance_matrix, "NUMPY_AVAILABLE", request.param)
+    return request.param
+
+def random_cells(members, meetings, seed):
+    rng = random.Random(seed)
+    cells = []
+    for member in members:
+        for meeting in meetings:
+            roll = rng.random()
+            if roll < 0.2:
+                continue  # no record
+            attended = roll > 0.45
+            duration = rng.choice([None, rng.uniform(5, 60)]) if attended else None
+            offset = rng.choice([None, rng.uniform(-5, 15)]) if attended else None
+            cells.append((member, meeting, ATTENDED if attended else ABSENT, duration, offset, attended and rng.random() < 0.3))
+    return cells
+
+def stats_with(numpy_enabled, monkeypatch, members, meetings, cells):
+    monkeypatch.setattr(attendance_matrix, "NUMPY_AVAILABLE", numpy_enabled)
+    return AttendanceMatrix(members, meetings, cells).stats()
+
+def test_numpy_and_python_paths_agree(monkeypatch):
+    if not attendance_matrix.NUMPY_AVAILABLE:
+        pytest.skip("NumPy not installed")
+
+    members = [f"m{i}" for i in range(40)]
+    meetings = [f"s{j}" for j in range(12)]
+    for seed in range(5):
+        cells = random_cells(members, meetings, seed)
+        vectorized = stats_with(True, monkeypatch, members, meetings, cells)
+        python = stats_with(False, monkeypatch, members, meetings, cells)
+
+        for name in STAT_NAMES:
+            for got, expected in zip(vectorized[name], python[name]):
+                if isinstance(expected, float):
+                    assert got == pytest.approx(expected), name
+                else:
+                    assert got == expected, name
+
+def test_member_history(numpy_mode):
+    meetings = [f"s{j}" for j in range(7)]
+    # attended, attended, absent, (no record), attended x3
+    states = [ATTENDED, ATTENDED, ABSENT, None, ATTENDED, ATTENDED, ATTENDED]
+    cells = [("m1", meeting, state, 30.0 if state == ATTENDED else None, 2.0 if state == ATTENDED else None, j == 0)
+             for j, (meeting, state) in enumerate(zip(meetings, states)) if state is not None]
+    cells.append(("outsider", "s0", ATTENDED, 10.0, 0.0, False))
+    cells.append(("m1", "other-meeting", ABSENT, None, None, False))
+
+    stats = AttendanceMatrix(["m1", "m2"], meetings, cells).stats()
+
+    assert stats["records"] == [6, 0]
+    assert stats["attended"] == [5, 0]
+    assert stats["late_count"] == [1, 0]
+    assert stats["average_duration"] == [30.0, 0.0]
+    assert stats["average_offset"] == [2.0, 0.0]
+    assert stats["current_streak"] == [3, 0]
+    assert stats["longest_streak"] == [3, 0]
+    assert stats["recent_records"] == [6, 0]
+    assert stats["recent_attended"] == [5, 0]
+    assert stats["trend_recent"] == [3, 0]
+    assert stats["trend_earlier"] == [2, 0]
+    assert stats["attended_recently"] == [True, False]
+    assert stats["last_attended"] == [6, -1]
+
+def test_empty_matrix(numpy_mode):
+    assert AttendanceMatrix([], ["s0"], []).stats() == {name: [] for name in STAT_NAMES}
+
+def test_no_meetings(numpy_mode):
+    stats = AttendanceMatrix(["m1"], [], []).stats()
+    assert stats["records"] == [0]
+    assert stats["current_streak"] == [0]
+    assert stats["last_attended"] == [-1]
+
+def test_ratio(numpy_mode):
+    assert ratio([1, 3, 5], [2, 0, 5], empty=-1.0) == [0.5, -1.0, 1.0]
+
+def test_band(numpy_mode):
+    assert band([0.1, 0.5, 0.8, 0.95], [0.2, 0.5, 0.8, 0.95], "abcde") == ["a", "c", "d", "e"]
+
+def test_first_match(numpy_mode):
+    conditions = [[True, False, False], [True, True, False]]
+    assert first_match(conditions, ["first", "second"], "none") == ["first", "second", "none"]
+    assert first_match([], ["first"], "none") == []
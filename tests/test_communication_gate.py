@@ -0,0 +1,74 @@
+"""Tests for the in-memory communication gate shared by several processes."""
+
+import time
+
+import pytest
+
+from communication_gate import CommunicationGate
+
+PREFS = {"telegram_user_id": 1, "communication_style": "balanced",
+         "enabled_message_types": ["daily_checkin"], "pause_until": None}
+
+@pytest.fixture
+def supabase(fake_supabase):
+    fake_supabase.tables.update({"communication_preferences": [PREFS], "message_analytics": [],
+                                 "communication_gate_state": []})
+    return fake_supabase
+
+def stored_sends(supabase):
+    gate = CommunicationGate(supabase)
+    gate.ensure_loaded([1])
+    return gate._users[1].hourly_sent.total(time.time())
+
+def test_checkpoints_from_two_processes_add_up(supabase):
+    first, second = CommunicationGate(supabase), CommunicationGate(supabase)
+    first.ensure_loaded([1])
+    second.ensure_loaded([1])
+
+    first.record_sent(1)
+    second.record_sent(1)
+    second.record_sent(1)
+    assert first.checkpoint() == 1
+    assert second.checkpoint() == 1
+
+    assert len(supabase.tables["communication_gate_state"]) == 1
+    assert stored_sends(supabase) == 3
+    assert first.get_stats()["merge_rpc_available"] is False
+
+def test_refresh_picks_up_counts_from_other_processes(supabase):
+    gate, other = CommunicationGate(supabase, prefs_ttl_seconds=0), CommunicationGate(supabase)
+    assert gate.check(1, "daily_checkin")["should_send"] is True
+
+    other.ensure_loaded([1])
+    other.record_sent(1)
+    other.record_sent(1)
+    other.checkpoint()
+
+    assert gate.check(1, "daily_checkin")["reason"] == "frequency_limit_reached"
+    assert gate.stats["refreshed"] == 1
+
+def test_failed_checkpoint_keeps_pending_counts(supabase):
+    gate = CommunicationGate(supabase)
+    gate.ensure_loaded([1])
+    gate.record_sent(1)
+    supabase.fail("communication_gate_state.upsert")
+
+    assert gate.checkpoint() == 0
+    gate.record_sent(1)
+    assert gate.checkpoint() == 1
+    assert stored_sends(supabase) == 2
+
+def test_merge_rpc_receives_only_this_process_counts(supabase):
+    supabase.rpc_handlers["merge_communication_gate_state"] = lambda params: len(params["deltas"])
+    supabase.tables["communication_gate_state"] = [{
+        "telegram_user_id": 1, "checkpointed_at": "2024-01-01T00:00:00",
+        "state": {"daily_sent": {"periods": [int(time.time() // 86400)] + [-1] * 14, "counts": [5] + [0] * 14}},
+    }]
+    gate = CommunicationGate(supabase)
+    gate.ensure_loaded([1])
+    gate.record_sent(1)
+    gate.checkpoint()
+
+    (name, params), = supabase.rpc_calls
+    assert sum(params["deltas"][0]["state"]["daily_sent"]["counts"]) == 1
+    assert supabase.executed("communication_gate_state", "upsert") == []
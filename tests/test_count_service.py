@@ -0,0 +1,42 @@
+"""Tests for the shared count service cache."""
+
+import asyncio
+from unittest.mock import MagicMock
+
+import count_service
+from count_service import CountService, CountSpec
+
+def head_counting_client(count=5):
+    supabase = MagicMock()
+    supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.count = count
+    return supabase
+
+def test_cached_count_is_reused():
+    supabase = head_counting_client()
+    service = CountService(supabase)
+    spec = CountSpec.build("users", eq={"is_active": True})
+
+    assert asyncio.run(service.count_many({"a": spec})) == {"a": 5}
+    assert asyncio.run(service.count_many({"b": spec})) == {"b": 5}
+    assert service.stats["head_requests"] == 1
+    assert service.stats["cache_hits"] == 1
+
+def test_expired_counts_are_evicted(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(count_service.time, "monotonic", lambda: clock[0])
+    service = CountService(head_counting_client(), ttl_seconds=30)
+
+    for minute in range(5):
+        clock[0] += 60
+        asyncio.run(service.count_many({"count": CountSpec.build("users", eq={"window": minute})}))
+
+    assert service.get_stats()["cached_counts"] == 1
+
+def test_cache_size_is_capped():
+    service = CountService(head_counting_client(), max_cached_counts=2)
+    for value in range(3):
+        asyncio.run(service.count_many({"count": CountSpec.build("users", eq={"pod_id": value})}))
+
+    cached = list(service._cache)
+    assert len(cached) == 2
+    assert CountSpec.build("users", eq={"pod_id": 0}) not in cached
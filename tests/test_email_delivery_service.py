@@ -0,0 +1,115 @@
+"""Tests for batched Resend delivery through the delivery engine."""
+
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+
+from delivery_workers import ChannelConfig, DeliveryEngine
+from email_delivery_service import EmailDeliveryService, _parse_retry_after
+
+class FakeResend:
+    """Resend stand-in: a batch or email with an invalid recipient is rejected with 422"""
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.requests.append((request.url.path, body))
+        emails = body if request.url.path == "/emails/batch" else [body]
+        if any("invalid" in to for email in emails for to in email["to"]):
+            return httpx.Response(422, json={"message": "Invalid `to` field"})
+        if request.url.path == "/emails/batch":
+            return httpx.Response(200, json={"data": [{"id": str(uuid.uuid4())} for _ in emails]})
+        return httpx.Response(200, json={"id": str(uuid.uuid4())})
+
+class QueuedDeliveryEngine(DeliveryEngine):
+    """DeliveryEngine claiming from a list instead of message_deliveries"""
+
+    def __init__(self, deliveries, channels):
+        super().__init__(None, channels)
+        self.pending = list(deliveries)
+
+    def claim(self, channel, limit):
+        claimed, self.pending = self.pending[:limit], self.pending[limit:]
+        return claimed
+
+def email_service(resend):
+    service = EmailDeliveryService("re_test", requests_per_second=1000)
+    service._client = httpx.AsyncClient(base_url=service.base_url, transport=httpx.MockTransport(resend))
+    return service
+
+def send_through_engine(service, recipients):
+    async def send(delivery):
+        return await service.send_nurture_email(
+            to_email=delivery["recipient_address"], subject="Update", content="Hello", tracking_id=delivery["id"]
+        )
+
+    deliveries = [{"id": str(i), "recipient_address": address} for i, address in enumerate(recipients)]
+    batch_size = service.MAX_BATCH_SIZE
+    engine = QueuedDeliveryEngine(deliveries, [
+        ChannelConfig("email", send, concurrency=batch_size, rate_per_second=None, claim_batch_size=batch_size)
+    ])
+
+    async def run():
+        totals = await engine.run_once()
+        await service.close()
+        return totals
+    return asyncio.run(run())
+
+def test_engine_fills_batches():
+    resend = FakeResend()
+    totals = send_through_engine(email_service(resend), [f"user{i}@example.com" for i in range(250)])
+
+    assert totals["email_sent"] == 250
+    assert [path for path, _ in resend.requests] == ["/emails/batch"] * 3
+    assert sorted(len(body) for _, body in resend.requests) == [50, 100, 100]
+
+def test_rejected_batch_is_resent_one_by_one():
+    resend = FakeResend()
+    recipients = ["a@example.com", "invalid@example.com", "b@example.com"]
+    totals = send_through_engine(email_service(resend), recipients)
+
+    assert (totals["email_sent"], totals["email_failed"]) == (2, 1)
+    assert [path for path, _ in resend.requests] == ["/emails/batch"] + ["/emails"] * 3
+
+def test_channel_without_rate_has_no_limiter():
+    async def send(delivery):
+        return True
+
+    engine = DeliveryEngine(None, [
+        ChannelConfig("email", send, concurrency=1, rate_per_second=None),
+        ChannelConfig("telegram", send, concurrency=1, rate_per_second=25),
+    ])
+    assert set(engine.limiters) == {"telegram"}
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    in_30s = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+
+    assert _parse_retry_after("2") == 2.0
+    assert 25 < _parse_retry_after(in_30s) <= 30
+    assert _parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert _parse_retry_after("soon") is None
+    assert _parse_retry_after("inf") is None
+    assert _parse_retry_after(None) is None
+
+def test_http_date_retry_after_is_honoured():
+    responses = [
+        httpx.Response(429, headers={"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}),
+        httpx.Response(200, json={"id": "email-1"}),
+    ]
+    service = EmailDeliveryService("re_test", requests_per_second=1000)
+    service._client = httpx.AsyncClient(base_url=service.base_url, transport=httpx.MockTransport(lambda request: responses.pop(0)))
+
+    async def run():
+        result = await service._request("/emails", {"to": ["a@example.com"]})
+        await service.close()
+        return result
+    response, status = asyncio.run(run())
+
+    assert status == 200
+    assert service.stats["throttled"] == 1
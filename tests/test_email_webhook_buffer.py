@@ -0,0 +1,79 @@
+"""Tests for buffered Resend webhook ingestion."""
+
+import asyncio
+
+import pytest
+
+from email_webhook_buffer import EmailWebhookBuffer, TRACKING_ID_CHUNK
+
+@pytest.fixture
+def supabase(fake_supabase):
+    fake_supabase.tables["message_deliveries"] = [
+        {"id": f"d-t{i}", "tracking_id": f"t{i}", "delivery_status": "sent"} for i in range(250)
+    ]
+    fake_supabase.rpc_updates = []
+
+    def apply_statuses(params):
+        fake_supabase.rpc_updates.extend(params["updates"])
+        return len(params["updates"])
+    fake_supabase.rpc_handlers["apply_email_event_statuses"] = apply_statuses
+    return fake_supabase
+
+def delivered_events(count):
+    return {(f"t{i}", "delivered"): (f"2024-01-01T10:00:{i % 3:02d}+00:00", {}) for i in range(count)}
+
+def tracking_id_filters(supabase, op):
+    return [value for query in supabase.executed("message_deliveries", op)
+            for name, column, value in query.filters if column == "tracking_id"]
+
+def test_lookups_are_chunked(supabase):
+    written = EmailWebhookBuffer(supabase)._write(delivered_events(250))
+
+    assert written == 250
+    assert [len(ids) for ids in tracking_id_filters(supabase, "select")] == [100, 100, 50]
+    assert len(supabase.tables["email_events"]) == 250
+
+def test_status_times_come_from_the_events(supabase):
+    EmailWebhookBuffer(supabase)._write({
+        ("t1", "delivered"): ("2024-01-01T10:00:00+00:00", {}),
+        ("t1", "opened"): ("2024-01-01T10:05:00+00:00", {}),
+        ("t2", "bounced"): ("2024-01-01T09:00:00+00:00", {}),
+    })
+
+    by_tracking = {update["tracking_id"]: update for update in supabase.rpc_updates}
+    assert by_tracking["t1"] == {"tracking_id": "t1", "status": "opened", "time_column": "opened_at",
+                                 "at": "2024-01-01T10:05:00+00:00"}
+    assert by_tracking["t2"]["at"] == "2024-01-01T09:00:00+00:00"
+    assert by_tracking["t2"]["reason"] == "Email bounced"
+
+def test_statuses_never_move_backwards(supabase):
+    supabase.tables["message_deliveries"][1]["delivery_status"] = "clicked"
+    EmailWebhookBuffer(supabase)._write({("t1", "opened"): ("2024-01-01T10:00:00+00:00", {})})
+    assert supabase.rpc_updates == []
+
+def test_fallback_updates_group_by_event_time_in_chunks(supabase):
+    del supabase.rpc_handlers["apply_email_event_statuses"]
+    buffer = EmailWebhookBuffer(supabase)
+    buffer._write(delivered_events(250))
+
+    assert buffer.get_stats()["rpc_available"] is False
+    assert all(len(ids) <= TRACKING_ID_CHUNK for ids in tracking_id_filters(supabase, "update"))
+    for row in supabase.tables["message_deliveries"]:
+        assert row["delivery_status"] == "delivered"
+        assert row["delivered_at"] == f"2024-01-01T10:00:{int(row['tracking_id'][1:]) % 3:02d}+00:00"
+
+def test_submitted_event_is_stamped_with_the_webhook_time(supabase):
+    buffer = EmailWebhookBuffer(supabase)
+
+    async def run():
+        buffer.submit({
+            "type": "email.opened",
+            "created_at": "2024-01-02T08:30:00+00:00",
+            "data": {"created_at": "2024-01-01T10:00:00+00:00", "tags": [{"name": "tracking_id", "value": "t1"}]},
+        })
+        await buffer.flush()
+        buffer._flusher.cancel()
+    asyncio.run(run())
+
+    assert supabase.tables["email_events"][0]["event_time"] == "2024-01-02T08:30:00+00:00"
+    assert supabase.rpc_updates[0]["at"] == "2024-01-02T08:30:00+00:00"
@@ -0,0 +1,75 @@
+"""Tests for compiled feature flag evaluation."""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from feature_flag_engine import CompiledFlag, DISABLED, ENABLED, stable_bucket
+
+def flag(**row):
+    return CompiledFlag.from_row({"feature_id": "new_dashboard", "flag": "enabled", "rollout_strategy": "all_users", **row})
+
+def iso(delta_days):
+    return (datetime.now() + timedelta(days=delta_days)).isoformat()
+
+def test_stable_bucket_is_deterministic():
+    assert stable_bucket("new_dashboard", 42) == stable_bucket("new_dashboard", 42)
+    assert 0 <= stable_bucket("new_dashboard", 42) < 100
+    assert flag().bucket(42) == stable_bucket("new_dashboard", 42)
+
+def test_disabled_flag():
+    assert flag(flag="disabled").evaluate(1) == DISABLED
+
+def test_all_users():
+    assert flag().evaluate(1) == ENABLED
+
+@pytest.mark.parametrize("percentage, expected", [(0, False), (100, True)])
+def test_percentage_rollout(percentage, expected):
+    assert flag(rollout_strategy="percentage", rollout_percentage=percentage).evaluate(7) == (expected, None)
+
+def test_percentage_rollout_uses_bucket():
+    compiled = flag(rollout_strategy="percentage", rollout_percentage=50)
+    for user_id in range(50):
+        assert compiled.evaluate(user_id) == (compiled.bucket(user_id) < 50, None)
+
+def test_user_list_accepts_json_strings():
+    compiled = flag(rollout_strategy="user_list", target_user_ids=json.dumps([1, 2]))
+    assert compiled.evaluate(2) == (True, None)
+    assert compiled.evaluate("2") == (True, None)
+    assert compiled.evaluate(3) == (False, None)
+
+def test_role_based():
+    compiled = flag(rollout_strategy="role_based", target_user_roles=["admin"])
+    assert compiled.evaluate(1, ["member", "admin"]) == (True, None)
+    assert compiled.evaluate(1, ["member"]) == (False, None)
+    assert compiled.evaluate(1) == (False, None)
+
+def test_time_based():
+    assert flag(rollout_strategy="time_based", rollout_target_date=iso(-1)).evaluate(1) == (True, None)
+    assert flag(rollout_strategy="time_based", rollout_target_date=iso(1)).evaluate(1) == (False, None)
+
+def test_ab_test_assigns_groups_by_bucket():
+    groups = {"control": {"percentage": 50, "enabled": False}, "treatment": {"percentage": 50, "enabled": True}}
+    compiled = flag(flag="a_b_test", ab_test_active=True, ab_test_groups=groups)
+    for user_id in range(50):
+        expected = (False, "control") if compiled.bucket(user_id) < 50 else (True, "treatment")
+        assert compiled.evaluate(user_id) == expected
+
+def test_inactive_ab_test_is_disabled():
+    groups = {"treatment": {"percentage": 100, "enabled": True}}
+    assert flag(flag="a_b_test", ab_test_active=False, ab_test_groups=groups).evaluate(1) == DISABLED
+
+def test_gradual_rollout_ramps_to_target():
+    finished = flag(flag="gradual_rollout", rollout_percentage=0, created_at=iso(-10), rollout_target_date=iso(-1))
+    assert finished.evaluate(1) == (True, None)
+
+    not_started = flag(flag="gradual_rollout", rollout_percentage=100, created_at=iso(0.001), rollout_target_date=iso(10))
+    assert not_started.evaluate(1) == (False, None)
+
+def test_user_segment():
+    compiled = flag(flag="user_segment", target_user_ids=[1], excluded_user_ids=[2], target_user_roles=["beta"])
+    assert compiled.evaluate(1) == ENABLED
+    assert compiled.evaluate(2, ["beta"]) == DISABLED
+    assert compiled.evaluate(3, ["beta"]) == ENABLED
+    assert compiled.evaluate(3) == DISABLED
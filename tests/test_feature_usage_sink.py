@@ -0,0 +1,76 @@
+"""Tests for the write-behind feature usage sink."""
+
+import asyncio
+
+import pytest
+
+from feature_usage_sink import FeatureUsageSink
+
+@pytest.fixture
+def supabase(fake_supabase):
+    fake_supabase.applied = []
+
+    def apply_deltas(params):
+        fake_supabase.applied.extend(params["deltas"])
+    fake_supabase.rpc_handlers["apply_feature_usage_deltas"] = apply_deltas
+    return fake_supabase
+
+def insert_attempts(supabase):
+    return len(supabase.executed("feature_usage_events", "insert"))
+
+def test_failed_counter_update_does_not_reinsert_events(supabase):
+    supabase.fail("rpc.apply_feature_usage_deltas", times=2)
+    sink = FeatureUsageSink(supabase, batch_size=10)
+
+    async def run():
+        for _ in range(3):
+            sink.record("dashboard", 1, "access")
+        await sink.flush()
+        sink.record("dashboard", 1, "access")
+        sink.record("dashboard", 1, "error")
+        await sink.flush()
+        await sink.flush()
+    asyncio.run(run())
+
+    inserted = supabase.tables["feature_usage_events"]
+    assert len(inserted) == 5
+    assert all("_attempts" not in row for row in inserted)
+    assert [delta["usage_count"] for delta in supabase.applied] == [4]
+    assert sink.get_stats()["pending_deltas"] == 0
+
+def test_failed_insert_is_retried_then_dropped(supabase):
+    supabase.fail("feature_usage_events.insert", times=10)
+    sink = FeatureUsageSink(supabase, max_retries=2)
+
+    async def run():
+        sink.record("dashboard", 1, "access")
+        for _ in range(4):
+            await sink.flush()
+    asyncio.run(run())
+
+    assert insert_attempts(supabase) == 3
+    assert sink.stats["retries_exhausted"] == 1
+    assert sink.get_stats()["buffered"] == 0
+    assert supabase.applied == []
+
+def test_unapplied_counts_are_dropped_after_retry_cap(supabase):
+    supabase.fail("rpc.apply_feature_usage_deltas", times=10)
+    sink = FeatureUsageSink(supabase, max_retries=1)
+
+    async def run():
+        sink.record("dashboard", 1, "access")
+        for _ in range(3):
+            await sink.flush()
+    asyncio.run(run())
+
+    assert len(supabase.rpc_calls) == 2
+    assert sink.stats["deltas_dropped"] == 1
+    assert sink.get_stats()["pending_deltas"] == 0
+
+def test_retry_delay_backs_off_up_to_cap(supabase):
+    sink = FeatureUsageSink(supabase, flush_interval_ms=1000, max_backoff_ms=5000)
+    delays = []
+    for failures in range(5):
+        sink._failures = failures
+        delays.append(sink._retry_delay())
+    assert delays == [1.0, 2.0, 4.0, 5.0, 5.0]
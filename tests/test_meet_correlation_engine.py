@@ -0,0 +1,67 @@
+"""Tests for bulk Meet attendance writes."""
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from google_admin_reports import MeetParticipant
+from meet_correlation_engine import MeetCorrelationEngine
+from participant_matcher import ParticipantMatcher
+
+def participant(email, joined_at, duration):
+    return MeetParticipant(
+        email=email, display_name=None, joined_at=joined_at, left_at=joined_at + timedelta(minutes=duration),
+        duration_minutes=duration, device_type="web", is_external=False, is_phone=False, reconnect_count=0,
+        audio_minutes=duration, video_minutes=duration, ip_address=None, location_country=None, call_rating=None
+    )
+
+def engine_with(existing_attendance):
+    tables = {"meet_participants": MagicMock(), "meeting_attendance": MagicMock()}
+    tables["meet_participants"].upsert.return_value.execute.return_value.data = []
+    attendance = tables["meeting_attendance"]
+    attendance.select.return_value.in_.return_value.in_.return_value.execute.return_value.data = existing_attendance
+
+    supabase = MagicMock()
+    supabase.table.side_effect = lambda name: tables[name]
+
+    engine = MeetCorrelationEngine(supabase, admin_reports=None)
+    engine.matcher = ParticipantMatcher(
+        [("u1", "ada@example.com")], [("ada.home@gmail.com", "u1", "low")], domain="example.com"
+    )
+    return engine, attendance
+
+def test_highest_confidence_participant_wins():
+    start = datetime(2024, 1, 1, 10, 0)
+    session = {"id": "s1", "meeting_id": "m1"}
+    participants = [
+        participant("ada.home@gmail.com", start, 10),      # manual mapping, 0.5
+        participant("ada@example.com", start + timedelta(minutes=5), 40),  # exact email, 1.0
+    ]
+    engine, attendance = engine_with([])
+
+    results = engine._write_session_batch([(session, participants)])
+
+    rows = attendance.upsert.call_args[0][0]
+    assert len(rows) == 1
+    assert rows[0]["user_id"] == "u1"
+    assert rows[0]["confidence_score"] == 1.0
+    assert rows[0]["duration_minutes"] == 40
+    assert results["s1"] == {"matched_users": 2, "new_records": 1, "updated_records": 0}
+
+def test_tie_keeps_earlier_participant():
+    start = datetime(2024, 1, 1, 10, 0)
+    session = {"id": "s1", "meeting_id": "m1"}
+    participants = [participant("ada@example.com", start, 10), participant("ADA@example.com", start + timedelta(minutes=30), 20)]
+    engine, attendance = engine_with([])
+
+    engine._write_session_batch([(session, participants)])
+
+    assert attendance.upsert.call_args[0][0][0]["duration_minutes"] == 10
+
+def test_existing_higher_confidence_record_is_kept():
+    session = {"id": "s1", "meeting_id": "m1"}
+    existing = [{"meeting_id": "m1", "user_id": "u1", "confidence_score": 0.9, "detection_method": "automatic_meet"}]
+    engine, attendance = engine_with(existing)
+
+    engine._write_session_batch([(session, [participant("ada.home@gmail.com", datetime(2024, 1, 1, 10), 10)])])
+
+    attendance.upsert.assert_not_called()
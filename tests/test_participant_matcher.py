@@ -0,0 +1,81 @@
+"""Tests for the in-memory Meet participant matcher."""
+
+import pytest
+
+from participant_matcher import DOMAIN_MATCH_CONFIDENCE, MAPPING_CONFIDENCE, ParticipantMatcher
+
+DOMAIN = "progressmethod.com"
+
+USERS = [
+    ("u1", "alice@example.com"),
+    ("u2", "bob.smith@progressmethod.com"),
+    ("u3", "carol@example.com"),
+    ("u4", None),
+    ("u5", "dave@personal.net"),
+]
+
+MAPPINGS = [
+    ("alice.work@gmail.com", "u1", "high"),
+    ("carol.m@gmail.com", "u3", "medium"),
+    ("carol.l@gmail.com", "u3", "low"),
+    ("carol.x@gmail.com", "u3", "unknown"),
+    ("ghost@gmail.com", "missing-user", "high"),
+    ("alice@example.com", "u3", "high"),
+]
+
+@pytest.fixture
+def matcher():
+    return ParticipantMatcher(USERS, MAPPINGS, domain=DOMAIN)
+
+def test_exact_email_is_full_confidence(matcher):
+    match = matcher.match("  Alice@Example.com ")
+    assert (match.user_id, match.confidence_score, match.match_method) == ("u1", 1.0, "exact_email")
+    assert match.meet_participant_email == "alice@example.com"
+
+def test_exact_email_wins_over_mapping(matcher):
+    assert matcher.match("alice@example.com").user_id == "u1"
+
+@pytest.mark.parametrize("email, level", [
+    ("alice.work@gmail.com", "high"),
+    ("carol.m@gmail.com", "medium"),
+    ("carol.l@gmail.com", "low"),
+])
+def test_mapping_confidence_levels(matcher, email, level):
+    match = matcher.match(email)
+    assert match.match_method == "manual_mapping"
+    assert match.confidence_score == MAPPING_CONFIDENCE[level]
+
+def test_unknown_mapping_level_scores_low(matcher):
+    assert matcher.match("carol.x@gmail.com").confidence_score == 0.5
+
+def test_mapping_to_missing_user_is_no_match(matcher):
+    match = matcher.match("ghost@gmail.com")
+    assert (match.user_id, match.confidence_score, match.match_method) == (None, 0.0, "no_match")
+
+def test_domain_address_matches_local_part(matcher):
+    match = matcher.match("dave@progressmethod.com")
+    assert (match.user_id, match.confidence_score, match.match_method) == ("u5", DOMAIN_MATCH_CONFIDENCE, "domain_match")
+
+def test_domain_address_matches_substring(matcher):
+    assert matcher.match("smith@progressmethod.com").user_id == "u2"
+
+def test_domain_match_treats_underscore_as_wildcard(matcher):
+    # ILIKE '%b_b%' matches "bob.smith@..."
+    assert matcher.match("b_b@progressmethod.com").user_id == "u2"
+
+def test_short_domain_term_scans_in_directory_order(matcher):
+    # Too short for trigrams: the first user (directory order) containing "al" wins
+    assert matcher.match("al@progressmethod.com").user_id == "u1"
+
+def test_outside_domain_without_mapping_is_no_match(matcher):
+    assert matcher.match("dave@elsewhere.org").match_method == "no_match"
+
+def test_no_domain_disables_similarity_match():
+    matcher = ParticipantMatcher(USERS, MAPPINGS)
+    assert matcher.match("dave@progressmethod.com").match_method == "no_match"
+
+def test_match_many_keys_by_given_email(matcher):
+    matches = matcher.match_many(["Alice@Example.com", "nobody@gmail.com", "Alice@Example.com"])
+    assert set(matches) == {"Alice@Example.com", "nobody@gmail.com"}
+    assert matches["Alice@Example.com"].user_id == "u1"
+    assert matches["nobody@gmail.com"].user_id is None
@@ -0,0 +1,72 @@
+"""Tests for nurture sequence compilation and validation."""
+
+import pytest
+
+from sequence_plans import compile_sequence, compile_sequences
+
+def definition(**overrides):
+    data = {
+        "name": "Welcome",
+        "trigger": "signup",
+        "messages": [
+            {"delay_hours": 0, "message": "Hi {first_name}!", "template": True},
+            {"delay_hours": 24, "message": "Day one done", "condition": "no_commitment"},
+            {"delay_hours": 48, "message": "Still there, {first_name}? {unknown}"},
+        ],
+    }
+    data.update(overrides)
+    return data
+
+def test_compiles_offsets_and_indexes():
+    plan = compile_sequence("welcome", definition(), known_conditions={"no_commitment"})
+
+    assert plan.name == "Welcome"
+    assert plan.trigger == "signup"
+    assert [step.offset_hours for step in plan.steps] == [0.0, 24.0, 72.0]
+    assert plan.duration_hours == 72.0
+    assert plan.immediate_steps == (0,)
+    assert plan.conditions == frozenset({"no_commitment"})
+    assert plan.steps[0].is_template
+    assert plan.step(3) is None
+    assert "messages" not in plan.data
+
+def test_render_keeps_unknown_placeholders():
+    step = compile_sequence("welcome", definition()).steps[2]
+    assert step.placeholders == ("first_name", "unknown")
+    assert step.render({"first_name": "Ada"}) == "Still there, Ada? {unknown}"
+
+@pytest.mark.parametrize("overrides, error", [
+    ({"name": ""}, "has no name"),
+    ({"messages": []}, "has no messages"),
+    ({"messages": [{"delay_hours": -1, "message": "x"}]}, "delay_hours"),
+    ({"messages": [{"delay_hours": True, "message": "x"}]}, "delay_hours"),
+    ({"messages": [{"delay_hours": "2", "message": "x"}]}, "delay_hours"),
+    ({"messages": [{"delay_hours": 1, "message": "   "}]}, "empty message"),
+    ({"messages": [{"delay_hours": 1, "message": "x", "condition": ""}]}, "condition"),
+    ({"messages": [{"delay_hours": 1, "message": "x", "condition": "nope"}]}, "unknown condition 'nope'"),
+])
+def test_rejects_bad_definitions(overrides, error):
+    with pytest.raises(ValueError, match=error):
+        compile_sequence("bad", definition(**overrides), known_conditions={"no_commitment"})
+
+def test_unknown_conditions_allowed_without_known_set():
+    plan = compile_sequence("open", definition(messages=[{"delay_hours": 1, "message": "x", "condition": "anything"}]))
+    assert plan.conditions == frozenset({"anything"})
+
+def test_compile_sequences_reports_every_error():
+    with pytest.raises(ValueError) as excinfo:
+        compile_sequences({
+            "ok": definition(),
+            "first": definition(name=""),
+            "second": definition(messages=[]),
+        })
+    message = str(excinfo.value)
+    assert "Sequence 'first' has no name" in message
+    assert "Sequence 'second' has no messages" in message
+
+def test_plans_are_read_only():
+    plans = compile_sequences({"welcome": definition()})
+    with pytest.raises(TypeError):
+        plans["other"] = None
+    with pytest.raises(TypeError):
+        plans["welcome"].steps[0].data["message"] = "changed"
@@ -15,7 +15,12 @@ import uuid
 
 from supabase import Client
 from nurture_sequences import NurtureSequences, SequenceType
+from sequence_plans import StepPlan
 from attendance_nurture_engine import AttendanceNurtureEngine, AttendanceTrigger
+from delivery_workers import DeliveryEngine, ChannelConfig
+from delivery_status_buffer import DeliveryStatusBuffer
+from analytics_rollups import AnalyticsRollups
+from engagement_scorer import EngagementScorer
 
 logger = logging.getLogger(__name__)
 
@@ -68,18 +73,37 @@ class UnifiedNurtureController:
         self.email_service = None
         self.telegram_service = None
         
+        # Optional NurtureScheduler for deadline-driven firing
+        self.scheduler = None
+        
+        # Per-channel worker pools, built once the channel services are injected
+        self.delivery_engine = None
+        
+        # Sent / failed transitions are written behind in bulk
+        self.status_buffer = DeliveryStatusBuffer(supabase_client)
+        self.analytics = AnalyticsRollups(supabase_client)
+        self.engagement_scorer = EngagementScorer(supabase_client)
+        
         logger.info("🎯 Unified Nurture Controller initialized")
     
     def set_email_service(self, email_service):
         """Inject email service for multi-channel delivery"""
         self.email_service = email_service
+        self.delivery_engine = None
         logger.info("📧 Email service configured")
     
     def set_telegram_service(self, telegram_service):
         """Inject telegram service for multi-channel delivery"""
         self.telegram_service = telegram_service
+        self.delivery_engine = None
         logger.info("📱 Telegram service configured")
     
+    def attach_scheduler(self, scheduler):
+        """Register a NurtureScheduler for new sequence steps and scheduled deliveries"""
+        self.scheduler = scheduler
+        self.nurture_sequences.scheduler = scheduler
+        self.status_buffer.on_retry = scheduler.schedule_delivery
+    
     async def trigger_sequence(
         self, 
         user_id: str, 
@@ -129,6 +153,9 @@ class UnifiedNurtureController:
             if result.data:
                 logger.info(f"✅ Started {sequence_type.value} sequence for user {user_id} with {delivery_strategy.value} channel")
                 
+                if self.scheduler:
+                    self.scheduler.schedule_step(result.data[0]["id"], sequence_state["next_message_at"])
+                
                 # Process immediate messages
                 await self._process_immediate_messages(user_id, sequence_type.value, engagement_ctx)
                 return True
@@ -186,33 +213,13 @@ class UnifiedNurtureController:
     
     async def _calculate_and_store_engagement_scores(self, user_id: str):
         """Calculate and store engagement scores for user"""
-        try:
-            score_types = ['overall', 'telegram', 'email', 'attendance', 'commitment']
-            
-            for score_type in score_types:
-                # Call database function to calculate score
-                result = self.supabase.rpc('calculate_engagement_score', {
-                    'target_user_id': user_id,
-                    'score_type': score_type
-                }).execute()
-                
-                if result.data:
-                    score = float(result.data)
-                    
-                    # Store the score
-                    score_data = {
-                        "user_id": user_id,
-                        "score_type": score_type,
-                        "score": score,
-                        "calculated_at": datetime.now().isoformat(),
-                        "valid_until": (datetime.now() + timedelta(hours=24)).isoformat()  # Cache for 24 hours
-                    }
-                    
-                    # Upsert the score
-                    self.supabase.table("engagement_scores").upsert(score_data).execute()
-                    
-        except Exception as e:
-            logger.error(f"Error calculating engagement scores: {e}")
+        await self.engagement_scorer.refresh([user_id])
+    
+    async def refresh_engagement_scores(self, user_ids: Optional[List[str]] = None) -> int:
+        """Rescore many users at once; with no ids, the whole active user base (nightly job)"""
+        if user_ids is None:
+            return await self.engagement_scorer.refresh_active_users()
+        return await self.engagement_scorer.refresh(user_ids)
     
     async def _determine_delivery_strategy(
         self, 
@@ -285,12 +292,13 @@ class UnifiedNurtureController:
     ) -> str:
         """Calculate next message time with engagement-based adjustments"""
         
-        # Get base timing from sequence definition
-        sequence_def = self.nurture_sequences.sequences.get(sequence_type.value)
-        if not sequence_def or current_step >= len(sequence_def["messages"]):
+        # Get base timing from the compiled sequence plan
+        plan = self.nurture_sequences.plans.get(sequence_type.value)
+        step = plan.step(current_step) if plan else None
+        if step is None:
             return None
         
-        base_delay_hours = sequence_def["messages"][current_step]["delay_hours"]
+        base_delay_hours = step.delay_hours
         
         # Adjust timing based on engagement score
         if engagement_ctx.overall_score > 80:
@@ -313,18 +321,15 @@ class UnifiedNurtureController:
     ):
         """Process messages that should be sent immediately"""
         try:
-            sequence_def = self.nurture_sequences.sequences[sequence_type]
-            immediate_messages = [
-                (idx, msg) for idx, msg in enumerate(sequence_def["messages"]) 
-                if msg["delay_hours"] == 0
-            ]
+            plan = self.nurture_sequences.plans[sequence_type]
             
-            for step_idx, message_data in immediate_messages:
+            for step_idx in plan.immediate_steps:
+                step = plan.steps[step_idx]
                 # Check conditions
-                if await self._should_send_message(user_id, message_data):
+                if await self._should_send_message(user_id, step):
                     # Get personalized message content
                     message_content = await self._personalize_message(
-                        user_id, message_data, engagement_ctx
+                        user_id, step, engagement_ctx
                     )
                     
                     # Schedule multi-channel delivery
@@ -340,15 +345,15 @@ class UnifiedNurtureController:
         except Exception as e:
             logger.error(f"Error processing immediate messages: {e}")
     
-    async def _should_send_message(self, user_id: str, message_data: Dict) -> bool:
+    async def _should_send_message(self, user_id: str, step: StepPlan) -> bool:
         """Enhanced message condition checking"""
         # Use existing logic from nurture_sequences.py
-        return await self.nurture_sequences._should_send_message(user_id, message_data)
+        return await self.nurture_sequences._should_send_message(user_id, step)
     
     async def _personalize_message(
         self, 
         user_id: str, 
-        message_data: Dict, 
+        step: StepPlan, 
         engagement_ctx: EngagementContext
     ) -> str:
         """Personalize message content based on engagement context"""
@@ -356,16 +361,13 @@ class UnifiedNurtureController:
             # Get user info
             user_result = self.supabase.table("users").select("first_name, last_name").eq("id", user_id).execute()
             if not user_result.data:
-                return message_data["message"]
+                return step.message
             
             user = user_result.data[0]
-            first_name = user.get("first_name", "there")
-            
-            message_content = message_data["message"]
+            first_name = user.get("first_name") or "there"
             
-            # Basic personalization
-            message_content = message_content.replace("{user_name}", first_name)
-            message_content = message_content.replace("{first_name}", first_name)
+            # Basic personalization (template tokenised when the plan was compiled)
+            message_content = step.render({"user_name": first_name, "first_name": first_name})
             
             # Engagement-based personalization
             if engagement_ctx.overall_score > 80:
@@ -379,7 +381,7 @@ class UnifiedNurtureController:
             
         except Exception as e:
             logger.error(f"Error personalizing message: {e}")
-            return message_data["message"]
+            return step.message
     
     def _enhance_message_for_high_engagement(self, message: str) -> str:
         """Enhance messages for highly engaged users"""
@@ -439,6 +441,9 @@ class UnifiedNurtureController:
                 )
                 results.append(delivery_result)
                 
+                if self.scheduler:
+                    self.scheduler.schedule_delivery(delivery["delivery_id"], scheduled_time or datetime.now())
+                
                 logger.info(f"📨 Scheduled {delivery['channel']} message for user {user_id}")
             
         except Exception as e:
@@ -456,47 +461,31 @@ class UnifiedNurtureController:
         
         return results
     
+    def _get_delivery_engine(self) -> DeliveryEngine:
+        """Delivery engine with a worker pool for each configured channel"""
+        if self.delivery_engine is None:
+            channels = []
+            if self.telegram_service:
+                # Telegram allows ~30 messages/second per bot
+                channels.append(ChannelConfig("telegram", self._send_telegram_message, concurrency=20, rate_per_second=25))
+            if self.email_service:
+                # The email service paces its own Resend requests (2/second) and coalesces concurrent
+                # sends into batch requests, so keep a full batch in flight instead of limiting per email
+                batch_size = self.email_service.MAX_BATCH_SIZE
+                channels.append(ChannelConfig("email", self._send_email_message, concurrency=batch_size,
+                                              rate_per_second=None, claim_batch_size=batch_size))
+            self.delivery_engine = DeliveryEngine(self.supabase, channels)
+        return self.delivery_engine
+    
     async def process_pending_deliveries(self) -> Dict[str, int]:
-        """Process all pending message deliveries"""
+        """Process all pending message deliveries (leased per channel, sent concurrently)"""
         try:
-            stats = {
-                "telegram_sent": 0,
-                "telegram_failed": 0,
-                "email_sent": 0,
-                "email_failed": 0,
-                "total_processed": 0
-            }
+            engine = self._get_delivery_engine()
+            if not engine.channels:
+                logger.warning("No delivery channels configured")
             
-            # Get pending deliveries
-            now = datetime.now().isoformat()
-            pending_result = self.supabase.table("message_deliveries").select("*").eq(
-                "delivery_status", "pending"
-            ).lte("scheduled_at", now).execute()
-            
-            for delivery in pending_result.data:
-                stats["total_processed"] += 1
-                
-                try:
-                    if delivery["channel"] == "telegram":
-                        success = await self._send_telegram_message(delivery)
-                        if success:
-                            stats["telegram_sent"] += 1
-                        else:
-                            stats["telegram_failed"] += 1
-                    
-                    elif delivery["channel"] == "email":
-                        success = await self._send_email_message(delivery)
-                        if success:
-                            stats["email_sent"] += 1
-                        else:
-                            stats["email_failed"] += 1
-                
-                except Exception as e:
-                    logger.error(f"Error processing delivery {delivery['id']}: {e}")
-                    if delivery["channel"] == "telegram":
-                        stats["telegram_failed"] += 1
-                    else:
-                        stats["email_failed"] += 1
+            stats = await engine.run_once()
+            await self.status_buffer.flush()
             
             logger.info(f"📊 Processed {stats['total_processed']} pending deliveries: {stats}")
             return stats
@@ -505,6 +494,10 @@ class UnifiedNurtureController:
             logger.error(f"Error processing pending deliveries: {e}")
             return {"error": str(e)}
     
+    def get_delivery_stats(self) -> Dict[str, Any]:
+        """Per-channel throughput and latency of the delivery workers"""
+        return self._get_delivery_engine().get_stats()
+    
     async def _send_telegram_message(self, delivery: Dict) -> bool:
         """Send Telegram message"""
         try:
@@ -521,11 +514,7 @@ class UnifiedNurtureController:
             )
             
             if success:
-                # Update delivery status
-                self.supabase.table("message_deliveries").update({
-                    "delivery_status": "sent",
-                    "sent_at": datetime.now().isoformat()
-                }).eq("id", delivery["id"]).execute()
+                self.status_buffer.record_sent(delivery["id"])
                 
                 logger.debug(f"✅ Telegram message sent to {telegram_user_id}")
                 return True
@@ -534,6 +523,10 @@ class UnifiedNurtureController:
                 self._mark_delivery_failed(delivery["id"], "Telegram send failed")
                 return False
                 
+        except ValueError as e:
+            # Malformed recipient - retrying will not help
+            self._mark_delivery_failed(delivery["id"], f"Invalid Telegram recipient: {str(e)}", retryable=False)
+            return False
         except Exception as e:
             self._mark_delivery_failed(delivery["id"], f"Telegram error: {str(e)}")
             return False
@@ -549,7 +542,9 @@ class UnifiedNurtureController:
             message_content = delivery["message_content"]
             
             # Get user for personalization
-            user_result = self.supabase.table("users").select("first_name").eq("id", delivery["user_id"]).execute()
+            user_result = await asyncio.to_thread(
+                self.supabase.table("users").select("first_name").eq("id", delivery["user_id"]).execute
+            )
             user_name = user_result.data[0]["first_name"] if user_result.data else "Friend"
             
             # Send via email service
@@ -562,12 +557,7 @@ class UnifiedNurtureController:
             )
             
             if success:
-                # Update delivery status
-                self.supabase.table("message_deliveries").update({
-                    "delivery_status": "sent",
-                    "sent_at": datetime.now().isoformat(),
-                    "tracking_id": delivery["id"]
-                }).eq("id", delivery["id"]).execute()
+                self.status_buffer.record_sent(delivery["id"], tracking_id=delivery["id"])
                 
                 logger.debug(f"✅ Email sent to {email_address}")
                 return True
@@ -579,97 +569,15 @@ class UnifiedNurtureController:
             self._mark_delivery_failed(delivery["id"], f"Email error: {str(e)}")
             return False
     
-    def _mark_delivery_failed(self, delivery_id: str, reason: str):
-        """Mark delivery as failed"""
-        try:
-            self.supabase.table("message_deliveries").update({
-                "delivery_status": "failed",
-                "failed_at": datetime.now().isoformat(),
-                "failure_reason": reason,
-                "attempt_count": self.supabase.table("message_deliveries").select("attempt_count").eq("id", delivery_id).execute().data[0]["attempt_count"] + 1
-            }).eq("id", delivery_id).execute()
-        except Exception as e:
-            logger.error(f"Error marking delivery failed: {e}")
+    def _mark_delivery_failed(self, delivery_id: str, reason: str, retryable: bool = True):
+        """Mark delivery as failed (retried with backoff until max_attempts)"""
+        self.status_buffer.record_failed(delivery_id, reason, retryable=retryable)
     
     async def get_sequence_analytics(self, days: int = 30) -> Dict[str, Any]:
         """Get comprehensive sequence analytics"""
         try:
-            cutoff_date = (datetime.now() - timedelta(days=days)).date()
-            
-            # Get delivery analytics
-            analytics_result = self.supabase.table("delivery_analytics").select("*").gte(
-                "delivery_date", cutoff_date.isoformat()
-            ).execute()
-            
-            # Aggregate data
-            analytics = {
-                "period_days": days,
-                "total_deliveries": 0,
-                "channel_breakdown": {},
-                "sequence_breakdown": {},
-                "overall_metrics": {
-                    "delivery_rate": 0,
-                    "open_rate": 0,
-                    "click_rate": 0
-                }
-            }
-            
-            total_scheduled = 0
-            total_delivered = 0
-            total_opened = 0
-            total_clicked = 0
-            
-            for row in analytics_result.data:
-                sequence_type = row["sequence_type"]
-                channel = row["channel"]
-                
-                # Channel breakdown
-                if channel not in analytics["channel_breakdown"]:
-                    analytics["channel_breakdown"][channel] = {
-                        "scheduled": 0,
-                        "delivered": 0,
-                        "opened": 0,
-                        "clicked": 0
-                    }
-                
-                analytics["channel_breakdown"][channel]["scheduled"] += row["total_scheduled"]
-                analytics["channel_breakdown"][channel]["delivered"] += row["delivered_count"]
-                analytics["channel_breakdown"][channel]["opened"] += row["opened_count"]
-                analytics["channel_breakdown"][channel]["clicked"] += row["clicked_count"]
-                
-                # Sequence breakdown
-                if sequence_type not in analytics["sequence_breakdown"]:
-                    analytics["sequence_breakdown"][sequence_type] = {
-                        "scheduled": 0,
-                        "delivered": 0,
-                        "opened": 0,
-                        "clicked": 0
-                    }
-                
-                analytics["sequence_breakdown"][sequence_type]["scheduled"] += row["total_scheduled"]
-                analytics["sequence_breakdown"][sequence_type]["delivered"] += row["delivered_count"]
-                analytics["sequence_breakdown"][sequence_type]["opened"] += row["opened_count"]
-                analytics["sequence_breakdown"][sequence_type]["clicked"] += row["clicked_count"]
-                
-                # Overall totals
-                total_scheduled += row["total_scheduled"]
-                total_delivered += row["delivered_count"]
-                total_opened += row["opened_count"]
-                total_clicked += row["clicked_count"]
-            
-            # Calculate overall metrics
-            analytics["total_deliveries"] = total_scheduled
-            analytics["overall_metrics"]["delivery_rate"] = round(
-                (total_delivered / total_scheduled * 100) if total_scheduled > 0 else 0, 2
-            )
-            analytics["overall_metrics"]["open_rate"] = round(
-                (total_opened / total_delivered * 100) if total_delivered > 0 else 0, 2
-            )
-            analytics["overall_metrics"]["click_rate"] = round(
-                (total_clicked / total_opened * 100) if total_opened > 0 else 0, 2
-            )
-            
-            return analytics
+            # Daily delivery rollups, a few rows per day
+            return self.analytics.sequence_delivery_analytics(days)
             
         except Exception as e:
             logger.error(f"Error getting sequence analytics: {e}")
@@ -722,6 +630,7 @@ async def main():
     parser.add_argument('--user-id', type=str, help='User ID to test with')
     parser.add_argument('--sequence', type=str, help='Sequence type to trigger')
     parser.add_argument('--analytics', action='store_true', help='Show analytics')
+    parser.add_argument('--refresh-engagement', action='store_true', help='Rescore all active users (nightly job)')
     
     args = parser.parse_args()
     
@@ -730,7 +639,11 @@ async def main():
     supabase = create_client(config.supabase_url, config.supabase_key)
     controller = UnifiedNurtureController(supabase)
     
-    if args.analytics:
+    if args.refresh_engagement:
+        scored = await controller.refresh_engagement_scores()
+        print(f"Engagement scores refreshed for {scored} users: {controller.engagement_scorer.get_stats()}")
+    
+    elif args.analytics:
         analytics = await controller.get_sequence_analytics()
         print("Nurture Sequence Analytics:")
         print("=" * 50)
@@ -0,0 +1,287 @@
+# Compact In-Memory User Directory for The Progress Method
+# Holds the small user projection that bulk paths need, warmed once at startup
+
+import asyncio
+import logging
+import sys
+from typing import Dict, List, Optional, Set, Tuple, Iterable
+from datetime import datetime, timedelta
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+# Columns pulled from `users` - keep this list short, it is what every entry costs
+USER_DIRECTORY_COLUMNS = "id, telegram_user_id, first_name, username, email, updated_at"
+
+class DirectoryUser:
+    """Slot-based user record (~200 bytes including the UUID string)"""
+
+    __slots__ = ("id", "telegram_user_id", "first_name", "username", "email", "roles", "pod_id")
+
+    def __init__(self, id: str, telegram_user_id: Optional[int], first_name: Optional[str],
+                 username: Optional[str], email: Optional[str],
+                 roles: Tuple[str, ...] = (), pod_id: Optional[str] = None):
+        self.id = id
+        self.telegram_user_id = telegram_user_id
+        self.first_name = first_name
+        self.username = username
+        self.email = email
+        self.roles = roles
+        self.pod_id = pod_id
+
+    def to_dict(self) -> Dict:
+        """Dict view matching the shape of a projected `users` row"""
+        return {
+            "id": self.id,
+            "telegram_user_id": self.telegram_user_id,
+            "first_name": self.first_name,
+            "username": self.username,
+            "email": self.email,
+            "roles": list(self.roles),
+            "pod_id": self.pod_id
+        }
+
+class UserDirectory:
+    """Process-wide user directory with secondary indexes, kept fresh by delta polling"""
+
+    def __init__(self, supabase_client: Client, page_size: int = 1000,
+                 refresh_interval: int = 60, membership_reload_interval: int = 900):
+        self.supabase = supabase_client
+        self.page_size = page_size
+        self.refresh_interval = refresh_interval
+        self.membership_reload_interval = timedelta(seconds=membership_reload_interval)
+
+        # Primary store and secondary indexes
+        self.by_id: Dict[str, DirectoryUser] = {}
+        self.by_telegram_id: Dict[int, DirectoryUser] = {}
+        self.by_email: Dict[str, DirectoryUser] = {}
+        self.by_pod: Dict[str, Set[str]] = {}
+
+        # High-water marks for delta polling
+        self.users_high_water_mark: Optional[str] = None
+        self.memberships_loaded_at: Optional[datetime] = None
+
+        self.loaded = False
+        self._load_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    # ---------------------------------------------------------------
+    # Loading and refreshing
+    # ---------------------------------------------------------------
+
+    async def load(self) -> bool:
+        """Full load of users, active roles and active pod memberships"""
+        async with self._load_lock:
+            try:
+                started = datetime.now()
+
+                for row in self._fetch_pages(lambda: self.supabase.table("users").select(USER_DIRECTORY_COLUMNS).order("id")):
+                    self._upsert_user(row)
+
+                self._reload_memberships()
+                self.loaded = True
+
+                logger.info(f"✅ User directory loaded: {len(self.by_id)} users in {(datetime.now() - started).total_seconds():.2f}s")
+                return True
+
+            except Exception as e:
+                logger.error(f"Error loading user directory: {e}")
+                return False
+
+    async def refresh(self) -> int:
+        """Apply users changed since the last poll; returns number of changed users"""
+        if not self.loaded:
+            return len(self.by_id) if await self.load() else 0
+
+        async with self._load_lock:
+            try:
+                changed = 0
+                since = self.users_high_water_mark
+                if since:
+                    query_factory = lambda: self.supabase.table("users").select(USER_DIRECTORY_COLUMNS).gt("updated_at", since).order("updated_at")
+                    for row in self._fetch_pages(query_factory):
+                        self._upsert_user(row)
+                        changed += 1
+
+                # Roles and memberships have no updated_at - reload the two-column projections periodically
+                if not self.memberships_loaded_at or datetime.now() - self.memberships_loaded_at >= self.membership_reload_interval:
+                    self._reload_memberships()
+
+                if changed:
+                    logger.info(f"🔄 User directory refreshed: {changed} changed users")
+                return changed
+
+            except Exception as e:
+                logger.error(f"Error refreshing user directory: {e}")
+                return 0
+
+    def start_background_refresh(self) -> None:
+        """Start the delta polling loop on the running event loop"""
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop_background_refresh(self) -> None:
+        """Stop the delta polling loop"""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def _refresh_loop(self):
+        """Poll for changed users every refresh_interval seconds"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+
+    def _fetch_pages(self, query_factory) -> Iterable[Dict]:
+        """Yield rows from a query in page_size ranges"""
+        offset = 0
+        while True:
+            result = query_factory().range(offset, offset + self.page_size - 1).execute()
+            rows = result.data or []
+            yield from rows
+            if len(rows) < self.page_size:
+                break
+            offset += self.page_size
+
+    def _reload_memberships(self):
+        """Reload active roles and pod memberships for every user in the directory"""
+        roles: Dict[str, List[str]] = {}
+        for row in self._fetch_pages(lambda: self.supabase.table("user_roles").select("user_id, role_type").eq("is_active", True).order("user_id")):
+            roles.setdefault(row["user_id"], []).append(sys.intern(row["role_type"]))
+
+        pods: Dict[str, str] = {}
+        for row in self._fetch_pages(lambda: self.supabase.table("pod_memberships").select("user_id, pod_id").eq("is_active", True).order("user_id")):
+            pods[row["user_id"]] = row["pod_id"]
+
+        self.by_pod = {}
+        for user_id, user in self.by_id.items():
+            user.roles = tuple(roles.get(user_id, ()))
+            self._set_pod(user, pods.get(user_id))
+
+        self.memberships_loaded_at = datetime.now()
+
+    # ---------------------------------------------------------------
+    # Index maintenance
+    # ---------------------------------------------------------------
+
+    def _upsert_user(self, row: Dict):
+        """Insert or update one user record and its secondary indexes"""
+        user_id = row["id"]
+        email = self._normalise_email(row.get("email"))
+        telegram_user_id = row.get("telegram_user_id")
+
+        user = self.by_id.get(user_id)
+        if user is None:
+            user = DirectoryUser(user_id, telegram_user_id, row.get("first_name"), row.get("username"), email)
+            self.by_id[user_id] = user
+        else:
+            # Drop stale secondary keys before re-indexing
+            if user.telegram_user_id is not None and user.telegram_user_id != telegram_user_id:
+                self.by_telegram_id.pop(user.telegram_user_id, None)
+            if user.email and user.email != email:
+                self.by_email.pop(user.email, None)
+
+            user.telegram_user_id = telegram_user_id
+            user.first_name = row.get("first_name")
+            user.username = row.get("username")
+            user.email = email
+
+        if telegram_user_id is not None:
+            self.by_telegram_id[telegram_user_id] = user
+        if email:
+            self.by_email[email] = user
+
+        updated_at = row.get("updated_at")
+        if updated_at and (not self.users_high_water_mark or updated_at > self.users_high_water_mark):
+            self.users_high_water_mark = updated_at
+
+    def _set_pod(self, user: DirectoryUser, pod_id: Optional[str]):
+        """Move a user between pod index buckets"""
+        if user.pod_id and user.pod_id in self.by_pod:
+            self.by_pod[user.pod_id].discard(user.id)
+
+        user.pod_id = sys.intern(pod_id) if pod_id else None
+        if user.pod_id:
+            self.by_pod.setdefault(user.pod_id, set()).add(user.id)
+
+    def apply_roles(self, user_id: str, roles: List[str]):
+        """Write-through hook for callers that just changed a user's roles"""
+        user = self.by_id.get(user_id)
+        if user:
+            user.roles = tuple(sys.intern(r) for r in roles)
+
+    def apply_pod_membership(self, user_id: str, pod_id: Optional[str]):
+        """Write-through hook for callers that just changed a user's pod"""
+        user = self.by_id.get(user_id)
+        if user:
+            self._set_pod(user, pod_id)
+
+    @staticmethod
+    def _normalise_email(email: Optional[str]) -> Optional[str]:
+        return email.strip().lower() if email else None
+
+    # ---------------------------------------------------------------
+    # Lookups
+    # ---------------------------------------------------------------
+
+    def get_by_id(self, user_id: str) -> Optional[DirectoryUser]:
+        return self.by_id.get(user_id)
+
+    def get_by_telegram_id(self, telegram_user_id: int) -> Optional[DirectoryUser]:
+        return self.by_telegram_id.get(telegram_user_id)
+
+    def get_by_email(self, email: str) -> Optional[DirectoryUser]:
+        return self.by_email.get(self._normalise_email(email))
+
+    def get_pod_members(self, pod_id: str) -> List[DirectoryUser]:
+        return [self.by_id[user_id] for user_id in self.by_pod.get(pod_id, ()) if user_id in self.by_id]
+
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, DirectoryUser]:
+        return {user_id: self.by_id[user_id] for user_id in user_ids if user_id in self.by_id}
+
+    def all_users(self) -> List[DirectoryUser]:
+        return list(self.by_id.values())
+
+    def get_stats(self) -> Dict:
+        """Directory size and approximate memory footprint"""
+        sample = next(iter(self.by_id.values()), None)
+        per_user = 0
+        if sample:
+            per_user = sys.getsizeof(sample) + sum(
+                sys.getsizeof(getattr(sample, slot)) for slot in ("id", "first_name", "username", "email")
+                if getattr(sample, slot) is not None
+            )
+
+        return {
+            "users": len(self.by_id),
+            "pods": len(self.by_pod),
+            "emails_indexed": len(self.by_email),
+            "approx_bytes_per_user": per_user,
+            "users_high_water_mark": self.users_high_water_mark,
+            "memberships_loaded_at": self.memberships_loaded_at.isoformat() if self.memberships_loaded_at else None,
+            "loaded": self.loaded
+        }
+
+# Process-wide instance
+_user_directory: Optional[UserDirectory] = None
+
+def get_user_directory(supabase_client: Client) -> UserDirectory:
+    """Get (or create) the process-wide user directory"""
+    global _user_directory
+    if _user_directory is None:
+        _user_directory = UserDirectory(supabase_client)
+    return _user_directory
+
+async def warm_user_directory(supabase_client: Client, background_refresh: bool = True) -> UserDirectory:
+    """Load the directory once at startup and start delta polling"""
+    directory = get_user_directory(supabase_client)
+    if not directory.loaded:
+        await directory.load()
+    if background_refresh:
+        directory.start_background_refresh()
+    return directory